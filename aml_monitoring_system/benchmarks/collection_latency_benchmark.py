@@ -0,0 +1,172 @@
+"""
+Measures the per-customer latency of the data collection stage:
+
+- sequential: the three detector tools awaited one after another, as the LLM data collector
+  calls them (model round trips excluded, so this is a lower bound for that agent)
+- parallel_stage: the ParallelAgent collection stage used by root_agent, run through an ADK Runner
+- llm_agent (with --llm): the former LLM data collector agent, which needs Gemini credentials
+
+Runs against the configured query backend, or on synthetic data in DuckDB with --synthetic-rows.
+Local DuckDB queries already use every core, so the parallel stage only pays off with remote
+jobs. --job-latency-seconds adds a fixed wait to every query to model BigQuery job latency, e.g.
+
+    python -m benchmarks.collection_latency_benchmark --synthetic-rows 1000000 --customers 20
+    python -m benchmarks.collection_latency_benchmark --synthetic-rows 100000 --job-latency-seconds 1.5
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import statistics
+import time
+
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from benchmarks.synthetic_transactions import generate_transactions
+from root_agent.sub_agents.data_collector_agent.collection_stage import create_collection_stage
+from root_agent.tools.config import TRANSACTIONS_TABLE
+from root_agent.tools.large_amount_detector import detect_large_amount_transactions_async
+from root_agent.tools.frequent_transaction_detector import detect_frequent_small_transactions_async
+from root_agent.tools.multiple_location_detector import detect_multiple_location_transactions_async
+from root_agent.tools.query_backend import DuckDBBackend, QueryBackend, get_backend, set_backend
+from root_agent.tools.schema import set_lookback_anchor
+
+APP_NAME = "collection_benchmark"
+
+
+class DelayedBackend(QueryBackend):
+    """
+    Wraps a backend and waits a fixed time before every async query, like a remote job would.
+    """
+
+    def __init__(self, backend, job_latency_seconds):
+        self.backend = backend
+        self.name = f"{backend.name}+{job_latency_seconds}s"
+        self.job_latency_seconds = job_latency_seconds
+
+    def query(self, query, job_config=None):
+        return self.backend.query(query, job_config)
+
+    async def query_async(self, query, job_config=None):
+        await asyncio.sleep(self.job_latency_seconds)
+        return await self.backend.query_async(query, job_config)
+
+
+async def run_sequential(customer_id):
+    await detect_large_amount_transactions_async(customer_id)
+    await detect_frequent_small_transactions_async(customer_id)
+    await detect_multiple_location_transactions_async(customer_id)
+
+
+async def run_agent(runner, session_service, customer_id):
+    session = session_service.create_session(app_name=APP_NAME, user_id="benchmark")
+    message = types.Content(role="user", parts=[types.Part(text=customer_id)])
+    async for _ in runner.run_async(user_id="benchmark", session_id=session.id, new_message=message):
+        pass
+
+
+async def _timed(coroutine):
+    start = time.perf_counter()
+    # The tools print their full results, which would dominate the timings on the console
+    with contextlib.redirect_stdout(io.StringIO()):
+        await coroutine
+    return time.perf_counter() - start
+
+
+def _summary(seconds):
+    ordered = sorted(seconds)
+    return {
+        "mean_seconds": round(statistics.mean(ordered), 4),
+        "p50_seconds": round(ordered[len(ordered) // 2], 4),
+        "p95_seconds": round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)], 4),
+    }
+
+
+def sample_customers(count):
+    """
+    Returns the most active customers, which have the slowest detections.
+    """
+    query = f"""
+        SELECT customer_id, COUNT(*) AS transaction_count
+        FROM (
+            SELECT customer_id_sender AS customer_id FROM {TRANSACTIONS_TABLE}
+            UNION ALL
+            SELECT customer_id_receiver AS customer_id FROM {TRANSACTIONS_TABLE}
+        )
+        GROUP BY customer_id
+        ORDER BY transaction_count DESC, customer_id
+        LIMIT {int(count)}
+    """
+    return [row.customer_id for row in get_backend().query(query)]
+
+
+async def run_benchmark(customer_ids, include_llm=False):
+    """
+    Times every collection strategy for each customer.
+
+    Returns:
+        dict: Latency summary per strategy and the speedup of the parallel stage.
+    """
+    session_service = InMemorySessionService()
+    stage_runner = Runner(app_name=APP_NAME, agent=create_collection_stage(), session_service=session_service)
+    llm_runner = None
+    if include_llm:
+        from root_agent.sub_agents.data_collector_agent.agent import data_collector_agent
+        llm_runner = Runner(app_name=APP_NAME, agent=data_collector_agent, session_service=session_service)
+
+    timings = {"sequential": [], "parallel_stage": []}
+    if llm_runner:
+        timings["llm_agent"] = []
+    for customer_id in customer_ids:
+        timings["sequential"].append(await _timed(run_sequential(customer_id)))
+        timings["parallel_stage"].append(await _timed(run_agent(stage_runner, session_service, customer_id)))
+        if llm_runner:
+            timings["llm_agent"].append(await _timed(run_agent(llm_runner, session_service, customer_id)))
+
+    result = {"customers": len(customer_ids)}
+    for name, seconds in timings.items():
+        result[name] = _summary(seconds)
+    parallel = result["parallel_stage"]["mean_seconds"]
+    for name in timings:
+        if name != "parallel_stage" and parallel:
+            result[f"speedup_vs_{name}"] = round(result[name]["mean_seconds"] / parallel, 2)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the per-customer latency of data collection.")
+    parser.add_argument("--customers", type=int, default=10, help="Number of (most active) customers to time")
+    parser.add_argument("--synthetic-rows", type=int, default=0,
+                        help="Run on this many synthetic transactions in DuckDB instead of the configured backend")
+    parser.add_argument("--job-latency-seconds", type=float, default=0.0,
+                        help="Fixed wait added to every detector query to model remote job latency")
+    parser.add_argument("--llm", action="store_true", help="Also time the LLM data collector agent")
+    parser.add_argument("--output", default="", help="Optional path of a JSON results file")
+    args = parser.parse_args()
+
+    if args.synthetic_rows:
+        backend = DuckDBBackend()
+        transactions = generate_transactions(args.synthetic_rows)
+        backend.load_dataframe("transactions", transactions)
+        set_backend(backend)
+        # The synthetic history is in the past, so the detectors look back from its last day
+        set_lookback_anchor(transactions["time"].max().to_pydatetime())
+    if args.job_latency_seconds:
+        set_backend(DelayedBackend(get_backend(), args.job_latency_seconds))
+    # ADK's ParallelAgent ends tracing spans in other tasks, which OpenTelemetry reports as errors
+    logging.getLogger("opentelemetry.context").setLevel(logging.CRITICAL)
+
+    result = asyncio.run(run_benchmark(sample_customers(args.customers), include_llm=args.llm))
+    result["backend"] = get_backend().name
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
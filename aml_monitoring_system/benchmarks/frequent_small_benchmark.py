@@ -0,0 +1,195 @@
+"""
+Compares the frequent small transaction detection strategies on synthetic data:
+
+- legacy_sql: the original self-join query (O(n^2) per customer)
+- window_sql: the window-frame query used by the detectors (O(n log n))
+- numpy: the sliding window kernel in root_agent/tools/sliding_window.py
+
+Runs on the local DuckDB backend, e.g.
+
+    python -m benchmarks.frequent_small_benchmark --sizes 10000,100000,1000000,10000000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+from google.cloud import bigquery
+
+from benchmarks.synthetic_transactions import generate_transactions
+from root_agent.tools.config import TRANSACTIONS_TABLE
+from root_agent.tools.frequent_transaction_detector import (
+    WINDOW_TRANSACTION_COLUMNS,
+    build_frequent_small_windows_query,
+)
+from root_agent.tools.query_backend import DuckDBBackend
+from root_agent.tools.sliding_window import non_overlapping_windows
+
+# The self-join query the detectors used before the window-frame rewrite
+LEGACY_QUERY = f"""
+    WITH AllTransactions AS (
+        SELECT transaction_id, time, amount, customer_id_sender as customer_id
+        FROM {TRANSACTIONS_TABLE}
+        WHERE amount <= @amount_threshold
+        UNION ALL
+        SELECT transaction_id, time, amount, customer_id_receiver as customer_id
+        FROM {TRANSACTIONS_TABLE}
+        WHERE amount <= @amount_threshold
+    ),
+    CustomerTransactionWindows AS (
+        SELECT
+            customer_id,
+            time as window_start,
+            TIMESTAMP_ADD(time, INTERVAL @time_window_hours HOUR) as window_end,
+            transaction_id
+        FROM AllTransactions
+    ),
+    CustomerTransactionsInWindows AS (
+        SELECT
+            ctw.customer_id,
+            ctw.transaction_id as window_start_txn_id,
+            ctw.window_start,
+            COUNT(t.transaction_id) as transaction_count,
+            ARRAY_AGG(STRUCT(t.transaction_id, t.time) ORDER BY t.time) as transactions
+        FROM CustomerTransactionWindows ctw
+        JOIN AllTransactions t
+            ON t.customer_id = ctw.customer_id
+            AND t.time >= ctw.window_start
+            AND t.time <= ctw.window_end
+        GROUP BY ctw.customer_id, ctw.transaction_id, ctw.window_start
+        HAVING COUNT(t.transaction_id) >= @count_threshold
+    ),
+    CustomerTransactionDetailsFlat AS (
+        SELECT
+            w.customer_id,
+            w.window_start_txn_id,
+            w.window_start,
+            w.transaction_count,
+            t.transaction_id,
+            ROW_NUMBER() OVER (PARTITION BY w.customer_id ORDER BY w.window_start, t.time) as window_order
+        FROM CustomerTransactionsInWindows w, UNNEST(w.transactions) t
+    ),
+    CustomerFirstOccurrence AS (
+        SELECT
+            *,
+            ROW_NUMBER() OVER (PARTITION BY customer_id, transaction_id ORDER BY window_order) = 1 AS is_first_occurrence
+        FROM CustomerTransactionDetailsFlat
+    )
+    SELECT customer_id, window_start as first_transaction, transaction_count
+    FROM CustomerFirstOccurrence
+    GROUP BY customer_id, window_start_txn_id, window_start, transaction_count
+    HAVING LOGICAL_AND(is_first_occurrence)
+"""
+
+SMALL_TRANSACTION_LEGS = f"""
+    SELECT customer_id_sender as customer_id, {WINDOW_TRANSACTION_COLUMNS}, 'sender' as direction
+    FROM {TRANSACTIONS_TABLE}
+    WHERE amount <= @amount_threshold
+    UNION ALL
+    SELECT customer_id_receiver as customer_id, {WINDOW_TRANSACTION_COLUMNS}, 'receiver' as direction
+    FROM {TRANSACTIONS_TABLE}
+    WHERE amount <= @amount_threshold
+"""
+
+
+def _timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def _window_keys(rows):
+    return {
+        (row["customer_id"], np.datetime64(row["first_transaction"], "us"), int(row["transaction_count"]))
+        for row in rows
+    }
+
+
+def run_numpy(transactions, amount_threshold, count_threshold, window_micros):
+    """
+    Runs the NumPy kernel over both sides of every small transaction.
+
+    Returns:
+        set: (customer_id, first transaction time, transaction count) of every kept window.
+    """
+    small = transactions[transactions["amount"] <= amount_threshold]
+    customers = np.concatenate([small["customer_id_sender"].to_numpy(), small["customer_id_receiver"].to_numpy()])
+    times = np.concatenate([small["time"].to_numpy("datetime64[us]")] * 2).astype(np.int64)
+    # Synthetic rows are generated in transaction_id order, so the row number breaks time ties
+    row_numbers = np.concatenate([np.arange(len(small))] * 2)
+
+    customer_index, codes = pd.factorize(customers, sort=True)
+    order = np.lexsort((row_numbers, times, customer_index))
+    starts, ends = non_overlapping_windows(times[order], window_micros, count_threshold, customer_index[order])
+
+    customer_of_window = codes[customer_index[order][starts]]
+    first_times = times[order][starts].astype("datetime64[us]")
+    return set(zip(customer_of_window, first_times, (ends - starts + 1).tolist()))
+
+
+def run_benchmark(sizes, legacy_max_rows=100000, amount_threshold=5000.0, count_threshold=3, time_window_hours=24):
+    """
+    Times every strategy for each dataset size and checks that they find the same windows.
+
+    Returns:
+        list: One result dict per size.
+    """
+    window_micros = time_window_hours * 3600 * 1000000
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("amount_threshold", "FLOAT", amount_threshold),
+            bigquery.ScalarQueryParameter("count_threshold", "INT64", count_threshold),
+            bigquery.ScalarQueryParameter("time_window_hours", "INT64", time_window_hours),
+            bigquery.ScalarQueryParameter("window_micros", "INT64", window_micros),
+        ]
+    )
+    window_query = build_frequent_small_windows_query(SMALL_TRANSACTION_LEGS, include_transactions=False)
+
+    results = []
+    for size in sizes:
+        transactions = generate_transactions(size)
+        backend = DuckDBBackend()
+        backend.load_dataframe("transactions", transactions)
+
+        window_rows, window_seconds = _timed(lambda: backend.query(window_query, job_config))
+        numpy_windows, numpy_seconds = _timed(
+            lambda: run_numpy(transactions, amount_threshold, count_threshold, window_micros)
+        )
+        window_windows = _window_keys(window_rows)
+        result = {
+            "rows": size,
+            "windows": len(window_windows),
+            "window_sql_seconds": round(window_seconds, 4),
+            "numpy_seconds": round(numpy_seconds, 4),
+            "numpy_matches_window_sql": numpy_windows == window_windows,
+            "legacy_sql_seconds": None,
+            "legacy_matches_window_sql": None,
+        }
+        if size <= legacy_max_rows:
+            legacy_rows, legacy_seconds = _timed(lambda: backend.query(LEGACY_QUERY, job_config))
+            result["legacy_sql_seconds"] = round(legacy_seconds, 4)
+            result["legacy_matches_window_sql"] = _window_keys(legacy_rows) == window_windows
+        results.append(result)
+        print(json.dumps(result))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark frequent small transaction detection.")
+    parser.add_argument("--sizes", default="10000,100000,1000000",
+                        help="Comma separated dataset sizes, e.g. 10000,100000,1000000,10000000")
+    parser.add_argument("--legacy-max-rows", type=int, default=100000,
+                        help="Largest dataset the quadratic legacy query is run on")
+    parser.add_argument("--output", default="", help="Optional path of a JSON results file")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = run_benchmark(sizes, legacy_max_rows=args.legacy_max_rows)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Compares the bytes scanned by the dashboard and refresh queries before and after the table
+layout migration (see root_agent/tools/schema.py):
+
+- before: the original unpartitioned transactions table (transactions_unpartitioned after
+  the migration), read twice through UNION ALL for the sender and receiver side
+- after: the transaction_legs table and the partitioned, clustered transactions table
+
+BigQuery bills the bytes of the referenced columns in the partitions a query touches, so each
+case is described by the columns it reads and its time range. On BigQuery the numbers come
+from dry runs; on the local backend they are computed from the data with BigQuery's logical
+sizes (2 bytes + UTF-8 length per STRING, 8 bytes per FLOAT64 and TIMESTAMP). Clustering
+savings only show when a query actually runs, so customer lookups are not included.
+
+    python -m benchmarks.layout_bytes_benchmark --synthetic-rows 1000000
+    python -m benchmarks.layout_bytes_benchmark --output bytes.json    # configured backend, after the migration
+"""
+import argparse
+import json
+import tempfile
+from datetime import timedelta
+
+from google.cloud import bigquery
+
+from benchmarks.synthetic_transactions import write_dataset
+from root_agent.tools import schema
+from root_agent.tools.config import DEFAULT_LOOKBACK_DAYS, table_ref
+from root_agent.tools.query_backend import DuckDBBackend, get_backend, set_backend
+from root_agent.tools.tool_logging import configure_tool_logging
+
+STRING_COLUMNS = {
+    "transaction_id", "customer_id_sender", "customer_id_receiver", "sender_id_account_no",
+    "recipient_id_account_no", "sender_location", "recipient_location", "payment_type",
+    "customer_id", "direction", "counterparty_id", "account_no", "counterparty_account_no",
+    "location", "counterparty_location",
+}
+TRANSACTION_COLUMNS = [
+    "transaction_id", "customer_id_sender", "customer_id_receiver", "sender_id_account_no",
+    "recipient_id_account_no", "sender_location", "recipient_location", "time", "payment_type", "amount",
+]
+
+# Per case: the (table, columns) read before and after the migration, and the days of data
+# the query covers (None for the full history)
+CASES = {
+    "dashboard_large_amount": {
+        "before": ("transactions", ["customer_id_sender", "customer_id_receiver", "amount"]),
+        "after": ("transaction_legs", ["customer_id", "amount"]),
+        "days": None,
+    },
+    "dashboard_frequent_small": {
+        "before": ("transactions", ["customer_id_sender", "customer_id_receiver", "transaction_id", "time", "amount"]),
+        "after": ("transaction_legs", ["customer_id", "transaction_id", "time", "amount"]),
+        "days": None,
+    },
+    "dashboard_multiple_location": {
+        "before": ("transactions", ["transaction_id", "customer_id_sender", "customer_id_receiver",
+                                    "sender_location", "recipient_location", "time"]),
+        "after": ("transaction_legs", ["transaction_id", "customer_id", "location", "time"]),
+        "days": None,
+    },
+    "dashboard_frequent_small_lookback": {
+        "before": ("transactions", ["customer_id_sender", "customer_id_receiver", "transaction_id", "time", "amount"]),
+        "after": ("transaction_legs", ["customer_id", "transaction_id", "time", "amount"]),
+        "days": DEFAULT_LOOKBACK_DAYS,
+    },
+    "feature_refresh_1_day": {
+        "before": ("transactions", ["customer_id_sender", "customer_id_receiver", "amount", "time"]),
+        "after": ("transaction_legs", ["customer_id", "amount", "time"]),
+        "days": 1,
+    },
+    "all_customers_30_days": {
+        "before": ("transactions", TRANSACTION_COLUMNS),
+        "after": ("transactions", TRANSACTION_COLUMNS),
+        "days": 30,
+    },
+}
+
+
+def measure_bytes(backend, table_name: str, columns, days, since, partitioned: bool) -> dict:
+    """
+    Returns the bytes a query reading the columns of a table for the last days would scan.
+    Only a partitioned table is read for the time range alone.
+
+    Returns:
+        dict: The bytes and how they were obtained ('dry_run' or 'estimate').
+    """
+    where = ""
+    job_config = None
+    if days is not None:
+        where = "WHERE time >= @since"
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ScalarQueryParameter("since", "TIMESTAMP", since)]
+        )
+    table = table_ref(table_name)
+    dry_run_bytes = backend.dry_run(f"SELECT {', '.join(columns)} FROM {table} {where}", job_config)
+    if dry_run_bytes is not None:
+        return {"bytes": dry_run_bytes, "method": "dry_run"}
+
+    # Only reached on the local backend: STRLEN is DuckDB's UTF-8 byte length
+    sizes = [
+        f"SUM(2 + STRLEN({column}))" if column in STRING_COLUMNS else f"8 * COUNT({column})"
+        for column in columns
+    ]
+    if not partitioned:
+        where, job_config = "", None
+    rows = backend.query(f"SELECT {' + '.join(sizes)} AS logical_bytes FROM {table} {where}", job_config)
+    return {"bytes": int(rows[0].logical_bytes or 0), "method": "estimate"}
+
+
+def run_benchmark(before_table: str = schema.BACKUP_TABLE_NAME) -> list:
+    """
+    Measures every case on the current backend, which must hold the migrated tables and the
+    original transactions under before_table.
+
+    Returns:
+        list: Per case, the bytes before and after and the reduction.
+    """
+    backend = get_backend()
+    if backend.get_table_layout(before_table) is None:
+        raise RuntimeError(f"{before_table} does not exist; run the migration with a backup first")
+    last_time = None
+    for row in backend.query(f"SELECT MAX(time) AS last_time FROM {table_ref(schema.TRANSACTIONS_TABLE_NAME)}"):
+        last_time = row.last_time
+
+    results = []
+    for name, case in CASES.items():
+        days = case["days"]
+        since = last_time - timedelta(days=days) if days is not None else None
+        before = measure_bytes(backend, before_table, case["before"][1], days, since, partitioned=False)
+        after = measure_bytes(backend, case["after"][0], case["after"][1], days, since, partitioned=True)
+        results.append({
+            "case": name,
+            "days": days,
+            "before_table": before_table,
+            "after_table": case["after"][0],
+            "before_bytes": before["bytes"],
+            "after_bytes": after["bytes"],
+            "reduction": round(1 - after["bytes"] / before["bytes"], 3) if before["bytes"] else None,
+            "method": after["method"],
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare bytes scanned before and after the layout migration.")
+    parser.add_argument("--synthetic-rows", type=int, default=0,
+                        help="Migrate a synthetic dataset of this many transactions in DuckDB first")
+    parser.add_argument("--before-table", default=schema.BACKUP_TABLE_NAME,
+                        help="The original, unpartitioned transactions table")
+    parser.add_argument("--output", default="", help="Optional path of a JSON results file")
+    args = parser.parse_args()
+
+    configure_tool_logging("OFF")
+    with tempfile.TemporaryDirectory() as data_dir:
+        if args.synthetic_rows:
+            write_dataset(data_dir, args.synthetic_rows)
+            set_backend(DuckDBBackend(data_dir=data_dir))
+            schema.migrate_transactions(keep_backup=True)
+            schema.backfill_transaction_legs()
+        results = run_benchmark(args.before_table)
+
+    for result in results:
+        print(json.dumps(result))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+Times the deterministic detection pipeline on synthetic datasets in the local DuckDB backend:
+
+- the per-customer detectors (large amount, frequent small, multiple location and the combined
+  single-scan detector), for the most active customers and those with injected patterns
+- the dashboard detectors, which scan the whole transactions table
+- risk scoring, per customer and as one batch
+- SAR report generation
+
+Datasets are generated with benchmarks.synthetic_transactions, from 1k to 50M rows. With
+--data-dir they are written once and reused by later runs. Every case runs --warmup untimed
+and --repeat timed times; the results, the environment and whether the detectors flagged every
+injected pattern are written as JSON. The detectors read the full history unless --lookback-days
+is given, which counts back from the last transaction of each dataset. --baseline compares the p50 latencies with an earlier
+result file and exits with status 1 on a regression, e.g.
+
+    python -m benchmarks.pipeline_benchmark --sizes 1k,100k,1m --output results.json
+    python -m benchmarks.pipeline_benchmark --sizes 10m --data-dir /data/aml-bench --baseline results.json
+"""
+import argparse
+import functools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.collection_latency_benchmark import sample_customers
+from benchmarks.synthetic_transactions import (
+    LARGE_AMOUNT,
+    MULTIPLE_LOCATIONS,
+    STRUCTURING,
+    parse_size,
+    write_dataset,
+)
+from root_agent.tools.config import TRANSACTIONS_TABLE
+from root_agent.tools.large_amount_detector import detect_large_amount_transactions
+from root_agent.tools.frequent_transaction_detector import detect_frequent_small_transactions
+from root_agent.tools.multiple_location_detector import detect_multiple_location_transactions
+from root_agent.tools.combined_detector import detect_all_patterns
+from root_agent.tools.risk_score_calculator import calculate_risk_score, calculate_risk_scores_batch
+from root_agent.tools.report_generator import generate_sar_report, prepare_sar_report
+from root_agent.tools.report_sink import get_report_sink
+from root_agent.tools.query_backend import DuckDBBackend, set_backend
+from root_agent.tools.result_cache import TRANSACTIONS, invalidate_tables
+from root_agent.tools.schema import set_lookback_anchor
+from root_agent.tools.tool_logging import configure_tool_logging
+from dashboard_agent.sub_agents.dashboard_large_amount_agent import tool as dashboard_large_amount
+from dashboard_agent.sub_agents.dashboard_frequent_small_agent import tool as dashboard_frequent_small
+from dashboard_agent.sub_agents.dashboard_multiple_location_agent import tool as dashboard_multiple_location
+
+# Version of the result file layout, increased when fields change meaning
+SCHEMA_VERSION = 1
+
+# The per-customer detector cases and the injected pattern each must flag
+CUSTOMER_DETECTORS = {
+    "large_amount": (detect_large_amount_transactions, LARGE_AMOUNT),
+    "frequent_small": (detect_frequent_small_transactions, STRUCTURING),
+    "multiple_location": (detect_multiple_location_transactions, MULTIPLE_LOCATIONS),
+}
+
+# The dashboard detectors, which scan all customers
+TABLE_DETECTORS = {
+    "dashboard_large_amount": dashboard_large_amount.detect_large_amount_transactions,
+    "dashboard_frequent_small": dashboard_frequent_small.detect_frequent_small_transactions,
+    "dashboard_multiple_location": dashboard_multiple_location.detect_multiple_location_transactions,
+}
+
+# Latency differences below this are treated as noise by compare_results
+NOISE_FLOOR_SECONDS = 0.001
+
+
+def _summary(seconds: List[float]) -> Dict[str, Any]:
+    ordered = sorted(seconds)
+    return {
+        "calls": len(ordered),
+        "total_seconds": round(sum(ordered), 4),
+        "mean_seconds": round(statistics.mean(ordered), 5),
+        "p50_seconds": round(ordered[len(ordered) // 2], 5),
+        "p95_seconds": round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)], 5),
+        "min_seconds": round(ordered[0], 5),
+        "max_seconds": round(ordered[-1], 5),
+    }
+
+
+def time_case(calls: List[Callable[[], Any]], repeat: int, warmup: int,
+              before: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    """
+    Times each call separately, warmup times untimed and then repeat times.
+
+    Args:
+        calls (list): The calls of one case, e.g. one per customer.
+        repeat (int): Timed rounds.
+        warmup (int): Untimed rounds, which fill the query plan and page caches.
+        before (callable, optional): Runs untimed before every call, e.g. to clear a cache.
+
+    Returns:
+        dict: The latency summary of all timed calls.
+    """
+    seconds = []
+    for round_number in range(warmup + repeat):
+        for call in calls:
+            if before:
+                before()
+            start = time.perf_counter()
+            call()
+            if round_number >= warmup:
+                seconds.append(time.perf_counter() - start)
+    return _summary(seconds)
+
+
+def environment() -> Dict[str, Any]:
+    """
+    Describes the machine and code a result was measured on.
+    """
+    import duckdb
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "duckdb": duckdb.__version__,
+        "git_commit": commit,
+    }
+
+
+def check_injected_patterns(patterns: Dict[str, List[str]], detected: Dict[str, Dict[str, List[Dict]]]) -> Dict:
+    """
+    Counts the injected pattern customers the combined detector flagged with the pattern.
+
+    Args:
+        patterns (dict): The customers of each injected pattern, from dataset.json.
+        detected (dict): The detect_all_patterns result of each customer.
+
+    Returns:
+        dict: Per pattern, the number of customers and of those detected.
+    """
+    found = {}
+    for pattern, customer_ids in patterns.items():
+        flagged = [
+            customer_id for customer_id in customer_ids
+            if any(activity.get("risk_type") == pattern
+                   for activities in detected[customer_id].values() for activity in activities)
+        ]
+        found[pattern] = {"customers": len(customer_ids), "detected": len(flagged)}
+    return found
+
+
+def run_dataset(data_dir: str, manifest: Dict, num_customers: int, repeat: int, warmup: int,
+                lookback_days: int = 0) -> Dict[str, Any]:
+    """
+    Loads one dataset into DuckDB and times every case on it. The detectors read the last
+    lookback_days of the dataset, or all of it for 0.
+
+    Returns:
+        dict: The dataset settings, load time, injected pattern check and per-case latencies.
+    """
+    backend = DuckDBBackend(data_dir=data_dir)
+    set_backend(backend)
+    start = time.perf_counter()
+    stats = backend.query(f"SELECT COUNT(*) AS n, MAX(time) AS last_time FROM {TRANSACTIONS_TABLE}")[0]
+    transaction_count = stats.n
+    load_seconds = time.perf_counter() - start
+    set_lookback_anchor(stats.last_time)
+
+    patterns = manifest["patterns"]
+    injected = sorted({customer_id for customer_ids in patterns.values() for customer_id in customer_ids})
+    customers = list(dict.fromkeys(sample_customers(num_customers) + injected))
+
+    cases = {}
+    for name, (detector, _) in CUSTOMER_DETECTORS.items():
+        cases[name] = time_case(
+            [lambda c=c: detector(c, lookback_days=lookback_days) for c in customers], repeat, warmup
+        )
+    detect = functools.partial(detect_all_patterns, lookback_days=lookback_days)
+    cases["all_patterns"] = time_case([lambda c=c: detect(c) for c in customers], repeat, warmup)
+    for name, detector in TABLE_DETECTORS.items():
+        # Cleared before every call, so the query runs instead of the result cache answering
+        cases[name] = time_case(
+            [functools.partial(detector, lookback_days=lookback_days)], repeat, warmup,
+            before=lambda: invalidate_tables(TRANSACTIONS),
+        )
+
+    detected = {customer_id: detect(customer_id) for customer_id in customers}
+    activities = {
+        customer_id: [activity for pattern in result.values() for activity in pattern]
+        for customer_id, result in detected.items()
+    }
+    flagged = [customer_id for customer_id in customers if activities[customer_id]]
+    cases["risk_scoring"] = time_case(
+        [lambda c=c: calculate_risk_score(activities[c]) for c in flagged], repeat, warmup
+    )
+    cases["risk_scoring_batch"] = time_case(
+        [lambda: calculate_risk_scores_batch({c: activities[c] for c in flagged})], repeat, warmup
+    )
+    cases["sar_generation"] = time_case(
+        [lambda c=c: generate_sar_report(c, activities[c]) for c in flagged], repeat, warmup
+    )
+    # One batched write of the reports of all flagged customers. The MERGE keeps the rows
+    # written by earlier rounds, so every round costs the same load job and MERGE
+    sink = get_report_sink()
+    reports = [prepare_sar_report(c, activities[c]) for c in flagged]
+    cases["sar_storage_batch"] = time_case(
+        [sink.flush], repeat, warmup, before=lambda: sink.add_many(reports)
+    )
+
+    set_lookback_anchor(None)
+    set_backend(None)
+    return {
+        "rows": manifest["settings"]["rows"],
+        "transactions": transaction_count,
+        "settings": manifest["settings"],
+        "customers_timed": len(customers),
+        "generate_seconds": manifest.get("generate_seconds"),
+        "load_seconds": round(load_seconds, 4),
+        "injected_patterns": check_injected_patterns(patterns, detected),
+        "cases": cases,
+    }
+
+
+def compare_results(current: Dict, baseline: Dict, max_regression: float) -> List[Dict[str, Any]]:
+    """
+    Finds the cases whose p50 latency grew by more than max_regression since the baseline.
+
+    Args:
+        current (dict): A result of this benchmark.
+        baseline (dict): An earlier result.
+        max_regression (float): The allowed relative growth, e.g. 0.2 for 20%.
+
+    Returns:
+        list: The regressions, with the dataset size, case and both latencies.
+    """
+    baseline_cases = {
+        (dataset["rows"], name): case
+        for dataset in baseline.get("datasets", [])
+        for name, case in dataset["cases"].items()
+    }
+    regressions = []
+    for dataset in current["datasets"]:
+        for name, case in dataset["cases"].items():
+            previous = baseline_cases.get((dataset["rows"], name))
+            if previous is None:
+                continue
+            limit = previous["p50_seconds"] * (1 + max_regression)
+            if case["p50_seconds"] > limit and case["p50_seconds"] - previous["p50_seconds"] > NOISE_FLOOR_SECONDS:
+                regressions.append({
+                    "rows": dataset["rows"],
+                    "case": name,
+                    "baseline_p50_seconds": previous["p50_seconds"],
+                    "p50_seconds": case["p50_seconds"],
+                })
+    return regressions
+
+
+def run_benchmark(sizes: List[int], data_dir: str = "", num_customers: int = 10, customers_per_pattern: int = 10,
+                  activity_exponent: float = 1.1, repeat: int = 3, warmup: int = 1, seed: int = 7,
+                  lookback_days: int = 0) -> Dict[str, Any]:
+    """
+    Generates (or reuses) a dataset of every size and times the pipeline on it.
+
+    Returns:
+        dict: The benchmark result, see the module docstring.
+    """
+    result = {
+        "benchmark": "pipeline",
+        "schema_version": SCHEMA_VERSION,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "environment": environment(),
+        "config": {
+            "customers": num_customers,
+            "customers_per_pattern": customers_per_pattern,
+            "activity_exponent": activity_exponent,
+            "repeat": repeat,
+            "warmup": warmup,
+            "seed": seed,
+            "lookback_days": lookback_days,
+        },
+        "datasets": [],
+    }
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        for size in sizes:
+            dataset_dir = os.path.join(data_dir or scratch_dir, str(size))
+            manifest = write_dataset(
+                dataset_dir, size, customers_per_pattern=customers_per_pattern,
+                seed=seed, activity_exponent=activity_exponent,
+            )
+            dataset = run_dataset(dataset_dir, manifest, num_customers, repeat, warmup, lookback_days)
+            result["datasets"].append(dataset)
+            print(json.dumps({"rows": size, **{name: case["p50_seconds"] for name, case in dataset["cases"].items()}}))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the detectors, risk scoring and SAR generation.")
+    parser.add_argument("--sizes", default="1k,100k,1m", help="Comma separated dataset sizes, from 1k to 50m")
+    parser.add_argument("--data-dir", default="",
+                        help="Directory to keep the generated datasets in for later runs. Defaults to a temporary one")
+    parser.add_argument("--customers", type=int, default=10, help="Number of most active customers to time")
+    parser.add_argument("--customers-per-pattern", type=int, default=10,
+                        help="Customers with each injected pattern, which are timed as well")
+    parser.add_argument("--activity-exponent", type=float, default=1.1, help="Power law exponent of the customer activity")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed rounds per case")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed rounds per case")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed of the datasets")
+    parser.add_argument("--lookback-days", type=int, default=0,
+                        help="Days the detectors read, back from the last transaction. 0 reads the full history")
+    parser.add_argument("--output", default="", help="Optional path of a JSON results file")
+    parser.add_argument("--baseline", default="", help="Earlier results file to check for regressions")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed relative p50 growth over the baseline, e.g. 0.2 for 20%%")
+    args = parser.parse_args()
+
+    # Per-call tool logs would be timed along with the tools
+    configure_tool_logging("OFF")
+    result = run_benchmark(
+        [parse_size(size) for size in args.sizes.split(",")],
+        data_dir=args.data_dir,
+        num_customers=args.customers,
+        customers_per_pattern=args.customers_per_pattern,
+        activity_exponent=args.activity_exponent,
+        repeat=args.repeat,
+        warmup=args.warmup,
+        seed=args.seed,
+        lookback_days=args.lookback_days,
+    )
+    if args.baseline:
+        with open(args.baseline) as f:
+            result["regressions"] = compare_results(result, json.load(f), args.max_regression)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if result.get("regressions"):
+        print(json.dumps(result["regressions"], indent=2))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
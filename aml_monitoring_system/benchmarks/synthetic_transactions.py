@@ -0,0 +1,398 @@
+"""
+Deterministic synthetic data for the benchmarks, with the schemas of the transactions and
+customers tables.
+
+Customer activity can follow a power law (a few customers send most transactions, like
+merchants and payroll accounts), and known structuring, multiple location and large amount
+patterns can be injected for a set of customers, so that a benchmark can check what the
+detectors find. Datasets larger than memory are generated in chunks and written as Parquet
+files that the local DuckDB backend loads directly:
+
+    python -m benchmarks.synthetic_transactions --rows 50m --output-dir data/50m
+"""
+import argparse
+import json
+import os
+import time
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+LOCATIONS = np.array(["New York", "London", "Dubai", "Singapore", "Mumbai", "Zurich", "Hong Kong", "Toronto"])
+PAYMENT_TYPES = np.array(["wire", "card", "ach", "cash"])
+FIRST_NAMES = np.array(["Alex", "Maria", "Wei", "Omar", "Priya", "John", "Fatima", "Lukas", "Sofia", "Kenji"])
+LAST_NAMES = np.array(["Smith", "Garcia", "Chen", "Haddad", "Patel", "Brown", "Khan", "Meyer", "Rossi", "Sato"])
+
+START_TIME = np.datetime64("2025-01-01T00:00:00", "us")
+HOUR_MICROS = 3600 * 1000000
+
+# Size suffixes accepted by parse_size
+_SIZE_SUFFIXES = {"k": 1000, "m": 1000000}
+
+# Injected pattern names, as in the risk_type of the detector results
+STRUCTURING = "frequent_small_transactions"
+MULTIPLE_LOCATIONS = "multiple_locations"
+LARGE_AMOUNT = "large_amount"
+
+
+def parse_size(size: str) -> int:
+    """
+    Parses a dataset size such as '1000', '100k' or '50M'.
+    """
+    size = size.strip().lower().replace("_", "")
+    if size[-1:] in _SIZE_SUFFIXES:
+        return int(float(size[:-1]) * _SIZE_SUFFIXES[size[-1]])
+    return int(size)
+
+
+def customer_ids(codes: np.ndarray) -> np.ndarray:
+    """
+    Formats integer customer codes as customer IDs (e.g. 42 -> 'C0000042').
+    """
+    return np.char.add("C", np.char.zfill(codes.astype(str), 7))
+
+
+def transaction_ids(numbers: np.ndarray) -> np.ndarray:
+    """
+    Formats integer transaction numbers as transaction IDs (e.g. 42 -> 'T0000000042').
+    """
+    return np.char.add("T", np.char.zfill(numbers.astype(str), 10))
+
+
+def default_customer_count(num_rows: int) -> int:
+    """
+    Returns the customer count used when none is given: one customer per 200 transactions.
+    """
+    return max(num_rows // 200, 10)
+
+
+def activity_weights(num_customers: int, exponent: float) -> np.ndarray:
+    """
+    Returns the probability of each customer taking part in a transaction. Customer k has
+    weight 1 / (k + 1) ** exponent, so customer 0 is the most active; 0 gives uniform activity.
+    """
+    weights = 1.0 / np.power(np.arange(1, num_customers + 1, dtype=np.float64), exponent)
+    return weights / weights.sum()
+
+
+def _transaction_frame(
+    numbers: np.ndarray,
+    senders: np.ndarray,
+    receivers: np.ndarray,
+    sender_locations: np.ndarray,
+    recipient_locations: np.ndarray,
+    times: np.ndarray,
+    payment_types: np.ndarray,
+    amounts: np.ndarray,
+) -> pd.DataFrame:
+    sender_ids = customer_ids(senders)
+    receiver_ids = customer_ids(receivers)
+    return pd.DataFrame({
+        "transaction_id": transaction_ids(numbers),
+        "customer_id_sender": sender_ids,
+        "customer_id_receiver": receiver_ids,
+        "sender_id_account_no": np.char.add("A", sender_ids),
+        "recipient_id_account_no": np.char.add("A", receiver_ids),
+        "sender_location": sender_locations,
+        "recipient_location": recipient_locations,
+        "time": times,
+        "payment_type": payment_types,
+        "amount": amounts,
+    })
+
+
+def generate_transactions(
+    num_rows: int,
+    num_customers: int = 0,
+    days: int = 365,
+    small_share: float = 0.7,
+    seed: int = 7,
+    activity_exponent: float = 0.0,
+    first_transaction: int = 0
+) -> pd.DataFrame:
+    """
+    Generates a deterministic synthetic transactions table.
+
+    Args:
+        num_rows (int): Number of transactions.
+        num_customers (int, optional): Number of customers. Defaults to one per 200 transactions.
+        days (int, optional): Length of the period covered by the transactions.
+        small_share (float, optional): Share of transactions at or below 5000.
+        seed (int, optional): Random seed.
+        activity_exponent (float, optional): Power law exponent of the customer activity, see
+            activity_weights. Defaults to 0, every customer equally active.
+        first_transaction (int, optional): Number of the first transaction ID, for chunks.
+
+    Returns:
+        pd.DataFrame: Rows with the columns of the transactions table.
+    """
+    rng = np.random.default_rng(seed)
+    num_customers = num_customers or default_customer_count(num_rows)
+
+    if activity_exponent > 0:
+        # Inverse CDF sampling, much faster than rng.choice(p=...) for many customers
+        cdf = np.cumsum(activity_weights(num_customers, activity_exponent))
+        senders = np.minimum(np.searchsorted(cdf, rng.random(num_rows)), num_customers - 1)
+        receivers = np.minimum(np.searchsorted(cdf, rng.random(num_rows)), num_customers - 1)
+        # Never send to yourself
+        receivers = np.where(receivers == senders, (receivers + 1) % num_customers, receivers)
+    else:
+        senders = rng.integers(0, num_customers, num_rows)
+        # Never send to yourself
+        receivers = (senders + rng.integers(1, num_customers, num_rows)) % num_customers
+
+    offsets = rng.integers(0, days * 24 * HOUR_MICROS, num_rows)
+    times = START_TIME + offsets.astype("timedelta64[us]")
+
+    small = rng.random(num_rows) < small_share
+    amounts = np.where(small, rng.uniform(10, 5000, num_rows), rng.uniform(5000.01, 50000, num_rows)).round(2)
+
+    return _transaction_frame(
+        first_transaction + np.arange(num_rows),
+        senders,
+        receivers,
+        LOCATIONS[rng.integers(0, len(LOCATIONS), num_rows)],
+        LOCATIONS[rng.integers(0, len(LOCATIONS), num_rows)],
+        times,
+        PAYMENT_TYPES[rng.integers(0, len(PAYMENT_TYPES), num_rows)],
+        amounts,
+    )
+
+
+def generate_customers(num_customers: int, seed: int = 7) -> pd.DataFrame:
+    """
+    Generates the customers table matching the customer IDs of generate_transactions.
+
+    Args:
+        num_customers (int): Number of customers.
+        seed (int, optional): Random seed.
+
+    Returns:
+        pd.DataFrame: Rows with the columns of the customers table.
+    """
+    rng = np.random.default_rng(seed)
+    codes = np.arange(num_customers)
+    ids = customer_ids(codes)
+    names = np.char.add(
+        np.char.add(FIRST_NAMES[rng.integers(0, len(FIRST_NAMES), num_customers)], " "),
+        LAST_NAMES[rng.integers(0, len(LAST_NAMES), num_customers)],
+    )
+    return pd.DataFrame({
+        "customer_id": ids,
+        "account_no": np.char.add("A", ids),
+        "location_of_account": LOCATIONS[rng.integers(0, len(LOCATIONS), num_customers)],
+        "customer_name": names,
+        "phone": np.char.add("+1555", np.char.zfill(codes.astype(str), 7)),
+        "email": np.char.add(np.char.lower(ids), "@example.com"),
+        "risk_score": rng.uniform(0, 30, num_customers).round(1),
+    })
+
+
+def inject_patterns(
+    num_customers: int,
+    customers_per_pattern: int,
+    days: int = 365,
+    seed: int = 7,
+    first_transaction: int = 0
+) -> Tuple[pd.DataFrame, Dict[str, List[str]]]:
+    """
+    Generates transactions that each detector must flag, for distinct customers per pattern:
+
+    - structuring: 5 transfers between 4000 and 4999 sent within 12 hours
+    - multiple locations: 4 transfers from 4 different locations within 24 hours
+    - large amount: one transfer between 250000 and 1000000
+
+    Args:
+        num_customers (int): Number of customers, the patterns use the least active ones.
+        customers_per_pattern (int): Number of customers per pattern.
+        days (int, optional): Length of the period covered by the transactions.
+        seed (int, optional): Random seed.
+        first_transaction (int, optional): Number of the first transaction ID.
+
+    Returns:
+        tuple: The transactions, and the customer IDs of each pattern.
+    """
+    rng = np.random.default_rng([seed, 1])
+    customers_per_pattern = min(customers_per_pattern, num_customers // 6)
+    # Distinct customers from the less active half, so the patterns are not hidden in noise
+    chosen = rng.choice(np.arange(num_customers // 2, num_customers), 3 * customers_per_pattern, replace=False)
+    pattern_customers = {
+        STRUCTURING: chosen[:customers_per_pattern],
+        MULTIPLE_LOCATIONS: chosen[customers_per_pattern:2 * customers_per_pattern],
+        LARGE_AMOUNT: chosen[2 * customers_per_pattern:],
+    }
+
+    senders, offsets, amounts, sender_locations = [], [], [], []
+    # (transfers per customer, spacing in hours, amount range) of each pattern
+    shapes = {
+        STRUCTURING: (5, 2, (4000, 4999)),
+        MULTIPLE_LOCATIONS: (4, 6, (100, 900)),
+        LARGE_AMOUNT: (1, 0, (250000, 1000000)),
+    }
+    for pattern, customers in pattern_customers.items():
+        count, spacing_hours, (low, high) = shapes[pattern]
+        starts = rng.integers(0, (days - 2) * 24 * HOUR_MICROS, len(customers))
+        senders.append(np.repeat(customers, count))
+        offsets.append((starts[:, None] + np.arange(count) * spacing_hours * HOUR_MICROS).ravel())
+        amounts.append(rng.uniform(low, high, len(customers) * count).round(2))
+        if pattern == MULTIPLE_LOCATIONS:
+            # A different location for every transfer of the window
+            first = rng.integers(0, len(LOCATIONS), len(customers))
+            sender_locations.append(LOCATIONS[((first[:, None] + np.arange(count)) % len(LOCATIONS)).ravel()])
+        else:
+            sender_locations.append(np.repeat(LOCATIONS[rng.integers(0, len(LOCATIONS), len(customers))], count))
+
+    senders = np.concatenate(senders)
+    num_rows = len(senders)
+    receivers = (senders + rng.integers(1, num_customers, num_rows)) % num_customers
+    transactions = _transaction_frame(
+        first_transaction + np.arange(num_rows),
+        senders,
+        receivers,
+        np.concatenate(sender_locations),
+        LOCATIONS[rng.integers(0, len(LOCATIONS), num_rows)],
+        START_TIME + np.concatenate(offsets).astype("timedelta64[us]"),
+        np.repeat("wire", num_rows),
+        np.concatenate(amounts),
+    )
+    return transactions, {pattern: customer_ids(codes).tolist() for pattern, codes in pattern_customers.items()}
+
+
+def generate_transaction_chunks(
+    num_rows: int,
+    num_customers: int = 0,
+    chunk_rows: int = 1000000,
+    days: int = 365,
+    seed: int = 7,
+    activity_exponent: float = 1.1
+) -> Iterator[pd.DataFrame]:
+    """
+    Generates a large transactions table in chunks of at most chunk_rows rows. The result
+    depends only on the arguments, not on memory or timing.
+
+    Args:
+        num_rows (int): Number of transactions.
+        num_customers (int, optional): Number of customers. Defaults to one per 200 transactions.
+        chunk_rows (int, optional): Rows per chunk.
+        days (int, optional): Length of the period covered by the transactions.
+        seed (int, optional): Random seed.
+        activity_exponent (float, optional): Power law exponent of the customer activity.
+
+    Yields:
+        pd.DataFrame: The chunks, with consecutive transaction IDs.
+    """
+    num_customers = num_customers or default_customer_count(num_rows)
+    for index, first in enumerate(range(0, num_rows, chunk_rows)):
+        yield generate_transactions(
+            min(chunk_rows, num_rows - first),
+            num_customers,
+            days=days,
+            seed=seed * 100003 + index,
+            activity_exponent=activity_exponent,
+            first_transaction=first,
+        )
+
+
+def write_dataset(
+    output_dir: str,
+    num_rows: int,
+    num_customers: int = 0,
+    customers_per_pattern: int = 10,
+    chunk_rows: int = 1000000,
+    days: int = 365,
+    seed: int = 7,
+    activity_exponent: float = 1.1
+) -> Dict:
+    """
+    Writes a synthetic dataset for the local backend: transactions/part-*.parquet (the
+    generated transactions followed by the injected patterns), customers.parquet and
+    dataset.json, which holds the generation settings and the customers of every injected
+    pattern. An existing dataset with the same settings is reused.
+
+    Args:
+        output_dir (str): The directory, usable as AML_LOCAL_DATA_DIR.
+        num_rows (int): Number of generated transactions, before the injected ones.
+        num_customers (int, optional): Number of customers. Defaults to one per 200 transactions.
+        customers_per_pattern (int, optional): Number of customers per injected pattern.
+        chunk_rows (int, optional): Rows per Parquet file.
+        days (int, optional): Length of the period covered by the transactions.
+        seed (int, optional): Random seed.
+        activity_exponent (float, optional): Power law exponent of the customer activity.
+
+    Returns:
+        dict: The contents of dataset.json.
+    """
+    num_customers = num_customers or default_customer_count(num_rows)
+    settings = {
+        "rows": num_rows,
+        "customers": num_customers,
+        "customers_per_pattern": customers_per_pattern,
+        "chunk_rows": chunk_rows,
+        "days": days,
+        "seed": seed,
+        "activity_exponent": activity_exponent,
+    }
+    manifest_path = os.path.join(output_dir, "dataset.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("settings") == settings:
+            return manifest
+
+    start = time.perf_counter()
+    transactions_dir = os.path.join(output_dir, "transactions")
+    os.makedirs(transactions_dir, exist_ok=True)
+    for name in os.listdir(transactions_dir):
+        if name.endswith(".parquet"):
+            os.remove(os.path.join(transactions_dir, name))
+
+    part = 0
+    chunks = generate_transaction_chunks(num_rows, num_customers, chunk_rows, days, seed, activity_exponent)
+    for part, chunk in enumerate(chunks):
+        chunk.to_parquet(os.path.join(transactions_dir, f"part-{part:05d}.parquet"), index=False)
+    injected, patterns = inject_patterns(num_customers, customers_per_pattern, days, seed, first_transaction=num_rows)
+    injected.to_parquet(os.path.join(transactions_dir, f"part-{part + 1:05d}.parquet"), index=False)
+    generate_customers(num_customers, seed).to_parquet(os.path.join(output_dir, "customers.parquet"), index=False)
+
+    manifest = {
+        "settings": settings,
+        "injected_rows": len(injected),
+        "patterns": patterns,
+        "generate_seconds": round(time.perf_counter() - start, 2),
+    }
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic transactions and customers dataset.")
+    parser.add_argument("--rows", default="1m", help="Number of transactions, e.g. 1k, 100k, 10m, 50m")
+    parser.add_argument("--output-dir", required=True, help="Directory of the Parquet files")
+    parser.add_argument("--customers", type=int, default=0,
+                        help="Number of customers. Defaults to one per 200 transactions")
+    parser.add_argument("--customers-per-pattern", type=int, default=10,
+                        help="Customers with injected structuring, multiple location and large amount patterns")
+    parser.add_argument("--activity-exponent", type=float, default=1.1,
+                        help="Power law exponent of the customer activity; 0 makes every customer equally active")
+    parser.add_argument("--days", type=int, default=365, help="Period covered by the transactions")
+    parser.add_argument("--chunk-rows", type=int, default=1000000, help="Rows per Parquet file")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed")
+    args = parser.parse_args()
+
+    manifest = write_dataset(
+        args.output_dir,
+        parse_size(args.rows),
+        num_customers=args.customers,
+        customers_per_pattern=args.customers_per_pattern,
+        chunk_rows=args.chunk_rows,
+        days=args.days,
+        seed=args.seed,
+        activity_exponent=args.activity_exponent,
+    )
+    print(json.dumps(manifest["settings"]))
+
+
+if __name__ == "__main__":
+    main()
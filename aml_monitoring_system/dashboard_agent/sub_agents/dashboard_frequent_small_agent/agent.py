@@ -4,11 +4,12 @@ import os
 import sys
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 sys.path.append(project_root)
-from .tool import detect_frequent_small_transactions
+from .tool import summarize_frequent_small_transactions_async
 from dotenv import load_dotenv
 load_dotenv()
 
-frequent_transaction_tool = FunctionTool(detect_frequent_small_transactions)
+# The tool returns totals and the top patterns only, so the result stays small for any data volume
+frequent_transaction_tool = FunctionTool(summarize_frequent_small_transactions_async)
 PROMPT = """
 # Frequent Small Transaction Detector Agent
 
@@ -28,6 +29,10 @@ A suspicious pattern is defined as:
 - All such transactions must occur within a **given time window** Take default as 24 hours
 - Take the threshold count of transactions as default (eg,. 3)
 You must invoke the `frequent_transaction_tool` with default parameters unless otherwise specified.
+Leave `lookback_days` unset so the tool covers the configured monitoring period; pass 0 only when the full history is explicitly requested.
+
+The tool lists the `top` patterns by total amount. State `total_count` (patterns) and the `totals` above the
+table, and note when `truncated` is true that only the top patterns are listed.
 
 ## Output Format Requirements (STRICT)
 
@@ -1,219 +1,255 @@
+import asyncio
+import logging
 from google.cloud import bigquery
-from typing import List, Dict
+from root_agent.tools.query_backend import get_backend
+from root_agent.tools.result_cache import cached_tool, TRANSACTIONS
+from root_agent.tools.async_support import async_variant
+from root_agent.tools.telemetry import instrumented_tool
+from root_agent.tools.config import (
+    CUSTOMERS_TABLE,
+    CUSTOMER_FEATURE_WINDOWS_TABLE,
+    USE_FEATURE_TABLES,
+    DEFAULT_LOOKBACK_DAYS,
+    STREAM_PAGE_SIZE,
+    TOOL_RESULT_TOP_N,
+)
+from root_agent.tools import feature_store
+from root_agent.tools.schema import transaction_legs_source, lookback_parameter
+from root_agent.tools.streaming import format_pages, summarize_batches
+from root_agent.tools.tool_logging import get_tool_logger, log_event, log_results
+from root_agent.tools.frequent_transaction_detector import build_frequent_small_windows_query
+from typing import List, Dict, Iterator
 from dotenv import load_dotenv
 load_dotenv()
-def detect_frequent_small_transactions(
-    amount_threshold: float = 5000.00,
-    count_threshold: int = 3,
-    time_window_hours: int = 24
-) -> List[Dict]:
+
+logger = get_tool_logger(__name__)
+
+def build_frequent_small_query(
+    amount_threshold: float,
+    count_threshold: int,
+    time_window_hours: int,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS
+):
     """
-    Detects frequent small transactions within a specified time window.
-    Includes customer name and email information.
-    
-    Args:
-        amount_threshold (float, optional): The maximum amount to consider as a small transaction.
-        count_threshold (int, optional): The minimum number of transactions to be considered suspicious.
-        time_window_hours (int, optional): The time window in hours to check for frequency.
-    
+    Builds the frequent small transaction dashboard query. Arguments as in detect_frequent_small_transactions.
+
     Returns:
-        list: A list of dictionaries containing information about suspicious transaction patterns.
+        tuple: The query and its job config.
     """
-    # Initialize BigQuery client
-    client = bigquery.Client()
-    
+    # Every small transaction counts once for its sender and once for its receiver
+    small_transactions = f"""
+            SELECT customer_id, transaction_id, time, amount
+            FROM {transaction_legs_source()} AS legs
+            WHERE amount <= @amount_threshold AND time >= @since
+    """
+    suspicious_patterns_query = build_frequent_small_windows_query(
+        small_transactions, include_transactions=False
+    )
+
     # For all customers version of the query with customer details
-    query = """
-        WITH AllTransactions AS (
-            SELECT 
-                transaction_id,
-                customer_id_sender,
-                customer_id_receiver,
-                sender_id_account_no,
-                recipient_id_account_no,
-                sender_location,
-                recipient_location,
-                time,
-                payment_type,
-                amount,
-                -- Keep track of customer for both sending and receiving
-                customer_id_sender as customer_id,
-                'sender' as direction
-            FROM 
-                `amlproject-458804.aml_data.transactions`
-            WHERE amount <= @amount_threshold
-            
-            UNION ALL
-            
-            SELECT 
-                transaction_id,
-                customer_id_sender,
-                customer_id_receiver,
-                sender_id_account_no,
-                recipient_id_account_no,
-                sender_location,
-                recipient_location,
-                time,
-                payment_type,
-                amount,
-                -- Keep track of customer for both sending and receiving
-                customer_id_receiver as customer_id,
-                'receiver' as direction
-            FROM 
-                `amlproject-458804.aml_data.transactions`
-            WHERE amount <= @amount_threshold
-        ),
-        -- For each customer and transaction, look ahead to find the window end
-        CustomerTransactionWindows AS (
-            SELECT
-                customer_id,
-                time as window_start,
-                TIMESTAMP_ADD(time, INTERVAL @time_window_hours HOUR) as window_end,
-                transaction_id
-            FROM AllTransactions
-            -- Include every transaction as a potential window start
-        ),
-        -- Join transactions with windows to find which transactions fall into each window
-        CustomerTransactionsInWindows AS (
-            SELECT
-                ctw.customer_id,
-                ctw.transaction_id as window_start_txn_id,
-                ctw.window_start,
-                ctw.window_end,
-                COUNT(t.transaction_id) as transaction_count,
-                SUM(t.amount) as total_amount,
-                -- Creating a JSON array of transaction details
-                ARRAY_AGG(
-                    STRUCT(
-                        t.transaction_id,
-                        t.customer_id_sender,
-                        t.customer_id_receiver,
-                        t.sender_id_account_no,
-                        t.recipient_id_account_no,
-                        t.sender_location,
-                        t.recipient_location,
-                        t.time,
-                        t.payment_type,
-                        t.amount,
-                        t.direction
-                    ) ORDER BY t.time
-                ) as transactions
-            FROM CustomerTransactionWindows ctw
-            JOIN AllTransactions t
-                ON t.customer_id = ctw.customer_id
-                AND t.time >= ctw.window_start 
-                AND t.time <= ctw.window_end
-            GROUP BY ctw.customer_id, ctw.transaction_id, ctw.window_start, ctw.window_end
-            HAVING COUNT(t.transaction_id) >= @count_threshold
-        ),
-        -- Find non-overlapping windows by ordering by count and taking the first
-        -- occurrence for any transaction that appears in multiple windows
-        CustomerRankedWindows AS (
-            SELECT
-                *,
-                ROW_NUMBER() OVER (
-                    PARTITION BY customer_id, window_start_txn_id 
-                    ORDER BY transaction_count DESC, total_amount DESC
-                ) as rn
-            FROM CustomerTransactionsInWindows
-        ),
-        -- Get all transaction IDs for each window and flatten into rows
-        CustomerTransactionDetailsFlat AS (
-            SELECT
-                crw.customer_id,
-                crw.window_start,
-                crw.window_end,
-                crw.transaction_count,
-                crw.total_amount,
-                crw.transactions,
-                t.transaction_id,
-                ROW_NUMBER() OVER (PARTITION BY crw.customer_id ORDER BY crw.window_start, t.time) as window_order
-            FROM CustomerRankedWindows crw,
-                UNNEST(crw.transactions) t
-            WHERE crw.rn = 1
-        ),
-        -- Flag each transaction as first occurrence per customer
-        CustomerFirstOccurrence AS (
-            SELECT
-                customer_id,
-                window_start,
-                window_end,
-                transaction_count,
-                total_amount,
-                transactions,
-                transaction_id,
-                ROW_NUMBER() OVER (PARTITION BY customer_id, transaction_id ORDER BY window_order) = 1 AS is_first_occurrence
-            FROM CustomerTransactionDetailsFlat
-        ),
-        -- Group transactions by customer and window and check if all are first occurrences
-        CustomerNonOverlappingWindows AS (
-            SELECT
-                customer_id,
-                window_start,
-                window_end,
-                transaction_count,
-                total_amount,
-                transactions,
-                LOGICAL_AND(is_first_occurrence) AS all_unique_transactions
-            FROM CustomerFirstOccurrence
-            GROUP BY customer_id, window_start, window_end, transaction_count, total_amount, transactions
-        ),
-        SuspiciousPatterns AS (
-            SELECT
-                customer_id,
-                transaction_count,
-                total_amount,
-                window_start as first_transaction_time,
-                (SELECT MIN(time) FROM UNNEST(transactions)) as first_transaction,
-                (SELECT MAX(time) FROM UNNEST(transactions)) as last_transaction,
-                transactions
-            FROM CustomerNonOverlappingWindows
-            WHERE all_unique_transactions = TRUE
-        )
+    query = f"""
         SELECT
             sp.customer_id,
             c.customer_name,
             c.email,
             sp.transaction_count,
             sp.total_amount,
-            sp.first_transaction_time,
             sp.first_transaction,
             sp.last_transaction
-        FROM SuspiciousPatterns sp
+        FROM ({suspicious_patterns_query}) sp
         JOIN (
             SELECT DISTINCT customer_id, customer_name, email
-            FROM `amlproject-458804.aml_data.customers`
+            FROM {CUSTOMERS_TABLE}
         ) c ON sp.customer_id = c.customer_id
-        ORDER BY sp.customer_id, sp.first_transaction_time
+        ORDER BY sp.customer_id, sp.first_transaction
     """
     
     job_config = bigquery.QueryJobConfig(
         query_parameters=[
             bigquery.ScalarQueryParameter("amount_threshold", "FLOAT", amount_threshold),
             bigquery.ScalarQueryParameter("count_threshold", "INT64", count_threshold),
-            bigquery.ScalarQueryParameter("time_window_hours", "INT64", time_window_hours),
+            bigquery.ScalarQueryParameter("window_micros", "INT64", time_window_hours * 3600 * 1000000),
+            lookback_parameter(lookback_days),
         ]
     )
 
-    # Execute the query
-    query_job = client.query(query, job_config=job_config)
-    results = query_job.result()
-    
-    # Format the results
+    # Windows for the default parameters are maintained incrementally in the feature tables,
+    # built over the full history. With a lookback, the windows reaching into it are returned
+    # whole, including their transactions from before the lookback start.
+    if (USE_FEATURE_TABLES
+            and amount_threshold == feature_store.SMALL_AMOUNT_THRESHOLD
+            and count_threshold == feature_store.SMALL_COUNT_THRESHOLD
+            and time_window_hours == feature_store.SMALL_TIME_WINDOW_HOURS):
+        query = f"""
+            SELECT
+                w.customer_id,
+                c.customer_name,
+                c.email,
+                w.transaction_count,
+                w.total_amount,
+                w.start_time as first_transaction,
+                w.end_time as last_transaction
+            FROM {CUSTOMER_FEATURE_WINDOWS_TABLE} w
+            JOIN (
+                SELECT DISTINCT customer_id, customer_name, email
+                FROM {CUSTOMERS_TABLE}
+            ) c ON w.customer_id = c.customer_id
+            WHERE w.window_type = @window_type AND w.end_time >= @since
+            ORDER BY w.customer_id, w.start_time
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter("window_type", "STRING", feature_store.FREQUENT_SMALL_WINDOW),
+                lookback_parameter(lookback_days),
+            ]
+        )
+    return query, job_config
+
+def format_frequent_small_pattern(row) -> Dict:
+    """
+    Formats one row of the frequent small transaction dashboard query.
+
+    Args:
+        row: A query row.
+
+    Returns:
+        dict: The suspicious transaction pattern.
+    """
+    return {
+        'customer_id': row.customer_id,
+        'customer_name': row.customer_name,
+        'email': row.email,
+        'transaction_count': row.transaction_count,
+        'total_amount': row.total_amount,
+        'first_transaction_date': row.first_transaction.isoformat(),
+        'last_transaction_date': row.last_transaction.isoformat(),
+    }
+
+def format_frequent_small_results(results) -> List[Dict]:
+    """
+    Formats the rows of the frequent small transaction dashboard query.
+
+    Args:
+        results: The query rows.
+
+    Returns:
+        list: The suspicious transaction patterns.
+    """
     suspicious_patterns = []
     for row in results:
-        pattern = {
-            'customer_id': row.customer_id,
-            'customer_name': row.customer_name,
-            'email': row.email,
-            'transaction_count': row.transaction_count,
-            'total_amount': row.total_amount,
-            'first_transaction_date': row.first_transaction.isoformat(),
-            'last_transaction_date': row.last_transaction.isoformat(),
-        }
-        
-        suspicious_patterns.append(pattern)
-    print("----------------------frequent------------------------")
-    print(f"Found {len(suspicious_patterns)} suspicious frequent transaction patterns")
-    print(suspicious_patterns)
-    return suspicious_patterns
\ No newline at end of file
+        suspicious_patterns.append(format_frequent_small_pattern(row))
+    log_results(logger, "dashboard_frequent_small_transactions", suspicious_patterns)
+    return suspicious_patterns
+
+@instrumented_tool
+@cached_tool(TRANSACTIONS)
+def detect_frequent_small_transactions(
+    amount_threshold: float = 5000.00,
+    count_threshold: int = 3,
+    time_window_hours: int = 24,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS
+) -> List[Dict]:
+    """
+    Detects frequent small transactions within a specified time window.
+    Includes customer name and email information.
+    
+    Args:
+        amount_threshold (float, optional): The maximum amount to consider as a small transaction.
+        count_threshold (int, optional): The minimum number of transactions to be considered suspicious.
+        time_window_hours (int, optional): The time window in hours to check for frequency.
+        lookback_days (int, optional): Days of transactions to check, counted back from now. 0 checks the full history.
+    
+    Returns:
+        list: A list of dictionaries containing information about suspicious transaction patterns.
+    """
+    # Get the configured query backend
+    backend = get_backend()
+    query, job_config = build_frequent_small_query(amount_threshold, count_threshold, time_window_hours, lookback_days)
+    
+    # Execute the query
+    results = backend.query(query, job_config)
+    return format_frequent_small_results(results)
+
+@instrumented_tool
+@cached_tool(TRANSACTIONS)
+@async_variant(detect_frequent_small_transactions)
+async def detect_frequent_small_transactions_async(
+    amount_threshold: float = 5000.00,
+    count_threshold: int = 3,
+    time_window_hours: int = 24,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS
+) -> List[Dict]:
+    query, job_config = build_frequent_small_query(amount_threshold, count_threshold, time_window_hours, lookback_days)
+    results = await get_backend().query_async(query, job_config)
+    return format_frequent_small_results(results)
+
+def stream_frequent_small_transactions(
+    amount_threshold: float = 5000.00,
+    count_threshold: int = 3,
+    time_window_hours: int = 24,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS,
+    page_size: int = STREAM_PAGE_SIZE
+) -> Iterator[List[Dict]]:
+    """
+    Streaming variant of detect_frequent_small_transactions for batch jobs: yields the patterns
+    page by page instead of returning (and printing) one list.
+
+    Args:
+        amount_threshold (float, optional): The maximum amount to consider as a small transaction.
+        count_threshold (int, optional): The minimum number of transactions to be considered suspicious.
+        time_window_hours (int, optional): The time window in hours to check for frequency.
+        lookback_days (int, optional): Days of transactions to check, counted back from now. 0 checks the full history.
+        page_size (int, optional): The number of patterns per batch.
+
+    Yields:
+        list: A batch of suspicious transaction patterns.
+    """
+    query, job_config = build_frequent_small_query(amount_threshold, count_threshold, time_window_hours, lookback_days)
+    return format_pages(get_backend().query_pages(query, job_config, page_size), format_frequent_small_pattern)
+
+@instrumented_tool
+@cached_tool(TRANSACTIONS)
+def summarize_frequent_small_transactions(
+    amount_threshold: float = 5000.00,
+    count_threshold: int = 3,
+    time_window_hours: int = 24,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS,
+    top_n: int = TOOL_RESULT_TOP_N
+) -> Dict:
+    """
+    Summarizes the frequent small transaction patterns of all customers: the number of patterns,
+    their total transaction count and amount, and the top_n patterns with the largest total
+    amount, including customer name and email.
+
+    Args:
+        amount_threshold (float, optional): The maximum amount to consider as a small transaction.
+        count_threshold (int, optional): The minimum number of transactions to be considered suspicious.
+        time_window_hours (int, optional): The time window in hours to check for frequency.
+        lookback_days (int, optional): Days of transactions to check, counted back from now. 0 checks the full history.
+        top_n (int, optional): The number of patterns to list. Default is 20.
+
+    Returns:
+        dict: total_count (patterns), totals (transaction_count, total_amount), top (the listed
+        patterns) and truncated (whether patterns were left out).
+    """
+    summary = summarize_batches(
+        stream_frequent_small_transactions(amount_threshold, count_threshold, time_window_hours, lookback_days),
+        top_n,
+        sort_field='total_amount',
+        sum_fields=['transaction_count', 'total_amount'],
+    )
+    log_event(logger, logging.INFO, "dashboard_frequent_small_transactions_summary", total_count=summary['total_count'], listed=len(summary['top']))
+    return summary
+
+@async_variant(summarize_frequent_small_transactions)
+async def summarize_frequent_small_transactions_async(
+    amount_threshold: float = 5000.00,
+    count_threshold: int = 3,
+    time_window_hours: int = 24,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS,
+    top_n: int = TOOL_RESULT_TOP_N
+) -> Dict:
+    # Pages are fetched one after another, so the whole stream is consumed in a worker thread
+    return await asyncio.to_thread(
+        summarize_frequent_small_transactions, amount_threshold, count_threshold, time_window_hours, lookback_days, top_n
+    )
@@ -4,12 +4,13 @@ import os
 import sys
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 sys.path.append(project_root)
-from .tool import detect_large_amount_transactions
+from .tool import summarize_large_amount_transactions_async
 from dotenv import load_dotenv
 load_dotenv()
 
 # Create FunctionTools
-large_amount_tool = FunctionTool(detect_large_amount_transactions)
+# The tool returns totals and the top customers only, so the result stays small for any data volume
+large_amount_tool = FunctionTool(summarize_large_amount_transactions_async)
 PROMPT = """
 #Large amount transaction detector agent
 
@@ -34,8 +35,11 @@ Without any input from the user, your task is to retrieve and analyze all transa
 
 - You MUST preserve the complete structure returned by the tool.
 - DO NOT summarize individual transactions; only include the **count per customer** based on raw tool output.
+- The tool lists the `top` customers by large transaction count. State `total_count` (customers) and
+  `totals.large_transaction_count` above the table, and note when `truncated` is true that only the top customers are listed.
 - DO NOT take any input from the user.
 - The default threshold amount to be used is 1000
+- Leave `lookback_days` unset so the tool covers the configured monitoring period.
 ## Output Format
 
 - Render the output in a **table format** using the following columns:
@@ -1,34 +1,45 @@
-from typing import Optional, List, Dict
+import asyncio
+import logging
+from typing import Optional, List, Dict, Iterator
 from google.cloud import bigquery
+from root_agent.tools.query_backend import get_backend
+from root_agent.tools.result_cache import cached_tool, TRANSACTIONS
+from root_agent.tools.async_support import async_variant
+from root_agent.tools.telemetry import instrumented_tool
+from root_agent.tools.config import (
+    CUSTOMERS_TABLE,
+    CUSTOMER_FEATURES_TABLE,
+    CUSTOMER_DAILY_FEATURES_TABLE,
+    USE_FEATURE_TABLES,
+    DEFAULT_LOOKBACK_DAYS,
+    STREAM_PAGE_SIZE,
+    TOOL_RESULT_TOP_N,
+)
+from root_agent.tools import feature_store
+from root_agent.tools.schema import transaction_legs_source, lookback_parameter
+from root_agent.tools.streaming import format_pages, summarize_batches
+from root_agent.tools.tool_logging import get_tool_logger, log_event, log_results
 from dotenv import load_dotenv
 load_dotenv()
 
-def detect_large_amount_transactions(threshold: float = 1000.00) -> List[Dict]:
+logger = get_tool_logger(__name__)
+
+def build_large_amount_query(threshold: float, lookback_days: int = DEFAULT_LOOKBACK_DAYS):
     """
-    Detects transactions with amounts larger than the specified threshold
-    and includes customer details like name and email.
+    Builds the large amount dashboard query.
 
     Args:
-        threshold (float): The amount threshold to consider as suspicious. Default is 1000.00.
+        threshold (float): The amount threshold to consider as suspicious.
+        lookback_days (int, optional): Days of transactions to count. 0 counts the full history.
 
     Returns:
-        List[Dict]: A list of dictionaries containing customer details and count of large amount transactions.
+        tuple: The query and its job config.
     """
-    client = bigquery.Client()
-    query = """
+    query = f"""
             WITH large_transactions AS (
                 SELECT customer_id, COUNT(*) AS large_transaction_count
-                FROM (
-                    SELECT customer_id_sender AS customer_id
-                    FROM `amlproject-458804.aml_data.transactions`
-                    WHERE amount > @threshold
-
-                    UNION ALL
-
-                    SELECT customer_id_receiver AS customer_id
-                    FROM `amlproject-458804.aml_data.transactions`
-                    WHERE amount > @threshold
-                ) AS all_customers
+                FROM {transaction_legs_source()} AS legs
+                WHERE amount > @threshold AND time >= @since
                 GROUP BY customer_id
                 ORDER BY large_transaction_count DESC
             )
@@ -41,7 +52,7 @@ def detect_large_amount_transactions(threshold: float = 1000.00) -> List[Dict]:
             FROM large_transactions lt
             JOIN (
                 SELECT DISTINCT customer_id, customer_name, email
-                FROM `amlproject-458804.aml_data.customers`
+                FROM {CUSTOMERS_TABLE}
             ) c ON lt.customer_id = c.customer_id
             ORDER BY lt.large_transaction_count DESC;
         """
@@ -49,20 +60,174 @@ def detect_large_amount_transactions(threshold: float = 1000.00) -> List[Dict]:
     job_config = bigquery.QueryJobConfig(
             query_parameters=[
                 bigquery.ScalarQueryParameter("threshold", "FLOAT", threshold),
+                lookback_parameter(lookback_days),
             ]
         )
 
-    query_job = client.query(query, job_config=job_config)
-    results = query_job.result()
+    # Counts for the default threshold are maintained incrementally in the feature tables: the
+    # full history per customer, and per day for a lookback. The daily counts cover whole days,
+    # so they include the transactions of the first day from before the lookback start.
+    if USE_FEATURE_TABLES and lookback_days > 0 and threshold == feature_store.LARGE_AMOUNT_THRESHOLD:
+        query = f"""
+            WITH large_transactions AS (
+                SELECT customer_id, SUM(large_transaction_count) AS large_transaction_count
+                FROM {CUSTOMER_DAILY_FEATURES_TABLE}
+                WHERE day >= DATE(@since)
+                GROUP BY customer_id
+                HAVING SUM(large_transaction_count) > 0
+            )
+            SELECT 
+                lt.customer_id,
+                c.customer_name,
+                c.email,
+                lt.large_transaction_count
+            FROM large_transactions lt
+            JOIN (
+                SELECT DISTINCT customer_id, customer_name, email
+                FROM {CUSTOMERS_TABLE}
+            ) c ON lt.customer_id = c.customer_id
+            ORDER BY lt.large_transaction_count DESC
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[lookback_parameter(lookback_days)]
+        )
+    elif USE_FEATURE_TABLES and threshold == feature_store.LARGE_AMOUNT_THRESHOLD:
+        query = f"""
+            SELECT 
+                cf.customer_id,
+                c.customer_name,
+                c.email,
+                cf.large_transaction_count
+            FROM {CUSTOMER_FEATURES_TABLE} cf
+            JOIN (
+                SELECT DISTINCT customer_id, customer_name, email
+                FROM {CUSTOMERS_TABLE}
+            ) c ON cf.customer_id = c.customer_id
+            WHERE cf.large_transaction_count > 0
+            ORDER BY cf.large_transaction_count DESC
+        """
+        job_config = None
+    return query, job_config
+
+def format_large_amount_customer(row) -> Dict:
+    """
+    Formats one row of the large amount dashboard query.
+
+    Args:
+        row: A query row.
+
+    Returns:
+        Dict: The customer and their large transaction count.
+    """
+    return {
+        'customer_id': row.customer_id,
+        'customer_name': row.customer_name,
+        'email': row.email,
+        'large_transaction_count': row.large_transaction_count
+    }
+
+def format_large_amount_results(results) -> List[Dict]:
+    """
+    Formats the rows of the large amount dashboard query.
 
+    Args:
+        results: The query rows.
+
+    Returns:
+        List[Dict]: The customers and their large transaction counts.
+    """
     suspicious_transactions = []
     for row in results:
-        suspicious_transactions.append({
-            'customer_id': row.customer_id,
-            'customer_name': row.customer_name,
-            'email': row.email,
-            'large_transaction_count': row.large_transaction_count
-        })
-    print("-----------------------largeamounttransactionsdetails---------------------------")
-    print(suspicious_transactions)
-    return suspicious_transactions
\ No newline at end of file
+        suspicious_transactions.append(format_large_amount_customer(row))
+    log_results(logger, "dashboard_large_amount_transactions", suspicious_transactions)
+    return suspicious_transactions
+
+@instrumented_tool
+@cached_tool(TRANSACTIONS)
+def detect_large_amount_transactions(threshold: float = 1000.00, lookback_days: int = DEFAULT_LOOKBACK_DAYS) -> List[Dict]:
+    """
+    Detects transactions with amounts larger than the specified threshold
+    and includes customer details like name and email.
+
+    Args:
+        threshold (float): The amount threshold to consider as suspicious. Default is 1000.00.
+        lookback_days (int, optional): Days of transactions to check, counted back from now. 0 checks the full history.
+
+    Returns:
+        List[Dict]: A list of dictionaries containing customer details and count of large amount transactions.
+    """
+    backend = get_backend()
+    query, job_config = build_large_amount_query(threshold, lookback_days)
+    results = backend.query(query, job_config)
+    return format_large_amount_results(results)
+
+@instrumented_tool
+@cached_tool(TRANSACTIONS)
+@async_variant(detect_large_amount_transactions)
+async def detect_large_amount_transactions_async(
+    threshold: float = 1000.00,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS
+) -> List[Dict]:
+    query, job_config = build_large_amount_query(threshold, lookback_days)
+    results = await get_backend().query_async(query, job_config)
+    return format_large_amount_results(results)
+
+def stream_large_amount_transactions(
+    threshold: float = 1000.00,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS,
+    page_size: int = STREAM_PAGE_SIZE
+) -> Iterator[List[Dict]]:
+    """
+    Streaming variant of detect_large_amount_transactions for batch jobs: yields the customers
+    page by page instead of returning (and printing) one list.
+
+    Args:
+        threshold (float): The amount threshold to consider as suspicious. Default is 1000.00.
+        lookback_days (int, optional): Days of transactions to check, counted back from now. 0 checks the full history.
+        page_size (int, optional): The number of customers per batch.
+
+    Yields:
+        List[Dict]: A batch of customers with their large transaction counts.
+    """
+    query, job_config = build_large_amount_query(threshold, lookback_days)
+    return format_pages(get_backend().query_pages(query, job_config, page_size), format_large_amount_customer)
+
+@instrumented_tool
+@cached_tool(TRANSACTIONS)
+def summarize_large_amount_transactions(
+    threshold: float = 1000.00,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS,
+    top_n: int = TOOL_RESULT_TOP_N
+) -> Dict:
+    """
+    Summarizes the customers with transactions larger than the specified threshold: the number
+    of such customers, their total number of large transactions, and the top_n customers with the
+    most large transactions, including name and email.
+
+    Args:
+        threshold (float): The amount threshold to consider as suspicious. Default is 1000.00.
+        lookback_days (int, optional): Days of transactions to check, counted back from now. 0 checks the full history.
+        top_n (int): The number of customers to list. Default is 20.
+
+    Returns:
+        Dict: total_count (customers), totals.large_transaction_count, top (the listed customers
+        with customer_id, customer_name, email and large_transaction_count) and truncated
+        (whether customers were left out).
+    """
+    summary = summarize_batches(
+        stream_large_amount_transactions(threshold, lookback_days),
+        top_n,
+        sort_field='large_transaction_count',
+        sum_fields=['large_transaction_count'],
+    )
+    log_event(logger, logging.INFO, "dashboard_large_amount_transactions_summary", total_count=summary['total_count'], listed=len(summary['top']))
+    return summary
+
+@async_variant(summarize_large_amount_transactions)
+async def summarize_large_amount_transactions_async(
+    threshold: float = 1000.00,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS,
+    top_n: int = TOOL_RESULT_TOP_N
+) -> Dict:
+    # Pages are fetched one after another, so the whole stream is consumed in a worker thread
+    return await asyncio.to_thread(summarize_large_amount_transactions, threshold, lookback_days, top_n)
@@ -4,12 +4,13 @@ import os
 import sys
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 sys.path.append(project_root)
-from .tool import detect_multiple_location_transactions
+from .tool import summarize_multiple_location_transactions_async
 from dotenv import load_dotenv
 load_dotenv()
 
 # Create FunctionTools
-multiple_location_tool = FunctionTool(detect_multiple_location_transactions)
+# The tool returns the window count and the top windows only, so the result stays small for any data volume
+multiple_location_tool = FunctionTool(summarize_multiple_location_transactions_async)
 PROMPT = """
 # Multiple Location Transaction Detector Agent
 
@@ -32,11 +33,14 @@ Use the tool `multiple_location_tool` to identify customers who:
 ## Data Handling Requirements (STRICT)
 
 - Analyze the data WITHOUT any input. Always run the tool for **all customers**.
+- Leave `lookback_days` unset so the tool covers the configured monitoring period.
 - ALWAYS PRESERVE the COMPLETE OUTPUT STRUCTURE of the tool.
 - DO NOT OMIT or REFORMAT any part of the tool's responses.
 - INCLUDE **ALL FIELDS** exactly as returned:
   - `customer_id`, `customer_name`, `email`, `location_count`, `start_time`, `end_time`
 - NEVER summarize, rename, or infer new fields unless explicitly instructed.
+- The tool lists the `top` windows by location count. State `total_count` (windows) above the table, and
+  note when `truncated` is true that only the top windows are listed.
 
 ## Output Format
 
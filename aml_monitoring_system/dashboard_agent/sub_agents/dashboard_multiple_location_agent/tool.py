@@ -1,36 +1,49 @@
+import asyncio
+import logging
 from google.cloud import bigquery
-from typing import List, Dict
+from root_agent.tools.query_backend import get_backend
+from root_agent.tools.result_cache import cached_tool, TRANSACTIONS
+from root_agent.tools.async_support import async_variant
+from root_agent.tools.telemetry import instrumented_tool
+from root_agent.tools.config import (
+    CUSTOMERS_TABLE,
+    CUSTOMER_FEATURE_WINDOWS_TABLE,
+    USE_FEATURE_TABLES,
+    DEFAULT_LOOKBACK_DAYS,
+    STREAM_PAGE_SIZE,
+    TOOL_RESULT_TOP_N,
+)
+from root_agent.tools import feature_store
+from root_agent.tools.schema import transaction_legs_source, lookback_parameter
+from root_agent.tools.streaming import format_pages, summarize_batches
+from root_agent.tools.tool_logging import get_tool_logger, log_event, log_results
+from typing import List, Dict, Iterator
 from dotenv import load_dotenv
 load_dotenv()
 
-def detect_multiple_location_transactions(
-    min_txn_count: int = 3,
-    location_threshold: int = 2,  # Minimum different locations to be considered
-    time_window_hours: int = 48
-) -> List[Dict]:
+logger = get_tool_logger(__name__)
+
+def build_multiple_location_query(
+    min_txn_count: int,
+    location_threshold: int,
+    time_window_hours: int,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS
+):
     """
-    Detects windows of transactions where there are at least `min_txn_count` transactions 
-    in non-overlapping time windows of `time_window_hours`.
-    Returns customer details including name and email along with transaction data.
+    Builds the multiple location dashboard query. Arguments as in detect_multiple_location_transactions.
+
+    Returns:
+        tuple: The query and its job config.
     """
-    client = bigquery.Client()
-    query = """
+    query = f"""
         WITH base_data AS (
           SELECT
             transaction_id,
-            customer_id_sender AS customer_id,
-            sender_location AS location,
-            TIMESTAMP(time) AS event_time
-          FROM `amlproject-458804.aml_data.transactions`
-
-          UNION ALL
-
-          SELECT
-            transaction_id,
-            customer_id_receiver AS customer_id,
-            recipient_location AS location,
+            customer_id,
+            location,
             TIMESTAMP(time) AS event_time
-          FROM `amlproject-458804.aml_data.transactions`
+          FROM {transaction_legs_source()} AS legs
+          WHERE time >= @since
         ),
         ordered_txns AS (
           SELECT
@@ -49,7 +62,7 @@ def detect_multiple_location_transactions(
             event_time,
             CASE 
               WHEN prev_event_time IS NULL OR 
-                   TIMESTAMP_DIFF(event_time, prev_event_time, HOUR) > @time_window_hours
+                   DIV(TIMESTAMP_DIFF(event_time, prev_event_time, SECOND), 3600) > @time_window_hours
               THEN 1 
               ELSE 0 
             END AS is_new_window
@@ -101,7 +114,7 @@ def detect_multiple_location_transactions(
         FROM suspicious_windows sw
         JOIN (
           SELECT DISTINCT customer_id, customer_name, email
-          FROM `amlproject-458804.aml_data.customers`
+          FROM {CUSTOMERS_TABLE}
         ) c ON sw.customer_id = c.customer_id
         ORDER BY sw.customer_id, sw.start_time
         """
@@ -110,22 +123,176 @@ def detect_multiple_location_transactions(
                 bigquery.ScalarQueryParameter("min_txn_count", "INT64", min_txn_count),
                 bigquery.ScalarQueryParameter("location_threshold", "INT64", location_threshold),
                 bigquery.ScalarQueryParameter("time_window_hours", "INT64", time_window_hours),
+                lookback_parameter(lookback_days),
+            ]
+        )
+
+    # Every location window of the full history for the default gap is materialized, so only the
+    # thresholds and the lookback are applied here. Windows reaching into the lookback are
+    # returned whole, including their transactions from before the lookback start.
+    if (USE_FEATURE_TABLES
+            and time_window_hours == feature_store.LOCATION_TIME_WINDOW_HOURS):
+        query = f"""
+            SELECT
+              w.customer_id,
+              c.customer_name,
+              c.email,
+              w.start_time,
+              w.end_time,
+              w.location_count
+            FROM {CUSTOMER_FEATURE_WINDOWS_TABLE} w
+            JOIN (
+              SELECT DISTINCT customer_id, customer_name, email
+              FROM {CUSTOMERS_TABLE}
+            ) c ON w.customer_id = c.customer_id
+            WHERE w.window_type = @window_type
+              AND w.transaction_count >= @min_txn_count
+              AND w.location_count >= @location_threshold
+              AND w.end_time >= @since
+            ORDER BY w.customer_id, w.start_time
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter("window_type", "STRING", feature_store.LOCATION_WINDOW),
+                bigquery.ScalarQueryParameter("min_txn_count", "INT64", min_txn_count),
+                bigquery.ScalarQueryParameter("location_threshold", "INT64", location_threshold),
+                lookback_parameter(lookback_days),
             ]
         )
+    return query, job_config
+
+def format_multiple_location_window(row) -> Dict:
+    """
+    Formats one row of the multiple location dashboard query.
+
+    Args:
+        row: A query row.
+
+    Returns:
+        Dict: The suspicious window with customer details.
+    """
+    return {
+        "customer_id": row.customer_id,
+        "customer_name": row.customer_name,
+        "email": row.email,
+        "location_count": row.location_count,
+        "start_time": row.start_time.isoformat() if row.start_time else None,
+        "end_time": row.end_time.isoformat() if row.end_time else None,
+    }
+
+def format_multiple_location_results(results) -> List[Dict]:
+    """
+    Formats the rows of the multiple location dashboard query.
 
-    query_job = client.query(query, job_config=job_config)
-    results = query_job.result()
+    Args:
+        results: The query rows.
 
+    Returns:
+        List[Dict]: The suspicious windows with customer details.
+    """
     suspicious_patterns = []
     for row in results:
-        suspicious_patterns.append({
-            "customer_id": row.customer_id,
-            "customer_name": row.customer_name,
-            "email": row.email,
-            "location_count": row.location_count,
-            "start_time": row.start_time.isoformat() if row.start_time else None,
-            "end_time": row.end_time.isoformat() if row.end_time else None,
-        })
-    print("-----------------------multiplelocationdetails---------------------------")
-    print(suspicious_patterns)
-    return suspicious_patterns
\ No newline at end of file
+        suspicious_patterns.append(format_multiple_location_window(row))
+    log_results(logger, "dashboard_multiple_location_transactions", suspicious_patterns)
+    return suspicious_patterns
+
+@instrumented_tool
+@cached_tool(TRANSACTIONS)
+def detect_multiple_location_transactions(
+    min_txn_count: int = 3,
+    location_threshold: int = 2,  # Minimum different locations to be considered
+    time_window_hours: int = 48,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS
+) -> List[Dict]:
+    """
+    Detects windows of transactions where there are at least `min_txn_count` transactions 
+    in non-overlapping time windows of `time_window_hours`, among the transactions of the last
+    `lookback_days` days (0 checks the full history).
+    Returns customer details including name and email along with transaction data.
+    """
+    backend = get_backend()
+    query, job_config = build_multiple_location_query(min_txn_count, location_threshold, time_window_hours, lookback_days)
+    results = backend.query(query, job_config)
+    return format_multiple_location_results(results)
+
+@instrumented_tool
+@cached_tool(TRANSACTIONS)
+@async_variant(detect_multiple_location_transactions)
+async def detect_multiple_location_transactions_async(
+    min_txn_count: int = 3,
+    location_threshold: int = 2,
+    time_window_hours: int = 48,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS
+) -> List[Dict]:
+    query, job_config = build_multiple_location_query(min_txn_count, location_threshold, time_window_hours, lookback_days)
+    results = await get_backend().query_async(query, job_config)
+    return format_multiple_location_results(results)
+
+def stream_multiple_location_transactions(
+    min_txn_count: int = 3,
+    location_threshold: int = 2,
+    time_window_hours: int = 48,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS,
+    page_size: int = STREAM_PAGE_SIZE
+) -> Iterator[List[Dict]]:
+    """
+    Streaming variant of detect_multiple_location_transactions for batch jobs: yields the
+    windows page by page instead of returning (and printing) one list.
+
+    Args:
+        min_txn_count (int, optional): The minimum number of transactions in a window.
+        location_threshold (int, optional): The minimum number of different locations in a window.
+        time_window_hours (int, optional): The gap in hours that starts a new window.
+        lookback_days (int, optional): Days of transactions to check, counted back from now. 0 checks the full history.
+        page_size (int, optional): The number of windows per batch.
+
+    Yields:
+        List[Dict]: A batch of suspicious windows with customer details.
+    """
+    query, job_config = build_multiple_location_query(min_txn_count, location_threshold, time_window_hours, lookback_days)
+    return format_pages(get_backend().query_pages(query, job_config, page_size), format_multiple_location_window)
+
+@instrumented_tool
+@cached_tool(TRANSACTIONS)
+def summarize_multiple_location_transactions(
+    min_txn_count: int = 3,
+    location_threshold: int = 2,
+    time_window_hours: int = 48,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS,
+    top_n: int = TOOL_RESULT_TOP_N
+) -> Dict:
+    """
+    Summarizes the windows of transactions in multiple locations of all customers: the number
+    of windows, and the top_n windows with the most locations, including customer name and email.
+
+    Args:
+        min_txn_count (int, optional): The minimum number of transactions in a window.
+        location_threshold (int, optional): The minimum number of different locations in a window.
+        time_window_hours (int, optional): The gap in hours that starts a new window.
+        lookback_days (int, optional): Days of transactions to check, counted back from now. 0 checks the full history.
+        top_n (int, optional): The number of windows to list. Default is 20.
+
+    Returns:
+        Dict: total_count (windows), top (the listed windows) and truncated (whether windows
+        were left out).
+    """
+    summary = summarize_batches(
+        stream_multiple_location_transactions(min_txn_count, location_threshold, time_window_hours, lookback_days),
+        top_n,
+        sort_field="location_count",
+    )
+    log_event(logger, logging.INFO, "dashboard_multiple_location_transactions_summary", total_count=summary['total_count'], listed=len(summary['top']))
+    return summary
+
+@async_variant(summarize_multiple_location_transactions)
+async def summarize_multiple_location_transactions_async(
+    min_txn_count: int = 3,
+    location_threshold: int = 2,
+    time_window_hours: int = 48,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS,
+    top_n: int = TOOL_RESULT_TOP_N
+) -> Dict:
+    # Pages are fetched one after another, so the whole stream is consumed in a worker thread
+    return await asyncio.to_thread(
+        summarize_multiple_location_transactions, min_txn_count, location_threshold, time_window_hours, lookback_days, top_n
+    )
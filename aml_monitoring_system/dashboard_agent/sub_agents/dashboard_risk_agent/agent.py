@@ -4,10 +4,12 @@ import os
 import sys
 
 # Import the tools for risk dashboard agent
-from .tools import get_top_risk_customers
+from .tools import get_top_risk_customers_async, get_risk_score_trend_async, get_top_risk_increases_async
 
 # Create FunctionTools
-top_risk_customers_tool = FunctionTool(get_top_risk_customers)
+top_risk_customers_tool = FunctionTool(get_top_risk_customers_async)
+risk_score_trend_tool = FunctionTool(get_risk_score_trend_async)
+top_risk_increases_tool = FunctionTool(get_top_risk_increases_async)
 
 PROMPT = """
 # Risk Dashboard Agent
@@ -18,10 +20,15 @@ Responsibilities:
    - Use the `get_top_risk_customers` tool to retrieve the top N risk-prone customers
    - Present the data in a clear, tabular format with only customer ID, name, and risk score
    - Default to showing the top 10 customers if no specific number is requested
+2. Show risk trends when asked how risk scores changed:
+   - Use the `get_top_risk_increases` tool for the customers whose risk score rose the most over the last N days (default 7)
+   - Use the `get_risk_score_trend` tool for the day-by-day risk score history of one customer (default 30 days)
 
 ## Output Format
 - Render the output in a **table format** using the following columns:
   - `Customer ID`, `Customer Name`, `Email`, `Risk Score`
+- For risk increases use `Customer ID`, `Customer Name`, `Risk Score`, `Risk Increase`, `Risk Increase %`
+- For a customer's trend use `Day`, `Risk Added`, `Risk Score`
 - Format the table clearly with headers and rows.
 Always present data in a clean, organized manner suitable for a simple dashboard display. Keep responses focused on only the essential customer details and risk scores.
 """
@@ -30,7 +37,7 @@ risk_dashboard_agent = Agent(
     name="risk_dashboard_agent",
     model="gemini-2.0-flash",
     description="Displays and analyzes top risk-prone customers for AML compliance.",
-    tools=[top_risk_customers_tool],
+    tools=[top_risk_customers_tool, risk_score_trend_tool, top_risk_increases_tool],
     instruction=PROMPT,
     output_key="riskdashboardoutput"
 )
\ No newline at end of file
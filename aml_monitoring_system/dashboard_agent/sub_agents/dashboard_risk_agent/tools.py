@@ -1,22 +1,25 @@
+import asyncio
 from google.cloud import bigquery
+from root_agent.tools.query_backend import get_backend
+from root_agent.tools.result_cache import cached_tool, CUSTOMERS
+from root_agent.tools.async_support import async_variant
+from root_agent.tools.telemetry import instrumented_tool
+from root_agent.tools.risk_ledger import (
+    build_risk_score_trend_query,
+    build_top_risk_increases_query,
+    ensure_risk_ledger,
+    risk_scores_source,
+)
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Any, Union
 
-def get_top_risk_customers(limit: int = 10, min_score: Optional[int] = None, 
-                          customer_type: Optional[str] = None) -> List[Dict[str, Any]]:
+def build_top_risk_customers_query(limit: int, min_score: Optional[int], customer_type: Optional[str]) -> str:
     """
-    Retrieves the top risk-prone customers from BigQuery.
-    
-    Args:
-        limit (int, optional): The number of customers to retrieve. Default is 10.
-        min_score (int, optional): Minimum risk score to filter by. Default is None.
-        customer_type (str, optional): Type of customer to filter by. Default is None.
-    
+    Builds the top risk customers query. Arguments as in get_top_risk_customers.
+
     Returns:
-        List[Dict[str, Any]]: A list of dictionaries containing customer information and risk scores.
+        str: The query.
     """
-    # Initialize BigQuery client
-    client = bigquery.Client()
-    
     # Build the WHERE clause based on optional filters
     where_clauses = []
     if min_score is not None:
@@ -36,7 +39,7 @@ def get_top_risk_customers(limit: int = 10, min_score: Optional[int] = None,
         risk_score,
         ROW_NUMBER() OVER (PARTITION BY customer_id ORDER BY risk_score DESC) AS rn
     FROM 
-        `amlproject-458804.aml_data.customers`
+        {risk_scores_source()}
     {where_clause}
 )
 SELECT 
@@ -51,11 +54,18 @@ ORDER BY risk_score DESC
 LIMIT {limit}
 
     """
-    
-    # Execute the query
-    query_job = client.query(query)
-    results = query_job.result()
-    
+    return query
+
+def format_top_risk_customers(results) -> List[Dict[str, Any]]:
+    """
+    Formats the rows of the top risk customers query.
+
+    Args:
+        results: The query rows.
+
+    Returns:
+        List[Dict[str, Any]]: The customers and their risk scores.
+    """
     # Format the results as a list of dictionaries with only essential information
     customers = []
     for row in results:
@@ -67,3 +77,137 @@ LIMIT {limit}
         })
     
     return customers
+
+@instrumented_tool
+@cached_tool(CUSTOMERS)
+def get_top_risk_customers(limit: int = 10, min_score: Optional[int] = None, 
+                          customer_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Retrieves the top risk-prone customers from BigQuery.
+    
+    Args:
+        limit (int, optional): The number of customers to retrieve. Default is 10.
+        min_score (int, optional): Minimum risk score to filter by. Default is None.
+        customer_type (str, optional): Type of customer to filter by. Default is None.
+    
+    Returns:
+        List[Dict[str, Any]]: A list of dictionaries containing customer information and risk scores.
+    """
+    # Get the configured query backend
+    backend = get_backend()
+    
+    # Execute the query
+    results = backend.query(build_top_risk_customers_query(limit, min_score, customer_type))
+    return format_top_risk_customers(results)
+
+@instrumented_tool
+@cached_tool(CUSTOMERS)
+@async_variant(get_top_risk_customers)
+async def get_top_risk_customers_async(limit: int = 10, min_score: Optional[int] = None,
+                                       customer_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    query = build_top_risk_customers_query(limit, min_score, customer_type)
+    results = await get_backend().query_async(query)
+    return format_top_risk_customers(results)
+
+
+def format_risk_score_trend(results) -> List[Dict[str, Any]]:
+    """
+    Formats the rows of the risk score trend query.
+
+    Args:
+        results: The query rows.
+
+    Returns:
+        List[Dict[str, Any]]: Per day, the risk added, the activities and events behind it and the
+            score at the end of the day.
+    """
+    return [
+        {
+            'day': row.day.isoformat(),
+            'risk_increment': float(row.risk_increment or 0),
+            'activities': int(row.activities or 0),
+            'events': int(row.events),
+            'risk_score': row.risk_score
+        }
+        for row in results
+    ]
+
+@instrumented_tool
+@cached_tool(CUSTOMERS)
+def get_risk_score_trend(customer_id: str, days: int = 30) -> List[Dict[str, Any]]:
+    """
+    Retrieves how a customer's risk score changed day by day, from the risk score ledger.
+    
+    Args:
+        customer_id (str): The ID of the customer.
+        days (int, optional): The number of days to cover. Default is 30.
+    
+    Returns:
+        List[Dict[str, Any]]: The days on which the score changed, with the risk added and the
+            resulting score.
+    """
+    ensure_risk_ledger()
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    query, job_config = build_risk_score_trend_query(customer_id, since)
+    return format_risk_score_trend(get_backend().query(query, job_config))
+
+@instrumented_tool
+@cached_tool(CUSTOMERS)
+@async_variant(get_risk_score_trend)
+async def get_risk_score_trend_async(customer_id: str, days: int = 30) -> List[Dict[str, Any]]:
+    await asyncio.to_thread(ensure_risk_ledger)
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    query, job_config = build_risk_score_trend_query(customer_id, since)
+    return format_risk_score_trend(await get_backend().query_async(query, job_config))
+
+def format_top_risk_increases(results) -> List[Dict[str, Any]]:
+    """
+    Formats the rows of the top risk increases query.
+
+    Args:
+        results: The query rows.
+
+    Returns:
+        List[Dict[str, Any]]: The customers, their current score and the increase over the period,
+            also as a percentage of the score at its start.
+    """
+    customers = []
+    for row in results:
+        risk_score = row.risk_score if row.risk_score is not None else 0
+        previous_risk_score = risk_score - row.risk_increase
+        customers.append({
+            'customer_id': row.customer_id,
+            'customer_name': row.customer_name,
+            'risk_score': risk_score,
+            'risk_increase': float(row.risk_increase),
+            'risk_increase_pct': round(100 * row.risk_increase / previous_risk_score, 1) if previous_risk_score > 0 else None,
+            'events': int(row.events)
+        })
+    return customers
+
+@instrumented_tool
+@cached_tool(CUSTOMERS)
+def get_top_risk_increases(days: int = 7, limit: int = 10) -> List[Dict[str, Any]]:
+    """
+    Retrieves the customers whose risk score rose the most recently, from the risk score ledger.
+    
+    Args:
+        days (int, optional): The period to compare, in days. Default is 7.
+        limit (int, optional): The number of customers to retrieve. Default is 10.
+    
+    Returns:
+        List[Dict[str, Any]]: The customers with their risk score and its increase.
+    """
+    ensure_risk_ledger()
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    query, job_config = build_top_risk_increases_query(since, limit)
+    return format_top_risk_increases(get_backend().query(query, job_config))
+
+@instrumented_tool
+@cached_tool(CUSTOMERS)
+@async_variant(get_top_risk_increases)
+async def get_top_risk_increases_async(days: int = 7, limit: int = 10) -> List[Dict[str, Any]]:
+    await asyncio.to_thread(ensure_risk_ledger)
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    query, job_config = build_top_risk_increases_query(since, limit)
+    return format_top_risk_increases(await get_backend().query_async(query, job_config))
@@ -1,6 +1,11 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from google.adk.cli.fast_api import get_fast_api_app
+from root_agent.tools.telemetry import render_prometheus
+from root_agent.tools.report_sink import close_report_sink, get_report_sink
+from root_agent.tools.tool_logging import get_tool_logger
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -9,10 +14,34 @@ SESSION_DB_URL = "sqlite:///./sessions.db"
 ALLOWED_ORIGINS = ["http://localhost", "http://localhost:8080", "*"]
 SERVE_WEB_INTERFACE = False
 
+logger = get_tool_logger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The sar_reports table is created once at startup, and buffered SAR reports are written
+    # before the server stops
+    try:
+        get_report_sink().start()
+    except Exception as e:
+        logger.warning("Could not prepare the sar_reports table: %s", e)
+    yield
+    close_report_sink()
+
+
 app: FastAPI = get_fast_api_app(
     agent_dir=AGENT_DIR,
     session_db_url=SESSION_DB_URL,
     allow_origins=ALLOWED_ORIGINS,
     web=SERVE_WEB_INTERFACE,
+    lifespan=lifespan,
 )
- 
\ No newline at end of file
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> str:
+    """
+    Per-tool latency, BigQuery bytes, slot time, cache hits and row counts, in the Prometheus
+    text format.
+    """
+    return render_prometheus()
@@ -1,17 +1,28 @@
 from google.adk.agents import Agent, SequentialAgent
-from root_agent.sub_agents.data_collector_agent.agent import data_collector_agent
-from root_agent.sub_agents.risk_analyzer_agent.agent import risk_analyzer_agent
+from root_agent.sub_agents.data_collector_agent.collection_stage import data_collection_stage
+from root_agent.sub_agents.risk_analyzer_agent.scoring_stage import ThresholdGateAgent, risk_scoring_stage
 from root_agent.sub_agents.alert_generator_agent.agent import alert_generator_agent
 from root_agent.sub_agents.report_generator_agent.agent import report_generator_agent
+from root_agent.tools.customer_profiles import close_customer_profile_scope, open_customer_profile_scope
 import os
 import sys
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(project_root)
 from dotenv import load_dotenv
 load_dotenv()
-# Create the root agent as a sequential agent that orchestrates the sub-agents 
+# Create the root agent as a sequential agent that orchestrates the sub-agents.
+# Data collection and risk scoring run without a model call; the alert and SAR report
+# agents only run for customers above the risk threshold.
+escalation_gate = ThresholdGateAgent(
+    name="escalation_gate",
+    description="Generates the alert and SAR report when the risk threshold is exceeded.",
+    sub_agents=[alert_generator_agent, report_generator_agent]
+)
 root_agent = SequentialAgent(
     name="root_agent",
     description="AML Monitoring System - Detects suspicious activities, analyzes risks, generates alerts, and creates SAR reports.Please dont revert back to already executed agents",
-    sub_agents=[data_collector_agent, risk_analyzer_agent, alert_generator_agent, report_generator_agent]
+    sub_agents=[data_collection_stage, risk_scoring_stage, escalation_gate],
+    # The customer's row is read once per run and shared by the scoring stage and the SAR report
+    before_agent_callback=open_customer_profile_scope,
+    after_agent_callback=close_customer_profile_scope
 )
\ No newline at end of file
@@ -0,0 +1,382 @@
+"""
+Headless AML sweep: screens customers by calling the deterministic tools directly instead of
+going through the LLM agents.
+
+For every customer the detectors run in a worker pool. Risk scores are then updated for the
+whole chunk with one MERGE, and a SAR report is generated for customers above the risk
+threshold. The reports of a chunk are generated in bulk (one customer query, formatting in the
+worker pool) and stored with one load job and MERGE before its customers are appended to a
+JSONL checkpoint, so an interrupted sweep continues where it stopped. The scored customers of
+a chunk are checkpointed right after the MERGE, so a resumed sweep only retries the reports
+of customers whose increment is already stored, and never adds it twice. With --reports-output the
+reports are also written to a JSONL or Parquet file. The LLM is only used, with --narratives, to write the SAR
+narrative of flagged customers.
+
+    python -m root_agent.batch_sweep --all --workers 16 --checkpoint sweep.jsonl
+    python -m root_agent.batch_sweep --customers C1,C2 --narratives
+    python -m root_agent.batch_sweep --customers-file flagged.txt --risk-threshold 0 --reports-output sar.parquet
+"""
+import argparse
+import contextlib
+import functools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+from root_agent.tools.query_backend import get_backend
+from root_agent.tools.config import CUSTOMERS_TABLE, DEFAULT_LOOKBACK_DAYS, RISK_ALERT_THRESHOLD
+from root_agent.tools.combined_detector import detect_all_patterns
+from root_agent.tools.risk_score_calculator import calculate_risk_scores_batch
+from root_agent.tools.report_generator import iter_sar_reports_bulk
+from root_agent.tools.report_sink import SarReportFileWriter, get_report_sink
+from dotenv import load_dotenv
+load_dotenv()
+
+
+def list_customers() -> List[str]:
+    """
+    Returns the IDs of all customers.
+
+    Returns:
+        list: Customer IDs, sorted.
+    """
+    query = f"""
+        SELECT DISTINCT customer_id
+        FROM {CUSTOMERS_TABLE}
+        ORDER BY customer_id
+    """
+    return [row.customer_id for row in get_backend().query(query)]
+
+
+def load_checkpoint(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Reads the results of a previous run.
+
+    Args:
+        path (str): The JSONL checkpoint file.
+
+    Returns:
+        dict: The last recorded result by customer ID.
+    """
+    results = {}
+    if not path or not os.path.exists(path):
+        return results
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                results[record["customer_id"]] = record
+    return results
+
+
+def append_checkpoint(path: str, records: List[Dict[str, Any]]) -> None:
+    """
+    Appends finished customers to the checkpoint file.
+
+    Args:
+        path (str): The JSONL checkpoint file.
+        records (list): The customer results.
+    """
+    if not path:
+        return
+    with open(path, "a") as f:
+        for record in records:
+            f.write(json.dumps(record, default=str) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def is_finished(record: Dict[str, Any]) -> bool:
+    """
+    Tells whether a checkpointed customer needs no more work.
+
+    Args:
+        record (dict): The customer's last checkpoint record.
+
+    Returns:
+        bool: False if the customer failed or its report is still pending.
+    """
+    return "error" not in record and "stage" not in record
+
+
+def scored_record(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Returns the scores of a checkpointed customer whose risk increment is already stored.
+
+    Args:
+        record (dict): The customer's last checkpoint record, or None.
+
+    Returns:
+        dict: The record without its error and report, None if the customer was not scored.
+    """
+    if not record or not record.get("scored"):
+        return None
+    return {
+        key: value for key, value in record.items()
+        if key not in ("error", "stage", "report_id", "narrative")
+    }
+
+
+def detect_customer(customer_id: str, lookback_days: int = DEFAULT_LOOKBACK_DAYS) -> Dict[str, Any]:
+    """
+    Runs all detectors for one customer. Used as the worker pool task.
+
+    Args:
+        customer_id (str): The ID of the customer.
+        lookback_days (int, optional): Days of transactions to screen. 0 screens the full history.
+
+    Returns:
+        dict: The customer ID, its suspicious activities (or the error) and the detection time.
+    """
+    start = time.perf_counter()
+    try:
+        patterns = detect_all_patterns(customer_id, lookback_days=lookback_days)
+        activities = [activity for pattern_activities in patterns.values() for activity in pattern_activities]
+        return {"customer_id": customer_id, "activities": activities,
+                "seconds": time.perf_counter() - start}
+    except Exception as e:
+        return {"customer_id": customer_id, "error": f"detection failed: {e}",
+                "seconds": time.perf_counter() - start}
+
+
+def write_narratives(reports: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+    """
+    Asks the LLM to write the SAR narrative for already generated reports.
+
+    Args:
+        reports (dict): SAR report by customer ID.
+
+    Returns:
+        dict: Narrative by customer ID.
+    """
+    from google.adk.agents import Agent
+    from google.adk.runners import Runner
+    from google.adk.sessions import InMemorySessionService
+    from google.genai import types
+    from root_agent.sub_agents.report_generator_agent.agent import REPORT_GENERATOR_PROMPT
+
+    narrative_agent = Agent(
+        name="sar_narrative_agent",
+        model="gemini-2.0-flash",
+        description="Writes the narrative of an already generated Suspicious Activity Report.",
+        instruction=REPORT_GENERATOR_PROMPT.strip() + (
+            "\n\nThe SAR report data is provided in the message. Write the report from it without calling any tools."
+        ),
+    )
+    session_service = InMemorySessionService()
+    runner = Runner(app_name="batch_sweep", agent=narrative_agent, session_service=session_service)
+
+    narratives = {}
+    for customer_id, report in reports.items():
+        session = session_service.create_session(app_name="batch_sweep", user_id="batch_sweep")
+        message = types.Content(role="user", parts=[types.Part(text=json.dumps(report, default=str))])
+        for event in runner.run(user_id="batch_sweep", session_id=session.id, new_message=message):
+            if event.is_final_response() and event.content and event.content.parts:
+                narratives[customer_id] = "".join(part.text or "" for part in event.content.parts)
+    return narratives
+
+
+def _chunks(items: List[str], size: int) -> Iterable[List[str]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def run_sweep(
+    customer_ids: Optional[List[str]] = None,
+    workers: int = 8,
+    use_processes: bool = False,
+    chunk_size: int = 500,
+    risk_threshold: float = RISK_ALERT_THRESHOLD,
+    checkpoint_path: str = "",
+    narratives: bool = False,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS,
+    reports_output: str = ""
+) -> Dict[str, Any]:
+    """
+    Screens customers: detection, risk scoring, threshold check and SAR reports.
+
+    Args:
+        customer_ids (list, optional): The customers to screen. Defaults to all customers.
+        workers (int, optional): Size of the worker pool.
+        use_processes (bool, optional): Use processes instead of threads for detection.
+        chunk_size (int, optional): Customers scored with one MERGE and checkpointed together.
+        risk_threshold (float, optional): Risk score from which a SAR report is generated.
+        checkpoint_path (str, optional): JSONL file of finished customers. Customers already in it are skipped.
+        narratives (bool, optional): Have the LLM write narratives for flagged customers.
+        lookback_days (int, optional): Days of transactions to screen. 0 screens the full history.
+        reports_output (str, optional): A .jsonl or .parquet file the SAR reports of this run are written to.
+
+    Returns:
+        dict: The throughput report.
+    """
+    start = time.perf_counter()
+    if customer_ids is None:
+        customer_ids = list_customers()
+    finished = load_checkpoint(checkpoint_path)
+    # Customers that failed in a previous run are retried. Those whose risk increment was
+    # already stored only get their report again
+    pending = [
+        customer_id for customer_id in customer_ids
+        if customer_id not in finished or not is_finished(finished[customer_id])
+    ]
+
+    stats = {
+        "customers": len(customer_ids),
+        "skipped": len(customer_ids) - len(pending),
+        "processed": 0,
+        "report_retries": sum(
+            1 for customer_id in pending if scored_record(finished.get(customer_id)) is not None
+        ),
+        "failed": 0,
+        "flagged": 0,
+        "reports": 0,
+        "detect_seconds": 0.0,
+        "score_seconds": 0.0,
+        "report_seconds": 0.0,
+    }
+    detect = functools.partial(detect_customer, lookback_days=lookback_days)
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    writer = SarReportFileWriter(reports_output) if reports_output else None
+    with executor_class(max_workers=workers) as executor, writer or contextlib.nullcontext():
+        for chunk in _chunks(pending, chunk_size):
+            detections = list(executor.map(detect, chunk))
+            stats["detect_seconds"] += sum(detection["seconds"] for detection in detections)
+
+            records = {}
+            activities_by_customer = {}
+            unscored = {}
+            for detection in detections:
+                customer_id = detection["customer_id"]
+                # Customers scored by a previous run keep their scores
+                record = scored_record(finished.get(customer_id))
+                if "error" in detection:
+                    records[customer_id] = dict(record or {"customer_id": customer_id}, error=detection["error"])
+                    continue
+                activities_by_customer[customer_id] = detection["activities"]
+                if record:
+                    records[customer_id] = record
+                else:
+                    unscored[customer_id] = detection["activities"]
+
+            score_start = time.perf_counter()
+            for score in calculate_risk_scores_batch(unscored):
+                customer_id = score["customer_id"]
+                records[customer_id] = {
+                    "customer_id": customer_id,
+                    "suspicious_activity_count": len(activities_by_customer[customer_id]),
+                    "previous_risk_score": score["previous_risk_score"],
+                    "risk_increment": score["risk_increment"],
+                    "total_risk_score": score["total_risk_score"],
+                    "threshold_exceeded": score["total_risk_score"] >= risk_threshold,
+                }
+                if score["updated"]:
+                    records[customer_id]["scored"] = True
+                else:
+                    records[customer_id]["error"] = "risk score update failed"
+            # Recorded before the reports, so a resumed sweep does not add the increments again
+            append_checkpoint(checkpoint_path, [
+                dict(records[customer_id], stage="scored")
+                for customer_id in unscored if records[customer_id].get("scored")
+            ])
+            stats["score_seconds"] += time.perf_counter() - score_start
+
+            flagged = [
+                customer_id for customer_id, record in records.items()
+                if record.get("threshold_exceeded") and "error" not in record
+            ]
+            report_start = time.perf_counter()
+            reports = {}
+            try:
+                for report in iter_sar_reports_bulk(
+                        flagged, activities_by_customer, workers, chunk_size=len(flagged) or 1, executor=executor):
+                    if "error" in report:
+                        records[report["customer_id"]]["error"] = f"report failed: {report['error']}"
+                    else:
+                        reports[report["customer_information"]["customer_id"]] = report
+            except Exception as e:
+                for customer_id in flagged:
+                    records[customer_id]["error"] = f"report failed: {e}"
+                reports = {}
+
+            if reports:
+                sink = get_report_sink()
+                sink.add_many(reports.values())
+                try:
+                    sink.flush()
+                    for customer_id, report in reports.items():
+                        records[customer_id]["report_id"] = report["report_id"]
+                except Exception as e:
+                    for customer_id in reports:
+                        records[customer_id]["error"] = f"report storage failed: {e}"
+                    reports = {}
+            if writer:
+                writer.write(reports.values())
+            stats["report_seconds"] += time.perf_counter() - report_start
+
+            if narratives and reports:
+                for customer_id, narrative in write_narratives(reports).items():
+                    records[customer_id]["narrative"] = narrative
+
+            append_checkpoint(checkpoint_path, list(records.values()))
+            stats["processed"] += len(records)
+            stats["failed"] += sum(1 for record in records.values() if "error" in record)
+            stats["flagged"] += len(flagged)
+            stats["reports"] += len(reports)
+            print(f"Swept {stats['processed']}/{len(pending)} customers")
+
+    elapsed = time.perf_counter() - start
+    stats["elapsed_seconds"] = round(elapsed, 3)
+    stats["customers_per_second"] = round(stats["processed"] / elapsed, 3) if elapsed else 0.0
+    for name in ("detect_seconds", "score_seconds", "report_seconds"):
+        stats[name] = round(stats[name], 3)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the AML screening for many customers without the LLM agents.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--all", action="store_true", help="Screen every customer")
+    target.add_argument("--customers", help="Comma separated customer IDs")
+    target.add_argument("--customers-file", help="File with one customer ID per line")
+    parser.add_argument("--workers", type=int, default=8, help="Worker pool size")
+    parser.add_argument("--processes", action="store_true", help="Detect in worker processes instead of threads")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Customers per risk MERGE and checkpoint write")
+    parser.add_argument("--risk-threshold", type=float, default=RISK_ALERT_THRESHOLD, help="Risk score that triggers a SAR report")
+    parser.add_argument("--checkpoint", default="", help="JSONL checkpoint file used to resume the sweep")
+    parser.add_argument("--narratives", action="store_true", help="Have the LLM write narratives for flagged customers")
+    parser.add_argument("--report", default="", help="Optional path of a JSON throughput report")
+    parser.add_argument("--lookback-days", type=int, default=DEFAULT_LOOKBACK_DAYS,
+                        help="Days of transactions to screen, 0 for the full history")
+    parser.add_argument("--reports-output", default="",
+                        help="Optional .jsonl or .parquet file the SAR reports are written to")
+    args = parser.parse_args()
+
+    customer_ids = None
+    if args.customers:
+        customer_ids = [customer_id.strip() for customer_id in args.customers.split(",") if customer_id.strip()]
+    elif args.customers_file:
+        with open(args.customers_file) as f:
+            customer_ids = [line.strip() for line in f if line.strip()]
+
+    stats = run_sweep(
+        customer_ids,
+        workers=args.workers,
+        use_processes=args.processes,
+        chunk_size=args.chunk_size,
+        risk_threshold=args.risk_threshold,
+        checkpoint_path=args.checkpoint,
+        narratives=args.narratives,
+        lookback_days=args.lookback_days,
+        reports_output=args.reports_output,
+    )
+    print(json.dumps(stats, indent=2))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(stats, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -30,7 +30,14 @@ try:
     remote_agent = agent_engines.create(
     agent_engine=create_local_agent(),
     requirements=[
-        "google-cloud-aiplatform[adk,agent_engines]"
+        "google-cloud-aiplatform[adk,agent_engines]",
+        # Used by the tools, pinned like root_agent/requirements.txt
+        "google-cloud-bigquery==3.31.0",
+        "google-cloud-bigquery-storage==2.31.0",
+        "pyarrow==20.0.0",
+        "numpy==2.2.5",
+        "cachetools==5.5.2",
+        "python-dotenv==1.1.0",
     ],
     extra_packages=["root_agent"]  # 👈 tells Vertex to send this folder
     )
@@ -0,0 +1,665 @@
+"""
+Real-time AML monitoring: consumes new transactions as they arrive and runs the three detection
+rules incrementally, instead of waiting for someone to ask the agent about a customer.
+
+Per customer the monitor keeps the rolling state of each rule in memory:
+
+- large amount: the number of transactions above the threshold, and an alert per transaction
+- frequent small: the small transactions of the last small_time_window_hours. A window alert is
+  raised as soon as a window holds small_count_threshold transactions, with the same
+  non-overlapping windows as the frequent small transaction query
+- multiple location: the transactions and the set of locations of the current window, which
+  ends after a gap of more than location_time_window_hours, as in the multiple location query
+
+Alerts carry the same records as the detector tools and are raised while the triggering
+transaction is processed. The rule state and the source position are checkpointed to a JSON
+file, so a restarted monitor continues where it stopped. Transactions processed after the last
+checkpoint are processed again after a restart, so an alert can be repeated; its alert_id stays
+the same. Transactions must arrive in time order per customer. Later ones only count for the
+large amount rule and are left to the batch detectors.
+
+The sources are local stand-ins for Pub/Sub: a JSON lines file, optionally followed as it
+grows, and an in-process queue. With --persist the transactions are also merged into the
+transactions table (and their legs written when AML_USE_TRANSACTION_LEGS is set).
+
+    python -m root_agent.realtime_monitor --source transactions.jsonl --follow \\
+        --checkpoint monitor_state.json --alerts alerts.jsonl
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import signal
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from google.cloud import bigquery
+from root_agent.tools.query_backend import LocalRow, get_backend
+from root_agent.tools.config import (
+    TRANSACTIONS_TABLE,
+    USE_TRANSACTION_LEGS,
+    MONITOR_CHECKPOINT_EVERY,
+    MONITOR_CHECKPOINT_SECONDS,
+    table_ref,
+)
+from root_agent.tools.schema import TRANSACTIONS_SCHEMA, backfill_transaction_legs
+from root_agent.tools.result_cache import TRANSACTIONS, invalidate_tables
+from root_agent.tools.large_amount_detector import format_large_amount_transaction
+from root_agent.tools.frequent_transaction_detector import format_window_transaction
+from root_agent.tools.tool_logging import get_tool_logger, log_event
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = get_tool_logger(__name__)
+
+# Version of the checkpoint file layout
+CHECKPOINT_VERSION = 1
+MICROS_PER_SECOND = 1000000
+MICROS_PER_HOUR = 3600 * MICROS_PER_SECOND
+TRANSACTION_COLUMNS = [field.name for field in TRANSACTIONS_SCHEMA]
+# Processing latencies kept for the percentiles in the stats
+LATENCY_SAMPLES = 10000
+
+
+def _to_micros(value: datetime) -> int:
+    return int((value - datetime(1970, 1, 1, tzinfo=timezone.utc)) / timedelta(microseconds=1))
+
+
+def _from_micros(micros: int) -> datetime:
+    return datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(microseconds=micros)
+
+
+def parse_transaction(record: Any) -> Dict[str, Any]:
+    """
+    Validates a transaction message and brings it into the transactions table format.
+
+    Args:
+        record (dict, str or bytes): The message, with the transactions table columns, or its
+            JSON. time is an ISO 8601 string, read as UTC when it has no offset.
+
+    Returns:
+        dict: The transaction, with time as an aware datetime and amount as a float.
+
+    Raises:
+        ValueError: If transaction_id or time is missing or a value cannot be parsed.
+    """
+    if isinstance(record, (str, bytes)):
+        record = json.loads(record)
+    if not isinstance(record, dict):
+        raise ValueError("a transaction must be a JSON object")
+    if not record.get("transaction_id") or not record.get("time"):
+        raise ValueError("transaction_id and time are required")
+    transaction = {column: record.get(column) for column in TRANSACTION_COLUMNS}
+    event_time = record["time"]
+    if not isinstance(event_time, datetime):
+        event_time = datetime.fromisoformat(str(event_time).replace("Z", "+00:00"))
+    if event_time.tzinfo is None:
+        event_time = event_time.replace(tzinfo=timezone.utc)
+    transaction["time"] = event_time.astimezone(timezone.utc)
+    transaction["amount"] = float(record["amount"]) if record.get("amount") is not None else 0.0
+    return transaction
+
+
+class JsonlFileSource:
+    """
+    Reads transaction messages from a JSON lines file and yields the raw lines. The position
+    is the byte offset of the next line, so a restarted monitor continues after the last
+    checkpointed line. With follow, the file is polled for new lines like tail -f, and None is
+    yielded while it does not grow.
+    """
+
+    def __init__(self, path: str, follow: bool = False, poll_seconds: float = 0.2):
+        self.path = path
+        self.follow = follow
+        self.poll_seconds = poll_seconds
+
+    def read(self, position: int = 0) -> Iterator[Tuple[Any, int]]:
+        with open(self.path, "rb") as f:
+            f.seek(position)
+            while True:
+                line = f.readline()
+                # A line without its newline is still being written
+                if not line or not line.endswith(b"\n"):
+                    f.seek(position)
+                    if not self.follow:
+                        if line.strip():
+                            position += len(line)
+                            yield line, position
+                        return
+                    time.sleep(self.poll_seconds)
+                    yield None, position
+                    continue
+                position += len(line)
+                if line.strip():
+                    yield line, position
+
+
+class QueueSource:
+    """
+    Reads transaction messages (dicts or JSON) from an in-process queue, e.g. filled by an API
+    handler. The position counts the messages read. Putting None ends the stream; None is
+    yielded when no message arrived for poll_seconds.
+    """
+
+    def __init__(self, messages: "queue.Queue", poll_seconds: float = 0.2):
+        self.messages = messages
+        self.poll_seconds = poll_seconds
+
+    def read(self, position: int = 0) -> Iterator[Tuple[Any, int]]:
+        while True:
+            try:
+                message = self.messages.get(timeout=self.poll_seconds)
+            except queue.Empty:
+                yield None, position
+                continue
+            if message is None:
+                return
+            position += 1
+            yield message, position
+
+
+class CustomerState:
+    """
+    The rolling rule state of one customer. Times are epoch microseconds, so the state is
+    stored in checkpoints as is.
+    """
+
+    def __init__(self):
+        self.large_count = 0
+        # Small transactions whose windows are still open, as (time, transaction, direction)
+        self.small_transactions: Deque[Tuple[int, Dict[str, Any], str]] = deque()
+        # End of the latest window that reached the count threshold
+        self.small_covered_until: Optional[int] = None
+        self.location_window_start: Optional[int] = None
+        self.location_last_time: Optional[int] = None
+        self.location_transaction_ids: List[str] = []
+        self.locations: List[str] = []
+        self.location_count = 0
+        self.location_alerted = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "large_count": self.large_count,
+            "small_transactions": [list(entry) for entry in self.small_transactions],
+            "small_covered_until": self.small_covered_until,
+            "location_window_start": self.location_window_start,
+            "location_last_time": self.location_last_time,
+            "location_transaction_ids": self.location_transaction_ids,
+            "locations": self.locations,
+            "location_count": self.location_count,
+            "location_alerted": self.location_alerted,
+        }
+
+    @classmethod
+    def from_dict(cls, values: Dict[str, Any]) -> "CustomerState":
+        state = cls()
+        state.large_count = values["large_count"]
+        state.small_transactions = deque(tuple(entry) for entry in values["small_transactions"])
+        state.small_covered_until = values["small_covered_until"]
+        state.location_window_start = values["location_window_start"]
+        state.location_last_time = values["location_last_time"]
+        state.location_transaction_ids = values["location_transaction_ids"]
+        state.locations = values["locations"]
+        state.location_count = values["location_count"]
+        state.location_alerted = values["location_alerted"]
+        return state
+
+
+class RealtimeMonitor:
+    """
+    Applies the large amount, frequent small and multiple location rules to one transaction at
+    a time. The rule parameters are those of detect_all_patterns.
+    """
+
+    def __init__(
+        self,
+        large_amount_threshold: float = 1000.00,
+        small_amount_threshold: float = 5000.00,
+        small_count_threshold: int = 3,
+        small_time_window_hours: int = 24,
+        location_min_txn_count: int = 3,
+        location_threshold: int = 2,
+        location_time_window_hours: int = 48
+    ):
+        self.settings = {
+            "large_amount_threshold": large_amount_threshold,
+            "small_amount_threshold": small_amount_threshold,
+            "small_count_threshold": small_count_threshold,
+            "small_time_window_hours": small_time_window_hours,
+            "location_min_txn_count": location_min_txn_count,
+            "location_threshold": location_threshold,
+            "location_time_window_hours": location_time_window_hours,
+        }
+        self.small_window = small_time_window_hours * MICROS_PER_HOUR
+        self.customers: Dict[str, CustomerState] = {}
+        # Latest transaction time seen, used to expire closed windows
+        self.watermark: Optional[int] = None
+        self.late_transactions = 0
+
+    def process(self, transaction: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Updates the rule state with a transaction.
+
+        Args:
+            transaction (dict): A transaction, as returned by parse_transaction.
+
+        Returns:
+            list: The alerts the transaction triggered.
+        """
+        micros = _to_micros(transaction["time"])
+        self.watermark = micros if self.watermark is None else max(self.watermark, micros)
+        alerts = []
+        legs = [
+            (transaction["customer_id_sender"], "sender", transaction["sender_location"]),
+            (transaction["customer_id_receiver"], "receiver", transaction["recipient_location"]),
+        ]
+        seen = set()
+        for customer_id, direction, location in legs:
+            # A transfer between accounts of one customer counts once, as in the detectors
+            if not customer_id or customer_id in seen:
+                continue
+            seen.add(customer_id)
+            state = self.customers.get(customer_id)
+            if state is None:
+                state = self.customers[customer_id] = CustomerState()
+            alerts.extend(self._large_amount(customer_id, state, transaction))
+            # Window rules need the transactions of a customer in time order
+            if state.location_last_time is not None and micros < state.location_last_time:
+                self.late_transactions += 1
+                log_event(logger, logging.WARNING, "late_transaction",
+                          customer_id=customer_id, transaction_id=transaction["transaction_id"])
+                continue
+            alerts.extend(self._frequent_small(customer_id, state, transaction, micros, direction))
+            alerts.extend(self._multiple_location(customer_id, state, transaction, micros, location))
+        return alerts
+
+    def _alert(self, risk_type: str, customer_id: str, key: str, transaction: Dict[str, Any],
+               activity: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "alert_id": f"{risk_type}:{customer_id}:{key}",
+            "risk_type": risk_type,
+            "customer_id": customer_id,
+            "transaction_id": transaction["transaction_id"],
+            "event_time": transaction["time"].isoformat(),
+            "activity": activity,
+        }
+
+    def _large_amount(self, customer_id: str, state: CustomerState, transaction: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if transaction["amount"] <= self.settings["large_amount_threshold"]:
+            return []
+        state.large_count += 1
+        activity = format_large_amount_transaction(LocalRow(transaction), customer_id)
+        activity["large_transaction_count"] = state.large_count
+        return [self._alert("large_amount", customer_id, transaction["transaction_id"], transaction, activity)]
+
+    def _frequent_small(self, customer_id: str, state: CustomerState, transaction: Dict[str, Any],
+                        micros: int, direction: str) -> List[Dict[str, Any]]:
+        if transaction["amount"] > self.settings["small_amount_threshold"]:
+            return []
+        window = state.small_transactions
+        # Windows that started more than the window length ago are closed
+        while window and window[0][0] + self.small_window < micros:
+            window.popleft()
+        stored = {**transaction, "time": transaction["time"].isoformat()}
+        window.append((micros, stored, direction))
+
+        # Every open window grows by one transaction, so exactly one window, the one starting
+        # count_threshold - 1 transactions back, reaches the threshold now
+        count_threshold = self.settings["small_count_threshold"]
+        if len(window) < count_threshold:
+            return []
+        start = len(window) - count_threshold
+        start_time = window[start][0]
+        # A window overlapping an earlier qualifying window is not reported, as in the query
+        covered = state.small_covered_until is not None and start_time <= state.small_covered_until
+        # Windows reach the threshold in the order of their start, so this is the latest end
+        state.small_covered_until = start_time + self.small_window
+        if covered:
+            return []
+
+        transactions = [
+            format_window_transaction({**entry, "time": _from_micros(entry_micros), "direction": entry_direction})
+            for entry_micros, entry, entry_direction in list(window)[start:]
+        ]
+        activity = {
+            "customer_id": customer_id,
+            "transaction_count": len(transactions),
+            "total_amount": sum(item["amount"] for item in transactions),
+            "first_transaction_date": _from_micros(start_time).isoformat(),
+            "last_transaction_date": transaction["time"].isoformat(),
+            "time_window_hours": self.settings["small_time_window_hours"],
+            "risk_type": "frequent_small_transactions",
+            "original_id": customer_id,
+            "transactions": transactions,
+        }
+        key = window[start][1]["transaction_id"]
+        return [self._alert("frequent_small_transactions", customer_id, key, transaction, activity)]
+
+    def _multiple_location(self, customer_id: str, state: CustomerState, transaction: Dict[str, Any],
+                           micros: int, location: Optional[str]) -> List[Dict[str, Any]]:
+        # A gap of more than the window length, in whole hours, starts a new window
+        gap_hours = None
+        if state.location_last_time is not None:
+            gap_hours = (micros - state.location_last_time) // MICROS_PER_SECOND // 3600
+        if gap_hours is None or gap_hours > self.settings["location_time_window_hours"]:
+            state.location_window_start = micros
+            state.location_transaction_ids = []
+            state.locations = []
+            state.location_count = 0
+            state.location_alerted = False
+        state.location_last_time = micros
+        state.location_count += 1
+        if state.location_alerted:
+            return []
+        state.location_transaction_ids.append(transaction["transaction_id"])
+        if location is not None and location not in state.locations:
+            state.locations.append(location)
+
+        if (state.location_count < self.settings["location_min_txn_count"]
+                or len(state.locations) < self.settings["location_threshold"]):
+            return []
+        state.location_alerted = True
+        activity = {
+            "original_id": customer_id,
+            "customer_id": customer_id,
+            "transaction_ids": ", ".join(state.location_transaction_ids),
+            "locations": ", ".join(state.locations),
+            "risk_type": "multiple_locations",
+            "start_time": _from_micros(state.location_window_start).isoformat(),
+            "end_time": transaction["time"].isoformat(),
+        }
+        # Transaction IDs are only needed for the alert
+        state.location_transaction_ids = []
+        key = activity["transaction_ids"].split(", ")[0]
+        return [self._alert("multiple_locations", customer_id, key, transaction, activity)]
+
+    def expire(self) -> None:
+        """
+        Drops the window state that no future transaction can extend, so the memory held is
+        bounded by the customers active within the longest window.
+        """
+        if self.watermark is None:
+            return
+        location_gap = (self.settings["location_time_window_hours"] + 1) * MICROS_PER_HOUR
+        for customer_id in list(self.customers):
+            state = self.customers[customer_id]
+            while state.small_transactions and state.small_transactions[0][0] + self.small_window < self.watermark:
+                state.small_transactions.popleft()
+            # Open windows starting inside the covered range must still be suppressed
+            if (state.small_covered_until is not None and state.small_covered_until < self.watermark
+                    and not (state.small_transactions
+                             and state.small_transactions[0][0] <= state.small_covered_until)):
+                state.small_covered_until = None
+            if state.location_last_time is not None and self.watermark - state.location_last_time >= location_gap:
+                state.location_window_start = state.location_last_time = None
+                state.location_transaction_ids, state.locations = [], []
+                state.location_count, state.location_alerted = 0, False
+            if (not state.large_count and not state.small_transactions
+                    and state.small_covered_until is None and state.location_last_time is None):
+                del self.customers[customer_id]
+
+    def state_dict(self) -> Dict[str, Any]:
+        return {
+            "settings": self.settings,
+            "watermark": self.watermark,
+            "late_transactions": self.late_transactions,
+            "customers": {customer_id: state.to_dict() for customer_id, state in self.customers.items()},
+        }
+
+    def load_state(self, values: Dict[str, Any]) -> None:
+        """
+        Restores the state of a checkpoint.
+
+        Raises:
+            ValueError: If the checkpoint was written with other rule parameters.
+        """
+        if values["settings"] != self.settings:
+            raise ValueError(
+                f"the checkpoint was written with the rule settings {values['settings']}; "
+                "use the same settings or start without the checkpoint"
+            )
+        self.watermark = values["watermark"]
+        self.late_transactions = values["late_transactions"]
+        self.customers = {
+            customer_id: CustomerState.from_dict(state) for customer_id, state in values["customers"].items()
+        }
+
+
+def load_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Reads a checkpoint file.
+
+    Returns:
+        dict: The source position and the monitor state, or None if there is no checkpoint.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"unsupported checkpoint version {checkpoint.get('version')}")
+    return checkpoint
+
+
+def write_checkpoint(path: str, position: int, monitor: RealtimeMonitor) -> None:
+    """
+    Writes the source position and the monitor state. The file is replaced atomically, so a
+    crash leaves the previous checkpoint.
+    """
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as f:
+        json.dump({"version": CHECKPOINT_VERSION, "position": position, "state": monitor.state_dict()}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_path, path)
+
+
+def persist_transactions(transactions: List[Dict[str, Any]]) -> int:
+    """
+    Writes transactions to the transactions table. They are loaded into a staging table and
+    merged on transaction_id, so transactions processed again after a restart are not
+    duplicated. The legs of the days written are refreshed when AML_USE_TRANSACTION_LEGS is set.
+
+    Args:
+        transactions (list): Transactions as returned by parse_transaction.
+
+    Returns:
+        int: The number of transactions merged, including those already in the table.
+    """
+    if not transactions:
+        return 0
+    backend = get_backend()
+    staging_table = f"transactions_ingest_{uuid.uuid4().hex}"
+    first_time = min(transaction["time"] for transaction in transactions)
+    last_time = max(transaction["time"] for transaction in transactions)
+    columns = ", ".join(TRANSACTION_COLUMNS)
+    # The time condition limits the target scan to the partitions of the batch
+    query = f"""
+        MERGE {TRANSACTIONS_TABLE} t
+        USING {table_ref(staging_table)} s
+        ON t.transaction_id = s.transaction_id AND t.time >= @first_time
+        WHEN NOT MATCHED THEN
+            INSERT ({columns})
+            VALUES ({", ".join(f"s.{column}" for column in TRANSACTION_COLUMNS)})
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter("first_time", "TIMESTAMP", first_time)]
+    )
+    try:
+        backend.load_rows(staging_table, transactions, TRANSACTIONS_SCHEMA)
+        backend.query(query, job_config)
+    finally:
+        try:
+            backend.query(f"DROP TABLE IF EXISTS {table_ref(staging_table)}")
+        except Exception as e:
+            logger.warning("Error dropping staging table %s: %s", staging_table, e)
+    if USE_TRANSACTION_LEGS:
+        first_day = first_time.replace(hour=0, minute=0, second=0, microsecond=0)
+        last_day = last_time.replace(hour=0, minute=0, second=0, microsecond=0)
+        backfill_transaction_legs(first_day, last_day + timedelta(days=1))
+    invalidate_tables(TRANSACTIONS)
+    return len(transactions)
+
+
+def _percentile(ordered: List[float], share: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return round(ordered[min(int(len(ordered) * share), len(ordered) - 1)], 3)
+
+
+def run_monitor(
+    source,
+    monitor: Optional[RealtimeMonitor] = None,
+    checkpoint_path: str = "",
+    alerts_path: str = "",
+    checkpoint_every: int = MONITOR_CHECKPOINT_EVERY,
+    checkpoint_seconds: float = MONITOR_CHECKPOINT_SECONDS,
+    persist: bool = False,
+    stop: Optional[threading.Event] = None
+) -> Dict[str, Any]:
+    """
+    Processes the transactions of a source until it ends or stop is set.
+
+    Alerts are appended to alerts_path as JSON lines and logged. Every checkpoint_every
+    transactions or checkpoint_seconds, the transactions are persisted (with persist), the
+    alerts flushed and the state checkpointed, in that order, and once more at the end.
+
+    Args:
+        source: A JsonlFileSource, QueueSource or any object with read(position).
+        monitor (RealtimeMonitor, optional): The rules. Defaults to the default parameters.
+        checkpoint_path (str, optional): JSON checkpoint file. An existing one is resumed.
+        alerts_path (str, optional): JSONL file the alerts are appended to.
+        checkpoint_every (int, optional): Transactions between checkpoints.
+        checkpoint_seconds (float, optional): Seconds between checkpoints.
+        persist (bool, optional): Write the transactions to the transactions table.
+        stop (threading.Event, optional): Ends the run after the current transaction.
+
+    Returns:
+        dict: Counts of transactions and alerts, the processing latency and the final position.
+    """
+    monitor = monitor or RealtimeMonitor()
+    position = 0
+    checkpoint = load_checkpoint(checkpoint_path)
+    if checkpoint:
+        monitor.load_state(checkpoint["state"])
+        position = checkpoint["position"]
+    stats = {"resumed_from": position, "processed": 0, "invalid": 0, "persisted": 0, "alerts": {}}
+    latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+    unpersisted: List[Dict[str, Any]] = []
+    alerts_file = open(alerts_path, "a") if alerts_path else None
+    since_checkpoint = 0
+    last_checkpoint = time.monotonic()
+
+    def save() -> None:
+        if persist:
+            stats["persisted"] += persist_transactions(unpersisted)
+            unpersisted.clear()
+        if alerts_file:
+            alerts_file.flush()
+            os.fsync(alerts_file.fileno())
+        monitor.expire()
+        if checkpoint_path:
+            write_checkpoint(checkpoint_path, position, monitor)
+
+    try:
+        for record, next_position in source.read(position):
+            if record is not None:
+                received = time.perf_counter()
+                try:
+                    transaction = parse_transaction(record)
+                except (ValueError, TypeError, KeyError) as e:
+                    stats["invalid"] += 1
+                    log_event(logger, logging.WARNING, "invalid_transaction", error=str(e), position=position)
+                else:
+                    for alert in monitor.process(transaction):
+                        alert["processing_ms"] = round((time.perf_counter() - received) * 1000, 3)
+                        alert["detected_at"] = datetime.now(timezone.utc).isoformat()
+                        stats["alerts"][alert["risk_type"]] = stats["alerts"].get(alert["risk_type"], 0) + 1
+                        if alerts_file:
+                            alerts_file.write(json.dumps(alert) + "\n")
+                        log_event(logger, logging.WARNING, "realtime_alert", alert_id=alert["alert_id"],
+                                  customer_id=alert["customer_id"], risk_type=alert["risk_type"],
+                                  processing_ms=alert["processing_ms"])
+                    latencies.append((time.perf_counter() - received) * 1000)
+                    stats["processed"] += 1
+                    if persist:
+                        unpersisted.append(transaction)
+                since_checkpoint += 1
+            position = next_position
+            if since_checkpoint and (since_checkpoint >= checkpoint_every
+                                     or time.monotonic() - last_checkpoint >= checkpoint_seconds):
+                save()
+                since_checkpoint = 0
+                last_checkpoint = time.monotonic()
+            if stop is not None and stop.is_set():
+                break
+    finally:
+        save()
+        if alerts_file:
+            alerts_file.close()
+
+    ordered = sorted(latencies)
+    stats.update({
+        "position": position,
+        "late": monitor.late_transactions,
+        "customers_in_state": len(monitor.customers),
+        "processing_p50_ms": _percentile(ordered, 0.5),
+        "processing_p99_ms": _percentile(ordered, 0.99),
+    })
+    log_event(logger, logging.INFO, "realtime_monitor_stopped", **{k: v for k, v in stats.items() if k != "alerts"})
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detect suspicious transactions as they arrive.")
+    parser.add_argument("--source", required=True, help="JSON lines file of transactions")
+    parser.add_argument("--follow", action="store_true", help="Keep reading lines appended to the source")
+    parser.add_argument("--checkpoint", default="", help="JSON checkpoint file used to resume the monitor")
+    parser.add_argument("--alerts", default="", help="JSONL file the alerts are appended to")
+    parser.add_argument("--checkpoint-every", type=int, default=MONITOR_CHECKPOINT_EVERY,
+                        help="Transactions between checkpoints")
+    parser.add_argument("--checkpoint-seconds", type=float, default=MONITOR_CHECKPOINT_SECONDS,
+                        help="Seconds between checkpoints")
+    parser.add_argument("--persist", action="store_true", help="Merge the transactions into the transactions table")
+    parser.add_argument("--large-amount-threshold", type=float, default=1000.0)
+    parser.add_argument("--small-amount-threshold", type=float, default=5000.0)
+    parser.add_argument("--small-count-threshold", type=int, default=3)
+    parser.add_argument("--small-time-window-hours", type=int, default=24)
+    parser.add_argument("--location-min-txn-count", type=int, default=3)
+    parser.add_argument("--location-threshold", type=int, default=2)
+    parser.add_argument("--location-time-window-hours", type=int, default=48)
+    args = parser.parse_args()
+
+    monitor = RealtimeMonitor(
+        args.large_amount_threshold,
+        args.small_amount_threshold,
+        args.small_count_threshold,
+        args.small_time_window_hours,
+        args.location_min_txn_count,
+        args.location_threshold,
+        args.location_time_window_hours,
+    )
+    # SIGTERM (e.g. from Cloud Run or Kubernetes) and Ctrl+C end the run with a final checkpoint
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    stats = run_monitor(
+        JsonlFileSource(args.source, follow=args.follow),
+        monitor,
+        checkpoint_path=args.checkpoint,
+        alerts_path=args.alerts,
+        checkpoint_every=args.checkpoint_every,
+        checkpoint_seconds=args.checkpoint_seconds,
+        persist=args.persist,
+        stop=stop,
+    )
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
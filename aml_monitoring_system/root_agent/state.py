@@ -0,0 +1,139 @@
+"""
+Session state schema of the root_agent pipeline.
+
+Every stage writes its own keys, so no stage overwrites the output of another one. The raw
+detector results are stored once, under the pattern keys; later stages read them from the
+state instead of receiving a copy re-serialized by the model, and only the compact summary is
+put in the prompts.
+"""
+from typing import Any, Dict, List, Mapping, Optional, TypedDict
+
+# Data collection stage
+CUSTOMER_ID = "customer_id"
+LARGE_AMOUNT_TRANSACTIONS = "large_amount_transactions"
+FREQUENT_SMALL_TRANSACTIONS = "frequent_small_transactions"
+MULTIPLE_LOCATION_TRANSACTIONS = "multiple_location_transactions"
+# Detector result keys, in the order of the detect_all_patterns output
+PATTERN_KEYS = (
+    LARGE_AMOUNT_TRANSACTIONS,
+    FREQUENT_SMALL_TRANSACTIONS,
+    MULTIPLE_LOCATION_TRANSACTIONS,
+)
+DETECTION_SUMMARY = "detection_summary"
+# Text of the LLM data collector agent, which is not part of root_agent
+COLLECTION_NOTES = "collection_notes"
+
+# Risk analysis stage
+RISK_SCORE = "risk_score"
+RISK_THRESHOLD = "risk_threshold"
+RISK_ANALYSIS = "risk_analysis"
+
+# Alert and report stages
+ALERT = "alert"
+SAR_REPORT = "sar_report"
+SAR_NARRATIVE = "sar_narrative"
+
+
+class PatternSummary(TypedDict):
+    state_key: str
+    count: int
+    total_amount: float
+    first_date: Optional[str]
+    last_date: Optional[str]
+    error: Optional[str]
+
+
+class DetectionSummary(TypedDict):
+    customer_id: str
+    activity_count: int
+    patterns: Dict[str, PatternSummary]
+
+
+class RiskScore(TypedDict):
+    customer_id: Optional[str]
+    previous_risk_score: float
+    risk_increment: float
+    total_risk_score: float
+
+
+class RiskThreshold(TypedDict):
+    threshold_exceeded: bool
+    customer_id: str
+    customer_name: Optional[str]
+    email: Optional[str]
+    phone: Optional[str]
+    risk_score: float
+
+
+def error_key(pattern_key: str) -> str:
+    """
+    Returns the state key holding the error of a detector, None when it succeeded.
+
+    Args:
+        pattern_key (str): The detector result key.
+
+    Returns:
+        str: The error key.
+    """
+    return f"{pattern_key}_error"
+
+
+def suspicious_activities(state: Mapping[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Returns all detector results in the session state as one list of suspicious activities,
+    the input of calculate_risk_score and generate_sar_report.
+
+    Args:
+        state (Mapping): The session state.
+
+    Returns:
+        list: The suspicious activities.
+    """
+    activities = []
+    for pattern_key in PATTERN_KEYS:
+        activities.extend(state.get(pattern_key) or [])
+    return activities
+
+
+def _activity_amount(activity: Dict[str, Any]) -> float:
+    return float(activity.get("amount") or activity.get("total_amount") or 0)
+
+
+def _activity_dates(activity: Dict[str, Any]) -> List[str]:
+    dates = [
+        activity.get("transaction_date"),
+        activity.get("first_transaction_date"),
+        activity.get("last_transaction_date"),
+        activity.get("start_time"),
+        activity.get("end_time"),
+    ]
+    return [date for date in dates if date]
+
+
+def summarize_detections(customer_id: str, state: Mapping[str, Any]) -> DetectionSummary:
+    """
+    Summarizes the detector results in the session state: per pattern, the number of findings,
+    their total amount and date range. The findings themselves stay under their state key.
+
+    Args:
+        customer_id (str): The screened customer.
+        state (Mapping): The session state.
+
+    Returns:
+        DetectionSummary: The compact summary.
+    """
+    patterns = {}
+    activity_count = 0
+    for pattern_key in PATTERN_KEYS:
+        findings = state.get(pattern_key) or []
+        dates = sorted(date for finding in findings for date in _activity_dates(finding))
+        patterns[pattern_key] = {
+            "state_key": pattern_key,
+            "count": len(findings),
+            "total_amount": round(sum(_activity_amount(finding) for finding in findings), 2),
+            "first_date": dates[0] if dates else None,
+            "last_date": dates[-1] if dates else None,
+            "error": state.get(error_key(pattern_key)),
+        }
+        activity_count += len(findings)
+    return {"customer_id": customer_id, "activity_count": activity_count, "patterns": patterns}
@@ -6,7 +6,11 @@ import sys
 # Dynamically set the project root path
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 sys.path.append(project_root)
-ALERT_GENERATOR_PROMPT = """
+from root_agent import state as state_keys
+from root_agent.tools.config import RISK_ALERT_THRESHOLD
+
+# The threshold is the one of the scoring stage and check_risk_threshold, which alert at scores >= it
+ALERT_GENERATOR_PROMPT = f"""
 # Alert Generator Agent
 
 You are an autonomous AML (Anti-Money Laundering) alert generator agent responsible for identifying high-risk customers and generating professional compliance alerts.
@@ -20,8 +24,8 @@ You are an autonomous AML (Anti-Money Laundering) alert generator agent responsi
 ## Operational Guidelines:
 
 ### Risk Assessment Processing:
-- Receive customer risk data from Risk Analyzer Agent
-- CRITICAL: Only generate alerts when risk score > 50.0
+- Use the risk score, threshold check and suspicious activities given under Case Data below
+- CRITICAL: Only generate alerts when risk score >= {RISK_ALERT_THRESHOLD}
 - Compare current risk score against previous score to highlight trends
 
 ### Alert Generation Requirements:
@@ -67,7 +71,7 @@ Contact: [EMAIL] / [PHONE]
 
 **Risk Assessment:**
 Current Risk Score: [RISK_SCORE]
-Threshold: 50.0
+Threshold: {RISK_ALERT_THRESHOLD}
 Previous Risk Score: [PREVIOUS_SCORE]
 Risk Increase: [PERCENTAGE]%
 
@@ -103,11 +107,24 @@ AML Monitoring System
 Before submitting the final alert, verify all data is accurate and correctly formatted.
 """
 
+# Case data read from the session state written by the earlier stages
+CASE_DATA = """
+## Case Data
+
+Risk score: {risk_score?}
+Threshold check: {risk_threshold?}
+Detection summary: {detection_summary?}
+
+Large amount transactions: {large_amount_transactions?}
+Frequent small transactions: {frequent_small_transactions?}
+Multiple location transactions: {multiple_location_transactions?}
+"""
+
 # Create the alert generator agent with the improved prompt
 alert_generator_agent = Agent(
     name="alert_generator_agent",
     model="gemini-2.0-flash",
     description="Generates detailed aalerts for high-risk customers with complete transaction information and professional formatting.",
-    instruction=ALERT_GENERATOR_PROMPT.strip(),
-    output_key="datacollectoroutput"
+    instruction=ALERT_GENERATOR_PROMPT.strip() + "\n" + CASE_DATA,
+    output_key=state_keys.ALERT
 )
\ No newline at end of file
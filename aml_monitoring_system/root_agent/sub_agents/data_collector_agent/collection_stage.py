@@ -0,0 +1,155 @@
+import json
+import re
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List
+
+from google.adk.agents import BaseAgent, ParallelAgent, SequentialAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+from root_agent.tools.large_amount_detector import detect_large_amount_transactions_async
+from root_agent.tools.frequent_transaction_detector import detect_frequent_small_transactions_async
+from root_agent.tools.multiple_location_detector import detect_multiple_location_transactions_async
+from root_agent import state as state_keys
+from root_agent.tools.tool_logging import get_tool_logger
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = get_tool_logger(__name__)
+
+# Customer IDs look like C10045; the user message usually is just the ID
+CUSTOMER_ID_PATTERN = re.compile(r"\b[A-Z]+\d+\b")
+
+# Reported instead of running the detectors when the message names no customer. An empty
+# customer ID would make the detectors scan every customer.
+NO_CUSTOMER_ID_ERROR = "No customer ID found in the message; send the ID of the customer to screen, e.g. C10045."
+
+# Session state keys written by the detector agents, in the order of the merged output
+PATTERN_KEYS = state_keys.PATTERN_KEYS
+
+
+def customer_id_from_context(ctx: InvocationContext) -> str:
+    """
+    Finds the customer to screen: the customer ID in the user message. Free text is never
+    taken for an ID, and the customer of an earlier turn is not screened again, since every
+    screening adds its risk increment.
+
+    Args:
+        ctx (InvocationContext): The invocation context.
+
+    Returns:
+        str: The customer ID, empty if none was given.
+    """
+    text = ""
+    if ctx.user_content and ctx.user_content.parts:
+        text = " ".join(part.text for part in ctx.user_content.parts if part.text)
+    match = CUSTOMER_ID_PATTERN.search(text)
+    return match.group(0) if match else ""
+
+
+class DetectorAgent(BaseAgent):
+    """
+    Runs one detector tool for the customer without a model call and stores its result
+    in the session state.
+    """
+
+    detector: Callable[[str], Awaitable[List[Dict[str, Any]]]]
+    output_key: str
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        # The error key is always written, so that a failure of an earlier turn is not reported again
+        error_key = state_keys.error_key(self.output_key)
+        state_delta = {error_key: None}
+        customer_id = customer_id_from_context(ctx)
+        try:
+            if not customer_id:
+                raise ValueError(NO_CUSTOMER_ID_ERROR)
+            state_delta[self.output_key] = await self.detector(customer_id)
+        except Exception as e:
+            logger.error("Error running %s: %s", self.name, e)
+            state_delta[self.output_key] = []
+            state_delta[error_key] = str(e)
+        yield Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            branch=ctx.branch,
+            actions=EventActions(state_delta=state_delta),
+        )
+
+
+class MergePatternsAgent(BaseAgent):
+    """
+    Summarizes the detector results for the next agents. The results stay in the session
+    state under their pattern keys; only the compact summary is written to the
+    'detection_summary' state and passed on as a JSON message.
+    """
+
+    output_key: str = state_keys.DETECTION_SUMMARY
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        customer_id = customer_id_from_context(ctx)
+        if not customer_id:
+            # Escalated as an error; the scoring stage skips a run without a customer
+            yield Event(
+                author=self.name,
+                invocation_id=ctx.invocation_id,
+                branch=ctx.branch,
+                content=types.Content(role="model", parts=[types.Part(text=NO_CUSTOMER_ID_ERROR)]),
+                error_message=NO_CUSTOMER_ID_ERROR,
+                actions=EventActions(
+                    state_delta={state_keys.CUSTOMER_ID: None, self.output_key: None},
+                    escalate=True,
+                ),
+            )
+            return
+        summary = state_keys.summarize_detections(customer_id, ctx.session.state)
+
+        yield Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            branch=ctx.branch,
+            content=types.Content(role="model", parts=[types.Part(text=json.dumps(summary, default=str))]),
+            actions=EventActions(state_delta={state_keys.CUSTOMER_ID: customer_id, self.output_key: summary}),
+        )
+
+
+def create_collection_stage(name: str = "data_collection_stage") -> SequentialAgent:
+    """
+    Creates the data collection stage: the three detectors run concurrently, then their
+    results are summarized. No model calls are made.
+
+    Args:
+        name (str, optional): The stage name.
+
+    Returns:
+        SequentialAgent: The stage.
+    """
+    detectors = ParallelAgent(
+        name="detector_fan_out",
+        description="Runs the large amount, frequent small and multiple location detectors concurrently.",
+        sub_agents=[
+            DetectorAgent(
+                name="large_amount_detector",
+                detector=detect_large_amount_transactions_async,
+                output_key=state_keys.LARGE_AMOUNT_TRANSACTIONS,
+            ),
+            DetectorAgent(
+                name="frequent_small_detector",
+                detector=detect_frequent_small_transactions_async,
+                output_key=state_keys.FREQUENT_SMALL_TRANSACTIONS,
+            ),
+            DetectorAgent(
+                name="multiple_location_detector",
+                detector=detect_multiple_location_transactions_async,
+                output_key=state_keys.MULTIPLE_LOCATION_TRANSACTIONS,
+            ),
+        ],
+    )
+    return SequentialAgent(
+        name=name,
+        description="Collects the suspicious activity patterns of a customer.",
+        sub_agents=[detectors, MergePatternsAgent(name="merge_patterns")],
+    )
+
+
+data_collection_stage = create_collection_stage()
@@ -4,13 +4,15 @@ import os
 import sys
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 sys.path.append(project_root)
-from root_agent.tools.report_generator import generate_sar_report
+from root_agent import state as state_keys
+from root_agent.tools.config import RISK_ALERT_THRESHOLD
+from root_agent.tools.session_tools import generate_customer_sar_report
 
-# Create FunctionTool
-sar_report_tool = FunctionTool(generate_sar_report)
+# Create FunctionTool. It reads the customer and the detector results from the session state.
+sar_report_tool = FunctionTool(generate_customer_sar_report)
 
 # Define enhanced prompt for the report generator agent
-REPORT_GENERATOR_PROMPT = """
+REPORT_GENERATOR_PROMPT = f"""
 # Report Generator Agent
 
 You are an autonomous AML (Anti-Money Laundering) Report Generator Agent responsible for creating comprehensive, regulatory-compliant Suspicious Activity Reports (SARs).
@@ -58,7 +60,7 @@ Contact: [EMAIL] / [PHONE]
 ---------------------------------------------------------------------
 Current Risk Score: [RISK_SCORE]
 Previous Risk Score: [PREVIOUS_RISK_SCORE]
-Threshold: 50.0
+Threshold: {RISK_ALERT_THRESHOLD}
 Score Increase: [PERCENTAGE]%
 Last Updated: [LAST_UPDATED]
 
@@ -134,12 +136,24 @@ SAR filing.
 After generating the report, verify that all sections are complete and properly formatted before submission.
 """
 
+# Case data read from the session state written by the earlier stages
+CASE_DATA = """
+## Case Data
+
+Generate the report data with the `sar_report_tool`; it reads the customer and the suspicious
+activities from the session state, so no arguments are needed.
+
+Risk score: {risk_score?}
+Threshold check: {risk_threshold?}
+Detection summary: {detection_summary?}
+"""
+
 # Create the report generator agent with the improved prompt
 report_generator_agent = Agent(
     name="report_generator_agent",
     model="gemini-2.0-flash",
     description="Generates comprehensive Suspicious Activity Reports (SARs) for approved cases with thorough analysis and structured formatting.",
     tools=[sar_report_tool],
-    instruction=REPORT_GENERATOR_PROMPT.strip(),
-    output_key="datacollectoroutput"
+    instruction=REPORT_GENERATOR_PROMPT.strip() + "\n" + CASE_DATA,
+    output_key=state_keys.SAR_NARRATIVE
 )
\ No newline at end of file
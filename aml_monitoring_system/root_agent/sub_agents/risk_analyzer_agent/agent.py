@@ -4,11 +4,12 @@ import os
 import sys
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 sys.path.append(project_root)
-from root_agent.tools.risk_score_calculator import calculate_risk_score, check_risk_threshold
+from root_agent import state as state_keys
+from root_agent.tools.session_tools import calculate_customer_risk_score, check_customer_risk_threshold
 
-# Create FunctionTools
-risk_calculator_tool = FunctionTool(calculate_risk_score)
-threshold_checker_tool = FunctionTool(check_risk_threshold)
+# Create FunctionTools. They read the detector results from the session state.
+risk_calculator_tool = FunctionTool(calculate_customer_risk_score)
+threshold_checker_tool = FunctionTool(check_customer_risk_threshold)
 
 PROMPT = """
 # Risk Analyzer Agent
@@ -16,7 +17,8 @@ You are an autonomous AML (Anti-Money Laundering) risk analyzer agent.
 
 Responsibilities:
 1. Calculate risk scores for customers based on suspicious activities:
-   - Receive suspicious activity data from the Data Collector Agent
+   - The suspicious activities found by the data collection stage are kept in the session
+     state; the tools read them, so never pass them in
    - Determine the risk level using the `risk_calculator_tool`
    - Update the customer's risk score in the database
 
@@ -30,6 +32,10 @@ Responsibilities:
    - Indicate if the threshold has been exceeded
 
 Always maintain accurate records and ensure all risk scores are properly calculated and stored.
+Keep the assessment short; the scores are stored in the session state for the next agents.
+
+## Detection Summary
+{detection_summary?}
 """
 
 risk_analyzer_agent = Agent(
@@ -38,5 +44,5 @@ risk_analyzer_agent = Agent(
     description="Calculates and analyzes risk scores based on suspicious activities.",
     tools=[risk_calculator_tool, threshold_checker_tool],
     instruction=PROMPT,
-    output_key="datacollectoroutput"
+    output_key=state_keys.RISK_ANALYSIS
 )
\ No newline at end of file
@@ -0,0 +1,125 @@
+from typing import AsyncGenerator
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+from root_agent import state as state_keys
+from root_agent.tools.config import RISK_ALERT_THRESHOLD
+from root_agent.tools.risk_score_calculator import check_risk_threshold_async
+from root_agent.tools.session_tools import score_customer_risk
+from root_agent.tools.tool_logging import get_tool_logger
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = get_tool_logger(__name__)
+
+
+def _text_event(agent: BaseAgent, ctx: InvocationContext, text: str, state_delta=None) -> Event:
+    return Event(
+        author=agent.name,
+        invocation_id=ctx.invocation_id,
+        branch=ctx.branch,
+        content=types.Content(role="model", parts=[types.Part(text=text)]),
+        actions=EventActions(state_delta=state_delta or {}),
+    )
+
+
+def format_risk_analysis(risk_score: dict, risk_threshold: dict, threshold: float) -> str:
+    """
+    Writes the risk assessment of the scoring stage.
+
+    Args:
+        risk_score (dict): The result of score_customer_risk.
+        risk_threshold (dict): The result of check_risk_threshold.
+        threshold (float): The risk threshold.
+
+    Returns:
+        str: The assessment.
+    """
+    status = "exceeded" if risk_threshold.get("threshold_exceeded") else "not exceeded"
+    return (
+        f"Risk score of customer {risk_score.get('customer_id')}: "
+        f"{risk_score.get('previous_risk_score')} -> {risk_score.get('total_risk_score')} "
+        f"(+{risk_score.get('risk_increment')}). Threshold {threshold} {status}."
+    )
+
+
+class RiskScoringAgent(BaseAgent):
+    """
+    Calculates the risk score from the detector results in the session state and checks it
+    against the threshold, without a model call.
+    """
+
+    threshold: float = RISK_ALERT_THRESHOLD
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        if not ctx.session.state.get(state_keys.CUSTOMER_ID):
+            # The collection stage found no customer, so nothing is scored or written
+            yield _text_event(self, ctx, "No customer to score.", {
+                state_keys.RISK_SCORE: None,
+                state_keys.RISK_THRESHOLD: {"threshold_exceeded": False},
+                state_keys.RISK_ANALYSIS: None,
+            })
+            return
+        try:
+            risk_score = await score_customer_risk(ctx.session.state)
+            risk_threshold = await check_risk_threshold_async(
+                ctx.session.state.get(state_keys.CUSTOMER_ID) or "", self.threshold
+            )
+        except Exception as e:
+            logger.error("Error running %s: %s", self.name, e)
+            risk_score = {"customer_id": ctx.session.state.get(state_keys.CUSTOMER_ID), "error": str(e)}
+            risk_threshold = {"threshold_exceeded": False, "error": str(e)}
+            analysis = f"Risk scoring failed: {e}"
+        else:
+            analysis = format_risk_analysis(risk_score, risk_threshold, self.threshold)
+
+        yield _text_event(self, ctx, analysis, {
+            state_keys.RISK_SCORE: risk_score,
+            state_keys.RISK_THRESHOLD: risk_threshold,
+            state_keys.RISK_ANALYSIS: analysis,
+        })
+
+
+class ThresholdGateAgent(BaseAgent):
+    """
+    Runs its sub-agents only when the risk scoring stage found the threshold exceeded, so no
+    model calls are made for low-risk customers.
+    """
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        risk_threshold = ctx.session.state.get(state_keys.RISK_THRESHOLD) or {}
+        if not risk_threshold.get("threshold_exceeded"):
+            # Cleared, so that the alert of an earlier turn is not taken for this customer's
+            yield _text_event(self, ctx, "Risk threshold not exceeded; no alert or SAR report is generated.", {
+                state_keys.ALERT: None,
+                state_keys.SAR_REPORT: None,
+                state_keys.SAR_NARRATIVE: None,
+            })
+            return
+        for sub_agent in self.sub_agents:
+            async for event in sub_agent.run_async(ctx):
+                yield event
+
+
+def create_scoring_stage(name: str = "risk_scoring_stage", threshold: float = RISK_ALERT_THRESHOLD) -> RiskScoringAgent:
+    """
+    Creates the risk scoring stage, the deterministic replacement of risk_analyzer_agent.
+
+    Args:
+        name (str, optional): The stage name.
+        threshold (float, optional): The risk threshold to trigger an alert.
+
+    Returns:
+        RiskScoringAgent: The stage.
+    """
+    return RiskScoringAgent(
+        name=name,
+        description="Calculates the customer's risk score and checks it against the threshold.",
+        threshold=threshold,
+    )
+
+
+risk_scoring_stage = create_scoring_stage()
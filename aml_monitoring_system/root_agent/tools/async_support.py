@@ -0,0 +1,25 @@
+from typing import Callable
+
+
+def async_variant(sync_tool: Callable) -> Callable:
+    """
+    Marks a coroutine function as the async variant of a tool.
+
+    The variant takes the tool's name and docstring, so that FunctionTool exposes it to the model
+    exactly like the synchronous tool and cached results are shared between the two. The
+    variants run their queries through QueryBackend.query_async, so ADK can await them without
+    blocking the event loop while BigQuery jobs run.
+
+    Args:
+        sync_tool (callable): The synchronous tool.
+
+    Returns:
+        callable: The decorator.
+    """
+    def decorator(function: Callable) -> Callable:
+        function.__name__ = sync_tool.__name__
+        function.__qualname__ = sync_tool.__qualname__
+        function.__doc__ = sync_tool.__doc__
+        return function
+
+    return decorator
@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+from typing import Dict, Optional, Any
+
+import google.auth
+from google.auth.transport.requests import AuthorizedSession
+from google.cloud import bigquery
+from requests.adapters import HTTPAdapter
+from root_agent.tools.tool_logging import get_tool_logger
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = get_tool_logger(__name__)
+
+# Size of the shared HTTP connection pool used by every BigQuery call in the process
+BIGQUERY_HTTP_POOL_SIZE = int(os.getenv("BIGQUERY_HTTP_POOL_SIZE", "32"))
+
+_client: Optional[bigquery.Client] = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+
+# BigQuery Storage Read API client used to download Arrow results, shared like _client
+_storage_client: Optional[Any] = None
+_storage_client_pid: Optional[int] = None
+
+_stats_lock = threading.Lock()
+_stats = {
+    "clients_created": 0,
+    "storage_clients_created": 0,
+    "client_requests": 0,
+    "health_checks": 0,
+    "health_check_failures": 0,
+}
+
+
+def _increment_stat(name: str, amount: int = 1) -> None:
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def _create_client() -> bigquery.Client:
+    """
+    Builds a BigQuery client whose HTTP session uses a pooled, thread-safe transport.
+
+    Returns:
+        bigquery.Client: A new BigQuery client.
+    """
+    credentials, project = google.auth.default(scopes=bigquery.Client.SCOPE)
+
+    # One authorized session shared by all threads; the adapter keeps connections alive
+    session = AuthorizedSession(credentials)
+    adapter = HTTPAdapter(
+        pool_connections=BIGQUERY_HTTP_POOL_SIZE,
+        pool_maxsize=BIGQUERY_HTTP_POOL_SIZE,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    return bigquery.Client(project=project, credentials=credentials, _http=session)
+
+
+def get_bigquery_client() -> bigquery.Client:
+    """
+    Returns the process-wide BigQuery client, creating it on first use.
+
+    The client is created lazily so that importing the tools does not trigger
+    credential discovery, and it is re-created after a fork (e.g. uvicorn workers)
+    so that pooled connections are never shared between processes.
+
+    Returns:
+        bigquery.Client: The shared BigQuery client.
+    """
+    global _client, _client_pid
+
+    _increment_stat("client_requests")
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+
+    with _client_lock:
+        if _client is None or _client_pid != pid:
+            _client = _create_client()
+            _client_pid = pid
+            _increment_stat("clients_created")
+        return _client
+
+
+def get_bigquery_storage_client() -> Any:
+    """
+    Returns the process-wide BigQuery Storage read client, which downloads large results as
+    Arrow record batches, creating it on first use. Like the BigQuery client, it is created
+    lazily and re-created after a fork, since its gRPC channel cannot be shared between
+    processes.
+
+    Returns:
+        bigquery_storage.BigQueryReadClient: The shared read client.
+    """
+    global _storage_client, _storage_client_pid
+
+    pid = os.getpid()
+    if _storage_client is not None and _storage_client_pid == pid:
+        return _storage_client
+
+    with _client_lock:
+        if _storage_client is None or _storage_client_pid != pid:
+            from google.cloud import bigquery_storage
+
+            credentials, _ = google.auth.default(scopes=bigquery.Client.SCOPE)
+            _storage_client = bigquery_storage.BigQueryReadClient(credentials=credentials)
+            _storage_client_pid = pid
+            _increment_stat("storage_clients_created")
+        return _storage_client
+
+
+def reset_bigquery_client() -> None:
+    """
+    Closes and discards the shared BigQuery and BigQuery Storage clients. The next calls to
+    get_bigquery_client() and get_bigquery_storage_client() create fresh ones.
+    """
+    global _client, _client_pid, _storage_client, _storage_client_pid
+
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            try:
+                _client.close()
+            except Exception as e:
+                logger.warning("Error closing BigQuery client: %s", e)
+        if _storage_client is not None and _storage_client_pid == os.getpid():
+            try:
+                _storage_client.transport.close()
+            except Exception as e:
+                logger.warning("Error closing BigQuery Storage client: %s", e)
+        _client = None
+        _client_pid = None
+        _storage_client = None
+        _storage_client_pid = None
+
+
+def get_bigquery_client_stats() -> Dict[str, Any]:
+    """
+    Returns counters describing how the shared BigQuery client is used.
+
+    Returns:
+        dict: Client creation/request counters, health check counters and pool size.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["initialized"] = _client is not None and _client_pid == os.getpid()
+    stats["pool_size"] = BIGQUERY_HTTP_POOL_SIZE
+    return stats
+
+
+def check_bigquery_health() -> Dict[str, Any]:
+    """
+    Runs a trivial query through the shared client to verify connectivity.
+
+    Returns:
+        dict: 'healthy' flag, round trip latency in milliseconds and the error message if any.
+    """
+    _increment_stat("health_checks")
+    start = time.perf_counter()
+    try:
+        client = get_bigquery_client()
+        list(client.query("SELECT 1").result())
+        return {
+            "healthy": True,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+            "error": None,
+        }
+    except Exception as e:
+        _increment_stat("health_check_failures")
+        return {
+            "healthy": False,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+            "error": str(e),
+        }
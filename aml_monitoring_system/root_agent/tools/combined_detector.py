@@ -0,0 +1,102 @@
+import asyncio
+from typing import List, Dict
+from root_agent.tools.vectorized_engine import fetch_transactions_table, fetch_transactions_table_async, scan_patterns
+from root_agent.tools.async_support import async_variant
+from root_agent.tools.config import DEFAULT_LOOKBACK_DAYS
+from root_agent.tools.telemetry import instrumented_tool
+from root_agent.tools.tool_logging import get_tool_logger, log_event
+import logging
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = get_tool_logger(__name__)
+
+
+@instrumented_tool
+def detect_all_patterns(
+    customer_id: str,
+    large_amount_threshold: float = 1000.00,
+    small_amount_threshold: float = 5000.00,
+    small_count_threshold: int = 3,
+    small_time_window_hours: int = 24,
+    location_min_txn_count: int = 3,
+    location_threshold: int = 2,
+    location_time_window_hours: int = 48,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS
+) -> Dict[str, List[Dict]]:
+    """
+    Detects large amount, frequent small and multiple location transactions for a customer
+    with a single scan of the transactions table. The rules run as vectorized column operations
+    over the Arrow result and only flagged transactions are turned into records.
+
+    Args:
+        customer_id (str): The ID of the customer to check. If empty, checks all customers.
+        large_amount_threshold (float, optional): Transactions above this amount are suspicious. Default is 1000.00.
+        small_amount_threshold (float, optional): The maximum amount of a small transaction. Default is 5000.00.
+        small_count_threshold (int, optional): Minimum small transactions in a window. Default is 3.
+        small_time_window_hours (int, optional): Frequent small transaction window in hours. Default is 24.
+        location_min_txn_count (int, optional): Minimum transactions in a multiple location window. Default is 3.
+        location_threshold (int, optional): Minimum different locations in a window. Default is 2.
+        location_time_window_hours (int, optional): Multiple location window in hours. Default is 48.
+        lookback_days (int, optional): Days of transactions to scan, counted back from now. 0 scans
+            the full history. Default is AML_DEFAULT_LOOKBACK_DAYS (90).
+
+    Returns:
+        dict: The suspicious activities per rule, each list holding the same records as the
+            corresponding single-rule detector.
+    """
+    transactions = fetch_transactions_table(customer_id, lookback_days)
+    patterns = scan_patterns(
+        transactions,
+        customer_id,
+        large_amount_threshold,
+        small_amount_threshold,
+        small_count_threshold,
+        small_time_window_hours,
+        location_min_txn_count,
+        location_threshold,
+        location_time_window_hours,
+    )
+    _print_scan(transactions.num_rows, patterns)
+    return patterns
+
+
+@instrumented_tool
+@async_variant(detect_all_patterns)
+async def detect_all_patterns_async(
+    customer_id: str,
+    large_amount_threshold: float = 1000.00,
+    small_amount_threshold: float = 5000.00,
+    small_count_threshold: int = 3,
+    small_time_window_hours: int = 24,
+    location_min_txn_count: int = 3,
+    location_threshold: int = 2,
+    location_time_window_hours: int = 48,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS
+) -> Dict[str, List[Dict]]:
+    transactions = await fetch_transactions_table_async(customer_id, lookback_days)
+    # The scan is CPU-bound NumPy work, which would otherwise stall the event loop on large tables
+    patterns = await asyncio.to_thread(
+        scan_patterns,
+        transactions,
+        customer_id,
+        large_amount_threshold,
+        small_amount_threshold,
+        small_count_threshold,
+        small_time_window_hours,
+        location_min_txn_count,
+        location_threshold,
+        location_time_window_hours,
+    )
+    _print_scan(transactions.num_rows, patterns)
+    return patterns
+
+
+def _print_scan(num_rows: int, patterns: Dict[str, List[Dict]]) -> None:
+    log_event(
+        logger, logging.INFO, "all_patterns",
+        scanned_rows=num_rows,
+        large_amount_count=len(patterns['large_amount_transactions']),
+        frequent_small_count=len(patterns['frequent_small_transactions']),
+        multiple_location_count=len(patterns['multiple_location_transactions']),
+    )
@@ -0,0 +1,103 @@
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+# BigQuery location of the AML dataset
+BIGQUERY_PROJECT = os.getenv("BIGQUERY_PROJECT", "amlproject-458804")
+BIGQUERY_DATASET = os.getenv("BIGQUERY_DATASET", "aml_data")
+
+# Query engine used by the tools: "bigquery" (default) or "duckdb" for offline runs
+QUERY_BACKEND = os.getenv("AML_QUERY_BACKEND", "bigquery").lower()
+
+# Directory holding <table>.parquet / <table>.csv fixtures for the local backend
+LOCAL_DATA_DIR = os.getenv("AML_LOCAL_DATA_DIR", "")
+
+# Whether the dashboard tools read the materialized customer feature tables (see feature_store.py)
+USE_FEATURE_TABLES = os.getenv("AML_USE_FEATURE_TABLES", "false").lower() in ("1", "true", "yes")
+
+# Whether the dashboard tools read the transaction_legs table (see schema.py) instead of deriving
+# one row per customer and side from the transactions table with UNION ALL
+USE_TRANSACTION_LEGS = os.getenv("AML_USE_TRANSACTION_LEGS", "false").lower() in ("1", "true", "yes")
+
+# Whether risk scoring appends to the risk_score_events ledger (see risk_ledger.py) and the tools
+# read scores from the customer_risk_scores view, instead of updating customers.risk_score
+USE_RISK_LEDGER = os.getenv("AML_USE_RISK_LEDGER", "false").lower() in ("1", "true", "yes")
+
+# Days of transactions the detectors read by default (0 reads the full history), and an optional
+# ISO timestamp the lookback is counted back from instead of the current time, to replay old data
+DEFAULT_LOOKBACK_DAYS = int(os.getenv("AML_DEFAULT_LOOKBACK_DAYS", "90"))
+LOOKBACK_ANCHOR = os.getenv("AML_LOOKBACK_ANCHOR", "")
+
+# Dashboard result cache (see result_cache.py): entry lifetime, in-memory size and an optional
+# SQLite file shared by all worker processes on the host
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("AML_RESULT_CACHE_TTL_SECONDS", "300"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("AML_RESULT_CACHE_MAX_ENTRIES", "256"))
+RESULT_CACHE_SQLITE_PATH = os.getenv("AML_RESULT_CACHE_SQLITE_PATH", "")
+
+# Polling of BigQuery jobs by the async tools: first delay and the cap of the exponential backoff
+ASYNC_POLL_INITIAL_SECONDS = float(os.getenv("AML_ASYNC_POLL_INITIAL_SECONDS", "0.1"))
+ASYNC_POLL_MAX_SECONDS = float(os.getenv("AML_ASYNC_POLL_MAX_SECONDS", "2.0"))
+
+# Streaming detectors (see streaming.py): rows per page fetched from the backend, and the number
+# of items the summary tools return to the model
+STREAM_PAGE_SIZE = int(os.getenv("AML_STREAM_PAGE_SIZE", "10000"))
+TOOL_RESULT_TOP_N = int(os.getenv("AML_TOOL_RESULT_TOP_N", "20"))
+
+# Real-time monitor (see root_agent/realtime_monitor.py): transactions and seconds between
+# checkpoints of its rule state
+MONITOR_CHECKPOINT_EVERY = int(os.getenv("AML_MONITOR_CHECKPOINT_EVERY", "1000"))
+MONITOR_CHECKPOINT_SECONDS = float(os.getenv("AML_MONITOR_CHECKPOINT_SECONDS", "5"))
+
+# Risk score increments (see risk_score_calculator.py): retries of a transaction aborted by a
+# concurrent update of the customers table, and the first delay of their exponential backoff
+RISK_UPDATE_RETRIES = int(os.getenv("AML_RISK_UPDATE_RETRIES", "5"))
+RISK_UPDATE_RETRY_SECONDS = float(os.getenv("AML_RISK_UPDATE_RETRY_SECONDS", "0.2"))
+
+# Customer profile cache (see customer_profiles.py): lifetime and number of the customers rows
+# kept per process for the risk and report tools
+CUSTOMER_PROFILE_TTL_SECONDS = float(os.getenv("AML_CUSTOMER_PROFILE_TTL_SECONDS", "60"))
+CUSTOMER_PROFILE_MAX_ENTRIES = int(os.getenv("AML_CUSTOMER_PROFILE_MAX_ENTRIES", "10000"))
+
+# Risk score at or above which a customer is alerted and a SAR report is generated (see
+# check_risk_threshold); the scoring stage, the alert and report prompts and the batch sweep use it
+RISK_ALERT_THRESHOLD = float(os.getenv("AML_RISK_ALERT_THRESHOLD", "50.0"))
+
+# SAR report sink (see report_sink.py): pending reports that trigger a batch write, the longest
+# time a report stays buffered, and the smallest batch written through a staging table and MERGE
+# (smaller batches use one INSERT)
+SAR_SINK_BATCH_SIZE = int(os.getenv("AML_SAR_SINK_BATCH_SIZE", "500"))
+SAR_SINK_FLUSH_SECONDS = float(os.getenv("AML_SAR_SINK_FLUSH_SECONDS", "5"))
+SAR_SINK_MERGE_MIN_ROWS = int(os.getenv("AML_SAR_SINK_MERGE_MIN_ROWS", "50"))
+
+# Tool logging (see tool_logging.py): level ("OFF" disables it), "json" lines for Cloud Logging or
+# "text", and the payload sampling of DEBUG logs: share of calls sampled and items per sample
+TOOL_LOG_LEVEL = os.getenv("AML_TOOL_LOG_LEVEL", "INFO").upper()
+TOOL_LOG_FORMAT = os.getenv("AML_TOOL_LOG_FORMAT", "json").lower()
+TOOL_LOG_SAMPLE_RATE = float(os.getenv("AML_TOOL_LOG_SAMPLE_RATE", "0.1"))
+TOOL_LOG_SAMPLE_ITEMS = int(os.getenv("AML_TOOL_LOG_SAMPLE_ITEMS", "3"))
+
+
+def table_ref(table_name: str) -> str:
+    """
+    Returns the fully qualified, backtick-quoted name of a table in the AML dataset.
+
+    Args:
+        table_name (str): The table name, e.g. 'transactions'.
+
+    Returns:
+        str: The table reference to use inside a query.
+    """
+    return f"`{BIGQUERY_PROJECT}.{BIGQUERY_DATASET}.{table_name}`"
+
+
+TRANSACTIONS_TABLE = table_ref("transactions")
+TRANSACTION_LEGS_TABLE = table_ref("transaction_legs")
+CUSTOMERS_TABLE = table_ref("customers")
+SAR_REPORTS_TABLE = table_ref("sar_reports")
+CUSTOMER_FEATURES_TABLE = table_ref("customer_features")
+CUSTOMER_FEATURE_WINDOWS_TABLE = table_ref("customer_feature_windows")
+CUSTOMER_DAILY_FEATURES_TABLE = table_ref("customer_daily_features")
+FEATURE_REFRESH_STATE_TABLE = table_ref("feature_refresh_state")
+RISK_SCORE_EVENTS_TABLE = table_ref("risk_score_events")
+RISK_SCORE_TOTALS_VIEW = table_ref("risk_score_totals")
+CUSTOMER_RISK_SCORES_VIEW = table_ref("customer_risk_scores")
@@ -0,0 +1,344 @@
+"""
+Customer profile cache shared by the risk and report tools.
+
+get_current_risk_score, check_risk_threshold and get_customer_info all need the same customers
+row. They read it through get_customer_profile, which selects every column they use with one
+query and keeps the row in two tiers:
+
+- a request scope, opened for one root_agent run (see customer_profile_scope), in which a
+  customer is read at most once. A risk score written during the request replaces the cached
+  score, so later steps of the request see it without another query.
+- a process-wide TTL + LRU cache (AML_CUSTOMER_PROFILE_TTL_SECONDS,
+  AML_CUSTOMER_PROFILE_MAX_ENTRIES). Risk score writes in this process invalidate the
+  customer's entry; writes by other processes show after the TTL at the latest.
+
+Customers that are not found are cached as well.
+"""
+import copy
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Dict, Iterator, List, Optional
+
+from cachetools import TTLCache
+from google.cloud import bigquery
+from root_agent.tools.query_backend import LocalRow, get_backend
+from root_agent.tools.risk_ledger import risk_scores_source
+from root_agent.tools.config import (
+    CUSTOMER_PROFILE_TTL_SECONDS,
+    CUSTOMER_PROFILE_MAX_ENTRIES,
+)
+from dotenv import load_dotenv
+load_dotenv()
+
+# The customers columns read by the risk and report tools
+PROFILE_COLUMNS = [
+    "customer_id",
+    "account_no",
+    "location_of_account",
+    "customer_name",
+    "phone",
+    "email",
+    "risk_score",
+]
+
+_MISSING = object()
+
+# Profiles read during the current request, by customer ID. None outside a request scope
+_request_profiles: ContextVar[Optional[Dict[str, Optional[Dict[str, Any]]]]] = ContextVar(
+    "customer_profiles", default=None
+)
+
+
+class CustomerProfileCache:
+    """
+    Process-wide TTL + LRU cache of customer profiles.
+    """
+
+    def __init__(self, ttl: float = CUSTOMER_PROFILE_TTL_SECONDS, max_entries: int = CUSTOMER_PROFILE_MAX_ENTRIES):
+        """
+        Args:
+            ttl (float, optional): Seconds a profile stays valid.
+            max_entries (int, optional): Profiles kept before the least recently used is evicted.
+        """
+        self._entries = TTLCache(maxsize=max_entries, ttl=ttl)
+        self._lock = threading.Lock()
+        self._stats = {
+            "request_hits": 0,
+            "hits": 0,
+            "misses": 0,
+            "invalidations": 0,
+        }
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, customer_id: str) -> Any:
+        """
+        Returns:
+            The cached profile (None for a customer that was not found), or _MISSING.
+        """
+        with self._lock:
+            return self._entries.get(customer_id, _MISSING)
+
+    def set(self, customer_id: str, profile: Optional[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._entries[customer_id] = profile
+
+    def invalidate(self, *customer_ids: str) -> None:
+        """
+        Drops the profiles of the customers.
+
+        Args:
+            *customer_ids (str): The customer IDs.
+        """
+        with self._lock:
+            for customer_id in customer_ids:
+                self._entries.pop(customer_id, None)
+            self._stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        """
+        Drops every profile.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns hit/miss counters of this process.
+
+        Returns:
+            dict: request_hits, hits, misses, invalidations, hit_rate and the current number of entries.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["request_hits"] + stats["hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["request_hits"] + stats["hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+_cache: Optional[CustomerProfileCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_customer_profile_cache() -> CustomerProfileCache:
+    """
+    Returns the process-wide customer profile cache.
+
+    Returns:
+        CustomerProfileCache: The shared cache.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CustomerProfileCache()
+    return _cache
+
+
+@contextmanager
+def customer_profile_scope() -> Iterator[None]:
+    """
+    Opens a request scope: within it, every customer is read at most once.
+    """
+    token = _request_profiles.set({})
+    try:
+        yield
+    finally:
+        _request_profiles.reset(token)
+
+
+class _RunScope(dict):
+    """
+    The request scope of one agent run, with the token restoring the scope it replaced.
+    """
+
+    def __init__(self, invocation_id: str):
+        super().__init__()
+        self.invocation_id = invocation_id
+        self.token: Optional[Token] = None
+
+
+def open_customer_profile_scope(callback_context=None) -> None:
+    """
+    Opens a request scope for the rest of the current run. Used as the before_agent_callback
+    of root_agent, where a context manager cannot span the run.
+
+    Args:
+        callback_context (CallbackContext, optional): Passed by ADK, identifies the run.
+    """
+    scope = _RunScope(getattr(callback_context, "invocation_id", ""))
+    scope.token = _request_profiles.set(scope)
+
+
+def close_customer_profile_scope(callback_context=None) -> None:
+    """
+    Closes the request scope opened by open_customer_profile_scope for the same run and
+    restores the scope it replaced, e.g. that of an enclosing run. Used as the
+    after_agent_callback of root_agent.
+
+    ADK skips the after-callback of a run that raises, so scopes of nested runs left open
+    above this run's scope are closed with it. A top-level run that raises leaves its scope
+    in the context it ran in, until that task ends or the next run replaces it.
+
+    Args:
+        callback_context (CallbackContext, optional): Passed by ADK, identifies the run.
+    """
+    invocation_id = getattr(callback_context, "invocation_id", "")
+    scope = _request_profiles.get()
+    while isinstance(scope, _RunScope) and scope.invocation_id != invocation_id:
+        scope = scope.token.old_value
+    if not isinstance(scope, _RunScope):
+        # Not opened in this context, or already closed
+        return
+    try:
+        _request_profiles.reset(scope.token)
+    except ValueError:
+        # The token was created in a copy of this context
+        previous = scope.token.old_value
+        _request_profiles.set(None if previous is Token.MISSING else previous)
+
+
+def build_customer_profile_query(customer_id: str):
+    """
+    Builds the query reading a customer's profile, with the current score of the risk ledger
+    when it is enabled.
+
+    Args:
+        customer_id (str): The ID of the customer.
+
+    Returns:
+        tuple: The query and its job config.
+    """
+    query = f"""
+        SELECT {", ".join(PROFILE_COLUMNS)}
+        FROM {risk_scores_source()}
+        WHERE customer_id = @customer_id
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("customer_id", "STRING", customer_id),
+        ]
+    )
+    return query, job_config
+
+
+def profile_from_rows(results) -> Optional[Dict[str, Any]]:
+    """
+    Reads the profile from the rows of build_customer_profile_query.
+
+    Args:
+        results: The query rows.
+
+    Returns:
+        dict: The profile columns, None if the customer was not found.
+    """
+    for row in results:
+        return {column: row[column] for column in PROFILE_COLUMNS}
+    return None
+
+
+def profile_rows(profile: Optional[Dict[str, Any]]) -> List[LocalRow]:
+    """
+    Returns a profile as query rows, for the formatters written for customers query results.
+
+    Args:
+        profile (dict): A profile from get_customer_profile, or None.
+
+    Returns:
+        list: One row with attribute access, or no row if the customer was not found.
+    """
+    return [LocalRow(profile)] if profile is not None else []
+
+
+def _lookup(customer_id: str) -> Any:
+    cache = get_customer_profile_cache()
+    request_profiles = _request_profiles.get()
+    if request_profiles is not None and customer_id in request_profiles:
+        cache.count("request_hits")
+        return request_profiles[customer_id]
+    profile = cache.get(customer_id)
+    if profile is not _MISSING:
+        cache.count("hits")
+        if request_profiles is not None:
+            request_profiles[customer_id] = profile
+        return profile
+    cache.count("misses")
+    return _MISSING
+
+
+def _store(customer_id: str, profile: Optional[Dict[str, Any]]) -> None:
+    get_customer_profile_cache().set(customer_id, profile)
+    request_profiles = _request_profiles.get()
+    if request_profiles is not None:
+        request_profiles[customer_id] = profile
+
+
+def get_customer_profile(customer_id: str, backend=None) -> Optional[Dict[str, Any]]:
+    """
+    Returns a customer's profile from the cache, reading it on a miss.
+
+    Args:
+        customer_id (str): The ID of the customer.
+        backend (QueryBackend, optional): The query backend. Defaults to the configured one.
+
+    Returns:
+        dict: The PROFILE_COLUMNS of the customer, None if the customer was not found.
+    """
+    profile = _lookup(customer_id)
+    if profile is _MISSING:
+        query, job_config = build_customer_profile_query(customer_id)
+        profile = profile_from_rows((backend or get_backend()).query(query, job_config))
+        _store(customer_id, profile)
+    return copy.copy(profile)
+
+
+async def get_customer_profile_async(customer_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Same as get_customer_profile, without blocking the event loop.
+
+    Args:
+        customer_id (str): The ID of the customer.
+
+    Returns:
+        dict: The PROFILE_COLUMNS of the customer, None if the customer was not found.
+    """
+    profile = _lookup(customer_id)
+    if profile is _MISSING:
+        query, job_config = build_customer_profile_query(customer_id)
+        profile = profile_from_rows(await get_backend().query_async(query, job_config))
+        _store(customer_id, profile)
+    return copy.copy(profile)
+
+
+def record_risk_score_write(customer_id: str, risk_score: int) -> None:
+    """
+    Updates the caches after a customer's risk score was written: the process-wide entry is
+    dropped, and the profile of the current request takes the written score.
+
+    Args:
+        customer_id (str): The ID of the customer.
+        risk_score (int): The stored risk score.
+    """
+    get_customer_profile_cache().invalidate(customer_id)
+    request_profiles = _request_profiles.get()
+    if request_profiles is not None and request_profiles.get(customer_id) is not None:
+        request_profiles[customer_id] = dict(request_profiles[customer_id], risk_score=risk_score)
+
+
+def invalidate_customer_profiles(*customer_ids: str) -> None:
+    """
+    Drops the cached profiles of customers whose row changed, in the process-wide cache and
+    the current request.
+
+    Args:
+        *customer_ids (str): The customer IDs.
+    """
+    get_customer_profile_cache().invalidate(*customer_ids)
+    request_profiles = _request_profiles.get()
+    if request_profiles is not None:
+        for customer_id in customer_ids:
+            request_profiles.pop(customer_id, None)
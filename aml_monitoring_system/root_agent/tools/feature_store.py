@@ -0,0 +1,462 @@
+"""
+Materialized per-customer features for the dashboard tools.
+
+Four tables are maintained next to the transactions table:
+
+- customer_features: one row per customer with large/small transaction counts, the largest
+  frequent small transaction window, the start of the customer's open location window and the
+  timestamp up to which the row has been processed.
+- customer_feature_windows: one row per customer per window, both the kept frequent small
+  transaction windows and the location windows (transactions separated by gaps of at most
+  LOCATION_TIME_WINDOW_HOURS) with their distinct location counts.
+- customer_daily_features: one row per customer per day with the large/small transaction
+  counts of that day, so counts over a lookback are sums of a few days instead of a scan of
+  the transactions.
+- feature_refresh_state: the watermark of the last completed refresh.
+
+A refresh only processes transactions newer than the watermark. Transactions are assumed to
+arrive in time order. Run it on a schedule with
+
+    python -m root_agent.tools.feature_store
+
+and set AML_USE_FEATURE_TABLES=true to let the dashboard tools read the tables.
+"""
+import argparse
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from google.cloud import bigquery
+from root_agent.tools.query_backend import get_backend
+from root_agent.tools.result_cache import invalidate_tables, TRANSACTIONS
+from root_agent.tools.config import (
+    TRANSACTIONS_TABLE,
+    TRANSACTION_LEGS_TABLE,
+    USE_TRANSACTION_LEGS,
+    CUSTOMER_FEATURES_TABLE,
+    CUSTOMER_FEATURE_WINDOWS_TABLE,
+    CUSTOMER_DAILY_FEATURES_TABLE,
+    FEATURE_REFRESH_STATE_TABLE,
+)
+from root_agent.tools.frequent_transaction_detector import build_frequent_small_windows_query
+from root_agent.tools.schema import transaction_legs_source
+from root_agent.tools.tool_logging import get_tool_logger, log_event
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = get_tool_logger(__name__)
+
+# Detection parameters the tables are materialized for. Dashboard requests with other
+# parameters are answered from the transactions table.
+LARGE_AMOUNT_THRESHOLD = 1000.00
+SMALL_AMOUNT_THRESHOLD = 5000.00
+SMALL_COUNT_THRESHOLD = 3
+SMALL_TIME_WINDOW_HOURS = 24
+LOCATION_TIME_WINDOW_HOURS = 48
+
+FREQUENT_SMALL_WINDOW = 'frequent_small_transactions'
+LOCATION_WINDOW = 'multiple_locations'
+
+FEATURE_TABLE_NAME = 'customer_features'
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def create_feature_tables() -> None:
+    """
+    Creates the feature tables if they do not exist yet.
+    """
+    backend = get_backend()
+    backend.query(f"""
+        CREATE TABLE IF NOT EXISTS {CUSTOMER_FEATURES_TABLE} (
+            customer_id STRING NOT NULL,
+            large_transaction_count INT64,
+            small_transaction_count INT64,
+            transaction_count INT64,
+            max_small_window_count INT64,
+            location_window_start TIMESTAMP,
+            last_transaction_time TIMESTAMP,
+            processed_through TIMESTAMP
+        )
+        CLUSTER BY customer_id
+    """)
+    backend.query(f"""
+        CREATE TABLE IF NOT EXISTS {CUSTOMER_FEATURE_WINDOWS_TABLE} (
+            customer_id STRING NOT NULL,
+            window_type STRING NOT NULL,
+            start_time TIMESTAMP,
+            end_time TIMESTAMP,
+            transaction_count INT64,
+            total_amount FLOAT64,
+            location_count INT64
+        )
+        CLUSTER BY window_type, customer_id
+    """)
+    backend.query(f"""
+        CREATE TABLE IF NOT EXISTS {CUSTOMER_DAILY_FEATURES_TABLE} (
+            customer_id STRING NOT NULL,
+            day DATE NOT NULL,
+            large_transaction_count INT64,
+            small_transaction_count INT64,
+            transaction_count INT64
+        )
+        PARTITION BY day
+        CLUSTER BY customer_id
+    """)
+    backend.query(f"""
+        CREATE TABLE IF NOT EXISTS {FEATURE_REFRESH_STATE_TABLE} (
+            feature_table STRING NOT NULL,
+            watermark TIMESTAMP,
+            refreshed_at TIMESTAMP
+        )
+    """)
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # BigQuery returns aware UTC timestamps, the local backend may return naive ones
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def get_watermark() -> Optional[datetime]:
+    """
+    Returns the time up to which transactions have been processed.
+
+    Returns:
+        datetime: The watermark, or None if the tables have never been refreshed.
+    """
+    query = f"""
+        SELECT watermark
+        FROM {FEATURE_REFRESH_STATE_TABLE}
+        WHERE feature_table = @feature_table
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("feature_table", "STRING", FEATURE_TABLE_NAME),
+        ]
+    )
+    for row in get_backend().query(query, job_config):
+        return _as_utc(row.watermark)
+    return None
+
+
+def _refresh_frequent_small_windows(backend, lower: datetime, upper: datetime) -> None:
+    # Windows starting before lower - window cannot reach a new transaction and stay as they are.
+    # Windows after that are rebuilt from transactions after lower - 2 * window, which covers
+    # every earlier window that can overlap them.
+    window = timedelta(hours=SMALL_TIME_WINDOW_HOURS)
+    small_transactions = f"""
+            SELECT customer_id, transaction_id, time, amount
+            FROM {transaction_legs_source()} AS legs
+            WHERE amount <= @amount_threshold AND time > @replay_from AND time <= @upper
+    """
+    windows_query = build_frequent_small_windows_query(small_transactions, include_transactions=False)
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("window_type", "STRING", FREQUENT_SMALL_WINDOW),
+            bigquery.ScalarQueryParameter("amount_threshold", "FLOAT", SMALL_AMOUNT_THRESHOLD),
+            bigquery.ScalarQueryParameter("count_threshold", "INT64", SMALL_COUNT_THRESHOLD),
+            bigquery.ScalarQueryParameter("window_micros", "INT64", SMALL_TIME_WINDOW_HOURS * 3600 * 1000000),
+            bigquery.ScalarQueryParameter("replay_from", "TIMESTAMP", lower - 2 * window),
+            bigquery.ScalarQueryParameter("keep_after", "TIMESTAMP", lower - window),
+            bigquery.ScalarQueryParameter("upper", "TIMESTAMP", upper),
+        ]
+    )
+    backend.query(f"""
+        DELETE FROM {CUSTOMER_FEATURE_WINDOWS_TABLE}
+        WHERE window_type = @window_type AND start_time > @keep_after
+    """, job_config)
+    backend.query(f"""
+        INSERT INTO {CUSTOMER_FEATURE_WINDOWS_TABLE}
+            (customer_id, window_type, start_time, end_time, transaction_count, total_amount, location_count)
+        SELECT
+            customer_id,
+            @window_type,
+            first_transaction,
+            last_transaction,
+            transaction_count,
+            total_amount,
+            NULL
+        FROM ({windows_query})
+        WHERE first_transaction > @keep_after
+    """, job_config)
+
+
+def _refresh_location_windows(backend, lower: datetime, upper: datetime) -> None:
+    # Only the open (last) location window of a customer can grow, so customers with new
+    # transactions are replayed from the start of that window.
+    changed_customers = f"""
+            SELECT DISTINCT customer_id FROM {transaction_legs_source()} AS legs WHERE time > @lower AND time <= @upper
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("window_type", "STRING", LOCATION_WINDOW),
+            bigquery.ScalarQueryParameter("time_window_hours", "INT64", LOCATION_TIME_WINDOW_HOURS),
+            bigquery.ScalarQueryParameter("epoch", "TIMESTAMP", EPOCH),
+            bigquery.ScalarQueryParameter("lower", "TIMESTAMP", lower),
+            bigquery.ScalarQueryParameter("upper", "TIMESTAMP", upper),
+        ]
+    )
+    backend.query(f"""
+        DELETE FROM {CUSTOMER_FEATURE_WINDOWS_TABLE} w
+        WHERE w.window_type = @window_type
+          AND w.customer_id IN ({changed_customers})
+          AND w.start_time >= IFNULL(
+              (SELECT cf.location_window_start FROM {CUSTOMER_FEATURES_TABLE} cf WHERE cf.customer_id = w.customer_id),
+              @epoch
+          )
+    """, job_config)
+    backend.query(f"""
+        INSERT INTO {CUSTOMER_FEATURE_WINDOWS_TABLE}
+            (customer_id, window_type, start_time, end_time, transaction_count, total_amount, location_count)
+        WITH replay_from AS (
+          SELECT
+            changed.customer_id,
+            IFNULL(cf.location_window_start, @epoch) AS replay_from
+          FROM ({changed_customers}) changed
+          LEFT JOIN {CUSTOMER_FEATURES_TABLE} cf ON cf.customer_id = changed.customer_id
+        ),
+        base_data AS (
+          SELECT customer_id, transaction_id, location, time AS event_time
+          FROM {transaction_legs_source()} AS legs
+          WHERE time <= @upper
+        ),
+        ordered_txns AS (
+          SELECT
+            b.customer_id,
+            b.location,
+            b.event_time,
+            LAG(b.event_time) OVER (PARTITION BY b.customer_id ORDER BY b.event_time, b.transaction_id) AS prev_event_time,
+            b.transaction_id
+          FROM base_data b
+          JOIN replay_from r ON b.customer_id = r.customer_id
+          WHERE b.event_time >= r.replay_from
+        ),
+        window_ids AS (
+          SELECT
+            customer_id,
+            location,
+            event_time,
+            SUM(
+              CASE
+                WHEN prev_event_time IS NULL OR
+                     DIV(TIMESTAMP_DIFF(event_time, prev_event_time, SECOND), 3600) > @time_window_hours
+                THEN 1
+                ELSE 0
+              END
+            ) OVER (
+              PARTITION BY customer_id ORDER BY event_time, transaction_id
+              ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+            ) AS window_id
+          FROM ordered_txns
+        )
+        SELECT
+          customer_id,
+          @window_type,
+          MIN(event_time),
+          MAX(event_time),
+          COUNT(*),
+          NULL,
+          COUNT(DISTINCT location)
+        FROM window_ids
+        GROUP BY customer_id, window_id
+    """, job_config)
+
+
+def _refresh_daily_counts(backend, lower: datetime, upper: datetime) -> None:
+    # The days from the one containing lower are recounted in full, so rerunning a failed
+    # refresh replaces them instead of counting a transaction twice
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("large_amount_threshold", "FLOAT", LARGE_AMOUNT_THRESHOLD),
+            bigquery.ScalarQueryParameter("small_amount_threshold", "FLOAT", SMALL_AMOUNT_THRESHOLD),
+            bigquery.ScalarQueryParameter("lower", "TIMESTAMP", lower),
+            bigquery.ScalarQueryParameter("upper", "TIMESTAMP", upper),
+        ]
+    )
+    backend.query(f"""
+        DELETE FROM {CUSTOMER_DAILY_FEATURES_TABLE}
+        WHERE day >= DATE(@lower)
+    """, job_config)
+    backend.query(f"""
+        INSERT INTO {CUSTOMER_DAILY_FEATURES_TABLE}
+            (customer_id, day, large_transaction_count, small_transaction_count, transaction_count)
+        SELECT
+            customer_id,
+            DATE(time) AS day,
+            COUNTIF(amount > @large_amount_threshold) AS large_transaction_count,
+            COUNTIF(amount <= @small_amount_threshold) AS small_transaction_count,
+            COUNT(*) AS transaction_count
+        FROM {transaction_legs_source()} AS legs
+        WHERE time >= TIMESTAMP(DATE(@lower)) AND time <= @upper
+        GROUP BY customer_id, day
+    """, job_config)
+
+
+def _refresh_customer_rows(backend, lower: datetime, upper: datetime) -> None:
+    # Counts are only increased by transactions after the row's own processed_through,
+    # so rerunning a failed refresh never counts a transaction twice
+    query = f"""
+        MERGE {CUSTOMER_FEATURES_TABLE} cf
+        USING (
+            WITH new_transactions AS (
+                SELECT customer_id, amount, time
+                FROM {transaction_legs_source()} AS legs
+                WHERE time > @lower AND time <= @upper
+            ),
+            deltas AS (
+                SELECT
+                    n.customer_id,
+                    COUNTIF(n.amount > @large_amount_threshold) AS large_transaction_count,
+                    COUNTIF(n.amount <= @small_amount_threshold) AS small_transaction_count,
+                    COUNT(*) AS transaction_count,
+                    MAX(n.time) AS last_transaction_time
+                FROM new_transactions n
+                LEFT JOIN {CUSTOMER_FEATURES_TABLE} processed ON processed.customer_id = n.customer_id
+                WHERE processed.processed_through IS NULL OR n.time > processed.processed_through
+                GROUP BY n.customer_id
+            ),
+            window_features AS (
+                SELECT
+                    customer_id,
+                    MAX(IF(window_type = @frequent_small_window, transaction_count, NULL)) AS max_small_window_count,
+                    MAX(IF(window_type = @location_window, start_time, NULL)) AS location_window_start
+                FROM {CUSTOMER_FEATURE_WINDOWS_TABLE}
+                WHERE customer_id IN (SELECT customer_id FROM deltas)
+                GROUP BY customer_id
+            )
+            SELECT
+                d.customer_id,
+                d.large_transaction_count,
+                d.small_transaction_count,
+                d.transaction_count,
+                d.last_transaction_time,
+                w.max_small_window_count,
+                w.location_window_start
+            FROM deltas d
+            LEFT JOIN window_features w ON w.customer_id = d.customer_id
+        ) s
+        ON cf.customer_id = s.customer_id
+        WHEN MATCHED THEN UPDATE SET
+            large_transaction_count = cf.large_transaction_count + s.large_transaction_count,
+            small_transaction_count = cf.small_transaction_count + s.small_transaction_count,
+            transaction_count = cf.transaction_count + s.transaction_count,
+            max_small_window_count = s.max_small_window_count,
+            location_window_start = s.location_window_start,
+            last_transaction_time = s.last_transaction_time,
+            processed_through = @upper
+        WHEN NOT MATCHED THEN INSERT (
+            customer_id,
+            large_transaction_count,
+            small_transaction_count,
+            transaction_count,
+            max_small_window_count,
+            location_window_start,
+            last_transaction_time,
+            processed_through
+        ) VALUES (
+            s.customer_id,
+            s.large_transaction_count,
+            s.small_transaction_count,
+            s.transaction_count,
+            s.max_small_window_count,
+            s.location_window_start,
+            s.last_transaction_time,
+            @upper
+        )
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("large_amount_threshold", "FLOAT", LARGE_AMOUNT_THRESHOLD),
+            bigquery.ScalarQueryParameter("small_amount_threshold", "FLOAT", SMALL_AMOUNT_THRESHOLD),
+            bigquery.ScalarQueryParameter("frequent_small_window", "STRING", FREQUENT_SMALL_WINDOW),
+            bigquery.ScalarQueryParameter("location_window", "STRING", LOCATION_WINDOW),
+            bigquery.ScalarQueryParameter("lower", "TIMESTAMP", lower),
+            bigquery.ScalarQueryParameter("upper", "TIMESTAMP", upper),
+        ]
+    )
+    backend.query(query, job_config)
+
+
+def _set_watermark(backend, upper: datetime) -> None:
+    query = f"""
+        MERGE {FEATURE_REFRESH_STATE_TABLE} state
+        USING (SELECT @feature_table AS feature_table, @upper AS watermark) refreshed
+        ON state.feature_table = refreshed.feature_table
+        WHEN MATCHED THEN UPDATE SET
+            watermark = refreshed.watermark,
+            refreshed_at = CURRENT_TIMESTAMP()
+        WHEN NOT MATCHED THEN INSERT (feature_table, watermark, refreshed_at)
+            VALUES (refreshed.feature_table, refreshed.watermark, CURRENT_TIMESTAMP())
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("feature_table", "STRING", FEATURE_TABLE_NAME),
+            bigquery.ScalarQueryParameter("upper", "TIMESTAMP", upper),
+        ]
+    )
+    backend.query(query, job_config)
+
+
+def refresh_customer_features() -> Dict:
+    """
+    Brings the feature tables up to date with the transactions newer than the watermark.
+
+    The watermark only moves after every step succeeded, and each step can be rerun for the
+    same transactions, so a failed refresh is completed by running it again.
+
+    Returns:
+        dict: The previous and new watermark and whether anything was processed.
+    """
+    backend = get_backend()
+    create_feature_tables()
+
+    watermark = get_watermark()
+    lower = watermark or EPOCH
+    upper = None
+    # The windows and counts are read from the legs when enabled, which may lag the transactions
+    source_table = TRANSACTION_LEGS_TABLE if USE_TRANSACTION_LEGS else TRANSACTIONS_TABLE
+    for row in backend.query(f"SELECT MAX(time) AS max_time FROM {source_table}"):
+        upper = _as_utc(row.max_time)
+    if upper is None or (watermark is not None and upper <= watermark):
+        return {'previous_watermark': watermark, 'watermark': watermark, 'refreshed': False}
+
+    _refresh_frequent_small_windows(backend, lower, upper)
+    _refresh_location_windows(backend, lower, upper)
+    _refresh_daily_counts(backend, lower, upper)
+    _refresh_customer_rows(backend, lower, upper)
+    _set_watermark(backend, upper)
+    # Dashboard results read from the feature tables are outdated now
+    invalidate_tables(TRANSACTIONS)
+    log_event(logger, logging.INFO, "customer_features_refreshed", lower=lower.isoformat(), upper=upper.isoformat())
+    return {'previous_watermark': watermark, 'watermark': upper, 'refreshed': True}
+
+
+def rebuild_customer_features() -> Dict:
+    """
+    Empties the feature tables and rebuilds them from all transactions, e.g. after the
+    materialized parameters changed.
+
+    Returns:
+        dict: The result of the refresh.
+    """
+    backend = get_backend()
+    create_feature_tables()
+    for table in (CUSTOMER_FEATURES_TABLE, CUSTOMER_FEATURE_WINDOWS_TABLE, CUSTOMER_DAILY_FEATURES_TABLE,
+                  FEATURE_REFRESH_STATE_TABLE):
+        backend.query(f"DELETE FROM {table} WHERE TRUE")
+    return refresh_customer_features()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the materialized customer feature tables.")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Rebuild the tables from all transactions instead of refreshing incrementally")
+    args = parser.parse_args()
+
+    result = rebuild_customer_features() if args.rebuild else refresh_customer_features()
+    print(result)
+
+
+if __name__ == "__main__":
+    main()
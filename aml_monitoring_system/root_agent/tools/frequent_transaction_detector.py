@@ -1,13 +1,276 @@
 ﻿from google.cloud import bigquery
-from typing import List, Dict
+from root_agent.tools.query_backend import get_backend
+from root_agent.tools.config import TRANSACTIONS_TABLE, STREAM_PAGE_SIZE, DEFAULT_LOOKBACK_DAYS
+from root_agent.tools.schema import lookback_parameter
+from root_agent.tools.async_support import async_variant
+from root_agent.tools.telemetry import instrumented_tool
+from root_agent.tools.streaming import format_pages
+from root_agent.tools.tool_logging import get_tool_logger, log_results
+from typing import List, Dict, Iterator
 from dotenv import load_dotenv
 load_dotenv()
 
+logger = get_tool_logger(__name__)
+
+def format_window_transaction(transaction) -> Dict:
+    """
+    Formats one transaction belonging to a frequent small transaction window.
+
+    Args:
+        transaction: A transaction struct (or row) with the transactions table columns and its direction.
+
+    Returns:
+        Dict: The transaction details.
+    """
+    return {
+        'transaction_id': transaction['transaction_id'],
+        'customer_id_send': transaction['customer_id_sender'],
+        'customer_id_dest': transaction['customer_id_receiver'],
+        'account_no_send': transaction['sender_id_account_no'],
+        'account_no_dest': transaction['recipient_id_account_no'],
+        'location_sender': transaction['sender_location'],
+        'location_receiver': transaction['recipient_location'],
+        'transaction_date': transaction['time'].isoformat(),
+        'transaction_type': transaction['payment_type'],
+        'amount': transaction['amount'],
+        'direction': transaction.get('direction')
+    }
+
+# Transaction columns carried through the frequent small transaction windows
+WINDOW_TRANSACTION_COLUMNS = """transaction_id,
+                customer_id_sender,
+                customer_id_receiver,
+                sender_id_account_no,
+                recipient_id_account_no,
+                sender_location,
+                recipient_location,
+                time,
+                payment_type,
+                amount"""
+
+def build_frequent_small_windows_query(small_transactions: str, include_transactions: bool = True) -> str:
+    """
+    Builds the query that finds non-overlapping windows of frequent small transactions.
+
+    A window starts at every small transaction and spans `@window_micros`. Windows with at least
+    `@count_threshold` transactions qualify, and a qualifying window is kept only if none of its
+    transactions belongs to an earlier qualifying window of the same customer. Only window
+    functions are used (no self-join), so the cost is O(n log n) in the number of transactions.
+    Transactions with the same timestamp are ordered by transaction_id.
+
+    Args:
+        small_transactions (str): A SELECT returning customer_id, direction and the
+            WINDOW_TRANSACTION_COLUMNS for every small transaction to consider. Without
+            include_transactions only customer_id, transaction_id, time and amount are needed.
+        include_transactions (bool, optional): Whether to return the transactions of each window.
+
+    Returns:
+        str: A query returning customer_id, transaction_count, total_amount, first_transaction,
+            last_transaction and optionally transactions for every window.
+    """
+    transactions_column = ""
+    if include_transactions:
+        transactions_column = """,
+            ARRAY_AGG(
+                STRUCT(
+                    transaction_id,
+                    customer_id_sender,
+                    customer_id_receiver,
+                    sender_id_account_no,
+                    recipient_id_account_no,
+                    sender_location,
+                    recipient_location,
+                    time,
+                    payment_type,
+                    amount,
+                    direction
+                ) ORDER BY pos
+            ) as transactions"""
+
+    return f"""
+        WITH SmallTransactions AS (
+            {small_transactions}
+        ),
+        -- Position of each transaction in its customer's timeline
+        Positioned AS (
+            SELECT
+                *,
+                UNIX_MICROS(time) as ts,
+                ROW_NUMBER() OVER (PARTITION BY customer_id ORDER BY time, transaction_id) as pos
+            FROM SmallTransactions
+        ),
+        -- Last position inside [time, time + window] for the window starting at each transaction
+        Windows AS (
+            SELECT
+                *,
+                MAX(pos) OVER (
+                    PARTITION BY customer_id ORDER BY ts
+                    RANGE BETWEEN CURRENT ROW AND @window_micros FOLLOWING
+                ) as window_end_pos
+            FROM Positioned
+        ),
+        -- Furthest position reached by any earlier qualifying window
+        Coverage AS (
+            SELECT
+                *,
+                window_end_pos - pos + 1 >= @count_threshold as is_qualifying,
+                MAX(IF(window_end_pos - pos + 1 >= @count_threshold, window_end_pos, 0)) OVER (
+                    PARTITION BY customer_id ORDER BY pos
+                    ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                ) as covered_until
+            FROM Windows
+        ),
+        KeptWindows AS (
+            SELECT
+                *,
+                is_qualifying AND IFNULL(covered_until, 0) < pos as is_kept
+            FROM Coverage
+        ),
+        -- Attach every transaction to the latest kept window starting at or before it
+        Assigned AS (
+            SELECT
+                *,
+                LAST_VALUE(IF(is_kept, pos, NULL) IGNORE NULLS) OVER (
+                    PARTITION BY customer_id ORDER BY pos
+                    ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+                ) as window_start_pos,
+                LAST_VALUE(IF(is_kept, window_end_pos, NULL) IGNORE NULLS) OVER (
+                    PARTITION BY customer_id ORDER BY pos
+                    ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+                ) as kept_window_end_pos
+            FROM KeptWindows
+        )
+        SELECT
+            customer_id,
+            COUNT(*) as transaction_count,
+            SUM(amount) as total_amount,
+            MIN(time) as first_transaction,
+            MAX(time) as last_transaction{transactions_column}
+        FROM Assigned
+        WHERE pos <= kept_window_end_pos
+        GROUP BY customer_id, window_start_pos
+    """
+
+def build_frequent_small_query(
+    customer_id: str,
+    amount_threshold: float,
+    count_threshold: int,
+    time_window_hours: int,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS
+):
+    """
+    Builds the frequent small transaction detection query.
+
+    Args:
+        (as in detect_frequent_small_transactions)
+
+    Returns:
+        tuple: The query and its job config.
+    """
+    if customer_id:
+        small_transactions = f"""
+            SELECT
+                @customer_id as customer_id,
+                {WINDOW_TRANSACTION_COLUMNS},
+                CASE 
+                    WHEN customer_id_sender = @customer_id THEN 'sender'
+                    WHEN customer_id_receiver = @customer_id THEN 'receiver'
+                END as direction
+            FROM 
+                {TRANSACTIONS_TABLE}
+            WHERE 
+                (customer_id_sender = @customer_id OR customer_id_receiver = @customer_id)
+                AND amount <= @amount_threshold
+                AND time >= @since
+        """
+    else:
+        # Every transaction counts once for its sender and once for its receiver
+        small_transactions = f"""
+            SELECT
+                customer_id_sender as customer_id,
+                {WINDOW_TRANSACTION_COLUMNS},
+                'sender' as direction
+            FROM {TRANSACTIONS_TABLE}
+            WHERE amount <= @amount_threshold AND time >= @since
+
+            UNION ALL
+
+            SELECT
+                customer_id_receiver as customer_id,
+                {WINDOW_TRANSACTION_COLUMNS},
+                'receiver' as direction
+            FROM {TRANSACTIONS_TABLE}
+            WHERE amount <= @amount_threshold AND time >= @since
+        """
+
+    query = build_frequent_small_windows_query(small_transactions) + """
+        ORDER BY customer_id, first_transaction
+    """
+    query_parameters = [
+        bigquery.ScalarQueryParameter("amount_threshold", "FLOAT", amount_threshold),
+        bigquery.ScalarQueryParameter("count_threshold", "INT64", count_threshold),
+        bigquery.ScalarQueryParameter("window_micros", "INT64", time_window_hours * 3600 * 1000000),
+        lookback_parameter(lookback_days),
+    ]
+    if customer_id:
+        query_parameters.append(bigquery.ScalarQueryParameter("customer_id", "STRING", customer_id))
+    job_config = bigquery.QueryJobConfig(query_parameters=query_parameters)
+    return query, job_config
+
+def format_frequent_small_pattern(row, original_id: str, time_window_hours: int) -> Dict:
+    """
+    Formats one window of the frequent small transaction detection query.
+
+    Args:
+        row: A query row.
+        original_id (str): The customer ID the detection was run for.
+        time_window_hours (int): The time window in hours.
+
+    Returns:
+        Dict: The suspicious transaction pattern.
+    """
+    pattern = {
+        'customer_id': row.customer_id,
+        'transaction_count': row.transaction_count,
+        'total_amount': row.total_amount,
+        'first_transaction_date': row.first_transaction.isoformat(),
+        'last_transaction_date': row.last_transaction.isoformat(),
+        'time_window_hours': time_window_hours,
+        'risk_type': 'frequent_small_transactions',
+        'original_id': original_id,
+        'transactions': []
+    }
+
+    # Extract the transactions array
+    for transaction in row.transactions:
+        pattern['transactions'].append(format_window_transaction(transaction))
+    return pattern
+
+def format_frequent_small_results(results, original_id: str, time_window_hours: int) -> List[Dict]:
+    """
+    Formats the rows of the frequent small transaction detection query.
+
+    Args:
+        results: The query rows.
+        original_id (str): The customer ID the detection was run for.
+        time_window_hours (int): The time window in hours.
+
+    Returns:
+        list: The suspicious transaction patterns.
+    """
+    suspicious_patterns = []
+    for row in results:
+        suspicious_patterns.append(format_frequent_small_pattern(row, original_id, time_window_hours))
+    log_results(logger, "frequent_small_transactions", suspicious_patterns, customer_id=original_id)
+    return suspicious_patterns
+
+@instrumented_tool
 def detect_frequent_small_transactions(
     customer_id: str = "",
     amount_threshold: float = 5000.00,
     count_threshold: int = 3,
-    time_window_hours: int = 24
+    time_window_hours: int = 24,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS
 ) -> List[Dict]:
     """
     Detects frequent small transactions within a specified time window.
@@ -17,195 +280,63 @@ def detect_frequent_small_transactions(
         amount_threshold (float, optional): The maximum amount to consider as a small transaction.
         count_threshold (int, optional): The minimum number of transactions to be considered suspicious.
         time_window_hours (int, optional): The time window in hours to check for frequency.
+        lookback_days (int, optional): Days of transactions to check, counted back from now. 0 checks the full history.
     
     Returns:
         list: A list of dictionaries containing information about suspicious transaction patterns.
     """
-    # Initialize BigQuery client
-    client = bigquery.Client()
-    original_id = customer_id
-    
-    if customer_id:
-        # Using window functions instead of correlated subqueries
-        query = """
-            WITH AllTransactions AS (
-    SELECT 
-        transaction_id,
-        customer_id_sender,
-        customer_id_receiver,
-        sender_id_account_no,
-        recipient_id_account_no,
-        sender_location,
-        recipient_location,
-        time,
-        payment_type,
-        amount,
-        CASE 
-            WHEN customer_id_sender = @customer_id THEN 'sender'
-            WHEN customer_id_receiver = @customer_id THEN 'receiver'
-        END as direction
-    FROM 
-        `amlproject-458804.aml_data.transactions`
-    WHERE 
-        (customer_id_sender = @customer_id OR customer_id_receiver = @customer_id)
-        AND amount <= @amount_threshold
-),
--- For each transaction, look ahead to find the window end
-TransactionWindows AS (
-    SELECT
-        time as window_start,
-        TIMESTAMP_ADD(time, INTERVAL @time_window_hours HOUR) as window_end,
-        transaction_id
-    FROM AllTransactions
-    -- Include every transaction as a potential window start
-),
--- Join transactions with windows to find which transactions fall into each window
-TransactionsInWindows AS (
-    SELECT
-        tw.transaction_id as window_start_txn_id,
-        tw.window_start,
-        tw.window_end,
-        COUNT(t.transaction_id) as transaction_count,
-        SUM(t.amount) as total_amount,
-        -- Creating a JSON array of transaction details
-        ARRAY_AGG(
-            STRUCT(
-                t.transaction_id,
-                t.customer_id_sender,
-                t.customer_id_receiver,
-                t.sender_id_account_no,
-                t.recipient_id_account_no,
-                t.sender_location,
-                t.recipient_location,
-                t.time,
-                t.payment_type,
-                t.amount,
-                t.direction
-            ) ORDER BY t.time
-        ) as transactions
-    FROM TransactionWindows tw
-    JOIN AllTransactions t
-        ON t.time >= tw.window_start 
-        AND t.time <= tw.window_end
-    GROUP BY tw.transaction_id, tw.window_start, tw.window_end
-    HAVING COUNT(t.transaction_id) >= @count_threshold
-),
--- Find non-overlapping windows by ordering by count and taking the first
--- occurrence for any transaction that appears in multiple windows
-RankedWindows AS (
-    SELECT
-        *,
-        ROW_NUMBER() OVER (
-            PARTITION BY window_start_txn_id 
-            ORDER BY transaction_count DESC, total_amount DESC
-        ) as rn
-    FROM TransactionsInWindows
-),
--- Get all transaction IDs for each window and flatten into rows
-TransactionDetailsFlat AS (
-    SELECT
-        rw.window_start,
-        rw.window_end,
-        rw.transaction_count,
-        rw.total_amount,
-        rw.transactions,
-        t.transaction_id,
-        ROW_NUMBER() OVER (ORDER BY rw.window_start, t.time) as window_order
-    FROM RankedWindows rw,
-        UNNEST(rw.transactions) t
-    WHERE rw.rn = 1
-),
--- Flag each transaction as first occurrence
-FirstOccurrence AS (
-    SELECT
-        window_start,
-        window_end,
-        transaction_count,
-        total_amount,
-        transactions,
-        transaction_id,
-        ROW_NUMBER() OVER (PARTITION BY transaction_id ORDER BY window_order) = 1 AS is_first_occurrence
-    FROM TransactionDetailsFlat
-),
--- Group transactions by window and check if all are first occurrences
-NonOverlappingWindows AS (
-    SELECT
-        @customer_id as customer_id,
-        window_start,
-        window_end,
-        transaction_count,
-        total_amount,
-        transactions,
-        LOGICAL_AND(is_first_occurrence) AS all_unique_transactions
-    FROM FirstOccurrence
-    GROUP BY window_start, window_end, transaction_count, total_amount, transactions
-)
-SELECT
-    customer_id,
-    transaction_count,
-    total_amount,
-    window_start as first_transaction_time,
-    (SELECT MIN(time) FROM UNNEST(transactions)) as first_transaction,
-    (SELECT MAX(time) FROM UNNEST(transactions)) as last_transaction,
-    transactions
-FROM NonOverlappingWindows
-WHERE all_unique_transactions = TRUE
-ORDER BY first_transaction_time
-"""
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("customer_id", "STRING", customer_id),
-                bigquery.ScalarQueryParameter("amount_threshold", "FLOAT", amount_threshold),
-                bigquery.ScalarQueryParameter("count_threshold", "INT64", count_threshold),
-                bigquery.ScalarQueryParameter("time_window_hours", "INT64", time_window_hours),
-            ]
-        )
-    else:
-        # For all customers (implementation omitted for brevity)
-        # You can implement this similar to the approach above but for all customers
-        pass
+    # Get the configured query backend
+    backend = get_backend()
+    query, job_config = build_frequent_small_query(
+        customer_id, amount_threshold, count_threshold, time_window_hours, lookback_days
+    )
     
     # Execute the query
-    query_job = client.query(query, job_config=job_config)
-    results = query_job.result()
-    
-    # Format the results
-    suspicious_patterns = []
-    for row in results:
-        pattern = {
-            'customer_id': row.customer_id,
-            'transaction_count': row.transaction_count,
-            'total_amount': row.total_amount,
-            'first_transaction_date': row.first_transaction.isoformat(),
-            'last_transaction_date': row.last_transaction.isoformat(),
-            'time_window_hours': time_window_hours,
-            'risk_type': 'frequent_small_transactions',
-            'original_id': original_id,
-            'transactions': []
-        }
-        
-        # Extract the transactions array
-        for transaction in row.transactions:
-            pattern['transactions'].append({
-                'transaction_id': transaction['transaction_id'],
-                'customer_id_send': transaction['customer_id_sender'],
-                'customer_id_dest': transaction['customer_id_receiver'],
-                'account_no_send': transaction['sender_id_account_no'],
-                'account_no_dest': transaction['recipient_id_account_no'],
-                'location_sender': transaction['sender_location'],
-                'location_receiver': transaction['recipient_location'],
-                'transaction_date': transaction['time'].isoformat(),
-                'transaction_type': transaction['payment_type'],
-                'amount': transaction['amount'],
-                'direction': transaction.get('direction')
-
-            })
-        
-        suspicious_patterns.append(pattern)
-    print("----------------------frequent------------------------")
-    print(f"Found {len(suspicious_patterns)} suspicious frequent transaction patterns")
-    print(suspicious_patterns)
-    return suspicious_patterns
+    results = backend.query(query, job_config)
+    return format_frequent_small_results(results, customer_id, time_window_hours)
+
+@instrumented_tool
+@async_variant(detect_frequent_small_transactions)
+async def detect_frequent_small_transactions_async(
+    customer_id: str = "",
+    amount_threshold: float = 5000.00,
+    count_threshold: int = 3,
+    time_window_hours: int = 24,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS
+) -> List[Dict]:
+    query, job_config = build_frequent_small_query(
+        customer_id, amount_threshold, count_threshold, time_window_hours, lookback_days
+    )
+    results = await get_backend().query_async(query, job_config)
+    return format_frequent_small_results(results, customer_id, time_window_hours)
+
+def stream_frequent_small_transactions(
+    customer_id: str = "",
+    amount_threshold: float = 5000.00,
+    count_threshold: int = 3,
+    time_window_hours: int = 24,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS,
+    page_size: int = STREAM_PAGE_SIZE
+) -> Iterator[List[Dict]]:
+    """
+    Streaming variant of detect_frequent_small_transactions for batch jobs: yields the
+    suspicious patterns page by page instead of returning (and printing) one list.
+
+    Args:
+        customer_id (str, optional): The ID of the customer to check. If empty, checks all customers.
+        amount_threshold (float, optional): The maximum amount to consider as a small transaction.
+        count_threshold (int, optional): The minimum number of transactions to be considered suspicious.
+        time_window_hours (int, optional): The time window in hours to check for frequency.
+        lookback_days (int, optional): Days of transactions to check. 0 checks the full history.
+        page_size (int, optional): The number of patterns per batch.
+
+    Yields:
+        list: A batch of suspicious transaction patterns.
+    """
+    query, job_config = build_frequent_small_query(
+        customer_id, amount_threshold, count_threshold, time_window_hours, lookback_days
+    )
+    pages = get_backend().query_pages(query, job_config, page_size)
+    return format_pages(pages, lambda row: format_frequent_small_pattern(row, customer_id, time_window_hours))
 
 # Example usage
- 
\ No newline at end of file
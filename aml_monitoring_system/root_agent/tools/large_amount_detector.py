@@ -1,23 +1,56 @@
-﻿from typing import Optional, List, Dict
+﻿from typing import Optional, List, Dict, Iterator
 from google.cloud import bigquery
+from root_agent.tools.query_backend import get_backend
+from root_agent.tools.config import TRANSACTIONS_TABLE, STREAM_PAGE_SIZE, DEFAULT_LOOKBACK_DAYS
+from root_agent.tools.schema import lookback_parameter
+from root_agent.tools.async_support import async_variant
+from root_agent.tools.telemetry import instrumented_tool
+from root_agent.tools.streaming import format_pages
+from root_agent.tools.tool_logging import get_tool_logger, log_results
 from dotenv import load_dotenv
 load_dotenv()
 
-def detect_large_amount_transactions(customer_id: str) -> List[Dict]:
+logger = get_tool_logger(__name__)
+
+def format_large_amount_transaction(row, original_id: str) -> Dict:
     """
-    Detects transactions with amounts larger than the specified threshold.
+    Formats a transaction row as a large amount suspicious activity.
 
     Args:
-        customer_id (str, optional): The ID of the customer to check. If None, checks all customers.
-        threshold (float): The amount threshold to consider as suspicious. Default is 1000.00.
+        row: A transactions table row.
+        original_id (str): The customer ID the detection was run for.
 
     Returns:
-        List[Dict]: A list of dictionaries containing information about suspicious transactions.
+        Dict: The suspicious activity record.
+    """
+    return {
+        'customer_id_send': row.customer_id_sender,
+        'customer_id_dest':row.customer_id_receiver,
+        'account_no_send': row.sender_id_account_no,
+        'account_no_dest': row.recipient_id_account_no,
+        'location_sender': row.sender_location,
+        'location_receiver':row.recipient_location,
+        'transaction_id':row.transaction_id,
+        'transaction_date': row.time.isoformat(),
+        'transaction_type': row.payment_type,
+        'amount': row.amount,
+        'risk_type': 'large_amount',
+        'original_id':original_id
+    }
+
+def build_large_amount_query(customer_id: str, lookback_days: int = DEFAULT_LOOKBACK_DAYS):
+    """
+    Builds the large amount detection query.
+
+    Args:
+        customer_id (str): The ID of the customer to check. If empty, checks all customers.
+        lookback_days (int, optional): Days of transactions to check. 0 checks the full history.
+
+    Returns:
+        tuple: The query and its job config.
     """
-    client = bigquery.Client()
-    original_id=customer_id
     if customer_id:
-        query = """
+        query = f"""
             SELECT 
                 customer_id_sender,
                 transaction_id,
@@ -30,50 +63,99 @@ def detect_large_amount_transactions(customer_id: str) -> List[Dict]:
                 payment_type,
                 amount
             FROM 
-                `amlproject-458804.aml_data.transactions`
+                {TRANSACTIONS_TABLE}
             WHERE 
                 (customer_id_sender = @customer_id OR customer_id_receiver = @customer_id)
                 AND amount > 1000
+                AND time >= @since
         """
         job_config = bigquery.QueryJobConfig(
             query_parameters=[
-                bigquery.ScalarQueryParameter("customer_id", "STRING", customer_id)
+                bigquery.ScalarQueryParameter("customer_id", "STRING", customer_id),
+                lookback_parameter(lookback_days),
             ]
         )
     else:
-        query = """
+        query = f"""
             SELECT 
                 customer_id_sender, 
+                transaction_id,
                 customer_id_receiver,
                 sender_id_account_no,
+                recipient_id_account_no,
                 sender_location,
+                recipient_location,
                 time,
                 payment_type,
                 amount
             FROM 
-                `amlproject-458804.aml_data.transactions`
+                {TRANSACTIONS_TABLE}
             WHERE 
                 amount > 1000
+                AND time >= @since
         """
-    query_job = client.query(query, job_config=job_config)
-    results = query_job.result()
+        job_config = bigquery.QueryJobConfig(query_parameters=[lookback_parameter(lookback_days)])
+    return query, job_config
 
+def format_large_amount_results(results, original_id: str) -> List[Dict]:
+    """
+    Formats the rows of the large amount detection query.
+
+    Args:
+        results: The query rows.
+        original_id (str): The customer ID the detection was run for.
+
+    Returns:
+        List[Dict]: The suspicious transactions.
+    """
     suspicious_transactions = []
     for row in results:
-        suspicious_transactions.append({
-            'customer_id_send': row.customer_id_sender,
-            'customer_id_dest':row.customer_id_receiver,
-            'account_no_send': row.sender_id_account_no,
-            'account_no_dest': row.recipient_id_account_no,
-            'location_sender': row.sender_location,
-            'location_receiver':row.recipient_location,
-            'transaction_id':row.transaction_id,
-            'transaction_date': row.time.isoformat(),
-            'transaction_type': row.payment_type,
-            'amount': row.amount,
-            'risk_type': 'large_amount',
-            'original_id':original_id
-        })
-    print("-----------------------largeamounttransactionsdetails---------------------------")
-    print(suspicious_transactions)
+        suspicious_transactions.append(format_large_amount_transaction(row, original_id))
+    log_results(logger, "large_amount_transactions", suspicious_transactions, customer_id=original_id)
     return suspicious_transactions
+
+@instrumented_tool
+def detect_large_amount_transactions(customer_id: str, lookback_days: int = DEFAULT_LOOKBACK_DAYS) -> List[Dict]:
+    """
+    Detects transactions with amounts larger than the specified threshold.
+
+    Args:
+        customer_id (str, optional): The ID of the customer to check. If None, checks all customers.
+        threshold (float): The amount threshold to consider as suspicious. Default is 1000.00.
+        lookback_days (int, optional): Days of transactions to check, counted back from now. 0 checks the full history.
+
+    Returns:
+        List[Dict]: A list of dictionaries containing information about suspicious transactions.
+    """
+    backend = get_backend()
+    query, job_config = build_large_amount_query(customer_id, lookback_days)
+    results = backend.query(query, job_config)
+    return format_large_amount_results(results, customer_id)
+
+@instrumented_tool
+@async_variant(detect_large_amount_transactions)
+async def detect_large_amount_transactions_async(customer_id: str, lookback_days: int = DEFAULT_LOOKBACK_DAYS) -> List[Dict]:
+    query, job_config = build_large_amount_query(customer_id, lookback_days)
+    results = await get_backend().query_async(query, job_config)
+    return format_large_amount_results(results, customer_id)
+
+def stream_large_amount_transactions(
+    customer_id: str = "",
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS,
+    page_size: int = STREAM_PAGE_SIZE
+) -> Iterator[List[Dict]]:
+    """
+    Streaming variant of detect_large_amount_transactions for batch jobs: yields the suspicious
+    transactions page by page instead of returning (and printing) one list.
+
+    Args:
+        customer_id (str, optional): The ID of the customer to check. If empty, checks all customers.
+        lookback_days (int, optional): Days of transactions to check. 0 checks the full history.
+        page_size (int, optional): The number of transactions per batch.
+
+    Yields:
+        List[Dict]: A batch of suspicious transactions.
+    """
+    query, job_config = build_large_amount_query(customer_id, lookback_days)
+    pages = get_backend().query_pages(query, job_config, page_size)
+    return format_pages(pages, lambda row: format_large_amount_transaction(row, customer_id))
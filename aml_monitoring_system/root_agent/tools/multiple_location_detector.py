@@ -1,29 +1,38 @@
 ﻿from google.cloud import bigquery
-from typing import List, Dict
+from root_agent.tools.query_backend import get_backend
+from root_agent.tools.config import TRANSACTIONS_TABLE, STREAM_PAGE_SIZE, DEFAULT_LOOKBACK_DAYS
+from root_agent.tools.schema import lookback_parameter
+from root_agent.tools.async_support import async_variant
+from root_agent.tools.telemetry import instrumented_tool
+from root_agent.tools.streaming import format_pages
+from root_agent.tools.tool_logging import get_tool_logger, log_results
+from typing import List, Dict, Iterator
 
-def detect_multiple_location_transactions(
-    customer_id: str = "",
-    min_txn_count: int = 3,
-    location_threshold: int = 2,  # Minimum different locations to be considered
-    time_window_hours: int = 48
-) -> List[Dict]:
+logger = get_tool_logger(__name__)
+
+def build_multiple_location_query(
+    customer_id: str,
+    min_txn_count: int,
+    location_threshold: int,
+    time_window_hours: int,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS
+):
     """
-    Detects windows of transactions for a specific customer (or all customers) where there are at least
-    `min_txn_count` transactions in non-overlapping time windows of `time_window_hours`.
-    Returns only the columns: customer_id, transaction_ids, locations, start_time, end_time.
+    Builds the multiple location detection query. Arguments as in detect_multiple_location_transactions.
+
+    Returns:
+        tuple: The query and its job config.
     """
-    client = bigquery.Client()
-    temp=customer_id
     if customer_id:
-        query = """
+        query = f"""
         WITH base_data AS (
           SELECT
             transaction_id,
             customer_id_sender AS customer_id,
             sender_location AS location,
             TIMESTAMP(time) AS event_time
-          FROM `amlproject-458804.aml_data.transactions`
-          WHERE customer_id_sender = @customer_id
+          FROM {TRANSACTIONS_TABLE}
+          WHERE customer_id_sender = @customer_id AND time >= @since
 
           UNION ALL
 
@@ -32,8 +41,8 @@ def detect_multiple_location_transactions(
             customer_id_receiver AS customer_id,
             recipient_location AS location,
             TIMESTAMP(time) AS event_time
-          FROM `amlproject-458804.aml_data.transactions`
-          WHERE customer_id_receiver = @customer_id
+          FROM {TRANSACTIONS_TABLE}
+          WHERE customer_id_receiver = @customer_id AND time >= @since
         ),
         ordered_txns AS (
           SELECT
@@ -52,7 +61,7 @@ def detect_multiple_location_transactions(
             event_time,
             CASE 
               WHEN prev_event_time IS NULL OR 
-                   TIMESTAMP_DIFF(event_time, prev_event_time, HOUR) > @time_window_hours
+                   DIV(TIMESTAMP_DIFF(event_time, prev_event_time, SECOND), 3600) > @time_window_hours
               THEN 1 
               ELSE 0 
             END AS is_new_window
@@ -96,17 +105,19 @@ def detect_multiple_location_transactions(
                 bigquery.ScalarQueryParameter("min_txn_count", "INT64", min_txn_count),
                 bigquery.ScalarQueryParameter("location_threshold", "INT64", location_threshold),
                 bigquery.ScalarQueryParameter("time_window_hours", "INT64", time_window_hours),
+                lookback_parameter(lookback_days),
             ]
         )
     else:
-        query = """
+        query = f"""
         WITH base_data AS (
           SELECT
             transaction_id,
             customer_id_sender AS customer_id,
             sender_location AS location,
             TIMESTAMP(time) AS event_time
-          FROM `amlproject-458804.aml_data.transactions`
+          FROM {TRANSACTIONS_TABLE}
+          WHERE time >= @since
 
           UNION ALL
 
@@ -115,7 +126,8 @@ def detect_multiple_location_transactions(
             customer_id_receiver AS customer_id,
             recipient_location AS location,
             TIMESTAMP(time) AS event_time
-          FROM `amlproject-458804.aml_data.transactions`
+          FROM {TRANSACTIONS_TABLE}
+          WHERE time >= @since
         ),
         ordered_txns AS (
           SELECT
@@ -134,7 +146,7 @@ def detect_multiple_location_transactions(
             event_time,
             CASE 
               WHEN prev_event_time IS NULL OR 
-                   TIMESTAMP_DIFF(event_time, prev_event_time, HOUR) > @time_window_hours
+                   DIV(TIMESTAMP_DIFF(event_time, prev_event_time, SECOND), 3600) > @time_window_hours
               THEN 1 
               ELSE 0 
             END AS is_new_window
@@ -177,23 +189,110 @@ def detect_multiple_location_transactions(
                 bigquery.ScalarQueryParameter("min_txn_count", "INT64", min_txn_count),
                 bigquery.ScalarQueryParameter("location_threshold", "INT64", location_threshold),
                 bigquery.ScalarQueryParameter("time_window_hours", "INT64", time_window_hours),
+                lookback_parameter(lookback_days),
             ]
         )
+    return query, job_config
 
-    query_job = client.query(query, job_config=job_config)
-    results = query_job.result()
+def format_multiple_location_window(row, original_id: str) -> Dict:
+    """
+    Formats one window of the multiple location detection query.
 
+    Args:
+        row: A query row.
+        original_id (str): The customer ID the detection was run for.
+
+    Returns:
+        Dict: The suspicious window.
+    """
+    return {
+        "original_id":original_id,
+        "customer_id": row.customer_id,
+        "transaction_ids": row.transaction_ids,
+        "locations": row.locations,
+        'risk_type': 'multiple_locations',
+        "start_time": row.start_time.isoformat() if row.start_time else None,
+        "end_time": row.end_time.isoformat() if row.end_time else None,
+    }
+
+def format_multiple_location_results(results, original_id: str) -> List[Dict]:
+    """
+    Formats the rows of the multiple location detection query.
+
+    Args:
+        results: The query rows.
+        original_id (str): The customer ID the detection was run for.
+
+    Returns:
+        List[Dict]: The suspicious windows.
+    """
     suspicious_patterns = []
     for row in results:
-        suspicious_patterns.append({
-            "original_id":temp,
-            "customer_id": row.customer_id,
-            "transaction_ids": row.transaction_ids,
-            "locations": row.locations,
-            'risk_type': 'multiple_locations',
-            "start_time": row.start_time.isoformat() if row.start_time else None,
-            "end_time": row.end_time.isoformat() if row.end_time else None,
-        })
-    print("-----------------------multiplelocationdetails---------------------------")
-    print(suspicious_patterns)
+        suspicious_patterns.append(format_multiple_location_window(row, original_id))
+    log_results(logger, "multiple_location_transactions", suspicious_patterns, customer_id=original_id)
     return suspicious_patterns
+
+@instrumented_tool
+def detect_multiple_location_transactions(
+    customer_id: str = "",
+    min_txn_count: int = 3,
+    location_threshold: int = 2,  # Minimum different locations to be considered
+    time_window_hours: int = 48,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS
+) -> List[Dict]:
+    """
+    Detects windows of transactions for a specific customer (or all customers) where there are at least
+    `min_txn_count` transactions in non-overlapping time windows of `time_window_hours`, among the
+    transactions of the last `lookback_days` days (0 checks the full history).
+    Returns only the columns: customer_id, transaction_ids, locations, start_time, end_time.
+    """
+    backend = get_backend()
+    query, job_config = build_multiple_location_query(
+        customer_id, min_txn_count, location_threshold, time_window_hours, lookback_days
+    )
+    results = backend.query(query, job_config)
+    return format_multiple_location_results(results, customer_id)
+
+@instrumented_tool
+@async_variant(detect_multiple_location_transactions)
+async def detect_multiple_location_transactions_async(
+    customer_id: str = "",
+    min_txn_count: int = 3,
+    location_threshold: int = 2,
+    time_window_hours: int = 48,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS
+) -> List[Dict]:
+    query, job_config = build_multiple_location_query(
+        customer_id, min_txn_count, location_threshold, time_window_hours, lookback_days
+    )
+    results = await get_backend().query_async(query, job_config)
+    return format_multiple_location_results(results, customer_id)
+
+def stream_multiple_location_transactions(
+    customer_id: str = "",
+    min_txn_count: int = 3,
+    location_threshold: int = 2,
+    time_window_hours: int = 48,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS,
+    page_size: int = STREAM_PAGE_SIZE
+) -> Iterator[List[Dict]]:
+    """
+    Streaming variant of detect_multiple_location_transactions for batch jobs: yields the
+    suspicious windows page by page instead of returning (and printing) one list.
+
+    Args:
+        customer_id (str, optional): The ID of the customer to check. If empty, checks all customers.
+        min_txn_count (int, optional): The minimum number of transactions in a window.
+        location_threshold (int, optional): The minimum number of different locations in a window.
+        time_window_hours (int, optional): The gap in hours that starts a new window.
+        lookback_days (int, optional): Days of transactions to check. 0 checks the full history.
+        page_size (int, optional): The number of windows per batch.
+
+    Yields:
+        List[Dict]: A batch of suspicious windows.
+    """
+    query, job_config = build_multiple_location_query(
+        customer_id, min_txn_count, location_threshold, time_window_hours, lookback_days
+    )
+    pages = get_backend().query_pages(query, job_config, page_size)
+    return format_pages(pages, lambda row: format_multiple_location_window(row, customer_id))
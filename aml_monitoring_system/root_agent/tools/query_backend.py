@@ -0,0 +1,571 @@
+import asyncio
+import glob
+import os
+import re
+import threading
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from google.cloud import bigquery
+from root_agent.tools.bigquery_client import get_bigquery_client, get_bigquery_storage_client
+from root_agent.tools.telemetry import record_query_job
+from root_agent.tools.config import (
+    BIGQUERY_PROJECT,
+    BIGQUERY_DATASET,
+    QUERY_BACKEND,
+    LOCAL_DATA_DIR,
+    ASYNC_POLL_INITIAL_SECONDS,
+    ASYNC_POLL_MAX_SECONDS,
+    STREAM_PAGE_SIZE,
+)
+
+# Rows per streaming insert request, the size BigQuery recommends
+STREAMING_INSERT_BATCH_ROWS = 500
+
+
+class QueryBackend:
+    """
+    Executes the detector SQL (written in BigQuery dialect) against a query engine.
+    """
+    name = "base"
+
+    def query(self, query: str, job_config: Optional[bigquery.QueryJobConfig] = None) -> Iterable[Any]:
+        """
+        Runs a query and returns its rows.
+
+        Args:
+            query (str): The query in BigQuery Standard SQL.
+            job_config (bigquery.QueryJobConfig, optional): Holds the query parameters.
+
+        Returns:
+            Iterable: Rows supporting both attribute (row.amount) and key (row['amount']) access.
+        """
+        raise NotImplementedError
+
+    def query_arrow(self, query: str, job_config: Optional[bigquery.QueryJobConfig] = None) -> Any:
+        """
+        Runs a query and returns its result as columns instead of rows.
+
+        Args:
+            query (str): The query in BigQuery Standard SQL.
+            job_config (bigquery.QueryJobConfig, optional): Holds the query parameters.
+
+        Returns:
+            pyarrow.Table: The query result.
+        """
+        raise NotImplementedError
+
+    def query_pages(
+        self,
+        query: str,
+        job_config: Optional[bigquery.QueryJobConfig] = None,
+        page_size: int = STREAM_PAGE_SIZE,
+    ) -> Iterator[List[Any]]:
+        """
+        Runs a query and yields its rows page by page, so that only one page is held in memory.
+
+        Args:
+            query (str): The query in BigQuery Standard SQL.
+            job_config (bigquery.QueryJobConfig, optional): Holds the query parameters.
+            page_size (int, optional): The number of rows per page.
+
+        Yields:
+            list: Up to page_size rows, as returned by query.
+        """
+        page = []
+        for row in self.query(query, job_config):
+            page.append(row)
+            if len(page) >= page_size:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    async def query_async(self, query: str, job_config: Optional[bigquery.QueryJobConfig] = None) -> List[Any]:
+        """
+        Runs a query without blocking the event loop and returns its rows.
+
+        Args:
+            query (str): The query in BigQuery Standard SQL.
+            job_config (bigquery.QueryJobConfig, optional): Holds the query parameters.
+
+        Returns:
+            list: The rows, as returned by query.
+        """
+        return await asyncio.to_thread(lambda: list(self.query(query, job_config)))
+
+    async def query_arrow_async(self, query: str, job_config: Optional[bigquery.QueryJobConfig] = None) -> Any:
+        """
+        Runs a query without blocking the event loop and returns its result as columns.
+
+        Args:
+            query (str): The query in BigQuery Standard SQL.
+            job_config (bigquery.QueryJobConfig, optional): Holds the query parameters.
+
+        Returns:
+            pyarrow.Table: The query result.
+        """
+        return await asyncio.to_thread(self.query_arrow, query, job_config)
+
+    def dry_run(self, query: str, job_config: Optional[bigquery.QueryJobConfig] = None) -> Optional[int]:
+        """
+        Returns the number of bytes a query would process, without running it.
+
+        Args:
+            query (str): The query in BigQuery Standard SQL.
+            job_config (bigquery.QueryJobConfig, optional): Holds the query parameters.
+
+        Returns:
+            int: The bytes processed, or None if the backend has no estimate.
+        """
+        return None
+
+    def get_table_layout(self, table_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Describes the storage layout of a table.
+
+        Args:
+            table_name (str): The table name in the AML dataset.
+
+        Returns:
+            dict: partition_field, clustering_fields, num_rows and num_bytes (None where the
+                backend does not know them), or None if the table does not exist.
+        """
+        raise NotImplementedError
+
+    def load_rows(self, table_name: str, rows: List[Dict[str, Any]], schema: List[bigquery.SchemaField]) -> None:
+        """
+        Replaces the contents of a table with the given rows using a load job, which does not
+        count against the DML quotas.
+
+        Args:
+            table_name (str): The table name in the AML dataset. The table is created if needed.
+            rows (list): The rows as dicts.
+            schema (list): The table schema.
+        """
+        raise NotImplementedError
+
+    def append_rows(self, table_name: str, rows: List[Dict[str, Any]], schema: List[bigquery.SchemaField]) -> None:
+        """
+        Appends rows to an existing table without a DML statement.
+
+        Args:
+            table_name (str): The table name in the AML dataset.
+            rows (list): The rows as dicts.
+            schema (list): The table schema.
+        """
+        raise NotImplementedError
+
+
+class BigQueryBackend(QueryBackend):
+    """
+    Runs queries on BigQuery through the shared client.
+    """
+    name = "bigquery"
+
+    def query(self, query: str, job_config: Optional[bigquery.QueryJobConfig] = None) -> Iterable[Any]:
+        client = get_bigquery_client()
+        query_job = client.query(query, job_config=job_config)
+        results = query_job.result()
+        record_query_job(query_job, results.total_rows)
+        return results
+
+    def query_arrow(self, query: str, job_config: Optional[bigquery.QueryJobConfig] = None) -> Any:
+        client = get_bigquery_client()
+        query_job = client.query(query, job_config=job_config)
+        # Large results are downloaded as Arrow record batches through the Storage Read API,
+        # with the process-wide read client
+        table = query_job.to_arrow(bqstorage_client=get_bigquery_storage_client())
+        record_query_job(query_job, table.num_rows)
+        return table
+
+    def query_pages(
+        self,
+        query: str,
+        job_config: Optional[bigquery.QueryJobConfig] = None,
+        page_size: int = STREAM_PAGE_SIZE,
+    ) -> Iterator[List[Any]]:
+        client = get_bigquery_client()
+        query_job = client.query(query, job_config=job_config)
+        # Each page is a separate tabledata request, so earlier pages can be released
+        results = query_job.result(page_size=page_size)
+        record_query_job(query_job, results.total_rows)
+        for page in results.pages:
+            yield list(page)
+
+    async def _run_job(self, query: str, job_config: Optional[bigquery.QueryJobConfig]) -> bigquery.QueryJob:
+        # Submits the job and polls its state with a backoff. Only the short API calls run in a
+        # thread, so no thread is held while BigQuery executes the query.
+        client = get_bigquery_client()
+        query_job = await asyncio.to_thread(client.query, query, job_config=job_config)
+        delay = ASYNC_POLL_INITIAL_SECONDS
+        while query_job.state != "DONE":
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, ASYNC_POLL_MAX_SECONDS)
+            await asyncio.to_thread(query_job.reload)
+        return query_job
+
+    async def query_async(self, query: str, job_config: Optional[bigquery.QueryJobConfig] = None) -> List[Any]:
+        query_job = await self._run_job(query, job_config)
+        # result() raises the job error, if any, and downloads the finished rows
+        rows = await asyncio.to_thread(lambda: list(query_job.result()))
+        record_query_job(query_job, len(rows))
+        return rows
+
+    async def query_arrow_async(self, query: str, job_config: Optional[bigquery.QueryJobConfig] = None) -> Any:
+        query_job = await self._run_job(query, job_config)
+        # The read client is created on first use, which may look up credentials
+        table = await asyncio.to_thread(
+            lambda: query_job.to_arrow(bqstorage_client=get_bigquery_storage_client())
+        )
+        record_query_job(query_job, table.num_rows)
+        return table
+
+    def dry_run(self, query: str, job_config: Optional[bigquery.QueryJobConfig] = None) -> Optional[int]:
+        client = get_bigquery_client()
+        dry_run_config = bigquery.QueryJobConfig(
+            dry_run=True,
+            use_query_cache=False,
+            query_parameters=job_config.query_parameters if job_config else [],
+        )
+        return client.query(query, job_config=dry_run_config).total_bytes_processed
+
+    def get_table_layout(self, table_name: str) -> Optional[Dict[str, Any]]:
+        from google.api_core.exceptions import NotFound
+
+        client = get_bigquery_client()
+        try:
+            table = client.get_table(f"{BIGQUERY_PROJECT}.{BIGQUERY_DATASET}.{table_name}")
+        except NotFound:
+            return None
+        partitioning = table.time_partitioning
+        return {
+            "partition_field": partitioning.field if partitioning else None,
+            "clustering_fields": list(table.clustering_fields or []),
+            "num_rows": table.num_rows,
+            "num_bytes": table.num_bytes,
+        }
+
+    def load_rows(self, table_name: str, rows: List[Dict[str, Any]], schema: List[bigquery.SchemaField]) -> None:
+        client = get_bigquery_client()
+        job_config = bigquery.LoadJobConfig(
+            schema=schema,
+            write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+        )
+        json_rows = [
+            {
+                name: value.isoformat() if isinstance(value, (date, datetime)) else value
+                for name, value in row.items()
+            }
+            for row in rows
+        ]
+        load_job = client.load_table_from_json(
+            json_rows, f"{BIGQUERY_PROJECT}.{BIGQUERY_DATASET}.{table_name}", job_config=job_config
+        )
+        load_job.result()
+
+    def append_rows(self, table_name: str, rows: List[Dict[str, Any]], schema: List[bigquery.SchemaField]) -> None:
+        # Streaming inserts are visible to queries at once and are not limited like load jobs
+        # (1,500 per table per day), so they also suit appends of a few rows
+        client = get_bigquery_client()
+        json_rows = [
+            {
+                name: value.isoformat() if isinstance(value, (date, datetime)) else value
+                for name, value in row.items()
+            }
+            for row in rows
+        ]
+        table = f"{BIGQUERY_PROJECT}.{BIGQUERY_DATASET}.{table_name}"
+        for start in range(0, len(json_rows), STREAMING_INSERT_BATCH_ROWS):
+            errors = client.insert_rows_json(table, json_rows[start:start + STREAMING_INSERT_BATCH_ROWS])
+            if errors:
+                raise RuntimeError(f"Error appending rows to {table_name}: {errors[:3]}")
+
+
+class LocalRow(dict):
+    """
+    Dict-backed row that also allows attribute access, mirroring bigquery.Row.
+    """
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+@lru_cache(maxsize=256)
+def _transpile_to_duckdb(query: str) -> Tuple[str, ...]:
+    import sqlglot
+
+    return tuple(sqlglot.transpile(query, read="bigquery", write="duckdb"))
+
+
+def _query_parameters(job_config: Optional[bigquery.QueryJobConfig]) -> Dict[str, Any]:
+    params = {}
+    if job_config is None:
+        return params
+    for param in job_config.query_parameters:
+        if isinstance(param, bigquery.ArrayQueryParameter):
+            params[param.name] = list(param.values)
+        else:
+            params[param.name] = param.value
+    return params
+
+
+def _arrow_types() -> Dict[str, Any]:
+    import pyarrow as pa
+
+    return {
+        "STRING": pa.string(),
+        "INTEGER": pa.int64(),
+        "INT64": pa.int64(),
+        "FLOAT": pa.float64(),
+        "FLOAT64": pa.float64(),
+        "NUMERIC": pa.float64(),
+        "BOOLEAN": pa.bool_(),
+        "BOOL": pa.bool_(),
+        "TIMESTAMP": pa.timestamp("us", tz="UTC"),
+        "DATETIME": pa.timestamp("us"),
+        "DATE": pa.date32(),
+    }
+
+
+class DuckDBBackend(QueryBackend):
+    """
+    Runs the same queries on an in-process DuckDB database loaded from Parquet/CSV fixtures.
+
+    Tables are created under a catalog and schema named after the configured BigQuery
+    project and dataset, so `project.dataset.table` references resolve unchanged.
+    BigQuery SQL is translated to DuckDB SQL with sqlglot. Multi-statement queries run statement
+    by statement on one cursor and return the rows of the last statement, like a BigQuery script.
+    """
+    name = "duckdb"
+
+    def __init__(self, data_dir: str = "", database: str = ":memory:"):
+        """
+        Args:
+            data_dir (str, optional): Directory containing <table>.parquet or <table>.csv files
+                (a <table>/ directory of Parquet files is also accepted).
+            database (str, optional): DuckDB database path. Defaults to an in-memory database.
+        """
+        self.data_dir = data_dir
+        self.database = database
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is not None:
+            return self._connection
+        with self._lock:
+            if self._connection is None:
+                try:
+                    import duckdb
+                except ImportError as e:
+                    raise ImportError(
+                        "The local query backend requires the 'duckdb' and 'sqlglot' packages."
+                    ) from e
+                connection = duckdb.connect(self.database)
+                connection.execute(f'ATTACH IF NOT EXISTS \':memory:\' AS "{BIGQUERY_PROJECT}"')
+                connection.execute(
+                    f'CREATE SCHEMA IF NOT EXISTS "{BIGQUERY_PROJECT}"."{BIGQUERY_DATASET}"'
+                )
+                self._connection = connection
+                if self.data_dir:
+                    self._load_data_dir(self.data_dir)
+        return self._connection
+
+    def _load_data_dir(self, data_dir: str) -> None:
+        for path in sorted(os.listdir(data_dir)):
+            full_path = os.path.join(data_dir, path)
+            table_name, extension = os.path.splitext(path)
+            if os.path.isdir(full_path):
+                self.load_table(path, os.path.join(full_path, "*.parquet"))
+            elif extension in (".parquet", ".csv"):
+                self.load_table(table_name, full_path)
+
+    def load_table(self, table_name: str, path: str) -> None:
+        """
+        Creates (or replaces) a table from a Parquet or CSV file. Glob patterns are allowed.
+
+        Args:
+            table_name (str): The table name, e.g. 'transactions'.
+            path (str): Path or glob of the fixture file(s).
+        """
+        connection = self._connect()
+        if not glob.glob(path):
+            raise FileNotFoundError(f"No fixture files match {path}")
+        reader = "read_csv_auto" if path.endswith(".csv") else "read_parquet"
+        connection.execute(
+            f'CREATE OR REPLACE TABLE "{BIGQUERY_PROJECT}"."{BIGQUERY_DATASET}"."{table_name}" '
+            f"AS SELECT * FROM {reader}(?)",
+            [path],
+        )
+
+    def load_dataframe(self, table_name: str, dataframe: Any) -> None:
+        """
+        Creates (or replaces) a table from an in-memory pandas DataFrame or Arrow table.
+
+        Args:
+            table_name (str): The table name, e.g. 'transactions'.
+            dataframe: The data to load.
+        """
+        connection = self._connect()
+        with self._lock:
+            connection.register("_aml_load_source", dataframe)
+            try:
+                connection.execute(
+                    f'CREATE OR REPLACE TABLE "{BIGQUERY_PROJECT}"."{BIGQUERY_DATASET}"."{table_name}" '
+                    "AS SELECT * FROM _aml_load_source"
+                )
+            finally:
+                connection.unregister("_aml_load_source")
+
+    def _execute(self, cursor, query: str, job_config: Optional[bigquery.QueryJobConfig]):
+        # DuckDB only binds parameters to single statements, so scripts are run one by one
+        params = _query_parameters(job_config)
+        result = None
+        for statement in _transpile_to_duckdb(query):
+            referenced = set(re.findall(r"\$(\w+)", statement))
+            result = cursor.execute(statement, {name: value for name, value in params.items() if name in referenced})
+        return result
+
+    def get_table_layout(self, table_name: str) -> Optional[Dict[str, Any]]:
+        connection = self._connect()
+        cursor = connection.cursor()
+        try:
+            rows = cursor.execute(
+                "SELECT estimated_size FROM duckdb_tables() "
+                "WHERE database_name = ? AND schema_name = ? AND table_name = ?",
+                [BIGQUERY_PROJECT, BIGQUERY_DATASET, table_name],
+            ).fetchall()
+        finally:
+            cursor.close()
+        if not rows:
+            return None
+        # DuckDB has no partitioning or clustering
+        return {"partition_field": None, "clustering_fields": [], "num_rows": rows[0][0], "num_bytes": None}
+
+    def load_rows(self, table_name: str, rows: List[Dict[str, Any]], schema: List[bigquery.SchemaField]) -> None:
+        import pyarrow as pa
+
+        arrow_schema = pa.schema([
+            (field.name, _arrow_types().get(field.field_type, pa.string())) for field in schema
+        ])
+        self.load_dataframe(table_name, pa.Table.from_pylist(rows, schema=arrow_schema))
+
+    def append_rows(self, table_name: str, rows: List[Dict[str, Any]], schema: List[bigquery.SchemaField]) -> None:
+        import pyarrow as pa
+
+        arrow_schema = pa.schema([
+            (field.name, _arrow_types().get(field.field_type, pa.string())) for field in schema
+        ])
+        connection = self._connect()
+        with self._lock:
+            connection.register("_aml_append_source", pa.Table.from_pylist(rows, schema=arrow_schema))
+            try:
+                connection.execute(
+                    f'INSERT INTO "{BIGQUERY_PROJECT}"."{BIGQUERY_DATASET}"."{table_name}" '
+                    "BY NAME SELECT * FROM _aml_append_source"
+                )
+            finally:
+                connection.unregister("_aml_append_source")
+
+    def query(self, query: str, job_config: Optional[bigquery.QueryJobConfig] = None) -> List[LocalRow]:
+        connection = self._connect()
+        cursor = connection.cursor()
+        try:
+            result = self._execute(cursor, query, job_config)
+            if result.description is None:
+                record_query_job(rows=0)
+                return []
+            columns = [column[0] for column in result.description]
+            rows = [LocalRow(zip(columns, row)) for row in result.fetchall()]
+            record_query_job(rows=len(rows))
+            return rows
+        finally:
+            cursor.close()
+
+    def query_pages(
+        self,
+        query: str,
+        job_config: Optional[bigquery.QueryJobConfig] = None,
+        page_size: int = STREAM_PAGE_SIZE,
+    ) -> Iterator[List[LocalRow]]:
+        connection = self._connect()
+        cursor = connection.cursor()
+        try:
+            result = self._execute(cursor, query, job_config)
+            if result.description is None:
+                return
+            columns = [column[0] for column in result.description]
+            row_count = 0
+            while True:
+                rows = result.fetchmany(page_size)
+                if not rows:
+                    break
+                row_count += len(rows)
+                yield [LocalRow(zip(columns, row)) for row in rows]
+            record_query_job(rows=row_count)
+        finally:
+            cursor.close()
+
+    def query_arrow(self, query: str, job_config: Optional[bigquery.QueryJobConfig] = None) -> Any:
+        connection = self._connect()
+        cursor = connection.cursor()
+        try:
+            table = self._execute(cursor, query, job_config).fetch_arrow_table()
+            record_query_job(rows=table.num_rows)
+            return table
+        finally:
+            cursor.close()
+
+
+_backend: Optional[QueryBackend] = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(name: str = QUERY_BACKEND, data_dir: str = LOCAL_DATA_DIR) -> QueryBackend:
+    """
+    Creates a query backend by name.
+
+    Args:
+        name (str, optional): 'bigquery' or 'duckdb'. Defaults to AML_QUERY_BACKEND.
+        data_dir (str, optional): Fixture directory for the local backend. Defaults to AML_LOCAL_DATA_DIR.
+
+    Returns:
+        QueryBackend: The new backend.
+    """
+    if name == "bigquery":
+        return BigQueryBackend()
+    if name == "duckdb":
+        return DuckDBBackend(data_dir=data_dir)
+    raise ValueError(f"Unknown query backend: {name}")
+
+
+def get_backend() -> QueryBackend:
+    """
+    Returns the process-wide query backend used by all tools.
+
+    Returns:
+        QueryBackend: The configured backend.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+
+def set_backend(backend: Optional[QueryBackend]) -> None:
+    """
+    Replaces the process-wide query backend, e.g. to run the tools against local fixtures.
+
+    Args:
+        backend (QueryBackend): The backend to use. None resets to the configured default.
+    """
+    global _backend
+    with _backend_lock:
+        _backend = backend
@@ -1,7 +1,19 @@
 ﻿from google.cloud import bigquery
+from root_agent.tools.query_backend import get_backend
+from root_agent.tools.config import SAR_SINK_BATCH_SIZE
+from root_agent.tools.risk_ledger import risk_scores_source
+from root_agent.tools.report_sink import SarReportFileWriter, get_report_sink
+from root_agent.tools.customer_profiles import get_customer_profile, get_customer_profile_async, profile_rows
+from root_agent.tools.async_support import async_variant
+from root_agent.tools.telemetry import instrumented_tool
+from root_agent.tools.tool_logging import get_tool_logger, log_event, log_results
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 import datetime
+import hashlib
 import json
-from typing import Dict, List, Any, Optional
+import logging
+import time
+from typing import Dict, List, Any, Iterator, Optional
 import os
 import sys
 
@@ -14,6 +26,9 @@ from root_agent.tools.large_amount_detector import detect_large_amount_transacti
 from root_agent.tools.frequent_transaction_detector import detect_frequent_small_transactions
 from root_agent.tools.multiple_location_detector import detect_multiple_location_transactions
 
+logger = get_tool_logger(__name__)
+
+@instrumented_tool
 def generate_sar_report(customer_id: str, suspicious_activities: Optional[List[Dict[str, Any]]] = None) -> Dict:
     """
     Generates a Suspicious Activity Report (SAR) for a customer.
@@ -26,27 +41,292 @@ def generate_sar_report(customer_id: str, suspicious_activities: Optional[List[D
     Returns:
         dict: A dictionary containing the SAR report data.
     """
-    print("------------generate sar report--------------")
-    
-    # Initialize BigQuery client
-    client = bigquery.Client()
+    report = prepare_sar_report(customer_id, suspicious_activities)
+    if "error" not in report:
+        # Queue the report for the batched write to BigQuery
+        store_report(report)
+    return report
+
+def prepare_sar_report(customer_id: str, suspicious_activities: Optional[List[Dict[str, Any]]] = None) -> Dict:
+    """
+    Generates a SAR report without storing it, for callers that store reports themselves.
+
+    Args:
+        customer_id (str): The ID of the customer.
+        suspicious_activities (List[Dict], optional): List of pre-detected suspicious activities.
+
+    Returns:
+        dict: The SAR report data, or an error if the customer was not found.
+    """
+    # Get the configured query backend
+    backend = get_backend()
     
     # Get customer information
-    customer_info = get_customer_info(client, customer_id)
+    customer_info = get_customer_info(backend, customer_id)
     if not customer_info:
         return {"error": f"Customer with ID {customer_id} not found."}
     
     # Get suspicious activities - either use provided activities or detect them
     formatted_activities = {}
     if suspicious_activities:
-        print(suspicious_activities)
+        log_results(logger, "generate_sar_report", suspicious_activities, customer_id=customer_id)
         formatted_activities = format_suspicious_activities(customer_id, suspicious_activities)
     # else:
     #     formatted_activities = get_suspicious_activities(customer_id)
     
     # Generate the report
+    report_id = build_report_id(customer_id, suspicious_activities or [])
+    return build_report(customer_id, customer_info, formatted_activities, report_id)
+
+@instrumented_tool
+@async_variant(generate_sar_report)
+async def generate_sar_report_async(customer_id: str, suspicious_activities: Optional[List[Dict[str, Any]]] = None) -> Dict:
+    customer_info = format_customer_info(profile_rows(await get_customer_profile_async(customer_id)))
+    if not customer_info:
+        return {"error": f"Customer with ID {customer_id} not found."}
+
+    formatted_activities = {}
+    if suspicious_activities:
+        log_results(logger, "generate_sar_report", suspicious_activities, customer_id=customer_id)
+        formatted_activities = format_suspicious_activities(customer_id, suspicious_activities)
+    report_id = build_report_id(customer_id, suspicious_activities or [])
+    report = build_report(customer_id, customer_info, formatted_activities, report_id)
+
+    # Queuing does not wait for BigQuery, the sink writes in the background
+    store_report(report)
+    return report
+
+def generate_sar_reports_bulk(
+    customer_ids: List[str],
+    suspicious_activities: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+    output_path: str = "",
+    workers: int = 8,
+    use_processes: bool = False,
+    chunk_size: int = SAR_SINK_BATCH_SIZE,
+    filing_key: str = ""
+) -> Dict[str, Any]:
+    """
+    Generates and stores the SAR reports of many customers, e.g. for a quarter-end filing run.
+
+    Customers are processed in chunks: one query reads the customer rows of a chunk, a worker
+    pool formats the reports, and the report sink stores them with one load job and MERGE.
+    The reports are streamed to output_path as they are generated, so memory stays bounded
+    by the chunk size.
+
+    Args:
+        customer_ids (List[str]): The IDs of the customers.
+        suspicious_activities (Dict[str, List[Dict]], optional): Pre-detected suspicious
+            activities by customer ID. Customers without an entry get a report without activities.
+        output_path (str, optional): A .jsonl or .parquet file the reports are written to.
+        workers (int, optional): Size of the worker pool formatting the reports.
+        use_processes (bool, optional): Format in worker processes instead of threads.
+        chunk_size (int, optional): Customers read and stored together.
+        filing_key (str, optional): Identifies the filing run, e.g. '2025-Q4'. Part of the
+            report IDs, so reports of another run are stored even with the same activities.
+
+    Returns:
+        dict: The number of reports, the report ID by customer ID, the error by customer ID
+            for customers that were not found, the output path and the elapsed seconds.
+    """
+    start = time.perf_counter()
+    sink = get_report_sink()
+    report_ids = {}
+    errors = {}
+    writer = SarReportFileWriter(output_path) if output_path else None
+    try:
+        batch = []
+        for report in iter_sar_reports_bulk(
+                customer_ids, suspicious_activities, workers, use_processes, chunk_size,
+                filing_key=filing_key):
+            if "error" in report:
+                errors[report["customer_id"]] = report["error"]
+                continue
+            report_ids[report["customer_information"]["customer_id"]] = report["report_id"]
+            batch.append(report)
+            if len(batch) >= chunk_size:
+                sink.add_many(batch)
+                if writer:
+                    writer.write(batch)
+                batch = []
+        sink.add_many(batch)
+        if writer:
+            writer.write(batch)
+    finally:
+        if writer:
+            writer.close()
+    sink.flush()
+
+    elapsed = time.perf_counter() - start
+    log_event(
+        logger, logging.INFO, "sar_reports_bulk",
+        customers=len(report_ids) + len(errors), reports=len(report_ids),
+        not_found=len(errors), seconds=round(elapsed, 3),
+    )
+    return {
+        "reports": len(report_ids),
+        "report_ids": report_ids,
+        "errors": errors,
+        "output_path": output_path,
+        "elapsed_seconds": round(elapsed, 3),
+    }
+
+def iter_sar_reports_bulk(
+    customer_ids: List[str],
+    suspicious_activities: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+    workers: int = 8,
+    use_processes: bool = False,
+    chunk_size: int = SAR_SINK_BATCH_SIZE,
+    executor: Optional[Executor] = None,
+    filing_key: str = ""
+) -> Iterator[Dict[str, Any]]:
+    """
+    Generates the SAR reports of many customers without storing them, in the order of
+    customer_ids. Each chunk of customers is read with one query and formatted in a worker pool.
+
+    Args:
+        customer_ids (List[str]): The IDs of the customers. Duplicates get one report.
+        suspicious_activities (Dict[str, List[Dict]], optional): Pre-detected suspicious
+            activities by customer ID.
+        workers (int, optional): Size of the worker pool.
+        use_processes (bool, optional): Use processes instead of threads.
+        chunk_size (int, optional): Customers read with one query.
+        executor (Executor, optional): An existing worker pool to use instead.
+        filing_key (str, optional): Identifies the filing run, see build_report_id.
+
+    Yields:
+        dict: A SAR report, or the customer_id and error of a customer that was not found.
+    """
+    backend = get_backend()
+    suspicious_activities = suspicious_activities or {}
+    customer_ids = list(dict.fromkeys(customer_ids))
+    own_executor = None
+    if executor is None:
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        executor = own_executor = executor_class(max_workers=workers)
+    try:
+        for offset in range(0, len(customer_ids), chunk_size):
+            chunk = customer_ids[offset:offset + chunk_size]
+            customers_info = get_customers_info(backend, chunk)
+            found = [customer_id for customer_id in chunk if customer_id in customers_info]
+            # Larger tasks keep the pickling overhead low when the pool runs processes
+            reports = dict(zip(found, executor.map(
+                build_customer_report,
+                found,
+                [customers_info[customer_id] for customer_id in found],
+                [suspicious_activities.get(customer_id, []) for customer_id in found],
+                [filing_key] * len(found),
+                chunksize=max(1, len(found) // (workers * 4)),
+            )))
+            for customer_id in chunk:
+                if customer_id in reports:
+                    yield reports[customer_id]
+                else:
+                    yield {"customer_id": customer_id, "error": f"Customer with ID {customer_id} not found."}
+    finally:
+        if own_executor is not None:
+            own_executor.shutdown()
+
+def build_customer_report(customer_id: str, customer_info: Dict[str, Any], activities: List[Dict[str, Any]],
+                          filing_key: str = "") -> Dict:
+    """
+    Formats the suspicious activities of a customer and assembles the SAR report. The task
+    of the bulk mode's worker pool.
+
+    Args:
+        customer_id (str): The ID of the customer.
+        customer_info (dict): The customer information.
+        activities (List[Dict]): The customer's suspicious activities.
+        filing_key (str, optional): Identifies the filing run, see build_report_id.
+
+    Returns:
+        dict: The SAR report data.
+    """
+    formatted_activities = format_suspicious_activities(customer_id, activities)
+    report_id = build_report_id(customer_id, activities, filing_key)
+    return build_report(customer_id, customer_info, formatted_activities, report_id)
+
+def _timestamp_key(value: Any) -> str:
+    # The SQL detectors return UTC timestamps with an offset, the vectorized engine without
+    if not value:
+        return ""
+    if not isinstance(value, datetime.datetime):
+        try:
+            value = datetime.datetime.fromisoformat(str(value))
+        except ValueError:
+            return str(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value.isoformat()
+
+def activity_key(activity: Dict[str, Any]) -> List[str]:
+    """
+    Identifies a suspicious activity by its risk type, the IDs of its transactions and the
+    bounds of its time window, whichever detector returned it.
+
+    Args:
+        activity (dict): A suspicious activity record.
+
+    Returns:
+        list: The risk type, the sorted transaction IDs, the window start and end.
+    """
+    transaction_ids = set()
+    if activity.get("transaction_id"):
+        transaction_ids.add(str(activity["transaction_id"]))
+    if activity.get("transaction_ids"):
+        transaction_ids.update(
+            transaction_id.strip() for transaction_id in str(activity["transaction_ids"]).split(",")
+            if transaction_id.strip()
+        )
+    for transaction in activity.get("transactions") or []:
+        if transaction.get("transaction_id"):
+            transaction_ids.add(str(transaction["transaction_id"]))
+    start = activity.get("start_time") or activity.get("first_transaction_date") or activity.get("transaction_date")
+    end = activity.get("end_time") or activity.get("last_transaction_date") or activity.get("transaction_date")
+    return [
+        str(activity.get("risk_type", "")),
+        ",".join(sorted(transaction_ids)),
+        _timestamp_key(start),
+        _timestamp_key(end),
+    ]
+
+def build_report_id(customer_id: str, suspicious_activities: List[Dict[str, Any]], filing_key: str = "") -> str:
+    """
+    Derives the ID of a SAR report from the customer, the transactions and time windows of the
+    reported activities and the filing key. A report generated again for the same activities
+    (e.g. a retry) gets the same ID and is stored once; a new window or new transactions give
+    a new ID. A report without activities is keyed by its filing date instead.
+
+    Args:
+        customer_id (str): The ID of the customer.
+        suspicious_activities (List[Dict]): The reported suspicious activities, as returned by
+            the detectors.
+        filing_key (str, optional): Identifies the filing run, e.g. a run ID or '2025-Q4'.
+
+    Returns:
+        str: The report ID.
+    """
+    keys = sorted(activity_key(activity) for activity in suspicious_activities)
+    if not keys and not filing_key:
+        filing_key = datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+    content = json.dumps([customer_id, filing_key, keys])
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return f"SAR-{customer_id}-{digest[:20]}"
+
+def build_report(customer_id: str, customer_info: Dict[str, Any], formatted_activities: Dict, report_id: str) -> Dict:
+    """
+    Assembles the SAR report.
+
+    Args:
+        customer_id (str): The ID of the customer.
+        customer_info (dict): The customer information.
+        formatted_activities (dict): The suspicious activities, by category.
+        report_id (str): The report ID, from build_report_id.
+
+    Returns:
+        dict: The SAR report data.
+    """
     report = {
-        "report_id": f"SAR-{customer_id}-{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}",
+        "report_id": report_id,
         "report_date": datetime.datetime.now().isoformat(),
         "customer_information": customer_info,
         "risk_assessment": {
@@ -56,13 +336,6 @@ def generate_sar_report(customer_id: str, suspicious_activities: Optional[List[D
         "suspicious_activities": formatted_activities,
         "summary": generate_summary(customer_info, formatted_activities)
     }
-    
-    # Store the report in BigQuery
-    try:
-        store_report(client, report)
-    except Exception as e:
-        print(f"Warning: Could not store report - {e}")
-    
     return report
 
 def format_suspicious_activities(customer_id: str, activities: List[Dict[str, Any]]) -> Dict:
@@ -122,19 +395,46 @@ def format_suspicious_activities(customer_id: str, activities: List[Dict[str, An
         "multiple_location_transactions": multiple_location_activities
     }
 
-def get_customer_info(client, customer_id):
+def get_customer_info(backend, customer_id):
     """
-    Retrieves customer information from BigQuery.
+    Retrieves customer information from BigQuery, through the customer profile cache shared
+    with the risk tools.
     
     Args:
-        client (bigquery.Client): The BigQuery client.
+        backend (QueryBackend): The query backend.
         customer_id (str): The ID of the customer.
     
     Returns:
         dict: Customer information.
     """
-    query = """
-        SELECT 
+    return format_customer_info(profile_rows(get_customer_profile(customer_id, backend)))
+
+def get_customers_info(backend, customer_ids):
+    """
+    Retrieves the information of several customers with one query.
+
+    Args:
+        backend (QueryBackend): The query backend.
+        customer_ids (List[str]): The IDs of the customers.
+
+    Returns:
+        dict: Customer information by customer ID. Customers not found are left out.
+    """
+    query, job_config = build_customers_info_query(customer_ids)
+    return {row.customer_id: format_customer_info([row]) for row in backend.query(query, job_config)}
+
+def build_customers_info_query(customer_ids: List[str]):
+    """
+    Builds the query reading the information of several customers.
+
+    Args:
+        customer_ids (List[str]): The IDs of the customers.
+
+    Returns:
+        tuple: The query and its job config.
+    """
+    query = f"""
+        SELECT
             customer_id,
             account_no,
             location_of_account,
@@ -142,20 +442,28 @@ def get_customer_info(client, customer_id):
             phone,
             email,
             risk_score
-        FROM 
-            `amlproject-458804.aml_data.customers`
-        WHERE 
-            customer_id = @customer_id
+        FROM
+            {risk_scores_source()}
+        WHERE
+            customer_id IN UNNEST(@customer_ids)
     """
     job_config = bigquery.QueryJobConfig(
         query_parameters=[
-            bigquery.ScalarQueryParameter("customer_id", "STRING", customer_id),
+            bigquery.ArrayQueryParameter("customer_ids", "STRING", customer_ids),
         ]
     )
-    
-    query_job = client.query(query, job_config=job_config)
-    results = query_job.result()
-    
+    return query, job_config
+
+def format_customer_info(results):
+    """
+    Formats the customer rows of a customer information query.
+
+    Args:
+        results: The query rows.
+
+    Returns:
+        dict: Customer information, None if the customer was not found.
+    """
     for row in results:
         return {
             "customer_id": row.customer_id,
@@ -302,57 +610,20 @@ def generate_summary(customer_info, suspicious_activities):
     
     return summary
 
-def store_report(client, report):
+def store_report(report):
     """
-    Stores the SAR report in BigQuery.
+    Queues the SAR report for storage in BigQuery. The report sink writes it together with
+    other reports in one load job and MERGE (see report_sink.py).
     
     Args:
-        client (bigquery.Client): The BigQuery client.
         report (dict): The SAR report.
     
     Returns:
-        bool: True if successful, False otherwise.
-    """
-    # First check if the sar_reports table exists, if not create it
-    try:
-        # Try to create the sar_reports table if it doesn't exist
-        query = """
-            CREATE TABLE IF NOT EXISTS `amlproject-458804.aml_data.sar_reports` (
-                report_id STRING,
-                customer_id STRING,
-                report_date TIMESTAMP,
-                report_content STRING
-            )
-        """
-        query_job = client.query(query)
-        query_job.result()
-    except Exception as e:
-        print(f"Error creating sar_reports table: {e}")
-        return False
-    
-    # Convert the report to JSON
-    report_json = json.dumps(report)
-    
-    # Construct the query
-    query = """
-        INSERT INTO `amlproject-458804.aml_data.sar_reports`
-        (report_id, customer_id, report_date, report_content)
-        VALUES (@report_id, @customer_id, @report_date, @report_content)
+        bool: True if the report was queued, False otherwise.
     """
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[
-            bigquery.ScalarQueryParameter("report_id", "STRING", report['report_id']),
-            bigquery.ScalarQueryParameter("customer_id", "STRING", report['customer_information']['customer_id']),
-            bigquery.ScalarQueryParameter("report_date", "TIMESTAMP", report['report_date']),
-            bigquery.ScalarQueryParameter("report_content", "STRING", report_json),
-        ]
-    )
-    
-    # Execute the query
     try:
-        query_job = client.query(query, job_config=job_config)
-        query_job.result()
+        get_report_sink().add(report)
         return True
     except Exception as e:
-        print(f"Error storing report: {e}")
-        return False
\ No newline at end of file
+        logger.error("Error storing report: %s", e)
+        return False
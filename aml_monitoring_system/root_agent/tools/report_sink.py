@@ -0,0 +1,391 @@
+"""
+Buffered writer of SAR reports to the sar_reports table.
+
+Storing every report with its own CREATE TABLE and INSERT costs two serialized jobs per report
+and runs into the DML quotas when many reports are generated. The sink instead creates the
+table once per process, keeps the reports in memory and writes them in batches. A batch of
+AML_SAR_SINK_MERGE_MIN_ROWS reports or more is loaded into a staging table, which does not
+count against the DML quotas, and merged on report_id: a load job, a MERGE and a DROP. A
+smaller batch, like the single report of an agent turn, is written with one
+INSERT ... SELECT ... WHERE NOT EXISTS, its rows passed as query parameters. Either way a
+report with a report_id that is already stored is skipped. build_report_id derives the ID
+from the customer, the transaction IDs and time windows of the reported activities and an
+optional filing key, so a retried flush, a report regenerated for the same activities or the
+same report from another worker is stored once, while a report on new transactions or
+windows is stored as well.
+
+A batch is written when AML_SAR_SINK_BATCH_SIZE reports are pending, after
+AML_SAR_SINK_FLUSH_SECONDS, on flush() and when the process exits. Reports still buffered when
+the process is killed are lost, so callers that record a report as done elsewhere (like the
+batch sweep checkpoint) flush first.
+
+SarReportFileWriter streams reports to a local JSON lines or Parquet file, e.g. the output of
+a bulk filing run.
+"""
+import atexit
+import datetime
+import json
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+from google.cloud import bigquery
+from root_agent.tools.query_backend import get_backend
+from root_agent.tools.config import (
+    SAR_REPORTS_TABLE,
+    SAR_SINK_BATCH_SIZE,
+    SAR_SINK_FLUSH_SECONDS,
+    SAR_SINK_MERGE_MIN_ROWS,
+    table_ref,
+)
+from root_agent.tools.tool_logging import get_tool_logger, log_event
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = get_tool_logger(__name__)
+
+CREATE_SAR_REPORTS_TABLE_QUERY = f"""
+    CREATE TABLE IF NOT EXISTS {SAR_REPORTS_TABLE} (
+        report_id STRING,
+        customer_id STRING,
+        report_date TIMESTAMP,
+        report_content STRING
+    )
+"""
+
+SAR_REPORTS_SCHEMA = [
+    bigquery.SchemaField("report_id", "STRING"),
+    bigquery.SchemaField("customer_id", "STRING"),
+    bigquery.SchemaField("report_date", "TIMESTAMP"),
+    bigquery.SchemaField("report_content", "STRING"),
+]
+
+
+def report_row(report: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Converts a SAR report to its sar_reports row.
+
+    Args:
+        report (dict): The SAR report, as returned by generate_sar_report.
+
+    Returns:
+        dict: The row, with the whole report as JSON in report_content.
+    """
+    return {
+        "report_id": report["report_id"],
+        "customer_id": report["customer_information"]["customer_id"],
+        "report_date": datetime.datetime.fromisoformat(report["report_date"]),
+        "report_content": json.dumps(report),
+    }
+
+
+class SarReportFileWriter:
+    """
+    Writes SAR reports to a local file as they are generated: JSON lines holding the whole
+    reports, or Parquet with the sar_reports columns, which can be loaded into BigQuery as is.
+    The format follows the extension (.parquet, otherwise JSON lines). An existing file is
+    replaced.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): The output file.
+        """
+        self.path = path
+        self.format = "parquet" if path.endswith(".parquet") else "jsonl"
+        self.count = 0
+        self._file = None
+        self._parquet_writer = None
+
+    def write(self, reports: Iterable[Dict[str, Any]]) -> None:
+        """
+        Appends reports to the file.
+
+        Args:
+            reports (iterable): The SAR reports.
+        """
+        reports = list(reports)
+        if not reports:
+            return
+        if self.format == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            schema = pa.schema([
+                ("report_id", pa.string()),
+                ("customer_id", pa.string()),
+                ("report_date", pa.timestamp("us", tz="UTC")),
+                ("report_content", pa.string()),
+            ])
+            # Every write becomes a row group, so memory stays bounded by the batch
+            table = pa.Table.from_pylist([report_row(report) for report in reports], schema=schema)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, schema)
+            self._parquet_writer.write_table(table)
+        else:
+            if self._file is None:
+                self._file = open(self.path, "w")
+            for report in reports:
+                self._file.write(json.dumps(report, default=str) + "\n")
+            self._file.flush()
+        self.count += len(reports)
+
+    def close(self) -> None:
+        """
+        Closes the file.
+        """
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "SarReportFileWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class SarReportSink:
+    """
+    Buffers SAR reports and writes them to the sar_reports table in batches.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = SAR_SINK_BATCH_SIZE,
+        flush_seconds: float = SAR_SINK_FLUSH_SECONDS,
+        merge_min_rows: int = SAR_SINK_MERGE_MIN_ROWS,
+    ):
+        """
+        Args:
+            batch_size (int, optional): Pending reports that trigger a write.
+            flush_seconds (float, optional): Longest time a report stays buffered. 0 only
+                writes on batch_size, flush() and close().
+            merge_min_rows (int, optional): Smallest batch written through a staging table and
+                MERGE. Smaller batches are written with one INSERT.
+        """
+        self.batch_size = max(batch_size, 1)
+        self.flush_seconds = flush_seconds
+        self.merge_min_rows = merge_min_rows
+        # Pending rows by report_id, so a report added twice is written once
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._table_ready = False
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._written = 0
+        self._flushes = 0
+        self._failures = 0
+
+    def start(self) -> None:
+        """
+        Creates the sar_reports table if needed and starts the background writer. Called at
+        server startup; otherwise this happens with the first report.
+        """
+        self._ensure_table()
+        self._start_thread()
+
+    def add(self, report: Dict[str, Any]) -> None:
+        """
+        Queues a SAR report. Does not wait for the write.
+
+        Args:
+            report (dict): The SAR report.
+        """
+        self.add_many([report])
+
+    def add_many(self, reports: Iterable[Dict[str, Any]]) -> None:
+        """
+        Queues several SAR reports. Does not wait for the write.
+
+        Args:
+            reports (iterable): The SAR reports.
+        """
+        rows = [report_row(report) for report in reports]
+        with self._lock:
+            for row in rows:
+                self._pending.setdefault(row["report_id"], row)
+            pending = len(self._pending)
+        self._start_thread()
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def pending(self) -> int:
+        """
+        Returns:
+            int: The number of reports not written yet.
+        """
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """
+        Writes all pending reports. On failure they stay pending for the next flush.
+
+        Returns:
+            int: The number of reports written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                rows = list(self._pending.values())
+                self._pending.clear()
+            if not rows:
+                return 0
+            start = time.perf_counter()
+            try:
+                self._ensure_table()
+                self._write(rows)
+            except Exception:
+                self._failures += 1
+                with self._lock:
+                    for row in rows:
+                        self._pending.setdefault(row["report_id"], row)
+                raise
+            self._written += len(rows)
+            self._flushes += 1
+        log_event(
+            logger, logging.INFO, "sar_reports_flushed",
+            reports=len(rows), seconds=round(time.perf_counter() - start, 3),
+        )
+        return len(rows)
+
+    def close(self) -> None:
+        """
+        Stops the background writer and writes the pending reports. Errors are logged.
+        """
+        self._closed.set()
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error("Error storing %d SAR reports at shutdown: %s", self.pending(), e)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns:
+            dict: Reports written and pending, batches written and failed writes.
+        """
+        return {
+            "written": self._written,
+            "pending": self.pending(),
+            "flushes": self._flushes,
+            "failures": self._failures,
+        }
+
+    def _ensure_table(self) -> None:
+        if self._table_ready:
+            return
+        get_backend().query(CREATE_SAR_REPORTS_TABLE_QUERY)
+        self._table_ready = True
+
+    def _write(self, rows: List[Dict[str, Any]]) -> None:
+        if len(rows) < self.merge_min_rows:
+            self._insert(rows)
+        else:
+            self._merge(rows)
+
+    def _insert(self, rows: List[Dict[str, Any]]) -> None:
+        # One DML job instead of a load, a MERGE and a DROP. The rows are query parameters,
+        # one set per row, so report contents are never spliced into the SQL.
+        columns = [field.name for field in SAR_REPORTS_SCHEMA]
+        selects = []
+        parameters = []
+        for index, row in enumerate(rows):
+            selects.append("SELECT " + ", ".join(f"@{column}_{index} AS {column}" for column in columns))
+            parameters.extend(
+                bigquery.ScalarQueryParameter(f"{field.name}_{index}", field.field_type, row[field.name])
+                for field in SAR_REPORTS_SCHEMA
+            )
+        union = "\n                UNION ALL ".join(selects)
+        query = f"""
+            INSERT INTO {SAR_REPORTS_TABLE} ({", ".join(columns)})
+            SELECT {", ".join(f"s.{column}" for column in columns)}
+            FROM (
+                {union}
+            ) s
+            WHERE NOT EXISTS (SELECT 1 FROM {SAR_REPORTS_TABLE} r WHERE r.report_id = s.report_id)
+        """
+        get_backend().query(query, job_config=bigquery.QueryJobConfig(query_parameters=parameters))
+
+    def _merge(self, rows: List[Dict[str, Any]]) -> None:
+        backend = get_backend()
+        staging_table = f"sar_reports_ingest_{uuid.uuid4().hex}"
+        columns = [field.name for field in SAR_REPORTS_SCHEMA]
+        query = f"""
+            MERGE {SAR_REPORTS_TABLE} r
+            USING {table_ref(staging_table)} s
+            ON r.report_id = s.report_id
+            WHEN NOT MATCHED THEN
+                INSERT ({", ".join(columns)})
+                VALUES ({", ".join(f"s.{column}" for column in columns)})
+        """
+        try:
+            backend.load_rows(staging_table, rows, SAR_REPORTS_SCHEMA)
+            backend.query(query)
+        finally:
+            try:
+                backend.query(f"DROP TABLE IF EXISTS {table_ref(staging_table)}")
+            except Exception as e:
+                logger.warning("Error dropping staging table %s: %s", staging_table, e)
+
+    def _start_thread(self) -> None:
+        if self._thread is not None or self._closed.is_set():
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sar-report-sink", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._closed.is_set():
+            self._wake.wait(self.flush_seconds if self.flush_seconds > 0 else None)
+            self._wake.clear()
+            if self._closed.is_set():
+                return
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Error storing %d SAR reports: %s", self.pending(), e)
+
+
+_sink: Optional[SarReportSink] = None
+_sink_lock = threading.Lock()
+
+
+def get_report_sink() -> SarReportSink:
+    """
+    Returns the process-wide SAR report sink. It is flushed when the process exits.
+
+    Returns:
+        SarReportSink: The shared sink.
+    """
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                _sink = SarReportSink()
+                atexit.register(_sink.close)
+    return _sink
+
+
+def close_report_sink() -> None:
+    """
+    Writes the pending SAR reports and stops the background writer, e.g. at server shutdown.
+    A later report starts a new sink.
+    """
+    global _sink
+    with _sink_lock:
+        sink, _sink = _sink, None
+    if sink is not None:
+        atexit.unregister(sink.close)
+        sink.close()
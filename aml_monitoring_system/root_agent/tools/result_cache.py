@@ -0,0 +1,322 @@
+import copy
+import functools
+import inspect
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Tuple
+
+from cachetools import TTLCache
+from root_agent.tools.config import (
+    RESULT_CACHE_TTL_SECONDS,
+    RESULT_CACHE_MAX_ENTRIES,
+    RESULT_CACHE_SQLITE_PATH,
+)
+from dotenv import load_dotenv
+load_dotenv()
+
+# Data a cached tool can depend on. Writers invalidate the matching tools through
+# invalidate_tables(), e.g. update_risk_score invalidates CUSTOMERS. Customer names and
+# emails are not written by the tools, so joining them does not make a tool depend on CUSTOMERS.
+TRANSACTIONS = "transactions"
+CUSTOMERS = "customers"
+
+_MISSING = object()
+
+
+class SQLiteCacheTier:
+    """
+    Cache entries and data generations in a SQLite file, so that several worker processes
+    on the same host reuse each other's results and see each other's invalidations.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): The SQLite database file.
+        """
+        self.path = path
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_generations "
+                "(table_name TEXT PRIMARY KEY, generation INTEGER NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        connection = sqlite3.connect(self.path, timeout=5)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def get(self, key: str) -> Any:
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT value FROM cache_entries WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else _MISSING
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._connect() as connection:
+            connection.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),))
+            connection.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + ttl),
+            )
+
+    def generations(self) -> Dict[str, int]:
+        with self._connect() as connection:
+            return dict(connection.execute("SELECT table_name, generation FROM cache_generations").fetchall())
+
+    def bump_generation(self, table_name: str) -> None:
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO cache_generations (table_name, generation) VALUES (?, 1) "
+                "ON CONFLICT(table_name) DO UPDATE SET generation = generation + 1",
+                (table_name,),
+            )
+
+    def clear(self) -> None:
+        with self._connect() as connection:
+            connection.execute("DELETE FROM cache_entries")
+
+
+class ResultCache:
+    """
+    TTL + LRU cache for tool results.
+
+    Entries are keyed by tool name, arguments and the current generation of every table the
+    tool reads. Invalidating a table bumps its generation, so stale entries are never returned
+    and age out of the LRU. With a SQLite tier, results and generations are shared between
+    processes.
+    """
+
+    def __init__(self, ttl: float = RESULT_CACHE_TTL_SECONDS, max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+                 sqlite_path: str = RESULT_CACHE_SQLITE_PATH):
+        """
+        Args:
+            ttl (float, optional): Seconds an entry stays valid.
+            max_entries (int, optional): In-memory entries kept before the least recently used is evicted.
+            sqlite_path (str, optional): SQLite file of the shared tier. Empty disables it.
+        """
+        self.ttl = ttl
+        self._entries = TTLCache(maxsize=max_entries, ttl=ttl)
+        self._generations: Dict[str, int] = {}
+        self._shared = SQLiteCacheTier(sqlite_path) if sqlite_path else None
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "shared_hits": 0,
+            "misses": 0,
+            "invalidations": 0,
+        }
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def _key(self, tool_name: str, arguments: Dict[str, Any], tables: Tuple[str, ...]) -> str:
+        generations = self._shared.generations() if self._shared else self._generations
+        return json.dumps({
+            "tool": tool_name,
+            "arguments": arguments,
+            "generations": {table: generations.get(table, 0) for table in tables},
+        }, sort_keys=True, default=str)
+
+    def get_or_compute(self, tool_name: str, arguments: Dict[str, Any], tables: Tuple[str, ...],
+                       compute: Callable[[], Any]) -> Any:
+        """
+        Returns the cached result of a tool call, computing and storing it on a miss.
+
+        Args:
+            tool_name (str): The tool name.
+            arguments (dict): The tool arguments, including defaults.
+            tables (tuple): The tables the tool reads.
+            compute (callable): Runs the tool.
+
+        Returns:
+            The tool result.
+        """
+        key = self._key(tool_name, arguments, tables)
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return copy.deepcopy(value)
+
+        value = compute()
+        self._store(key, value)
+        return copy.deepcopy(value)
+
+    async def get_or_compute_async(self, tool_name: str, arguments: Dict[str, Any], tables: Tuple[str, ...],
+                                   compute: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Same as get_or_compute for async tools.
+
+        Args:
+            tool_name (str): The tool name.
+            arguments (dict): The tool arguments, including defaults.
+            tables (tuple): The tables the tool reads.
+            compute (callable): Returns the awaitable that runs the tool.
+
+        Returns:
+            The tool result.
+        """
+        key = self._key(tool_name, arguments, tables)
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return copy.deepcopy(value)
+
+        value = await compute()
+        self._store(key, value)
+        return copy.deepcopy(value)
+
+    def _lookup(self, key: str) -> Any:
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+        if value is not _MISSING:
+            self._count("hits")
+            return value
+
+        if self._shared:
+            value = self._shared.get(key)
+            if value is not _MISSING:
+                self._count("shared_hits")
+                with self._lock:
+                    self._entries[key] = value
+                return value
+
+        self._count("misses")
+        return _MISSING
+
+    def _store(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+        if self._shared:
+            self._shared.set(key, value, self.ttl)
+
+    def invalidate(self, *tables: str) -> None:
+        """
+        Invalidates every cached result that depends on one of the tables.
+
+        Args:
+            *tables (str): Table names, e.g. TRANSACTIONS or CUSTOMERS.
+        """
+        with self._lock:
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+            self._stats["invalidations"] += 1
+        if self._shared:
+            for table in tables:
+                self._shared.bump_generation(table)
+
+    def clear(self) -> None:
+        """
+        Drops every cached result.
+        """
+        with self._lock:
+            self._entries.clear()
+        if self._shared:
+            self._shared.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns hit/miss counters of this process.
+
+        Returns:
+            dict: hits, shared_hits, misses, invalidations, hit_rate and the current number of entries.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["shared_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """
+    Returns the process-wide result cache.
+
+    Returns:
+        ResultCache: The shared cache.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache()
+    return _cache
+
+
+def invalidate_tables(*tables: str) -> None:
+    """
+    Invalidates cached tool results after the given tables changed.
+
+    Args:
+        *tables (str): Table names, e.g. TRANSACTIONS after ingestion or CUSTOMERS after a risk update.
+    """
+    get_result_cache().invalidate(*tables)
+
+
+def get_result_cache_stats() -> Dict[str, Any]:
+    """
+    Returns the hit/miss metrics of the result cache.
+
+    Returns:
+        dict: The cache statistics.
+    """
+    return get_result_cache().stats()
+
+
+def cached_tool(*tables: str) -> Callable:
+    """
+    Caches the results of a tool that reads the given tables.
+
+    The wrapper keeps the tool's name, docstring and signature, so it can be passed to
+    FunctionTool unchanged. Async tools get an async wrapper.
+
+    Args:
+        *tables (str): The tables the tool reads.
+
+    Returns:
+        callable: The decorator.
+    """
+    def decorator(function: Callable) -> Callable:
+        signature = inspect.signature(function)
+        tool_name = f"{function.__module__}.{function.__qualname__}"
+
+        def arguments(args, kwargs) -> Dict[str, Any]:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return dict(bound.arguments)
+
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                return await get_result_cache().get_or_compute_async(
+                    tool_name, arguments(args, kwargs), tables, lambda: function(*args, **kwargs)
+                )
+
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            return get_result_cache().get_or_compute(
+                tool_name, arguments(args, kwargs), tables, lambda: function(*args, **kwargs)
+            )
+
+        return wrapper
+
+    return decorator
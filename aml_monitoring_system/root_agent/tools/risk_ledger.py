@@ -0,0 +1,299 @@
+"""
+Append-only ledger of risk score changes.
+
+Without the ledger, every scoring rewrites customers.risk_score with an UPDATE, which keeps no
+history and counts against the DML quotas. With AML_USE_RISK_LEDGER=true, scorings append one
+row per customer and risk type to risk_score_events instead:
+
+- risk_score_events holds customer_id, event_time, risk_type, risk_increment, the number of
+  activities behind the increment and the source that appended it. It is partitioned by
+  DATE(event_time) and clustered by customer_id, and rows are appended with streaming inserts
+  (see QueryBackend.append_rows), which are visible to queries at once.
+- risk_score_totals sums the increments per customer. On BigQuery it is a materialized view,
+  refreshed incrementally from the appended rows, so reading a score does not scan the history.
+- customer_risk_scores is the customers table with risk_score replaced by the stored score plus
+  the customer's increments. customers.risk_score is no longer written and stays the baseline
+  the ledger started from; setting a score appends an 'adjustment' event for the difference.
+
+The tools read scores through risk_scores_source(), and the dashboard reads the events for
+risk trends. The ledger is created on first use, or with
+
+    python -m root_agent.tools.risk_ledger create
+"""
+import argparse
+import logging
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from google.cloud import bigquery
+from root_agent.tools.query_backend import get_backend
+from root_agent.tools.result_cache import invalidate_tables, CUSTOMERS
+from root_agent.tools.config import (
+    CUSTOMERS_TABLE,
+    CUSTOMER_RISK_SCORES_VIEW,
+    RISK_SCORE_EVENTS_TABLE,
+    RISK_SCORE_TOTALS_VIEW,
+    USE_RISK_LEDGER,
+)
+from root_agent.tools.tool_logging import get_tool_logger, log_event
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = get_tool_logger(__name__)
+
+RISK_SCORE_EVENTS_TABLE_NAME = "risk_score_events"
+
+# risk_type of the events that set a score to a given value
+ADJUSTMENT_RISK_TYPE = "adjustment"
+
+RISK_SCORE_EVENTS_SCHEMA = [
+    bigquery.SchemaField("event_id", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("customer_id", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("event_time", "TIMESTAMP", mode="REQUIRED"),
+    bigquery.SchemaField("risk_type", "STRING"),
+    bigquery.SchemaField("risk_increment", "FLOAT64"),
+    bigquery.SchemaField("activity_count", "INT64"),
+    bigquery.SchemaField("source", "STRING"),
+]
+
+CREATE_RISK_SCORE_EVENTS_TABLE_QUERY = f"""
+    CREATE TABLE IF NOT EXISTS {RISK_SCORE_EVENTS_TABLE} (
+        event_id STRING NOT NULL,
+        customer_id STRING NOT NULL,
+        event_time TIMESTAMP NOT NULL,
+        risk_type STRING,
+        risk_increment FLOAT64,
+        activity_count INT64,
+        source STRING
+    )
+    PARTITION BY DATE(event_time)
+    CLUSTER BY customer_id
+"""
+
+# The local backend creates a plain view, DuckDB has no materialized views
+CREATE_RISK_SCORE_TOTALS_VIEW_QUERY = f"""
+    CREATE MATERIALIZED VIEW IF NOT EXISTS {RISK_SCORE_TOTALS_VIEW} AS
+    SELECT
+        customer_id,
+        SUM(risk_increment) AS risk_increment,
+        COUNT(*) AS events,
+        MAX(event_time) AS last_event_time
+    FROM {RISK_SCORE_EVENTS_TABLE}
+    GROUP BY customer_id
+"""
+
+# risk_score keeps the INT64 type of the customers column, truncated like the former updates
+CREATE_CUSTOMER_RISK_SCORES_VIEW_QUERY = f"""
+    CREATE OR REPLACE VIEW {CUSTOMER_RISK_SCORES_VIEW} AS
+    SELECT
+        c.* EXCEPT (risk_score),
+        CAST(TRUNC(COALESCE(c.risk_score, 0) + COALESCE(t.risk_increment, 0)) AS INT64) AS risk_score,
+        c.risk_score AS baseline_risk_score,
+        COALESCE(t.events, 0) AS risk_events,
+        t.last_event_time
+    FROM {CUSTOMERS_TABLE} c
+    LEFT JOIN {RISK_SCORE_TOTALS_VIEW} t
+    ON t.customer_id = c.customer_id
+"""
+
+_ledger_ready = False
+_ledger_lock = threading.Lock()
+
+
+def create_risk_ledger() -> None:
+    """
+    Creates the risk_score_events table and the views reading it, if they do not exist yet.
+    """
+    global _ledger_ready
+    backend = get_backend()
+    with _ledger_lock:
+        backend.query(CREATE_RISK_SCORE_EVENTS_TABLE_QUERY)
+        backend.query(CREATE_RISK_SCORE_TOTALS_VIEW_QUERY)
+        backend.query(CREATE_CUSTOMER_RISK_SCORES_VIEW_QUERY)
+        _ledger_ready = True
+
+
+def ensure_risk_ledger() -> None:
+    """
+    Creates the ledger once per process, before its first use.
+    """
+    if not _ledger_ready:
+        create_risk_ledger()
+
+
+def risk_scores_source(use_risk_ledger: Optional[bool] = None) -> str:
+    """
+    Returns what a query reads current risk scores from: the customer_risk_scores view, or the
+    customers table. Both have the columns of customers.
+
+    Args:
+        use_risk_ledger (bool, optional): Whether to read the view. Defaults to AML_USE_RISK_LEDGER.
+
+    Returns:
+        str: A table or view reference, to use after FROM.
+    """
+    if use_risk_ledger is None:
+        use_risk_ledger = USE_RISK_LEDGER
+    if use_risk_ledger:
+        ensure_risk_ledger()
+        return CUSTOMER_RISK_SCORES_VIEW
+    return CUSTOMERS_TABLE
+
+
+def risk_event(customer_id: str, risk_type: str, risk_increment: float, activity_count: int = 1,
+               source: str = "") -> Dict[str, Any]:
+    """
+    Builds a risk_score_events row stamped with the current time.
+
+    Args:
+        customer_id (str): The ID of the customer.
+        risk_type (str): The risk type, e.g. 'large_amount', or 'adjustment'.
+        risk_increment (float): The risk added (negative to lower the score).
+        activity_count (int, optional): The suspicious activities behind the increment.
+        source (str, optional): What appended the event, e.g. 'calculate_risk_score'.
+
+    Returns:
+        dict: The row.
+    """
+    return {
+        "event_id": uuid.uuid4().hex,
+        "customer_id": customer_id,
+        "event_time": datetime.now(timezone.utc),
+        "risk_type": risk_type,
+        "risk_increment": float(risk_increment),
+        "activity_count": activity_count,
+        "source": source,
+    }
+
+
+def append_risk_events(events: List[Dict[str, Any]]) -> None:
+    """
+    Appends events to the ledger. Callers drop the cached profiles of the customers.
+
+    Args:
+        events (list): Rows built with risk_event.
+    """
+    if not events:
+        return
+    ensure_risk_ledger()
+    get_backend().append_rows(RISK_SCORE_EVENTS_TABLE_NAME, events, RISK_SCORE_EVENTS_SCHEMA)
+    # Cached risk dashboards no longer reflect the current scores
+    invalidate_tables(CUSTOMERS)
+    log_event(
+        logger, logging.INFO, "risk_events_appended",
+        events=len(events), customers=len({event["customer_id"] for event in events}),
+    )
+
+
+def build_risk_score_trend_query(customer_id: str, since: datetime):
+    """
+    Builds the query of a customer's daily risk score changes since a time, with the score at
+    the end of each day.
+
+    Args:
+        customer_id (str): The ID of the customer.
+        since (datetime): The first day is the one containing since.
+
+    Returns:
+        tuple: The query and its job config.
+    """
+    # The running total needs the whole history of the customer, a few clustered blocks
+    query = f"""
+        WITH daily AS (
+            SELECT
+                DATE(event_time) AS day,
+                SUM(risk_increment) AS risk_increment,
+                SUM(activity_count) AS activities,
+                COUNT(*) AS events
+            FROM {RISK_SCORE_EVENTS_TABLE}
+            WHERE customer_id = @customer_id
+            GROUP BY day
+        ),
+        running AS (
+            SELECT
+                day,
+                risk_increment,
+                activities,
+                events,
+                SUM(risk_increment) OVER (ORDER BY day) AS total_increment
+            FROM daily
+        )
+        SELECT
+            day,
+            risk_increment,
+            activities,
+            events,
+            CAST(TRUNC(COALESCE(
+                (SELECT MAX(risk_score) FROM {CUSTOMERS_TABLE} WHERE customer_id = @customer_id), 0
+            ) + total_increment) AS INT64) AS risk_score
+        FROM running
+        WHERE day >= DATE(@since)
+        ORDER BY day
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("customer_id", "STRING", customer_id),
+            bigquery.ScalarQueryParameter("since", "TIMESTAMP", since),
+        ]
+    )
+    return query, job_config
+
+
+def build_top_risk_increases_query(since: datetime, limit: int):
+    """
+    Builds the query of the customers whose risk score rose the most since a time.
+
+    Args:
+        since (datetime): The start of the period.
+        limit (int): The number of customers.
+
+    Returns:
+        tuple: The query and its job config.
+    """
+    # Only the partitions of the period are read
+    query = f"""
+        WITH increases AS (
+            SELECT
+                customer_id,
+                SUM(risk_increment) AS risk_increase,
+                COUNT(*) AS events
+            FROM {RISK_SCORE_EVENTS_TABLE}
+            WHERE event_time >= @since
+            GROUP BY customer_id
+        )
+        SELECT
+            i.customer_id,
+            s.customer_name,
+            s.risk_score,
+            i.risk_increase,
+            i.events
+        FROM increases i
+        LEFT JOIN {CUSTOMER_RISK_SCORES_VIEW} s
+        ON s.customer_id = i.customer_id
+        WHERE TRUE
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY i.customer_id ORDER BY s.risk_score DESC) = 1
+        ORDER BY i.risk_increase DESC
+        LIMIT {int(limit)}
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("since", "TIMESTAMP", since),
+        ]
+    )
+    return query, job_config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the risk score ledger.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("create", help="Create the risk_score_events table and the score views")
+    parser.parse_args()
+
+    create_risk_ledger()
+    print({"created": True})
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,53 @@
 ﻿from google.cloud import bigquery
-from typing import Dict,Optional,List
+from root_agent.tools.query_backend import get_backend
+from root_agent.tools.result_cache import invalidate_tables, CUSTOMERS
+from root_agent.tools.customer_profiles import (
+    get_customer_profile,
+    get_customer_profile_async,
+    invalidate_customer_profiles,
+    profile_rows,
+    record_risk_score_write,
+)
+from root_agent.tools.risk_ledger import (
+    ADJUSTMENT_RISK_TYPE,
+    append_risk_events,
+    risk_event,
+    risk_scores_source,
+)
+from root_agent.tools.config import (
+    CUSTOMERS_TABLE,
+    RISK_ALERT_THRESHOLD,
+    RISK_UPDATE_RETRIES,
+    RISK_UPDATE_RETRY_SECONDS,
+    USE_RISK_LEDGER,
+    table_ref,
+)
+from root_agent.tools.async_support import async_variant
+from root_agent.tools.telemetry import instrumented_tool
+from typing import Dict,Optional,List,Tuple
+from concurrent.futures import Future
+import asyncio
+import random
+import threading
+import time
+import uuid
+from root_agent.tools.tool_logging import get_tool_logger, log_results
+
+logger = get_tool_logger(__name__)
+
+# Messages of a transaction aborted by a concurrent update: BigQuery's, then DuckDB's
+CONCURRENT_UPDATE_ERRORS = (
+    'concurrent update',
+    'could not serialize access',
+    'conflict on',
+)
+
+# Risk added for each suspicious activity, by risk type
+RISK_WEIGHTS = {
+    'large_amount': 15.0,
+    'frequent_small_transactions': 10.0,
+    'multiple_locations': 20.0
+}
 
 def get_current_risk_score(customer_id: str) -> float:
     """
@@ -11,25 +59,31 @@ def get_current_risk_score(customer_id: str) -> float:
     Returns:
         float: The current risk score of the customer. Returns 0 if not found.
     """
-    # Initialize BigQuery client
-    client = bigquery.Client()
-    
-    # Construct the query
-    query = """
-        SELECT risk_score
-        FROM `amlproject-458804.aml_data.customers`
-        WHERE customer_id = @customer_id
+    # The customer's row is shared with check_risk_threshold and the SAR report
+    return risk_score_from_rows(profile_rows(get_customer_profile(customer_id)))
+
+async def get_current_risk_score_async(customer_id: str) -> float:
+    """
+    Same as get_current_risk_score, without blocking the event loop.
+
+    Args:
+        customer_id (str): The ID of the customer.
+
+    Returns:
+        float: The current risk score of the customer. Returns 0 if not found.
+    """
+    return risk_score_from_rows(profile_rows(await get_customer_profile_async(customer_id)))
+
+def risk_score_from_rows(results) -> float:
+    """
+    Reads the risk score from customer rows.
+
+    Args:
+        results: The query rows.
+
+    Returns:
+        float: The risk score, 0 if the customer was not found.
     """
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[
-            bigquery.ScalarQueryParameter("customer_id", "STRING", customer_id),
-        ]
-    )
-    
-    # Execute the query
-    query_job = client.query(query, job_config=job_config)
-    results = query_job.result()
-    
     # Get the risk score
     for row in results:
         return float(row.risk_score) if row.risk_score is not None else 0.0
@@ -37,6 +91,47 @@ def get_current_risk_score(customer_id: str) -> float:
     # Return 0 if no risk score is found
     return 0.0
 
+def calculate_risk_increment(suspicious_activities: List[Dict[str, str]]) -> float:
+    """
+    Sums the risk weights of a customer's suspicious activities.
+
+    Args:
+        suspicious_activities (list): Suspicious activity records with a 'risk_type'.
+
+    Returns:
+        float: The risk increment.
+    """
+    risk_increment = 0.0
+    for activity in suspicious_activities:
+        risk_type = activity.get('risk_type')
+        if risk_type in RISK_WEIGHTS:
+            risk_increment += RISK_WEIGHTS[risk_type]
+    return risk_increment
+
+def risk_events(customer_id: str, suspicious_activities: List[Dict[str, str]], source: str) -> List[Dict]:
+    """
+    Builds the risk ledger events of a customer's suspicious activities: one per risk type,
+    with the summed weights and the number of activities.
+
+    Args:
+        customer_id (str): The ID of the customer.
+        suspicious_activities (list): Suspicious activity records with a 'risk_type'.
+        source (str): What appends the events.
+
+    Returns:
+        list: The risk_score_events rows.
+    """
+    counts = {}
+    for activity in suspicious_activities:
+        risk_type = activity.get('risk_type')
+        if risk_type in RISK_WEIGHTS:
+            counts[risk_type] = counts.get(risk_type, 0) + 1
+    return [
+        risk_event(customer_id, risk_type, RISK_WEIGHTS[risk_type] * count, count, source)
+        for risk_type, count in counts.items()
+    ]
+
+@instrumented_tool
 def calculate_risk_score(suspicious_activities: List[Dict[str, str]]) -> Dict[str, float]:
     """
     Calculates a risk score based on suspicious activities.
@@ -47,44 +142,269 @@ def calculate_risk_score(suspicious_activities: List[Dict[str, str]]) -> Dict[st
     Returns:
         dict: A dictionary containing customer_id and calculated risk score.
     """
-    print("hoooooooooo")
-    print(suspicious_activities)
+    log_results(logger, "calculate_risk_score", suspicious_activities or [])
     if not suspicious_activities:
         return {'customer_id': None, 'risk_score': 0}
     
     # Get the customer_id from the first activity
     customer_id = suspicious_activities[0].get('original_id') or suspicious_activities[0].get('customer_id')
     
-    # Get the current risk score
-    current_risk_score = get_current_risk_score(customer_id)
-    
-    # Define weights for different types of suspicious activities
-    risk_weights = {
-        'large_amount': 15.0,
-        'frequent_small_transactions': 10.0,
-        'multiple_locations': 20.0
-    }
-    
     # Calculate the new risk increment
-    risk_increment = 0.0
-    for activity in suspicious_activities:
-        risk_type = activity.get('risk_type')
-        if risk_type in risk_weights:
-            risk_increment += risk_weights[risk_type]
+    risk_increment = calculate_risk_increment(suspicious_activities)
     
-    # Calculate the total risk score
-    total_risk_score = current_risk_score + risk_increment
-    
-    # Update the risk score in BigQuery
-    update_risk_score(customer_id, total_risk_score)
+    # Append it to the risk ledger, or add it to the stored risk score in the database, so
+    # concurrent scorings of the customer do not overwrite each other
+    if risk_increment and USE_RISK_LEDGER:
+        scores = append_risk_score_events(customer_id, suspicious_activities)
+    elif risk_increment:
+        scores = apply_risk_increment(customer_id, risk_increment)
+    else:
+        current_risk_score = get_current_risk_score(customer_id)
+        scores = {'previous_risk_score': current_risk_score, 'total_risk_score': current_risk_score}
     
     return {
         'customer_id': customer_id,
-        'previous_risk_score': current_risk_score,
+        'previous_risk_score': scores['previous_risk_score'],
         'risk_increment': risk_increment,
-        'total_risk_score': total_risk_score
+        'total_risk_score': scores['total_risk_score']
     }
 
+@instrumented_tool
+@async_variant(calculate_risk_score)
+async def calculate_risk_score_async(suspicious_activities: List[Dict[str, str]]) -> Dict[str, float]:
+    log_results(logger, "calculate_risk_score", suspicious_activities or [])
+    if not suspicious_activities:
+        return {'customer_id': None, 'risk_score': 0}
+
+    customer_id = suspicious_activities[0].get('original_id') or suspicious_activities[0].get('customer_id')
+    risk_increment = calculate_risk_increment(suspicious_activities)
+    if risk_increment and USE_RISK_LEDGER:
+        scores = await asyncio.to_thread(append_risk_score_events, customer_id, suspicious_activities)
+    elif risk_increment:
+        scores = await apply_risk_increment_async(customer_id, risk_increment)
+    else:
+        current_risk_score = await get_current_risk_score_async(customer_id)
+        scores = {'previous_risk_score': current_risk_score, 'total_risk_score': current_risk_score}
+
+    return {
+        'customer_id': customer_id,
+        'previous_risk_score': scores['previous_risk_score'],
+        'risk_increment': risk_increment,
+        'total_risk_score': scores['total_risk_score']
+    }
+
+def build_risk_increment_query(customer_id: str, risk_increment: float):
+    """
+    Builds the script adding an increment to a customer's risk score in one transaction. The
+    score before the update is kept in a temporary table and returned by the last statement.
+
+    Args:
+        customer_id (str): The ID of the customer.
+        risk_increment (float): The risk to add.
+
+    Returns:
+        tuple: The query and its job config.
+    """
+    query = f"""
+        BEGIN TRANSACTION;
+        CREATE TEMP TABLE previous_risk AS
+        SELECT COALESCE(risk_score, 0) AS risk_score
+        FROM {CUSTOMERS_TABLE}
+        WHERE customer_id = @customer_id;
+        UPDATE {CUSTOMERS_TABLE}
+        SET risk_score = CAST(TRUNC(COALESCE(risk_score, 0) + @risk_increment) AS INT64)
+        WHERE customer_id = @customer_id;
+        COMMIT TRANSACTION;
+        SELECT risk_score FROM previous_risk;
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("customer_id", "STRING", customer_id),
+            bigquery.ScalarQueryParameter("risk_increment", "FLOAT64", risk_increment),
+        ]
+    )
+    return query, job_config
+
+def is_concurrent_update_error(error: Exception) -> bool:
+    """
+    Tells whether a query failed because another transaction updated the same table.
+
+    Args:
+        error (Exception): The error raised by the backend.
+
+    Returns:
+        bool: True for a transaction conflict, which can be retried.
+    """
+    message = str(error).lower()
+    return any(pattern in message for pattern in CONCURRENT_UPDATE_ERRORS)
+
+def run_risk_update(query: str, job_config=None, retries: int = RISK_UPDATE_RETRIES):
+    """
+    Runs a risk score transaction, retrying it with an exponential backoff when it is aborted
+    by a concurrent update from another process. An aborted transaction changes nothing, so
+    it can be run again.
+
+    Args:
+        query (str): The transaction script.
+        job_config (bigquery.QueryJobConfig, optional): Its job config.
+        retries (int, optional): The number of retries before the error is raised.
+
+    Returns:
+        The rows of the script.
+    """
+    delay = RISK_UPDATE_RETRY_SECONDS
+    for attempt in range(retries + 1):
+        try:
+            return get_backend().query(query, job_config)
+        except Exception as e:
+            if attempt == retries or not is_concurrent_update_error(e):
+                raise
+            logger.warning("Risk score update conflicted with a concurrent update, retrying: %s", e)
+            time.sleep(delay * (1 + random.random()))
+            delay *= 2
+
+def increment_risk_score(customer_id: str, risk_increment: float) -> float:
+    """
+    Adds an increment to a customer's risk score with one job. Use apply_risk_increment,
+    which does not run two jobs for the same customer at once.
+
+    Args:
+        customer_id (str): The ID of the customer.
+        risk_increment (float): The risk to add.
+
+    Returns:
+        float: The risk score before the increment, 0 if the customer was not found.
+    """
+    query, job_config = build_risk_increment_query(customer_id, risk_increment)
+    previous_risk_score = risk_score_from_rows(run_risk_update(query, job_config))
+    invalidate_tables(CUSTOMERS)
+    return previous_risk_score
+
+class RiskIncrementCoalescer:
+    """
+    Applies risk increments with at most one job per customer at a time. Increments for a
+    customer that arrive while its job runs are summed and applied by the next job, so
+    concurrent scorings neither conflict in the database nor wait for one job each.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[str, List[Tuple[float, Future]]] = {}
+        self._running = set()
+        self._stats = {'increments': 0, 'jobs': 0}
+
+    def apply(self, customer_id: str, risk_increment: float) -> Dict[str, float]:
+        """
+        Adds an increment to a customer's risk score.
+
+        Args:
+            customer_id (str): The ID of the customer.
+            risk_increment (float): The risk to add.
+
+        Returns:
+            dict: previous_risk_score and total_risk_score, as if the increments coalesced
+                into one job had been applied one after the other.
+        """
+        future = Future()
+        with self._lock:
+            self._pending.setdefault(customer_id, []).append((risk_increment, future))
+            self._stats['increments'] += 1
+            run_jobs = customer_id not in self._running
+            if run_jobs:
+                self._running.add(customer_id)
+        # The caller that finds no job running for the customer runs them until none is pending
+        if run_jobs:
+            self._run_jobs(customer_id)
+        return future.result()
+
+    def _run_jobs(self, customer_id: str) -> None:
+        while True:
+            with self._lock:
+                batch = self._pending.pop(customer_id, [])
+                if not batch:
+                    self._running.discard(customer_id)
+                    return
+                self._stats['jobs'] += 1
+            try:
+                risk_score = increment_risk_score(customer_id, sum(increment for increment, _ in batch))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for increment, future in batch:
+                future.set_result({'previous_risk_score': risk_score, 'total_risk_score': risk_score + increment})
+                risk_score += increment
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns:
+            dict: The increments applied and the jobs they took.
+        """
+        with self._lock:
+            return dict(self._stats)
+
+_risk_increments = RiskIncrementCoalescer()
+
+def apply_risk_increment(customer_id: str, risk_increment: float) -> Dict[str, float]:
+    """
+    Adds an increment to a customer's risk score in the database (risk_score = risk_score +
+    increment), coalesced with the concurrent increments of this process for the customer.
+
+    Args:
+        customer_id (str): The ID of the customer.
+        risk_increment (float): The risk to add.
+
+    Returns:
+        dict: previous_risk_score and total_risk_score.
+    """
+    scores = _risk_increments.apply(customer_id, risk_increment)
+    # Dropped in the caller's context, so its request scope reads the new score
+    invalidate_customer_profiles(customer_id)
+    return scores
+
+async def apply_risk_increment_async(customer_id: str, risk_increment: float) -> Dict[str, float]:
+    """
+    Same as apply_risk_increment, without blocking the event loop. Runs in a thread so that
+    sync and async callers share one coalescer.
+
+    Args:
+        customer_id (str): The ID of the customer.
+        risk_increment (float): The risk to add.
+
+    Returns:
+        dict: previous_risk_score and total_risk_score.
+    """
+    return await asyncio.to_thread(apply_risk_increment, customer_id, risk_increment)
+
+def append_risk_score_events(customer_id: str, suspicious_activities: List[Dict[str, str]]) -> Dict[str, float]:
+    """
+    Appends a scoring to the risk ledger instead of updating the customers table. The previous
+    score is read before the append, so it does not include increments appended concurrently
+    for the customer; the stored total always does.
+
+    Args:
+        customer_id (str): The ID of the customer.
+        suspicious_activities (list): The customer's suspicious activities.
+
+    Returns:
+        dict: previous_risk_score and total_risk_score.
+    """
+    previous_risk_score = get_current_risk_score(customer_id)
+    events = risk_events(customer_id, suspicious_activities, 'calculate_risk_score')
+    append_risk_events(events)
+    total_risk_score = previous_risk_score + sum(event['risk_increment'] for event in events)
+    record_risk_score_write(customer_id, int(total_risk_score))
+    return {'previous_risk_score': previous_risk_score, 'total_risk_score': total_risk_score}
+
+def get_risk_increment_stats() -> Dict[str, int]:
+    """
+    Returns the increments applied by this process and the jobs they took.
+
+    Returns:
+        dict: increments and jobs.
+    """
+    return _risk_increments.stats()
+
 def update_risk_score(customer_id: str, risk_score: float) -> bool:
     """
     Updates the risk score for a customer in BigQuery.
@@ -96,15 +416,65 @@ def update_risk_score(customer_id: str, risk_score: float) -> bool:
     Returns:
         bool: True if successful, False otherwise.
     """
-    # Initialize BigQuery client
-    client = bigquery.Client()
+    # The risk ledger records the change to the new score instead
+    if USE_RISK_LEDGER:
+        return update_risk_scores({customer_id: risk_score})
+
+    # Get the configured query backend
+    backend = get_backend()
+    query, job_config = build_risk_score_update_query(customer_id, risk_score)
     
+    # Execute the query
+    try:
+        backend.query(query, job_config)
+        # Cached risk dashboards and the customer's profile no longer reflect the customers table
+        invalidate_tables(CUSTOMERS)
+        record_risk_score_write(customer_id, int(risk_score))
+        return True
+    except Exception as e:
+        logger.error("Error updating risk score: %s", e)
+        return False  # Return False to indicate the update failed
+
+async def update_risk_score_async(customer_id: str, risk_score: float) -> bool:
+    """
+    Same as update_risk_score, without blocking the event loop.
+
+    Args:
+        customer_id (str): The ID of the customer.
+        risk_score (float): The new risk score.
+
+    Returns:
+        bool: True if successful, False otherwise.
+    """
+    if USE_RISK_LEDGER:
+        return await asyncio.to_thread(update_risk_scores, {customer_id: risk_score})
+    query, job_config = build_risk_score_update_query(customer_id, risk_score)
+    try:
+        await get_backend().query_async(query, job_config)
+        invalidate_tables(CUSTOMERS)
+        record_risk_score_write(customer_id, int(risk_score))
+        return True
+    except Exception as e:
+        logger.error("Error updating risk score: %s", e)
+        return False
+
+def build_risk_score_update_query(customer_id: str, risk_score: float):
+    """
+    Builds the query storing a customer's risk score.
+
+    Args:
+        customer_id (str): The ID of the customer.
+        risk_score (float): The new risk score.
+
+    Returns:
+        tuple: The query and its job config.
+    """
     # Convert the risk score to an integer to match the column type
     risk_score_int = int(risk_score)
     
     # Update the risk score record
-    query = """
-        UPDATE `amlproject-458804.aml_data.customers`
+    query = f"""
+        UPDATE {CUSTOMERS_TABLE}
         SET risk_score = @risk_score
         WHERE customer_id = @customer_id
     """
@@ -114,53 +484,278 @@ def update_risk_score(customer_id: str, risk_score: float) -> bool:
             bigquery.ScalarQueryParameter("risk_score", "INT64", risk_score_int),  # Changed to INT64
         ]
     )
-    
-    # Execute the query
+    return query, job_config
+
+def get_current_risk_scores(customer_ids: List[str]) -> Dict[str, float]:
+    """
+    Retrieves the current risk scores of many customers with one query.
+
+    Args:
+        customer_ids (list): The customer IDs.
+
+    Returns:
+        dict: Risk score by customer ID. Customers that are not found are left out.
+    """
+    backend = get_backend()
+    query = f"""
+        SELECT customer_id, risk_score
+        FROM {risk_scores_source()}
+        WHERE customer_id IN UNNEST(@customer_ids)
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ArrayQueryParameter("customer_ids", "STRING", customer_ids),
+        ]
+    )
+    risk_scores = {}
+    for row in backend.query(query, job_config):
+        # Keep the first row of customers listed more than once, like get_current_risk_score
+        risk_scores.setdefault(row.customer_id, float(row.risk_score) if row.risk_score is not None else 0.0)
+    return risk_scores
+
+def update_risk_scores(risk_scores: Dict[str, float]) -> bool:
+    """
+    Updates the risk scores of many customers with a single MERGE.
+
+    The new scores are written to a staging table with a load job, which avoids the DML
+    quota, and merged into the customers table in one statement. With the risk ledger, the
+    differences to the current scores are appended as adjustment events instead.
+
+    Args:
+        risk_scores (dict): New risk score by customer ID.
+
+    Returns:
+        bool: True if successful, False otherwise.
+    """
+    if not risk_scores:
+        return True
+    if USE_RISK_LEDGER:
+        try:
+            current_risk_scores = get_current_risk_scores(list(risk_scores))
+            append_risk_events([
+                risk_event(customer_id, ADJUSTMENT_RISK_TYPE, int(risk_score) - current_risk_scores[customer_id],
+                           0, 'update_risk_scores')
+                for customer_id, risk_score in risk_scores.items()
+                if customer_id in current_risk_scores and int(risk_score) != current_risk_scores[customer_id]
+            ])
+            invalidate_customer_profiles(*risk_scores)
+            return True
+        except Exception as e:
+            logger.error("Error updating risk scores: %s", e)
+            return False
+    backend = get_backend()
+    staging_table = f"risk_score_updates_{uuid.uuid4().hex}"
+    rows = [
+        {'customer_id': customer_id, 'risk_score': int(risk_score)}
+        for customer_id, risk_score in risk_scores.items()
+    ]
+    schema = [
+        bigquery.SchemaField("customer_id", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("risk_score", "INT64"),
+    ]
+    query = f"""
+        MERGE {CUSTOMERS_TABLE} c
+        USING {table_ref(staging_table)} u
+        ON c.customer_id = u.customer_id
+        WHEN MATCHED THEN UPDATE SET risk_score = u.risk_score
+    """
     try:
-        query_job = client.query(query, job_config=job_config)
-        query_job.result()
+        backend.load_rows(staging_table, rows, schema)
+        backend.query(query)
+        invalidate_tables(CUSTOMERS)
+        invalidate_customer_profiles(*risk_scores)
         return True
     except Exception as e:
-        print(f"Error updating risk score: {e}")
-        return False  # Return False to indicate the update failed
+        logger.error("Error updating risk scores: %s", e)
+        return False
+    finally:
+        try:
+            backend.query(f"DROP TABLE IF EXISTS {table_ref(staging_table)}")
+        except Exception as e:
+            logger.warning("Error dropping staging table %s: %s", staging_table, e)
+
+def append_risk_events_batch(events: List[Dict]) -> bool:
+    """
+    Appends the risk ledger events of many customers with one append.
+
+    Args:
+        events (list): The risk_score_events rows.
+
+    Returns:
+        bool: True if successful, False otherwise.
+    """
+    try:
+        append_risk_events(events)
+        invalidate_customer_profiles(*{event['customer_id'] for event in events})
+        return True
+    except Exception as e:
+        logger.error("Error appending risk events: %s", e)
+        return False
+
+def build_risk_increments_merge_query(staging_table: str) -> str:
+    """
+    Builds the script adding the increments of a staging table to the customers' risk scores
+    in one transaction, with the same formula as build_risk_increment_query. The scores before
+    the MERGE are kept in a temporary table and returned by the last statement.
+
+    Args:
+        staging_table (str): The name of the table holding customer_id and risk_increment.
+
+    Returns:
+        str: The query.
+    """
+    return f"""
+        BEGIN TRANSACTION;
+        CREATE TEMP TABLE previous_risk AS
+        SELECT c.customer_id, COALESCE(c.risk_score, 0) AS risk_score
+        FROM {CUSTOMERS_TABLE} c
+        JOIN {table_ref(staging_table)} u
+        ON c.customer_id = u.customer_id;
+        MERGE {CUSTOMERS_TABLE} c
+        USING {table_ref(staging_table)} u
+        ON c.customer_id = u.customer_id
+        WHEN MATCHED THEN UPDATE SET risk_score = CAST(TRUNC(COALESCE(c.risk_score, 0) + u.risk_increment) AS INT64);
+        COMMIT TRANSACTION;
+        SELECT customer_id, risk_score FROM previous_risk;
+    """
+
+def increment_risk_scores(risk_increments: Dict[str, float]) -> Dict[str, float]:
+    """
+    Adds increments to the risk scores of many customers with a single MERGE. The increments
+    are written to a staging table with a load job, which avoids the DML quota. Like
+    increment_risk_score, the scores are added to in the database, so increments applied
+    concurrently by calculate_risk_score are kept.
+
+    Args:
+        risk_increments (dict): The risk to add, by customer ID.
+
+    Returns:
+        dict: The risk score before the increment, by customer ID. Customers that are not found
+            are left out.
+    """
+    if not risk_increments:
+        return {}
+    backend = get_backend()
+    staging_table = f"risk_score_increments_{uuid.uuid4().hex}"
+    rows = [
+        {'customer_id': customer_id, 'risk_increment': float(risk_increment)}
+        for customer_id, risk_increment in risk_increments.items()
+    ]
+    schema = [
+        bigquery.SchemaField("customer_id", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("risk_increment", "FLOAT64"),
+    ]
+    try:
+        backend.load_rows(staging_table, rows, schema)
+        results = run_risk_update(build_risk_increments_merge_query(staging_table))
+    finally:
+        try:
+            backend.query(f"DROP TABLE IF EXISTS {table_ref(staging_table)}")
+        except Exception as e:
+            logger.warning("Error dropping staging table %s: %s", staging_table, e)
+    invalidate_tables(CUSTOMERS)
+    invalidate_customer_profiles(*risk_increments)
+    previous_risk_scores = {}
+    for row in results:
+        # Keep the first row of customers listed more than once, like get_current_risk_score
+        previous_risk_scores.setdefault(row.customer_id, float(row.risk_score))
+    return previous_risk_scores
+
+@instrumented_tool
+def calculate_risk_scores_batch(activities_by_customer: Dict[str, List[Dict[str, str]]]) -> List[Dict[str, float]]:
+    """
+    Calculates and stores risk scores for many customers at once.
+
+    Adds the increments with one MERGE, which also returns the previous scores (one append to
+    the risk ledger when it is enabled), instead of a write per customer as in
+    calculate_risk_score. Either way the increments are added in the database, so scores
+    written concurrently by calculate_risk_score are not overwritten.
+
+    Args:
+        activities_by_customer (dict): The suspicious activities of each customer, by customer ID.
 
-def check_risk_threshold(customer_id: str, threshold: float = 50.0) -> Dict[str, Optional[float]]:
+    Returns:
+        list: Per customer, a dictionary with customer_id, previous_risk_score, risk_increment,
+            total_risk_score and whether the update was stored.
+    """
+    customer_ids = list(activities_by_customer)
+    if not customer_ids:
+        return []
+
+    risk_increments = {
+        customer_id: calculate_risk_increment(activities_by_customer[customer_id])
+        for customer_id in customer_ids
+    }
+    scored = {customer_id: risk_increment for customer_id, risk_increment in risk_increments.items() if risk_increment}
+
+    if USE_RISK_LEDGER:
+        # The view adds the appended increments to the stored scores
+        previous_risk_scores = get_current_risk_scores(customer_ids)
+        updated = append_risk_events_batch([
+            event
+            for customer_id in scored
+            for event in risk_events(customer_id, activities_by_customer[customer_id], 'calculate_risk_scores_batch')
+        ])
+    else:
+        try:
+            previous_risk_scores = increment_risk_scores(scored)
+            updated = True
+        except Exception as e:
+            logger.error("Error updating risk scores: %s", e)
+            previous_risk_scores = {}
+            updated = False
+        # Customers without an increment (or all of them after a failure) are read as they are
+        unread = [customer_id for customer_id in customer_ids if customer_id not in previous_risk_scores]
+        if unread:
+            previous_risk_scores.update(get_current_risk_scores(unread))
+
+    results = []
+    for customer_id in customer_ids:
+        previous_risk_score = previous_risk_scores.get(customer_id, 0.0)
+        risk_increment = risk_increments[customer_id]
+        results.append({
+            'customer_id': customer_id,
+            'previous_risk_score': previous_risk_score,
+            'risk_increment': risk_increment,
+            'total_risk_score': previous_risk_score + risk_increment,
+            'updated': updated
+        })
+    return results
+
+@instrumented_tool
+def check_risk_threshold(customer_id: str, threshold: float = RISK_ALERT_THRESHOLD) -> Dict[str, Optional[float]]:
     """
     Checks if a customer's risk score exceeds the specified threshold.
     
     Args:
         customer_id (str): The ID of the customer.
-        threshold (float, optional): The risk threshold to trigger an alert. Default is 50.0.
+        threshold (float, optional): The risk threshold to trigger an alert. Default is
+            AML_RISK_ALERT_THRESHOLD (50.0).
     
     Returns:
         dict: A dictionary containing risk status and customer information.
     """
-    # Initialize BigQuery client
-    client = bigquery.Client()
-    
-    # Construct the query to get customer information and risk score
-    query = """
-        SELECT 
-            customer_id,
-            customer_name,
-            email,
-            phone,
-            risk_score
-        FROM 
-            `amlproject-458804.aml_data.customers`
-        WHERE 
-            customer_id = @customer_id
+    # A score written earlier in the same request is read from the request's profile
+    return format_risk_threshold_result(profile_rows(get_customer_profile(customer_id)), customer_id, threshold)
+
+@instrumented_tool
+@async_variant(check_risk_threshold)
+async def check_risk_threshold_async(customer_id: str, threshold: float = RISK_ALERT_THRESHOLD) -> Dict[str, Optional[float]]:
+    profile = await get_customer_profile_async(customer_id)
+    return format_risk_threshold_result(profile_rows(profile), customer_id, threshold)
+
+def format_risk_threshold_result(results, customer_id: str, threshold: float) -> Dict[str, Optional[float]]:
+    """
+    Formats the customer rows of a risk threshold check.
+
+    Args:
+        results: The query rows.
+        customer_id (str): The ID of the customer.
+        threshold (float): The risk threshold to trigger an alert.
+
+    Returns:
+        dict: The risk status and customer information.
     """
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[
-            bigquery.ScalarQueryParameter("customer_id", "STRING", customer_id),
-        ]
-    )
-    
-    # Execute the query
-    query_job = client.query(query, job_config=job_config)
-    results = query_job.result()
-    
     # Format the results
     for row in results:
         risk_score = float(row.risk_score) if row.risk_score is not None else 0.0
@@ -0,0 +1,401 @@
+"""
+Table layout of the transaction data.
+
+- transactions is partitioned by DATE(time) and clustered by customer_id_sender and
+  customer_id_receiver, so time-bounded queries only read the partitions in range and
+  customer lookups skip the blocks of other customers.
+- transaction_legs holds one row per customer per side of a transaction: the sender leg and
+  the receiver leg, each with the customer's own account and location and those of the
+  counterparty. It is partitioned the same way and clustered by customer_id, so the dashboard
+  queries read one table filtered by customer instead of a UNION ALL of the sender and
+  receiver columns of transactions. Set AML_USE_TRANSACTION_LEGS=true once it is backfilled.
+
+An existing unpartitioned transactions table is migrated, and the legs are backfilled in
+batches of days (each batch is replaced, so a failed backfill is completed by rerunning it):
+
+    python -m root_agent.tools.schema create
+    python -m root_agent.tools.schema migrate
+    python -m root_agent.tools.schema backfill-legs --days-per-batch 31
+
+Transactions written after the backfill must have their legs inserted as well, e.g. with
+backfill_transaction_legs for the new time range, as the real-time monitor does with --persist.
+
+The detectors only read the last lookback_days of transactions (AML_DEFAULT_LOOKBACK_DAYS), with
+a time >= @since condition on the partitioning column, so their cost stays flat as the history
+grows.
+"""
+import argparse
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from google.cloud import bigquery
+from root_agent.tools.query_backend import get_backend
+from root_agent.tools.config import (
+    TRANSACTIONS_TABLE,
+    TRANSACTION_LEGS_TABLE,
+    USE_TRANSACTION_LEGS,
+    LOOKBACK_ANCHOR,
+    table_ref,
+)
+from root_agent.tools.tool_logging import get_tool_logger, log_event
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = get_tool_logger(__name__)
+
+TRANSACTIONS_TABLE_NAME = "transactions"
+# The migration builds the new table here and keeps the original under the backup name
+MIGRATION_TABLE_NAME = "transactions_migrating"
+BACKUP_TABLE_NAME = "transactions_unpartitioned"
+
+PARTITION_FIELD = "time"
+TRANSACTIONS_CLUSTERING = ("customer_id_sender", "customer_id_receiver")
+TRANSACTION_LEGS_CLUSTERING = ("customer_id", "direction")
+
+# Columns of the transactions table, for load jobs
+TRANSACTIONS_SCHEMA = [
+    bigquery.SchemaField("transaction_id", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("customer_id_sender", "STRING"),
+    bigquery.SchemaField("customer_id_receiver", "STRING"),
+    bigquery.SchemaField("sender_id_account_no", "STRING"),
+    bigquery.SchemaField("recipient_id_account_no", "STRING"),
+    bigquery.SchemaField("sender_location", "STRING"),
+    bigquery.SchemaField("recipient_location", "STRING"),
+    bigquery.SchemaField("time", "TIMESTAMP", mode="REQUIRED"),
+    bigquery.SchemaField("payment_type", "STRING"),
+    bigquery.SchemaField("amount", "FLOAT64"),
+]
+
+# Start of the range of a detection reading the full history
+HISTORY_START = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+TRANSACTIONS_LAYOUT = f"""
+        PARTITION BY DATE({PARTITION_FIELD})
+        CLUSTER BY {", ".join(TRANSACTIONS_CLUSTERING)}
+"""
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # BigQuery returns aware UTC timestamps, the local backend may return naive ones
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def build_transaction_legs_select(where: str = "") -> str:
+    """
+    Builds the SELECT deriving the transaction legs from the transactions table.
+
+    Args:
+        where (str, optional): A condition on the transactions columns, applied to both sides.
+
+    Returns:
+        str: A query with the columns of the transaction_legs table.
+    """
+    condition = f"WHERE {where}" if where else ""
+    return f"""
+            SELECT
+                customer_id_sender AS customer_id,
+                'sender' AS direction,
+                transaction_id,
+                customer_id_receiver AS counterparty_id,
+                sender_id_account_no AS account_no,
+                recipient_id_account_no AS counterparty_account_no,
+                sender_location AS location,
+                recipient_location AS counterparty_location,
+                time,
+                payment_type,
+                amount
+            FROM {TRANSACTIONS_TABLE}
+            {condition}
+
+            UNION ALL
+
+            SELECT
+                customer_id_receiver AS customer_id,
+                'receiver' AS direction,
+                transaction_id,
+                customer_id_sender AS counterparty_id,
+                recipient_id_account_no AS account_no,
+                sender_id_account_no AS counterparty_account_no,
+                recipient_location AS location,
+                sender_location AS counterparty_location,
+                time,
+                payment_type,
+                amount
+            FROM {TRANSACTIONS_TABLE}
+            {condition}
+    """
+
+
+def transaction_legs_source(use_transaction_legs: Optional[bool] = None) -> str:
+    """
+    Returns what a query selects transaction legs from: the transaction_legs table, or the
+    same rows derived from transactions.
+
+    Args:
+        use_transaction_legs (bool, optional): Whether to read the table. Defaults to
+            AML_USE_TRANSACTION_LEGS.
+
+    Returns:
+        str: A table reference or a parenthesized subquery, to use after FROM.
+    """
+    if use_transaction_legs is None:
+        use_transaction_legs = USE_TRANSACTION_LEGS
+    if use_transaction_legs:
+        return TRANSACTION_LEGS_TABLE
+    return f"({build_transaction_legs_select()})"
+
+
+_lookback_anchor: Optional[datetime] = _as_utc(datetime.fromisoformat(LOOKBACK_ANCHOR)) if LOOKBACK_ANCHOR else None
+
+
+def set_lookback_anchor(anchor: Optional[datetime]) -> None:
+    """
+    Counts the lookback of the detectors back from anchor instead of the current time, e.g. to
+    replay historical or synthetic data.
+
+    Args:
+        anchor (datetime, optional): The end of the lookback. None restores the current time.
+    """
+    global _lookback_anchor
+    _lookback_anchor = _as_utc(anchor)
+
+
+def lookback_since(lookback_days: int) -> datetime:
+    """
+    Returns the earliest transaction time read by a detection with the given lookback.
+
+    Args:
+        lookback_days (int): Days of transactions to read, counted back from now, or from
+            AML_LOOKBACK_ANCHOR when it is set. 0 reads the full history.
+
+    Returns:
+        datetime: The start of the range, in UTC.
+    """
+    if lookback_days <= 0:
+        return HISTORY_START
+    anchor = _lookback_anchor or datetime.now(timezone.utc)
+    return anchor - timedelta(days=lookback_days)
+
+
+def lookback_parameter(lookback_days: int) -> bigquery.ScalarQueryParameter:
+    """
+    Returns the @since parameter of a detection with the given lookback. Queries compare it
+    with the partitioning column (time >= @since), so BigQuery only reads the partitions in range.
+
+    Args:
+        lookback_days (int): Days of transactions to read. 0 reads the full history.
+
+    Returns:
+        bigquery.ScalarQueryParameter: The TIMESTAMP parameter.
+    """
+    return bigquery.ScalarQueryParameter("since", "TIMESTAMP", lookback_since(lookback_days))
+
+
+def create_transactions_table() -> None:
+    """
+    Creates the partitioned and clustered transactions table if it does not exist yet.
+    """
+    get_backend().query(f"""
+        CREATE TABLE IF NOT EXISTS {TRANSACTIONS_TABLE} (
+            transaction_id STRING NOT NULL,
+            customer_id_sender STRING,
+            customer_id_receiver STRING,
+            sender_id_account_no STRING,
+            recipient_id_account_no STRING,
+            sender_location STRING,
+            recipient_location STRING,
+            time TIMESTAMP NOT NULL,
+            payment_type STRING,
+            amount FLOAT64
+        )
+        {TRANSACTIONS_LAYOUT}
+    """)
+
+
+def create_transaction_legs_table() -> None:
+    """
+    Creates the transaction_legs table if it does not exist yet.
+    """
+    get_backend().query(f"""
+        CREATE TABLE IF NOT EXISTS {TRANSACTION_LEGS_TABLE} (
+            customer_id STRING NOT NULL,
+            direction STRING NOT NULL,
+            transaction_id STRING NOT NULL,
+            counterparty_id STRING,
+            account_no STRING,
+            counterparty_account_no STRING,
+            location STRING,
+            counterparty_location STRING,
+            time TIMESTAMP NOT NULL,
+            payment_type STRING,
+            amount FLOAT64
+        )
+        PARTITION BY DATE({PARTITION_FIELD})
+        CLUSTER BY {", ".join(TRANSACTION_LEGS_CLUSTERING)}
+    """)
+
+
+def create_schema() -> None:
+    """
+    Creates the transactions and transaction_legs tables if they do not exist yet.
+    """
+    create_transactions_table()
+    create_transaction_legs_table()
+
+
+def migrate_transactions(keep_backup: bool = True) -> Dict:
+    """
+    Rewrites an existing transactions table with the partitioned and clustered layout.
+
+    BigQuery cannot change the partitioning of a table in place, so the data is copied into a
+    new table that then takes the name of the original one. The original table is renamed to
+    transactions_unpartitioned first and only dropped without keep_backup, after the new table
+    holds the name and the same number of rows, so the data is never only in the temporary
+    table. Queries issued between the two renames fail, so run the migration while nothing
+    writes or reads transactions.
+
+    Args:
+        keep_backup (bool, optional): Keep the original table as transactions_unpartitioned.
+
+    Returns:
+        dict: Whether the table was migrated, and its layout before.
+
+    Raises:
+        RuntimeError: If the new table does not hold the rows of the original one. The original
+            is kept as transactions_unpartitioned.
+    """
+    backend = get_backend()
+    layout = backend.get_table_layout(TRANSACTIONS_TABLE_NAME)
+    if layout is None:
+        create_transactions_table()
+        return {"migrated": False, "created": True, "previous_layout": None}
+    if (layout["partition_field"] == PARTITION_FIELD
+            and tuple(layout["clustering_fields"]) == TRANSACTIONS_CLUSTERING):
+        return {"migrated": False, "created": False, "previous_layout": layout}
+
+    backend.query(f"""
+        CREATE OR REPLACE TABLE {table_ref(MIGRATION_TABLE_NAME)}
+        {TRANSACTIONS_LAYOUT}
+        AS SELECT * FROM {TRANSACTIONS_TABLE}
+    """)
+    backend.query(f"DROP TABLE IF EXISTS {table_ref(BACKUP_TABLE_NAME)}")
+    backend.query(f"ALTER TABLE {TRANSACTIONS_TABLE} RENAME TO {BACKUP_TABLE_NAME}")
+    try:
+        backend.query(f"ALTER TABLE {table_ref(MIGRATION_TABLE_NAME)} RENAME TO {TRANSACTIONS_TABLE_NAME}")
+    except Exception:
+        # The original table takes its name back, the copy stays as transactions_migrating
+        backend.query(f"ALTER TABLE {table_ref(BACKUP_TABLE_NAME)} RENAME TO {TRANSACTIONS_TABLE_NAME}")
+        raise
+
+    if not keep_backup:
+        counts = {}
+        for table_name in (TRANSACTIONS_TABLE_NAME, BACKUP_TABLE_NAME):
+            for row in backend.query(f"SELECT COUNT(*) AS row_count FROM {table_ref(table_name)}"):
+                counts[table_name] = row.row_count
+        if counts[TRANSACTIONS_TABLE_NAME] != counts[BACKUP_TABLE_NAME]:
+            raise RuntimeError(
+                f"the migrated transactions table has {counts[TRANSACTIONS_TABLE_NAME]} rows and the original "
+                f"{counts[BACKUP_TABLE_NAME]}; the original is kept as {BACKUP_TABLE_NAME}"
+            )
+        backend.query(f"DROP TABLE {table_ref(BACKUP_TABLE_NAME)}")
+    log_event(logger, logging.INFO, "transactions_migrated", keep_backup=keep_backup, previous_layout=layout)
+    return {"migrated": True, "created": False, "previous_layout": layout}
+
+
+def backfill_transaction_legs(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    days_per_batch: int = 31
+) -> Dict:
+    """
+    Replaces the transaction legs of a time range with the legs of the transactions in it.
+
+    Every batch deletes and reinserts the legs of days_per_batch days, which only touches
+    those partitions, so rerunning a batch never duplicates legs.
+
+    Args:
+        start (datetime, optional): Start of the range. Defaults to the day of the first transaction.
+        end (datetime, optional): End of the range, exclusive. Defaults to the day after the
+            last transaction.
+        days_per_batch (int, optional): Days per DELETE and INSERT.
+
+    Returns:
+        dict: The range and the number of batches.
+    """
+    backend = get_backend()
+    create_transaction_legs_table()
+
+    if start is None or end is None:
+        first_time = last_time = None
+        for row in backend.query(f"SELECT MIN(time) AS first_time, MAX(time) AS last_time FROM {TRANSACTIONS_TABLE}"):
+            first_time, last_time = _as_utc(row.first_time), _as_utc(row.last_time)
+        if first_time is None:
+            return {"start": start, "end": end, "batches": 0}
+        if start is None:
+            start = first_time.replace(hour=0, minute=0, second=0, microsecond=0)
+        if end is None:
+            end = last_time.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    start, end = _as_utc(start), _as_utc(end)
+
+    batches = 0
+    batch_start = start
+    while batch_start < end:
+        batch_end = min(batch_start + timedelta(days=days_per_batch), end)
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter("batch_start", "TIMESTAMP", batch_start),
+                bigquery.ScalarQueryParameter("batch_end", "TIMESTAMP", batch_end),
+            ]
+        )
+        in_batch = "time >= @batch_start AND time < @batch_end"
+        backend.query(f"DELETE FROM {TRANSACTION_LEGS_TABLE} WHERE {in_batch}", job_config)
+        backend.query(f"""
+            INSERT INTO {TRANSACTION_LEGS_TABLE}
+                (customer_id, direction, transaction_id, counterparty_id, account_no, counterparty_account_no,
+                 location, counterparty_location, time, payment_type, amount)
+            {build_transaction_legs_select(in_batch)}
+        """, job_config)
+        batches += 1
+        log_event(logger, logging.INFO, "transaction_legs_backfilled",
+                  batch_start=batch_start.isoformat(), batch_end=batch_end.isoformat())
+        batch_start = batch_end
+    return {"start": start, "end": end, "batches": batches}
+
+
+def _parse_date(value: str) -> datetime:
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the layout of the transaction tables.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("create", help="Create the partitioned transactions and transaction_legs tables")
+    migrate = commands.add_parser("migrate", help="Rewrite an unpartitioned transactions table")
+    migrate.add_argument("--no-backup", action="store_true",
+                         help="Drop the original table, once the new one is in place with the same rows, "
+                              "instead of keeping it as transactions_unpartitioned")
+    backfill = commands.add_parser("backfill-legs", help="Fill transaction_legs from transactions")
+    backfill.add_argument("--start", default="", help="First day, e.g. 2025-01-01. Defaults to the first transaction")
+    backfill.add_argument("--end", default="", help="Day after the last one. Defaults to after the last transaction")
+    backfill.add_argument("--days-per-batch", type=int, default=31, help="Days replaced per DELETE and INSERT")
+    args = parser.parse_args()
+
+    if args.command == "create":
+        create_schema()
+        result = {"created": True}
+    elif args.command == "migrate":
+        result = migrate_transactions(keep_backup=not args.no_backup)
+    else:
+        result = backfill_transaction_legs(
+            _parse_date(args.start) if args.start else None,
+            _parse_date(args.end) if args.end else None,
+            args.days_per_batch,
+        )
+    print(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+from typing import Any, Dict, Mapping, Optional
+
+from google.adk.tools import ToolContext
+
+from root_agent import state as state_keys
+from root_agent.tools.config import RISK_ALERT_THRESHOLD
+from root_agent.tools.risk_score_calculator import (
+    calculate_risk_score_async,
+    check_risk_threshold_async,
+    get_current_risk_score_async,
+)
+from root_agent.tools.report_generator import generate_sar_report_async
+from dotenv import load_dotenv
+load_dotenv()
+
+
+def _customer_id(tool_context: ToolContext) -> str:
+    return tool_context.state.get(state_keys.CUSTOMER_ID) or ""
+
+
+async def score_customer_risk(state: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    Calculates and stores the risk score of the screened customer from the detector results
+    in the session state.
+
+    Args:
+        state (Mapping): The session state.
+
+    Returns:
+        dict: The customer_id, previous_risk_score, risk_increment and total_risk_score.
+    """
+    activities = state_keys.suspicious_activities(state)
+    if activities:
+        return await calculate_risk_score_async(activities)
+    # No findings: the score is unchanged, so it is reported without writing it back
+    customer_id = state.get(state_keys.CUSTOMER_ID) or ""
+    current_risk_score = await get_current_risk_score_async(customer_id)
+    return {
+        "customer_id": customer_id,
+        "previous_risk_score": current_risk_score,
+        "risk_increment": 0.0,
+        "total_risk_score": current_risk_score,
+    }
+
+
+async def calculate_customer_risk_score(tool_context: ToolContext) -> Dict[str, Any]:
+    """
+    Calculates and stores the risk score of the screened customer from the suspicious activities
+    found by the data collection stage. The activities are read from the session state, so they
+    do not need to be passed in.
+
+    Returns:
+        dict: The customer_id, previous_risk_score, risk_increment and total_risk_score.
+    """
+    result = await score_customer_risk(tool_context.state)
+    tool_context.state[state_keys.RISK_SCORE] = result
+    return result
+
+
+async def check_customer_risk_threshold(tool_context: ToolContext, threshold: float = RISK_ALERT_THRESHOLD) -> Dict[str, Optional[float]]:
+    """
+    Checks if the screened customer's risk score exceeds the threshold.
+
+    Args:
+        threshold (float, optional): The risk threshold to trigger an alert. Default is
+            AML_RISK_ALERT_THRESHOLD (50.0).
+
+    Returns:
+        dict: threshold_exceeded, the customer's contact details and risk_score.
+    """
+    result = await check_risk_threshold_async(_customer_id(tool_context), threshold)
+    tool_context.state[state_keys.RISK_THRESHOLD] = result
+    return result
+
+
+async def generate_customer_sar_report(tool_context: ToolContext) -> Dict:
+    """
+    Generates and stores the Suspicious Activity Report (SAR) of the screened customer, with
+    the suspicious activities found by the data collection stage.
+
+    Returns:
+        dict: The SAR report data.
+    """
+    report = await generate_sar_report_async(
+        _customer_id(tool_context), state_keys.suspicious_activities(tool_context.state)
+    )
+    tool_context.state[state_keys.SAR_REPORT] = report
+    return report
@@ -0,0 +1,83 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Largest composite key used when several customers are processed in one pass
+_MAX_COMPOSITE_KEY = 2 ** 62
+
+
+def window_ends(times: np.ndarray, window: int, groups: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    For every transaction, finds the index of the last transaction inside [time, time + window].
+
+    Args:
+        times (np.ndarray): Integer timestamps (e.g. epoch microseconds), sorted ascending
+            within each group.
+        window (int): The window length, in the same unit as `times`.
+        groups (np.ndarray, optional): Integer customer codes, sorted ascending. Windows never
+            cross from one group into the next.
+
+    Returns:
+        np.ndarray: The inclusive end index of the window starting at each position.
+    """
+    times = np.asarray(times, dtype=np.int64)
+    if len(times) == 0:
+        return np.empty(0, dtype=np.int64)
+    if groups is None:
+        return np.searchsorted(times, times + window, side="right") - 1
+
+    groups = np.asarray(groups, dtype=np.int64)
+    # Shift each group onto its own stretch of the time axis so a single binary search works
+    relative = times - times.min()
+    span = int(relative.max()) + window + 1
+    group_codes = groups - groups.min()
+    if int(group_codes.max()) * span + span < _MAX_COMPOSITE_KEY:
+        keys = group_codes * span + relative
+        return np.searchsorted(keys, keys + window, side="right") - 1
+
+    # Too many groups for a composite key: search each group separately
+    ends = np.empty(len(times), dtype=np.int64)
+    boundaries = np.flatnonzero(np.diff(groups)) + 1
+    for start, stop in zip(np.r_[0, boundaries], np.r_[boundaries, len(times)]):
+        segment = times[start:stop]
+        ends[start:stop] = np.searchsorted(segment, segment + window, side="right") - 1 + start
+    return ends
+
+
+def non_overlapping_windows(
+    times: np.ndarray,
+    window: int,
+    count_threshold: int,
+    groups: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds non-overlapping windows of frequent transactions in O(n log n).
+
+    A window starts at every transaction and spans `window`. Windows holding at least
+    `count_threshold` transactions qualify, and a qualifying window is kept only if none of its
+    transactions belongs to an earlier qualifying window. This is the rule implemented by the
+    frequent small transaction query.
+
+    Args:
+        times (np.ndarray): Integer timestamps, sorted ascending within each group.
+        window (int): The window length, in the same unit as `times`.
+        count_threshold (int): The minimum number of transactions in a window.
+        groups (np.ndarray, optional): Integer customer codes, sorted ascending.
+
+    Returns:
+        tuple: Arrays of inclusive start and end indexes of the kept windows.
+    """
+    ends = window_ends(times, window, groups)
+    if len(ends) == 0:
+        return ends, ends
+
+    positions = np.arange(len(ends), dtype=np.int64)
+    qualifying = ends - positions + 1 >= count_threshold
+
+    # Furthest index covered by any earlier qualifying window. Windows of a previous group
+    # end before the current group starts, so the running maximum never needs resetting.
+    covered = np.maximum.accumulate(np.where(qualifying, ends, -1))
+    covered_before = np.concatenate(([-1], covered[:-1]))
+
+    kept = qualifying & (covered_before < positions)
+    return positions[kept], ends[kept]
@@ -0,0 +1,140 @@
+"""
+Bounded-memory consumption of the streaming detectors.
+
+The stream_* variants of the detectors yield their results in page-sized batches instead of
+building one list. The consumers here process such a stream while holding at most one batch
+plus a fixed amount of state: StreamSummary keeps counts, totals and the top N items for the
+model, and write_jsonl hands every item to a file for batch jobs.
+"""
+import heapq
+import itertools
+import json
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from root_agent.tools.config import TOOL_RESULT_TOP_N
+
+# A stream of detector results: lists of result dicts, one per backend page
+Batches = Iterable[List[Dict[str, Any]]]
+
+
+def format_pages(pages: Iterable[List[Any]], formatter: Callable[[Any], Dict[str, Any]]) -> Batches:
+    """
+    Formats a stream of query pages row by row.
+
+    Args:
+        pages (Iterable): The pages of QueryBackend.query_pages.
+        formatter (callable): Turns a row into a result dict.
+
+    Yields:
+        list: The formatted rows of one page.
+    """
+    for page in pages:
+        yield [formatter(row) for row in page]
+
+
+class StreamSummary:
+    """
+    Summarizes a stream of detector results in constant memory: the number of items, the
+    totals of numeric fields and the top N items by a field.
+    """
+
+    def __init__(self, top_n: int = TOOL_RESULT_TOP_N, sort_field: Optional[str] = None,
+                 sum_fields: Sequence[str] = ()):
+        """
+        Args:
+            top_n (int, optional): The number of items to keep.
+            sort_field (str, optional): The field ranking the items, largest first. Without it
+                the first top_n items are kept.
+            sum_fields (list, optional): Numeric fields to total over all items.
+        """
+        self.top_n = top_n
+        self.sort_field = sort_field
+        self.sum_fields = tuple(sum_fields)
+        self.total_count = 0
+        self.totals = {field: 0 for field in self.sum_fields}
+        self._top = []
+        # Tie breaker, so that the heap never compares the dicts themselves
+        self._sequence = itertools.count()
+
+    def add(self, batch: List[Dict[str, Any]]) -> None:
+        """
+        Adds a batch of items to the summary.
+
+        Args:
+            batch (list): The result dicts.
+        """
+        for item in batch:
+            self.total_count += 1
+            for field in self.sum_fields:
+                self.totals[field] += item.get(field) or 0
+            if self.top_n <= 0:
+                continue
+            if self.sort_field is None:
+                if len(self._top) < self.top_n:
+                    self._top.append((0, next(self._sequence), item))
+                continue
+            # Earlier items win ties, like a stable sort would
+            entry = (item.get(self.sort_field) or 0, -next(self._sequence), item)
+            if len(self._top) < self.top_n:
+                heapq.heappush(self._top, entry)
+            else:
+                heapq.heappushpop(self._top, entry)
+
+    def result(self) -> Dict[str, Any]:
+        """
+        Returns the summary.
+
+        Returns:
+            dict: total_count, totals, the top items and whether items were left out.
+        """
+        if self.sort_field is None:
+            top = [item for _, _, item in self._top]
+        else:
+            top = [item for _, _, item in sorted(self._top, reverse=True)]
+        totals = {field: round(value, 2) for field, value in self.totals.items()}
+        return {
+            "total_count": self.total_count,
+            "totals": totals,
+            "top": top,
+            "truncated": self.total_count > len(top),
+        }
+
+
+def summarize_batches(batches: Batches, top_n: int = TOOL_RESULT_TOP_N, sort_field: Optional[str] = None,
+                      sum_fields: Sequence[str] = ()) -> Dict[str, Any]:
+    """
+    Consumes a stream of detector results and summarizes it with StreamSummary.
+
+    Args:
+        batches (Iterable): The batches of a stream_* detector.
+        top_n (int, optional): The number of items to keep.
+        sort_field (str, optional): The field ranking the items, largest first.
+        sum_fields (list, optional): Numeric fields to total over all items.
+
+    Returns:
+        dict: The summary, see StreamSummary.result.
+    """
+    summary = StreamSummary(top_n, sort_field, sum_fields)
+    for batch in batches:
+        summary.add(batch)
+    return summary.result()
+
+
+def write_jsonl(batches: Batches, path: str) -> int:
+    """
+    Writes a stream of detector results to a JSONL file, one item per line.
+
+    Args:
+        batches (Iterable): The batches of a stream_* detector.
+        path (str): The output file.
+
+    Returns:
+        int: The number of items written.
+    """
+    count = 0
+    with open(path, "w") as f:
+        for batch in batches:
+            for item in batch:
+                f.write(json.dumps(item, default=str) + "\n")
+            count += len(batch)
+    return count
@@ -0,0 +1,256 @@
+"""
+Per-tool query instrumentation.
+
+instrumented_tool wraps a tool so that every call runs in an OpenTelemetry span and is
+recorded in metrics: wall time, and for the BigQuery jobs the tool ran, the queue time,
+total_bytes_processed, total_bytes_billed, slot_millis, cache hits and rows returned. The query
+backends report each finished job with record_query_job; the statistics are collected in a
+context variable, so concurrent tool calls (threads or asyncio tasks) are kept apart and a
+tool called by another tool adds its queries to the caller's.
+
+The metrics go to the global OpenTelemetry meter provider, so a deployment that configures one
+(an OTLP or Prometheus reader) exports them with its own readers. When no provider is configured
+by the first tool call, an in-process provider with an in-memory reader is installed, and
+render_prometheus renders its metrics in the Prometheus text format, which main.py serves on
+/metrics.
+"""
+import contextvars
+import functools
+import inspect
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from opentelemetry import metrics, trace
+from opentelemetry.metrics._internal import _ProxyMeterProvider
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import HistogramDataPoint, InMemoryMetricReader
+
+tracer = trace.get_tracer(__name__)
+
+# The meter of the global provider. Until a provider is set, its instruments are proxies that
+# forward to the provider set later.
+_meter = metrics.get_meter("aml.tools")
+_metric_reader: Optional[InMemoryMetricReader] = None
+_provider_checked = False
+_provider_lock = threading.Lock()
+
+_calls = _meter.create_counter("aml.tool.calls", description="Tool calls")
+_duration = _meter.create_histogram("aml.tool.duration", unit="ms", description="Tool wall time")
+_queue_time = _meter.create_histogram(
+    "aml.tool.queue_time", unit="ms", description="Time the tool's BigQuery jobs waited before starting"
+)
+_bytes_processed = _meter.create_counter("aml.tool.bytes_processed", unit="By", description="BigQuery bytes processed")
+_bytes_billed = _meter.create_counter("aml.tool.bytes_billed", unit="By", description="BigQuery bytes billed")
+_slot_millis = _meter.create_counter("aml.tool.slot_millis", description="BigQuery slot milliseconds")
+_jobs = _meter.create_counter("aml.tool.jobs", description="Query jobs run by tools")
+_cache_hits = _meter.create_counter("aml.tool.cache_hits", description="Query jobs answered from the BigQuery cache")
+_rows = _meter.create_counter("aml.tool.rows", description="Rows returned by the tools' queries")
+
+
+def ensure_meter_provider() -> Optional[InMemoryMetricReader]:
+    """
+    Installs the local fallback provider, with an in-memory reader, if no global meter provider
+    has been configured. The check runs once, at the first tool call or /metrics request rather
+    than at import, so a provider the deployment configures at startup is used.
+
+    Returns:
+        InMemoryMetricReader: The local reader, or None when a configured provider is used.
+    """
+    global _metric_reader, _provider_checked
+    if _provider_checked:
+        return _metric_reader
+    with _provider_lock:
+        if not _provider_checked:
+            if isinstance(metrics.get_meter_provider(), _ProxyMeterProvider):
+                reader = InMemoryMetricReader()
+                provider = MeterProvider(metric_readers=[reader])
+                metrics.set_meter_provider(provider)
+                # A provider set by another thread in the meantime is kept
+                if metrics.get_meter_provider() is provider:
+                    _metric_reader = reader
+            _provider_checked = True
+    return _metric_reader
+
+
+class QueryStats:
+    """
+    Statistics of the queries run during one tool call.
+    """
+
+    FIELDS = ("jobs", "cache_hits", "rows", "bytes_processed", "bytes_billed", "slot_millis", "queue_ms")
+
+    def __init__(self):
+        self.jobs = 0
+        self.cache_hits = 0
+        self.rows = 0
+        self.bytes_processed = 0
+        self.bytes_billed = 0
+        self.slot_millis = 0
+        self.queue_ms = 0.0
+
+    def add(self, other: "QueryStats") -> None:
+        for field in self.FIELDS:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
+_current_stats: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar("aml_query_stats", default=None)
+
+
+def record_query_job(query_job: Any = None, rows: Optional[int] = None) -> None:
+    """
+    Adds a finished query to the statistics of the current tool call, if any.
+
+    Args:
+        query_job (bigquery.QueryJob, optional): The finished job. Local backends pass None.
+        rows (int, optional): The number of rows returned.
+    """
+    stats = _current_stats.get()
+    if stats is None:
+        return
+    stats.jobs += 1
+    if rows is not None:
+        stats.rows += rows
+    if query_job is None:
+        return
+    stats.bytes_processed += getattr(query_job, "total_bytes_processed", None) or 0
+    stats.bytes_billed += getattr(query_job, "total_bytes_billed", None) or 0
+    stats.slot_millis += getattr(query_job, "slot_millis", None) or 0
+    if getattr(query_job, "cache_hit", None):
+        stats.cache_hits += 1
+    created, started = getattr(query_job, "created", None), getattr(query_job, "started", None)
+    if created and started:
+        stats.queue_ms += (started - created).total_seconds() * 1000
+
+
+def _record(tool_name: str, stats: QueryStats, elapsed_ms: float, status: str, span: trace.Span) -> None:
+    ensure_meter_provider()
+    attributes = {"tool": tool_name}
+    _calls.add(1, {**attributes, "status": status})
+    _duration.record(elapsed_ms, attributes)
+    if stats.jobs:
+        _queue_time.record(stats.queue_ms, attributes)
+    _jobs.add(stats.jobs, attributes)
+    _cache_hits.add(stats.cache_hits, attributes)
+    _rows.add(stats.rows, attributes)
+    _bytes_processed.add(stats.bytes_processed, attributes)
+    _bytes_billed.add(stats.bytes_billed, attributes)
+    _slot_millis.add(stats.slot_millis, attributes)
+    span.set_attribute("aml.tool.duration_ms", elapsed_ms)
+    for field, value in stats.as_dict().items():
+        span.set_attribute(f"aml.tool.{field}", value)
+
+
+class _ToolCall:
+    # Opens the span and the statistics of a call and records them when it ends
+
+    def __init__(self, tool_name: str):
+        self.tool_name = tool_name
+
+    def __enter__(self):
+        self.stats = QueryStats()
+        self.parent = _current_stats.get()
+        self.token = _current_stats.set(self.stats)
+        self.span_context = tracer.start_as_current_span(f"tool {self.tool_name}")
+        self.span = self.span_context.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed_ms = (time.perf_counter() - self.start) * 1000
+        _current_stats.reset(self.token)
+        if self.parent is not None:
+            self.parent.add(self.stats)
+        _record(self.tool_name, self.stats, elapsed_ms, "error" if exc_type else "ok", self.span)
+        self.span_context.__exit__(exc_type, exc, tb)
+        return False
+
+
+def instrumented_tool(function: Callable) -> Callable:
+    """
+    Records a span and metrics for every call of a tool. The wrapper keeps the tool's name,
+    docstring and signature, so it can be passed to FunctionTool unchanged.
+
+    Args:
+        function (callable): The tool, sync or async.
+
+    Returns:
+        callable: The instrumented tool.
+    """
+    tool_name = function.__name__
+
+    if inspect.iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def async_wrapper(*args, **kwargs):
+            with _ToolCall(tool_name):
+                return await function(*args, **kwargs)
+
+        return async_wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with _ToolCall(tool_name):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+def _metric_name(name: str, unit: str) -> str:
+    # Prometheus names end with their unit, unless the name already says it (bytes_processed)
+    name = re.sub(r"[^a-zA-Z0-9_]", "_", name)
+    suffix = {"ms": "milliseconds", "By": "bytes"}.get(unit, "")
+    return name if suffix in name else f"{name}_{suffix}"
+
+
+def _labels(attributes: Dict[str, Any], extra: Optional[Dict[str, Any]] = None) -> str:
+    labels = dict(attributes or {})
+    labels.update(extra or {})
+    if not labels:
+        return ""
+    escaped = []
+    for name, value in sorted(labels.items()):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def render_prometheus() -> str:
+    """
+    Renders the current tool metrics in the Prometheus text exposition format. With a configured
+    meter provider the metrics are exported by its readers, and nothing is rendered here.
+
+    Returns:
+        str: The metrics.
+    """
+    reader = ensure_meter_provider()
+    if reader is None:
+        return ""
+    lines = []
+    data = reader.get_metrics_data()
+    for resource_metrics in (data.resource_metrics if data else []):
+        for scope_metrics in resource_metrics.scope_metrics:
+            for metric in scope_metrics.metrics:
+                name = _metric_name(metric.name, metric.unit)
+                points = list(metric.data.data_points)
+                if not points:
+                    continue
+                if isinstance(points[0], HistogramDataPoint):
+                    lines.append(f"# HELP {name} {metric.description}")
+                    lines.append(f"# TYPE {name} histogram")
+                    for point in points:
+                        cumulative = 0
+                        for bound, count in zip(list(point.explicit_bounds) + ["+Inf"], point.bucket_counts):
+                            cumulative += count
+                            lines.append(f"{name}_bucket{_labels(point.attributes, {'le': bound})} {cumulative}")
+                        lines.append(f"{name}_sum{_labels(point.attributes)} {point.sum}")
+                        lines.append(f"{name}_count{_labels(point.attributes)} {point.count}")
+                else:
+                    lines.append(f"# HELP {name}_total {metric.description}")
+                    lines.append(f"# TYPE {name}_total counter")
+                    for point in points:
+                        lines.append(f"{name}_total{_labels(point.attributes)} {point.value}")
+    return "\n".join(lines) + "\n"
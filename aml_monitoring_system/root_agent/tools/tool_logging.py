@@ -0,0 +1,145 @@
+"""
+Structured logging for the tools.
+
+The tools log one record per call with the number of rows they return instead of printing
+their results. The payload itself is only logged at DEBUG level, for a sample of the calls
+(AML_TOOL_LOG_SAMPLE_RATE) and limited to the first AML_TOOL_LOG_SAMPLE_ITEMS items. Records
+are written to stdout as JSON lines with a 'severity' field, which Cloud Run turns into
+structured Cloud Logging entries; AML_TOOL_LOG_FORMAT=text writes plain lines instead.
+
+Every helper checks the logger level before building anything, so disabled levels, and
+AML_TOOL_LOG_LEVEL=OFF, cost a single comparison per call.
+"""
+import itertools
+import json
+import logging
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Any, Collection
+
+from root_agent.tools.config import (
+    TOOL_LOG_LEVEL,
+    TOOL_LOG_FORMAT,
+    TOOL_LOG_SAMPLE_RATE,
+    TOOL_LOG_SAMPLE_ITEMS,
+)
+
+# Parent of all tool loggers
+ROOT_LOGGER_NAME = "aml"
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object: severity, time, logger, message and the structured
+    fields passed with extra={"fields": {...}}.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "severity": record.levelname,
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """
+    Formats a record as a plain line followed by its structured fields as key=value pairs.
+    """
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, "fields", {})
+        if fields:
+            line += " " + " ".join(f"{name}={value}" for name, value in fields.items())
+        return line
+
+
+def configure_tool_logging(level: str = TOOL_LOG_LEVEL, log_format: str = TOOL_LOG_FORMAT) -> None:
+    """
+    Sets the level and output format of the tool loggers. Called on the first use of a tool
+    logger with the configured defaults; call it again to change them.
+
+    Args:
+        level (str, optional): A logging level name, or 'OFF'. Defaults to AML_TOOL_LOG_LEVEL.
+        log_format (str, optional): 'json' or 'text'. Defaults to AML_TOOL_LOG_FORMAT.
+    """
+    global _configured
+
+    with _configure_lock:
+        logger = logging.getLogger(ROOT_LOGGER_NAME)
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        if level.upper() == "OFF":
+            logger.setLevel(logging.CRITICAL + 1)
+        else:
+            logger.setLevel(level.upper())
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(TextFormatter() if log_format == "text" else StructuredFormatter())
+            logger.addHandler(handler)
+        logger.propagate = False
+        _configured = True
+
+
+def get_tool_logger(name: str) -> logging.Logger:
+    """
+    Returns the logger of a tool module.
+
+    Args:
+        name (str): The module name, usually __name__.
+
+    Returns:
+        logging.Logger: A child of the 'aml' logger.
+    """
+    if not _configured:
+        configure_tool_logging()
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+
+def log_event(logger: logging.Logger, level: int, event: str, **fields: Any) -> None:
+    """
+    Logs an event with structured fields.
+
+    Args:
+        logger (logging.Logger): The tool logger.
+        level (int): The logging level.
+        event (str): The event name, used as the message.
+        **fields: The structured fields.
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
+
+
+def log_results(logger: logging.Logger, event: str, results: Collection, **fields: Any) -> None:
+    """
+    Logs the row count of a tool result at INFO level and, at DEBUG level, a sample of the
+    payload for a share of the calls.
+
+    Args:
+        logger (logging.Logger): The tool logger.
+        event (str): The event name, e.g. 'large_amount_transactions'.
+        results (list): The tool result.
+        **fields: Further structured fields, such as the customer ID.
+    """
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    fields["row_count"] = len(results)
+    if (logger.isEnabledFor(logging.DEBUG) and TOOL_LOG_SAMPLE_ITEMS > 0
+            and random.random() < TOOL_LOG_SAMPLE_RATE):
+        fields["sample"] = list(itertools.islice(results, TOOL_LOG_SAMPLE_ITEMS))
+        logger.debug(event, extra={"fields": fields})
+    else:
+        logger.info(event, extra={"fields": fields})
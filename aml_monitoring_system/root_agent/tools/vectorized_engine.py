@@ -0,0 +1,322 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from google.cloud import bigquery
+
+from root_agent.tools.query_backend import get_backend, LocalRow
+from root_agent.tools.config import TRANSACTIONS_TABLE, DEFAULT_LOOKBACK_DAYS
+from root_agent.tools.schema import lookback_parameter
+from root_agent.tools.large_amount_detector import format_large_amount_transaction
+from root_agent.tools.frequent_transaction_detector import WINDOW_TRANSACTION_COLUMNS, format_window_transaction
+from root_agent.tools.sliding_window import non_overlapping_windows
+from dotenv import load_dotenv
+load_dotenv()
+
+MICROS_PER_HOUR = 3600 * 1000000
+
+
+def build_transactions_table_query(customer_id: str = "", lookback_days: int = DEFAULT_LOOKBACK_DAYS):
+    """
+    Builds the query of fetch_transactions_table.
+
+    Args:
+        customer_id (str, optional): Only fetch transactions this customer sent or received.
+            If empty, fetches all transactions.
+        lookback_days (int, optional): Only fetch the transactions of the last days. 0 fetches
+            the full history.
+
+    Returns:
+        tuple: The query and its job config.
+    """
+    query = f"""
+        SELECT
+            {WINDOW_TRANSACTION_COLUMNS}
+        FROM
+            {TRANSACTIONS_TABLE}
+        WHERE
+            time >= @since
+    """
+    query_parameters = [lookback_parameter(lookback_days)]
+    if customer_id:
+        query += """
+            AND (customer_id_sender = @customer_id OR customer_id_receiver = @customer_id)
+        """
+        query_parameters.append(bigquery.ScalarQueryParameter("customer_id", "STRING", customer_id))
+    return query, bigquery.QueryJobConfig(query_parameters=query_parameters)
+
+
+def fetch_transactions_table(customer_id: str = "", lookback_days: int = DEFAULT_LOOKBACK_DAYS) -> pa.Table:
+    """
+    Fetches transactions as an Arrow table, using the BigQuery Storage Read API for large results.
+
+    Args:
+        customer_id (str, optional): Only fetch transactions this customer sent or received.
+            If empty, fetches all transactions.
+        lookback_days (int, optional): Only fetch the transactions of the last days. 0 fetches
+            the full history.
+
+    Returns:
+        pa.Table: The transactions table columns.
+    """
+    query, job_config = build_transactions_table_query(customer_id, lookback_days)
+    return get_backend().query_arrow(query, job_config)
+
+
+async def fetch_transactions_table_async(customer_id: str = "", lookback_days: int = DEFAULT_LOOKBACK_DAYS) -> pa.Table:
+    """
+    Same as fetch_transactions_table, without blocking the event loop.
+
+    Args:
+        customer_id (str, optional): Only fetch transactions this customer sent or received.
+            If empty, fetches all transactions.
+        lookback_days (int, optional): Only fetch the transactions of the last days. 0 fetches
+            the full history.
+
+    Returns:
+        pa.Table: The transactions table columns.
+    """
+    query, job_config = build_transactions_table_query(customer_id, lookback_days)
+    return await get_backend().query_arrow_async(query, job_config)
+
+
+def _encode(column: pa.ChunkedArray) -> Tuple[np.ndarray, pa.Array]:
+    # Integer codes (-1 for NULL) and the distinct values they refer to
+    encoded = column.combine_chunks().dictionary_encode()
+    codes = pc.fill_null(encoded.indices, -1).to_numpy().astype(np.int64)
+    return codes, encoded.dictionary
+
+
+def build_legs(transactions: pa.Table, customer_id: str = "") -> Dict[str, np.ndarray]:
+    """
+    Splits transactions into one leg per customer side: the sender side carries the sender
+    location and the receiver side the recipient location. Legs are sorted by customer, time
+    and transaction ID.
+
+    Args:
+        transactions (pa.Table): The transactions, as returned by fetch_transactions_table.
+        customer_id (str, optional): Only keep this customer's legs. If empty, keeps every customer's legs.
+
+    Returns:
+        dict: Column arrays 'row' (index into `transactions`), 'customer' (customer code),
+            'time' (epoch microseconds), 'location' (location code), 'is_sender' and 'amount',
+            plus the 'customer_ids' the customer codes refer to.
+    """
+    time_type = transactions.schema.field("time").type
+    times = transactions["time"].cast(pa.timestamp("us", tz=time_type.tz)).cast(pa.int64())
+    rows = pa.array(np.arange(transactions.num_rows, dtype=np.int64))
+
+    sides = []
+    for customer_column, location_column, is_sender in (
+        ("customer_id_sender", "sender_location", True),
+        ("customer_id_receiver", "recipient_location", False),
+    ):
+        customers = transactions[customer_column]
+        if customer_id:
+            keep = pc.fill_null(pc.equal(customers, customer_id), False)
+        else:
+            keep = pc.is_valid(customers)
+        side = pa.table({
+            "row": rows,
+            "customer_id": customers,
+            "time": times,
+            "transaction_id": transactions["transaction_id"],
+            "location": transactions[location_column],
+            "is_sender": pa.array(np.full(transactions.num_rows, is_sender)),
+            "amount": transactions["amount"],
+        })
+        sides.append(side.filter(keep))
+
+    legs = pa.concat_tables(sides).sort_by([
+        ("customer_id", "ascending"),
+        ("time", "ascending"),
+        ("transaction_id", "ascending"),
+    ])
+    customer_codes, customer_ids = _encode(legs["customer_id"])
+    location_codes, _ = _encode(legs["location"])
+    return {
+        "row": legs["row"].to_numpy(),
+        "customer": customer_codes,
+        "customer_ids": customer_ids.to_numpy(zero_copy_only=False),
+        "time": legs["time"].to_numpy(),
+        "location": location_codes,
+        "is_sender": legs["is_sender"].to_numpy(),
+        "amount": legs["amount"].to_numpy(),
+    }
+
+
+def large_amount_rows(transactions: pa.Table, amount_threshold: float = 1000.00) -> np.ndarray:
+    """
+    Applies the large amount rule to the amount column.
+
+    Args:
+        transactions (pa.Table): The transactions.
+        amount_threshold (float, optional): Transactions above this amount are suspicious.
+
+    Returns:
+        np.ndarray: Indexes of the suspicious transactions.
+    """
+    return np.flatnonzero(transactions["amount"].to_numpy() > amount_threshold)
+
+
+def frequent_small_windows(
+    legs: Dict[str, np.ndarray],
+    amount_threshold: float = 5000.00,
+    count_threshold: int = 3,
+    time_window_hours: int = 24
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Applies the frequent small transaction rule to the legs with the sliding window kernel.
+
+    Args:
+        legs (dict): Legs from build_legs.
+        amount_threshold (float, optional): The maximum amount to consider as a small transaction.
+        count_threshold (int, optional): The minimum number of transactions to be considered suspicious.
+        time_window_hours (int, optional): The time window in hours to check for frequency.
+
+    Returns:
+        tuple: Leg indexes of the small transactions, and the inclusive start and end positions of
+            each kept window within them.
+    """
+    small = np.flatnonzero(legs["amount"] <= amount_threshold)
+    starts, ends = non_overlapping_windows(
+        legs["time"][small], time_window_hours * MICROS_PER_HOUR, count_threshold, legs["customer"][small]
+    )
+    return small, starts, ends
+
+
+def multiple_location_windows(
+    legs: Dict[str, np.ndarray],
+    min_txn_count: int = 3,
+    location_threshold: int = 2,
+    time_window_hours: int = 48
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Applies the multiple location rule to the legs. A window breaks whenever two consecutive legs
+    of a customer are more than `time_window_hours` whole hours apart.
+
+    Args:
+        legs (dict): Legs from build_legs.
+        min_txn_count (int, optional): Minimum transactions in a window.
+        location_threshold (int, optional): Minimum different locations in a window.
+        time_window_hours (int, optional): Maximum gap in hours between transactions of a window.
+
+    Returns:
+        tuple: Inclusive start and end leg indexes of the suspicious windows.
+    """
+    times, customers, locations = legs["time"], legs["customer"], legs["location"]
+    if len(times) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    new_window = np.ones(len(times), dtype=bool)
+    new_window[1:] = (customers[1:] != customers[:-1]) | (np.diff(times) // MICROS_PER_HOUR > time_window_hours)
+    starts = np.flatnonzero(new_window)
+    ends = np.r_[starts[1:], len(times)] - 1
+    window_ids = np.cumsum(new_window) - 1
+
+    # Distinct (window, location) pairs give the number of locations per window
+    num_locations = max(int(locations.max()) + 1, 1)
+    located = locations >= 0
+    pairs = np.unique(window_ids[located] * num_locations + locations[located])
+    location_counts = np.bincount(pairs // num_locations, minlength=len(starts))
+
+    flagged = (ends - starts + 1 >= min_txn_count) & (location_counts >= location_threshold)
+    return starts[flagged], ends[flagged]
+
+
+def _window_positions(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    # Concatenation of every range start..end
+    counts = ends - starts + 1
+    offsets = np.cumsum(counts) - counts
+    return np.repeat(starts - offsets, counts) + np.arange(int(counts.sum()))
+
+
+def scan_patterns(
+    transactions: pa.Table,
+    customer_id: str = "",
+    large_amount_threshold: float = 1000.00,
+    small_amount_threshold: float = 5000.00,
+    small_count_threshold: int = 3,
+    small_time_window_hours: int = 24,
+    location_min_txn_count: int = 3,
+    location_threshold: int = 2,
+    location_time_window_hours: int = 48
+) -> Dict[str, List[Dict]]:
+    """
+    Runs the large amount, frequent small and multiple location rules as column operations and
+    formats only the flagged transactions.
+
+    Args:
+        transactions (pa.Table): The transactions, as returned by fetch_transactions_table.
+        customer_id (str, optional): The customer to check. If empty, checks all customers.
+        (remaining arguments as in detect_all_patterns)
+
+    Returns:
+        dict: The suspicious activities per rule, in the same structure as the single-rule detectors.
+    """
+    legs = build_legs(transactions, customer_id)
+    large_rows = large_amount_rows(transactions, large_amount_threshold)
+    small, small_starts, small_ends = frequent_small_windows(
+        legs, small_amount_threshold, small_count_threshold, small_time_window_hours
+    )
+    location_starts, location_ends = multiple_location_windows(
+        legs, location_min_txn_count, location_threshold, location_time_window_hours
+    )
+
+    # Materialize the flagged transactions only
+    small_legs = small[_window_positions(small_starts, small_ends)]
+    location_legs = _window_positions(location_starts, location_ends)
+    flagged_rows = np.unique(np.concatenate([large_rows, legs["row"][small_legs], legs["row"][location_legs]]))
+    records = dict(zip(flagged_rows.tolist(), transactions.take(pa.array(flagged_rows)).to_pylist()))
+
+    large_amount = [
+        format_large_amount_transaction(LocalRow(records[row]), customer_id)
+        for row in sorted(large_rows.tolist(), key=lambda row: (records[row]["time"], records[row]["transaction_id"]))
+    ]
+
+    frequent_small = []
+    for start, end in zip(small_starts.tolist(), small_ends.tolist()):
+        window = small[start:end + 1]
+        transactions_in_window = []
+        for leg in window.tolist():
+            transaction = dict(records[int(legs["row"][leg])])
+            transaction["direction"] = "sender" if legs["is_sender"][leg] else "receiver"
+            transactions_in_window.append(transaction)
+        frequent_small.append({
+            'customer_id': legs["customer_ids"][legs["customer"][window[0]]],
+            'transaction_count': len(window),
+            'total_amount': sum(transaction['amount'] for transaction in transactions_in_window),
+            'first_transaction_date': transactions_in_window[0]['time'].isoformat(),
+            'last_transaction_date': transactions_in_window[-1]['time'].isoformat(),
+            'time_window_hours': small_time_window_hours,
+            'risk_type': 'frequent_small_transactions',
+            'original_id': customer_id,
+            'transactions': [format_window_transaction(transaction) for transaction in transactions_in_window]
+        })
+
+    multiple_locations = []
+    for start, end in zip(location_starts.tolist(), location_ends.tolist()):
+        window = [
+            (records[int(legs["row"][leg])], legs["is_sender"][leg])
+            for leg in range(start, end + 1)
+        ]
+        locations = [
+            record["sender_location"] if is_sender else record["recipient_location"]
+            for record, is_sender in window
+        ]
+        multiple_locations.append({
+            "original_id": customer_id,
+            "customer_id": legs["customer_ids"][legs["customer"][start]],
+            "transaction_ids": ", ".join(record["transaction_id"] for record, _ in window),
+            "locations": ", ".join(dict.fromkeys(location for location in locations if location is not None)),
+            'risk_type': 'multiple_locations',
+            "start_time": window[0][0]["time"].isoformat(),
+            "end_time": window[-1][0]["time"].isoformat(),
+        })
+
+    return {
+        "large_amount_transactions": large_amount,
+        "frequent_small_transactions": frequent_small,
+        "multiple_location_transactions": multiple_locations,
+    }
@@ -0,0 +1,112 @@
+"""
+Shared fixtures: the tools run against an in-memory DuckDB backend loaded with a few
+customers and their transactions, with the process-wide caches emptied around every test.
+"""
+import csv
+from datetime import datetime
+
+import pytest
+
+from root_agent.tools import risk_ledger
+from root_agent.tools.config import CUSTOMERS_TABLE
+from root_agent.tools.customer_profiles import get_customer_profile_cache
+from root_agent.tools.query_backend import DuckDBBackend, set_backend
+from root_agent.tools.result_cache import get_result_cache
+from root_agent.tools.schema import set_lookback_anchor
+
+CUSTOMER_COLUMNS = [
+    "customer_id", "account_no", "location_of_account", "customer_name", "phone", "email", "risk_score",
+]
+
+# C1..C5 with risk scores 10..50
+CUSTOMERS = [
+    {
+        "customer_id": f"C{number}",
+        "account_no": f"A{number}",
+        "location_of_account": "NY",
+        "customer_name": f"Name{number}",
+        "phone": "555",
+        "email": f"c{number}@example.com",
+        "risk_score": number * 10,
+    }
+    for number in range(1, 6)
+]
+
+
+TRANSACTION_COLUMNS = [
+    "transaction_id", "customer_id_sender", "customer_id_receiver", "sender_id_account_no",
+    "recipient_id_account_no", "sender_location", "recipient_location", "time", "payment_type", "amount",
+]
+
+# The detectors' lookback ends here instead of now, so it covers the fixture transactions
+LOOKBACK_ANCHOR = datetime(2025, 2, 1)
+
+# C1 sends two large wires, C2 sends small payments from three cities within a day
+TRANSACTIONS = [
+    ("T1", "C1", "C3", "A1", "A3", "NY", "NY", "2025-01-10 09:00:00", "wire", 2500.0),
+    ("T2", "C1", "C4", "A1", "A4", "NY", "NY", "2025-01-12 15:30:00", "wire", 4000.0),
+    ("T3", "C2", "C5", "A2", "A5", "NY", "NY", "2025-01-20 08:00:00", "card", 120.0),
+    ("T4", "C2", "C5", "A2", "A5", "SF", "NY", "2025-01-20 12:00:00", "card", 80.0),
+    ("T5", "C2", "C5", "A2", "A5", "BOS", "NY", "2025-01-20 18:00:00", "card", 95.0),
+    ("T6", "C3", "C1", "A3", "A1", "NY", "NY", "2025-01-25 10:00:00", "wire", 300.0),
+]
+
+
+class RecordingBackend(DuckDBBackend):
+    """
+    DuckDB backend that counts queries and can fail the next ones, to test cache hits and
+    retries.
+    """
+
+    def __init__(self, data_dir: str):
+        super().__init__(data_dir=data_dir)
+        self.queries = []
+        self.failures = []
+
+    def fail_next(self, error: Exception, times: int = 1, matching: str = "") -> None:
+        """
+        Raises error instead of running the next queries containing matching.
+        """
+        self.failures.extend([(matching, error)] * times)
+
+    def query(self, query, job_config=None):
+        for index, (matching, error) in enumerate(self.failures):
+            if matching in query:
+                del self.failures[index]
+                raise error
+        self.queries.append(query)
+        return super().query(query, job_config)
+
+    def stored_risk_scores(self) -> dict:
+        """
+        Returns the risk_score column of the customers table, by customer ID.
+        """
+        rows = super().query(f"SELECT customer_id, risk_score FROM {CUSTOMERS_TABLE}")
+        return {row.customer_id: row.risk_score for row in rows}
+
+
+def _clear_caches() -> None:
+    get_customer_profile_cache().clear()
+    get_result_cache().clear()
+    risk_ledger._ledger_ready = False
+
+
+@pytest.fixture
+def backend(tmp_path):
+    with open(tmp_path / "customers.csv", "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=CUSTOMER_COLUMNS)
+        writer.writeheader()
+        writer.writerows(CUSTOMERS)
+    with open(tmp_path / "transactions.csv", "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(TRANSACTION_COLUMNS)
+        writer.writerows(TRANSACTIONS)
+    backend = RecordingBackend(data_dir=str(tmp_path))
+    set_backend(backend)
+    set_lookback_anchor(LOOKBACK_ANCHOR)
+    _clear_caches()
+    yield backend
+    set_backend(None)
+    set_lookback_anchor(None)
+    _clear_caches()
+
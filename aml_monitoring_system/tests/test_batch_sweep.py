@@ -0,0 +1,77 @@
+"""
+Batch sweep: a resumed sweep retries failed reports without adding the risk increments again.
+"""
+import json
+
+import pytest
+
+from root_agent import batch_sweep
+from root_agent.batch_sweep import load_checkpoint, run_sweep
+from root_agent.tools.config import SAR_REPORTS_TABLE
+from root_agent.tools.report_sink import close_report_sink
+
+# Scores after one sweep: C1 has two large amounts, C2 frequent small payments from three cities
+SCORED = {"C1": 40, "C2": 50, "C3": 30, "C4": 40, "C5": 50}
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    yield str(tmp_path / "sweep.jsonl")
+    close_report_sink()
+
+
+def sweep(checkpoint_path):
+    return run_sweep(["C1", "C2"], workers=2, risk_threshold=0, checkpoint_path=checkpoint_path, lookback_days=0)
+
+
+def stored_report_customers(backend):
+    return sorted(row.customer_id for row in backend.query(f"SELECT customer_id FROM {SAR_REPORTS_TABLE}"))
+
+
+def test_sweep_scores_reports_and_skips_finished_customers(backend, checkpoint):
+    stats = sweep(checkpoint)
+    assert (stats["processed"], stats["failed"], stats["reports"]) == (2, 0, 2)
+    assert backend.stored_risk_scores() == SCORED
+    assert stored_report_customers(backend) == ["C1", "C2"]
+    assert all("report_id" in record for record in load_checkpoint(checkpoint).values())
+
+    stats = sweep(checkpoint)
+    assert (stats["skipped"], stats["processed"]) == (2, 0)
+    assert backend.stored_risk_scores() == SCORED
+
+
+def test_resume_after_a_report_failure_keeps_the_score(backend, checkpoint, monkeypatch):
+    def fail_reports(*args, **kwargs):
+        raise RuntimeError("customer query failed")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(batch_sweep, "iter_sar_reports_bulk", fail_reports)
+        stats = sweep(checkpoint)
+    assert stats["failed"] == 2
+    assert load_checkpoint(checkpoint)["C1"]["error"] == "report failed: customer query failed"
+    assert backend.stored_risk_scores() == SCORED
+
+    stats = sweep(checkpoint)
+    assert (stats["report_retries"], stats["failed"], stats["reports"]) == (2, 0, 2)
+    assert backend.stored_risk_scores() == SCORED
+    assert stored_report_customers(backend) == ["C1", "C2"]
+    record = load_checkpoint(checkpoint)["C1"]
+    assert "error" not in record
+    assert (record["previous_risk_score"], record["total_risk_score"]) == (10.0, 40.0)
+
+
+def test_resume_after_a_crash_before_the_reports_keeps_the_score(backend, checkpoint, monkeypatch):
+    def crash(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    with monkeypatch.context() as patch:
+        patch.setattr(batch_sweep, "iter_sar_reports_bulk", crash)
+        with pytest.raises(KeyboardInterrupt):
+            sweep(checkpoint)
+    with open(checkpoint) as f:
+        assert [json.loads(line)["stage"] for line in f] == ["scored", "scored"]
+    assert backend.stored_risk_scores() == SCORED
+
+    stats = sweep(checkpoint)
+    assert (stats["report_retries"], stats["reports"]) == (2, 2)
+    assert backend.stored_risk_scores() == SCORED
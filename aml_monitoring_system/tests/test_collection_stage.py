@@ -0,0 +1,79 @@
+"""
+Collection stage: the detectors only run for a customer ID found in the message or in the
+session, never for free text. A customer scored exactly at the threshold is escalated, as the
+alert prompt says.
+"""
+import asyncio
+
+import pytest
+from google.adk.agents import SequentialAgent
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from root_agent import state as state_keys
+from root_agent.sub_agents.alert_generator_agent.agent import alert_generator_agent
+from root_agent.sub_agents.data_collector_agent.collection_stage import (
+    CUSTOMER_ID_PATTERN,
+    NO_CUSTOMER_ID_ERROR,
+    create_collection_stage,
+)
+from root_agent.sub_agents.risk_analyzer_agent.scoring_stage import create_scoring_stage
+from root_agent.tools.config import RISK_ALERT_THRESHOLD
+
+APP_NAME = "collection_stage_test"
+
+
+def run_turns(agent, *texts):
+    session_service = InMemorySessionService()
+    runner = Runner(app_name=APP_NAME, agent=agent, session_service=session_service)
+    session = session_service.create_session(app_name=APP_NAME, user_id="test")
+
+    async def run(text):
+        message = types.Content(role="user", parts=[types.Part(text=text)])
+        return [event async for event in runner.run_async(user_id="test", session_id=session.id, new_message=message)]
+
+    events = [asyncio.run(run(text)) for text in texts]
+    return events, session_service.get_session(app_name=APP_NAME, user_id="test", session_id=session.id).state
+
+
+def run_stage(text):
+    events, state = run_turns(create_collection_stage(), text)
+    return events[0], state
+
+
+def test_customer_id_pattern():
+    assert CUSTOMER_ID_PATTERN.search("C10045").group(0) == "C10045"
+    assert CUSTOMER_ID_PATTERN.search("Please screen customer C10045 today").group(0) == "C10045"
+    assert CUSTOMER_ID_PATTERN.search("please screen this customer") is None
+
+
+@pytest.mark.parametrize("text", [" ", "please screen this customer"])
+def test_message_without_customer_id_runs_no_detector(backend, text):
+    events, state = run_stage(text)
+    assert [event.error_message for event in events if event.error_message] == [NO_CUSTOMER_ID_ERROR]
+    assert events[-1].actions.escalate is True
+    assert state.get(state_keys.CUSTOMER_ID) is None
+    assert state.get(state_keys.DETECTION_SUMMARY) is None
+    assert all(state.get(key) == [] for key in state_keys.PATTERN_KEYS)
+    assert backend.queries == []
+
+
+def test_follow_up_turn_does_not_score_the_customer_again(backend):
+    agent = SequentialAgent(name="screening", sub_agents=[create_collection_stage(), create_scoring_stage()])
+    (first, second), state = run_turns(agent, "C1", "why?")
+    assert not any(event.error_message for event in first)
+    assert [event.error_message for event in second if event.error_message] == [NO_CUSTOMER_ID_ERROR]
+    # C1 has two large amounts: one increment of 30
+    assert backend.stored_risk_scores()["C1"] == 40
+    assert state.get(state_keys.CUSTOMER_ID) is None
+    assert state.get(state_keys.RISK_SCORE) is None
+
+
+def test_score_at_the_threshold_is_escalated(backend):
+    agent = SequentialAgent(name="screening", sub_agents=[create_collection_stage(), create_scoring_stage()])
+    _, state = run_turns(agent, "C2")
+    # C2 starts at 20 and gets 30 for its small payments from three cities
+    assert state[state_keys.RISK_SCORE]["total_risk_score"] == RISK_ALERT_THRESHOLD
+    assert state[state_keys.RISK_THRESHOLD]["threshold_exceeded"]
+    assert f"risk score >= {RISK_ALERT_THRESHOLD}" in alert_generator_agent.instruction
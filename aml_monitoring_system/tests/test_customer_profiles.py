@@ -0,0 +1,183 @@
+"""
+Customer profile cache: a customer is read once per request scope and per TTL, and risk
+score writes of this process are never hidden by a cached profile.
+"""
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+from root_agent.tools.customer_profiles import (
+    _MISSING,
+    CustomerProfileCache,
+    _request_profiles,
+    build_customer_profile_query,
+    close_customer_profile_scope,
+    customer_profile_scope,
+    get_customer_profile,
+    get_customer_profile_cache,
+    open_customer_profile_scope,
+)
+from root_agent.tools.report_generator import get_customer_info
+from root_agent.tools.risk_score_calculator import (
+    apply_risk_increment,
+    calculate_risk_scores_batch,
+    check_risk_threshold,
+    get_current_risk_score,
+    update_risk_score,
+)
+
+PROFILE_QUERY, _ = build_customer_profile_query("")
+
+
+def profile_queries(backend) -> int:
+    return backend.queries.count(PROFILE_QUERY)
+
+
+def test_request_scope_reads_a_customer_once(backend):
+    with customer_profile_scope():
+        assert get_current_risk_score("C1") == 10.0
+        assert check_risk_threshold("C1", 5.0)["threshold_exceeded"] is True
+        assert get_customer_info(backend, "C1")["name"] == "Name1"
+    assert profile_queries(backend) == 1
+    assert get_customer_profile_cache().stats()["request_hits"] == 2
+
+
+def test_process_cache_is_shared_across_requests(backend):
+    with customer_profile_scope():
+        get_current_risk_score("C2")
+    with customer_profile_scope():
+        assert get_current_risk_score("C2") == 20.0
+    assert get_current_risk_score("C2") == 20.0
+    assert profile_queries(backend) == 1
+
+
+def test_unknown_customer_is_cached_as_missing(backend):
+    assert get_customer_profile("C404") is None
+    assert get_customer_profile("C404") is None
+    assert get_customer_info(backend, "C404") is None
+    assert profile_queries(backend) == 1
+
+
+def test_cached_profile_is_a_copy(backend):
+    get_customer_profile("C1")["risk_score"] = 99
+    assert get_current_risk_score("C1") == 10.0
+
+
+def test_increment_is_seen_in_the_request_and_after_it(backend):
+    with customer_profile_scope():
+        assert get_current_risk_score("C1") == 10.0
+        apply_risk_increment("C1", 15.0)
+        assert get_current_risk_score("C1") == 25.0
+        assert check_risk_threshold("C1", 25.0)["threshold_exceeded"] is True
+    with customer_profile_scope():
+        assert get_current_risk_score("C1") == 25.0
+
+
+def test_absolute_update_replaces_the_request_score_without_a_query(backend):
+    with customer_profile_scope():
+        get_current_risk_score("C3")
+        assert update_risk_score("C3", 70) is True
+        queries = profile_queries(backend)
+        assert get_current_risk_score("C3") == 70.0
+        assert profile_queries(backend) == queries
+    assert get_current_risk_score("C3") == 70.0
+    assert backend.stored_risk_scores()["C3"] == 70
+
+
+def test_batch_update_drops_the_cached_profiles(backend):
+    with customer_profile_scope():
+        assert get_current_risk_score("C4") == 40.0
+        assert get_current_risk_score("C5") == 50.0
+        calculate_risk_scores_batch({
+            "C4": [{"risk_type": "large_amount"}],
+            "C5": [{"risk_type": "multiple_locations"}],
+        })
+        assert get_current_risk_score("C4") == 55.0
+        assert get_current_risk_score("C5") == 70.0
+
+
+def test_request_scopes_of_concurrent_runs_are_isolated(backend):
+    errors = []
+    barrier = threading.Barrier(4)
+
+    def run(customer_id, risk_increment):
+        try:
+            with customer_profile_scope():
+                previous = get_current_risk_score(customer_id)
+                barrier.wait()
+                apply_risk_increment(customer_id, risk_increment)
+                barrier.wait()
+                # Each run sees its own write, and the other runs' writes of other customers
+                # do not leak into its scope
+                assert get_current_risk_score(customer_id) == previous + risk_increment
+        except Exception as e:
+            errors.append(e)
+
+    threads = [
+        threading.Thread(target=run, args=(f"C{number}", float(number)))
+        for number in range(1, 5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert backend.stored_risk_scores() == {"C1": 11, "C2": 22, "C3": 33, "C4": 44, "C5": 50}
+
+
+def test_profiles_expire_after_the_ttl():
+    cache = CustomerProfileCache(ttl=0.05)
+    cache.set("C1", {"customer_id": "C1"})
+    assert cache.get("C1") == {"customer_id": "C1"}
+    time.sleep(0.1)
+    assert cache.get("C1") is _MISSING
+
+
+def run_context(invocation_id):
+    return SimpleNamespace(invocation_id=invocation_id)
+
+
+def test_nested_run_restores_the_enclosing_scope(backend):
+    open_customer_profile_scope(run_context("outer"))
+    get_current_risk_score("C1")
+    open_customer_profile_scope(run_context("inner"))
+    get_current_risk_score("C2")
+    close_customer_profile_scope(run_context("inner"))
+    # The outer run still reads C1 from its scope, and not C2
+    get_customer_profile_cache().clear()
+    get_current_risk_score("C1")
+    assert profile_queries(backend) == 2
+    close_customer_profile_scope(run_context("outer"))
+    get_current_risk_score("C1")
+    assert profile_queries(backend) == 3
+
+
+def test_scope_left_open_by_a_failed_nested_run_is_closed_with_its_parent(backend):
+    open_customer_profile_scope(run_context("outer"))
+    open_customer_profile_scope(run_context("failed"))
+    close_customer_profile_scope(run_context("outer"))
+    get_current_risk_score("C1")
+    get_customer_profile_cache().clear()
+    get_current_risk_score("C1")
+    assert profile_queries(backend) == 2
+    # Closing again, or a run that was never opened, changes nothing
+    close_customer_profile_scope(run_context("outer"))
+    close_customer_profile_scope(run_context("other"))
+
+
+def test_overlapping_runs_keep_their_own_scopes(backend):
+    async def run(invocation_id, customer_id, started, other_started):
+        open_customer_profile_scope(run_context(invocation_id))
+        get_current_risk_score(customer_id)
+        started.set()
+        await other_started.wait()
+        scope = dict(_request_profiles.get())
+        close_customer_profile_scope(run_context(invocation_id))
+        return sorted(scope), _request_profiles.get()
+
+    async def both():
+        first, second = asyncio.Event(), asyncio.Event()
+        return await asyncio.gather(run("a", "C1", first, second), run("b", "C2", second, first))
+
+    assert asyncio.run(both()) == [(["C1"], None), (["C2"], None)]
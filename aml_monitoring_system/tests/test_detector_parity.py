@@ -0,0 +1,94 @@
+"""
+Detector parity: detect_all_patterns, which runs the rules as column operations with the
+sliding window kernel, returns the same activities as the SQL detectors on a synthetic
+dataset with injected patterns. Row order and timestamp offsets are normalized, since the
+SQL results and the Arrow scan order and type their timestamps differently.
+"""
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic_transactions import generate_customers, generate_transactions, inject_patterns
+from root_agent.tools.combined_detector import detect_all_patterns
+from root_agent.tools.frequent_transaction_detector import detect_frequent_small_transactions
+from root_agent.tools.large_amount_detector import detect_large_amount_transactions
+from root_agent.tools.multiple_location_detector import detect_multiple_location_transactions
+from root_agent.tools.query_backend import DuckDBBackend, set_backend
+from root_agent.tools.schema import set_lookback_anchor
+from root_agent.tools.sliding_window import non_overlapping_windows
+
+NUM_CUSTOMERS = 20
+
+
+@pytest.fixture(scope="module")
+def synthetic_backend(tmp_path_factory):
+    data_dir = tmp_path_factory.mktemp("synthetic")
+    transactions = generate_transactions(3000, NUM_CUSTOMERS, days=30, seed=3)
+    patterns, _ = inject_patterns(NUM_CUSTOMERS, 3, days=30, seed=3, first_transaction=len(transactions))
+    pd.concat([transactions, patterns]).to_parquet(data_dir / "transactions.parquet")
+    generate_customers(NUM_CUSTOMERS).to_parquet(data_dir / "customers.parquet")
+    set_backend(DuckDBBackend(data_dir=str(data_dir)))
+    set_lookback_anchor(datetime(2025, 3, 1))
+    yield
+    set_backend(None)
+    set_lookback_anchor(None)
+
+
+def normalize(value):
+    # ISO timestamps as naive UTC, amounts to the cent, records and lists in a fixed order
+    if isinstance(value, dict):
+        return {key: normalize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return sorted((normalize(item) for item in value), key=repr)
+    if isinstance(value, float):
+        return round(value, 2)
+    if isinstance(value, str) and len(value) >= 19 and value[4] == "-" and value[10] == "T":
+        timestamp = datetime.fromisoformat(value)
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        return timestamp.isoformat()
+    return value
+
+
+def sql_patterns(customer_id):
+    return {
+        "large_amount_transactions": detect_large_amount_transactions(customer_id, lookback_days=0),
+        "frequent_small_transactions": detect_frequent_small_transactions(customer_id, lookback_days=0),
+        "multiple_location_transactions": detect_multiple_location_transactions(customer_id, lookback_days=0),
+    }
+
+
+@pytest.mark.parametrize("customer_id", ["", "C0000003", "C0000017"])
+def test_detect_all_patterns_matches_the_sql_detectors(synthetic_backend, customer_id):
+    patterns = detect_all_patterns(customer_id, lookback_days=0)
+    expected = sql_patterns(customer_id)
+
+    for rule, activities in expected.items():
+        assert activities, rule
+        assert normalize(patterns[rule]) == normalize(activities), rule
+
+
+def test_non_overlapping_windows_match_a_scan():
+    rng = np.random.default_rng(5)
+    groups = np.sort(rng.integers(0, 4, 400))
+    times = np.concatenate([np.sort(rng.integers(0, 1000, count)) for count in np.bincount(groups)])
+    window, count_threshold = 30, 3
+
+    # The rule of the frequent small transaction query, one window start at a time: a qualifying
+    # window is kept unless it starts inside an earlier qualifying window, kept or not
+    expected = []
+    covered = {}
+    for start in range(len(times)):
+        end = start
+        while end + 1 < len(times) and groups[end + 1] == groups[start] and times[end + 1] <= times[start] + window:
+            end += 1
+        if end - start + 1 < count_threshold:
+            continue
+        if covered.get(groups[start], -1) < start:
+            expected.append((start, end))
+        covered[groups[start]] = max(covered.get(groups[start], -1), end)
+
+    starts, ends = non_overlapping_windows(times, window, count_threshold, groups)
+    assert list(zip(starts.tolist(), ends.tolist())) == expected
@@ -0,0 +1,65 @@
+"""
+Feature tables: refreshing them batch by batch as transactions arrive gives the same rows as
+rebuilding them from all transactions at once.
+"""
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic_transactions import generate_transactions, inject_patterns
+from root_agent.tools import feature_store
+from root_agent.tools.config import (
+    CUSTOMER_DAILY_FEATURES_TABLE,
+    CUSTOMER_FEATURE_WINDOWS_TABLE,
+    CUSTOMER_FEATURES_TABLE,
+)
+from root_agent.tools.query_backend import DuckDBBackend, set_backend
+from root_agent.tools.schema import TRANSACTIONS_SCHEMA
+
+NUM_CUSTOMERS = 15
+FEATURE_TABLES = (CUSTOMER_FEATURES_TABLE, CUSTOMER_FEATURE_WINDOWS_TABLE, CUSTOMER_DAILY_FEATURES_TABLE)
+
+
+@pytest.fixture
+def empty_backend(tmp_path):
+    backend = DuckDBBackend(data_dir=str(tmp_path))
+    set_backend(backend)
+    yield backend
+    set_backend(None)
+
+
+def synthetic_transactions():
+    transactions = generate_transactions(2000, NUM_CUSTOMERS, days=20, seed=4)
+    patterns, _ = inject_patterns(NUM_CUSTOMERS, 2, days=20, seed=4, first_transaction=len(transactions))
+    transactions = pd.concat([transactions, patterns]).sort_values("time", ignore_index=True)
+    transactions["time"] = transactions["time"].dt.tz_localize("UTC")
+    return transactions
+
+
+def feature_rows(backend):
+    rows = {}
+    for table in FEATURE_TABLES:
+        rows[table] = sorted(
+            sorted((name, str(value)) for name, value in row.items())
+            for row in backend.query(f"SELECT * FROM {table}")
+        )
+    return rows
+
+
+def test_incremental_refresh_matches_a_rebuild(empty_backend):
+    transactions = synthetic_transactions()
+    # Uneven batches, so batch boundaries fall inside windows and days
+    bounds = [0, 137, 700, 701, 1333, 1800, len(transactions)]
+    empty_backend.load_dataframe("transactions", transactions.iloc[:bounds[1]])
+    assert feature_store.refresh_customer_features()["refreshed"]
+    for start, stop in zip(bounds[1:-1], bounds[2:]):
+        empty_backend.append_rows("transactions", transactions.iloc[start:stop].to_dict("records"), TRANSACTIONS_SCHEMA)
+        assert feature_store.refresh_customer_features()["refreshed"]
+    # Nothing new arrived
+    assert not feature_store.refresh_customer_features()["refreshed"]
+    incremental = feature_rows(empty_backend)
+
+    feature_store.rebuild_customer_features()
+
+    rebuilt = feature_rows(empty_backend)
+    assert all(rebuilt.values())
+    assert incremental == rebuilt
@@ -0,0 +1,84 @@
+"""
+DuckDBBackend: BigQuery SQL with backtick table names, query parameters and scripts runs on the
+local fixtures, and the load, append, paging and Arrow methods behave like the BigQuery ones.
+"""
+from datetime import datetime, timezone
+
+import pytest
+from google.cloud import bigquery
+
+from root_agent.tools.config import TRANSACTIONS_TABLE, table_ref
+from root_agent.tools.query_backend import DuckDBBackend, create_backend
+
+SCORES_SCHEMA = [
+    bigquery.SchemaField("customer_id", "STRING"),
+    bigquery.SchemaField("score", "INT64"),
+    bigquery.SchemaField("scored_at", "TIMESTAMP"),
+]
+
+
+def test_parameters_and_bigquery_functions(backend):
+    query = f"""
+        SELECT
+            customer_id_sender AS customer_id,
+            COUNT(*) AS transaction_count,
+            STRING_AGG(transaction_id, ', ' ORDER BY time) AS transaction_ids,
+            TIMESTAMP_DIFF(MAX(time), MIN(time), HOUR) AS hours,
+            ARRAY_AGG(STRUCT(transaction_id, amount) ORDER BY time) AS transactions
+        FROM {TRANSACTIONS_TABLE}
+        WHERE customer_id_sender IN UNNEST(@customer_ids) AND amount <= @max_amount
+        GROUP BY customer_id_sender
+        ORDER BY customer_id
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ArrayQueryParameter("customer_ids", "STRING", ["C1", "C2"]),
+        bigquery.ScalarQueryParameter("max_amount", "FLOAT64", 3000.0),
+    ])
+
+    rows = backend.query(query, job_config)
+
+    assert [(row.customer_id, row.transaction_count, row.transaction_ids, row.hours) for row in rows] == [
+        ("C1", 1, "T1", 0),
+        ("C2", 3, "T3, T4, T5", 10),
+    ]
+    assert [transaction["transaction_id"] for transaction in rows[1].transactions] == ["T3", "T4", "T5"]
+    assert rows[1]["transactions"][0]["amount"] == 120.0
+
+
+def test_script_returns_the_rows_of_its_last_statement(backend):
+    rows = backend.query(f"""
+        CREATE TEMP TABLE large AS SELECT * FROM {TRANSACTIONS_TABLE} WHERE amount > 1000;
+        SELECT transaction_id FROM large ORDER BY transaction_id
+    """)
+
+    assert [row.transaction_id for row in rows] == ["T1", "T2"]
+
+
+def test_pages_and_arrow_results(backend):
+    query = f"SELECT transaction_id FROM {TRANSACTIONS_TABLE} ORDER BY transaction_id"
+
+    pages = list(backend.query_pages(query, page_size=4))
+    table = backend.query_arrow(query)
+
+    assert [[row.transaction_id for row in page] for page in pages] == [["T1", "T2", "T3", "T4"], ["T5", "T6"]]
+    assert table.column("transaction_id").to_pylist() == ["T1", "T2", "T3", "T4", "T5", "T6"]
+
+
+def test_load_rows_replaces_and_append_rows_appends(backend):
+    scored_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    backend.load_rows("scores", [{"customer_id": "C1", "score": 1, "scored_at": scored_at}], SCORES_SCHEMA)
+    backend.load_rows("scores", [{"customer_id": "C2", "score": 2, "scored_at": scored_at}], SCORES_SCHEMA)
+    backend.append_rows("scores", [{"customer_id": "C3", "score": 3, "scored_at": scored_at}], SCORES_SCHEMA)
+
+    rows = backend.query(f"SELECT customer_id, score, scored_at FROM {table_ref('scores')} ORDER BY customer_id")
+
+    assert [(row.customer_id, row.score) for row in rows] == [("C2", 2), ("C3", 3)]
+    assert rows[0].scored_at.astimezone(timezone.utc) == scored_at
+    assert backend.get_table_layout("scores")["num_rows"] == 2
+    assert backend.get_table_layout("missing") is None
+
+
+def test_create_backend_by_name(tmp_path):
+    assert isinstance(create_backend("duckdb", str(tmp_path)), DuckDBBackend)
+    with pytest.raises(ValueError):
+        create_backend("sqlite")
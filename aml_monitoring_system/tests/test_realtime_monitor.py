@@ -0,0 +1,104 @@
+"""
+RealtimeMonitor: alerts raised one transaction at a time match the windows of the batch rules,
+a monitor resumed from its checkpoint raises the alerts of an uninterrupted run, and persisted
+transactions are merged once.
+"""
+import json
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from benchmarks.synthetic_transactions import generate_transactions, inject_patterns
+from root_agent.realtime_monitor import (
+    JsonlFileSource,
+    RealtimeMonitor,
+    parse_transaction,
+    persist_transactions,
+    run_monitor,
+)
+from root_agent.tools.config import TRANSACTIONS_TABLE
+from root_agent.tools.vectorized_engine import scan_patterns
+
+NUM_CUSTOMERS = 40
+
+
+@pytest.fixture(scope="module")
+def transactions():
+    # Sparse enough that customers have many separate windows
+    transactions = generate_transactions(1500, NUM_CUSTOMERS, days=200, seed=4)
+    patterns, _ = inject_patterns(NUM_CUSTOMERS, 4, days=200, seed=4, first_transaction=len(transactions))
+    transactions = pd.concat([transactions, patterns]).sort_values(["time", "transaction_id"], ignore_index=True)
+    transactions["time"] = transactions["time"].dt.tz_localize("UTC")
+    return transactions
+
+
+def messages(transactions):
+    return [
+        json.dumps(dict(record, time=record["time"].isoformat()))
+        for record in transactions.to_dict("records")
+    ]
+
+
+def alert_keys(alerts, risk_type, field):
+    return sorted((alert["customer_id"], alert["activity"][field]) for alert in alerts if alert["risk_type"] == risk_type)
+
+
+def test_alerts_match_the_batch_rules(transactions):
+    monitor = RealtimeMonitor()
+    alerts = []
+    for message in messages(transactions):
+        alerts.extend(monitor.process(parse_transaction(message)))
+
+    patterns = scan_patterns(pa.Table.from_pandas(transactions, preserve_index=False))
+
+    assert alert_keys(alerts, "frequent_small_transactions", "first_transaction_date") == sorted(
+        (window["customer_id"], window["first_transaction_date"]) for window in patterns["frequent_small_transactions"]
+    )
+    assert alert_keys(alerts, "multiple_locations", "start_time") == sorted(
+        (window["customer_id"], window["start_time"]) for window in patterns["multiple_location_transactions"]
+    )
+    # The monitor alerts both the sender and the receiver of a large transaction
+    large = patterns["large_amount_transactions"]
+    assert alert_keys(alerts, "large_amount", "transaction_id") == sorted(
+        [(record["customer_id_send"], record["transaction_id"]) for record in large]
+        + [(record["customer_id_dest"], record["transaction_id"]) for record in large]
+    )
+    assert monitor.late_transactions == 0
+
+
+def test_resumed_monitor_raises_the_alerts_of_an_uninterrupted_run(transactions, tmp_path):
+    lines = messages(transactions)
+    source_path = tmp_path / "transactions.jsonl"
+    source_path.write_text("\n".join(lines) + "\n")
+    run_monitor(JsonlFileSource(str(source_path)), alerts_path=str(tmp_path / "expected.jsonl"))
+
+    # The same stream, in two runs sharing a checkpoint
+    source_path.write_text("\n".join(lines[:700]) + "\n")
+    first = run_monitor(JsonlFileSource(str(source_path)), checkpoint_path=str(tmp_path / "state.json"),
+                        alerts_path=str(tmp_path / "alerts.jsonl"), checkpoint_every=50)
+    with open(source_path, "a") as f:
+        f.write("\n".join(lines[700:]) + "\n")
+    second = run_monitor(JsonlFileSource(str(source_path)), checkpoint_path=str(tmp_path / "state.json"),
+                         alerts_path=str(tmp_path / "alerts.jsonl"), checkpoint_every=50)
+
+    def alert_ids(name):
+        return [json.loads(line)["alert_id"] for line in (tmp_path / name).read_text().splitlines()]
+
+    assert second["resumed_from"] == first["position"]
+    assert first["processed"] + second["processed"] == len(lines)
+    assert sorted(alert_ids("alerts.jsonl")) == sorted(alert_ids("expected.jsonl"))
+
+
+def test_persisted_transactions_are_merged_once(backend):
+    transaction = parse_transaction({
+        "transaction_id": "T7", "customer_id_sender": "C4", "customer_id_receiver": "C5",
+        "sender_location": "NY", "recipient_location": "SF", "time": "2025-01-30T10:00:00Z",
+        "payment_type": "card", "amount": 75.0,
+    })
+
+    persist_transactions([transaction])
+    persist_transactions([transaction])
+
+    rows = backend.query(f"SELECT transaction_id FROM {TRANSACTIONS_TABLE} ORDER BY transaction_id")
+    assert [row.transaction_id for row in rows] == ["T1", "T2", "T3", "T4", "T5", "T6", "T7"]
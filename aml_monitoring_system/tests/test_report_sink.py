@@ -0,0 +1,152 @@
+"""
+SarReportSink: reports are stored once per report_id, whether a batch is inserted directly or
+merged from a staging table, and a failed write keeps them pending.
+"""
+import threading
+from datetime import datetime
+
+import pytest
+
+from root_agent.tools.config import SAR_REPORTS_TABLE
+from root_agent.tools.report_generator import build_report_id, format_suspicious_activities, prepare_sar_report
+from root_agent.tools.report_sink import SarReportSink
+
+LARGE_AMOUNT = {"risk_type": "large_amount", "customer_id_send": "C1", "transaction_id": "T1",
+                "amount": 15000.0, "transaction_date": "2025-01-01T10:00:00"}
+OTHER_LARGE_AMOUNT = dict(LARGE_AMOUNT, transaction_id="T2", transaction_date="2025-01-02T10:00:00")
+SMALL_WINDOW = {"risk_type": "frequent_small_transactions", "customer_id": "C1", "transaction_count": 3,
+                "total_amount": 300.0, "first_transaction_date": "2025-01-05T08:00:00",
+                "last_transaction_date": "2025-01-05T18:00:00",
+                "transactions": [{"transaction_id": "T3"}, {"transaction_id": "T4"}, {"transaction_id": "T5"}]}
+
+
+@pytest.fixture(params=["insert", "merge"])
+def sink(request, backend):
+    # merge_min_rows=1 writes every batch through the staging table
+    sink = SarReportSink(batch_size=1000, flush_seconds=0, merge_min_rows=1000 if request.param == "insert" else 1)
+    yield sink
+    sink.close()
+
+
+def stored_report_ids(backend):
+    return sorted(row.report_id for row in backend.query(f"SELECT report_id FROM {SAR_REPORTS_TABLE}"))
+
+
+def test_report_id_follows_the_reported_activities(backend):
+    report = prepare_sar_report("C1", [LARGE_AMOUNT])
+    assert prepare_sar_report("C1", [LARGE_AMOUNT])["report_id"] == report["report_id"]
+    assert prepare_sar_report("C1", [OTHER_LARGE_AMOUNT])["report_id"] != report["report_id"]
+    assert prepare_sar_report("C2", [dict(LARGE_AMOUNT, customer_id_send="C2")])["report_id"] != report["report_id"]
+
+
+def test_report_id_tells_windows_with_the_same_totals_apart():
+    later_window = dict(
+        SMALL_WINDOW, first_transaction_date="2025-02-05T08:00:00", last_transaction_date="2025-02-05T18:00:00",
+        transactions=[{"transaction_id": "T6"}, {"transaction_id": "T7"}, {"transaction_id": "T8"}],
+    )
+    assert build_report_id("C1", [SMALL_WINDOW]) != build_report_id("C1", [later_window])
+    # The formatted report of both windows is the same
+    assert format_suspicious_activities("C1", [SMALL_WINDOW]) == format_suspicious_activities("C1", [later_window])
+
+
+def test_report_id_is_the_same_for_every_detector():
+    location_window = {"risk_type": "multiple_locations", "customer_id": "C1", "transaction_ids": "T5, T3, T4",
+                       "start_time": "2025-01-05T08:00:00+00:00", "end_time": "2025-01-05T18:00:00+00:00"}
+    same_window = dict(location_window, transaction_ids="T3, T4, T5",
+                       start_time=datetime(2025, 1, 5, 8), end_time=datetime(2025, 1, 5, 18))
+    assert build_report_id("C1", [LARGE_AMOUNT, location_window]) == build_report_id("C1", [same_window, LARGE_AMOUNT])
+
+
+def test_report_id_without_activities_follows_the_filing():
+    assert build_report_id("C1", []) == build_report_id("C1", [])
+    assert build_report_id("C1", [], "2025-Q3") != build_report_id("C1", [], "2025-Q4")
+    assert build_report_id("C1", [LARGE_AMOUNT], "2025-Q3") != build_report_id("C1", [LARGE_AMOUNT], "2025-Q4")
+
+
+def test_report_added_twice_is_written_once(backend, sink):
+    report = prepare_sar_report("C1", [LARGE_AMOUNT])
+    sink.add(report)
+    sink.add(prepare_sar_report("C1", [LARGE_AMOUNT]))
+    assert sink.pending() == 1
+    assert sink.flush() == 1
+    assert stored_report_ids(backend) == [report["report_id"]]
+
+
+def test_report_flushed_again_is_stored_once(backend, sink):
+    report = prepare_sar_report("C1", [LARGE_AMOUNT])
+    other_report = prepare_sar_report("C1", [OTHER_LARGE_AMOUNT])
+    sink.add(report)
+    sink.flush()
+    # A retried flush, or the same report from another sink
+    sink.add_many([report, other_report])
+    assert sink.flush() == 2
+    assert stored_report_ids(backend) == sorted([report["report_id"], other_report["report_id"]])
+
+
+def test_failed_flush_keeps_the_reports_pending(backend, sink):
+    report = prepare_sar_report("C1", [LARGE_AMOUNT])
+    sink.add(report)
+    # The INSERT, or the MERGE, whose insert clause matches too
+    backend.fail_next(RuntimeError("write failed"), matching="INSERT")
+    with pytest.raises(RuntimeError):
+        sink.flush()
+    assert sink.pending() == 1
+    assert sink.stats()["failures"] == 1
+    assert sink.flush() == 1
+    assert stored_report_ids(backend) == [report["report_id"]]
+
+
+def test_small_batch_is_written_with_one_insert(backend):
+    sink = SarReportSink(batch_size=1000, flush_seconds=0, merge_min_rows=3)
+    reports = [prepare_sar_report("C1", [LARGE_AMOUNT]), prepare_sar_report("C1", [OTHER_LARGE_AMOUNT])]
+    sink.start()
+    backend.queries.clear()
+    sink.add_many(reports)
+    sink.add(reports[0])
+    assert sink.flush() == 2
+    assert len(backend.queries) == 1
+    assert "INSERT INTO" in backend.queries[0] and "MERGE" not in backend.queries[0]
+    assert stored_report_ids(backend) == sorted(report["report_id"] for report in reports)
+    sink.close()
+
+
+def test_large_batch_is_merged_from_a_staging_table(backend):
+    sink = SarReportSink(batch_size=1000, flush_seconds=0, merge_min_rows=3)
+    reports = [
+        prepare_sar_report("C1", [dict(LARGE_AMOUNT, transaction_id=f"T{number}")])
+        for number in range(3)
+    ]
+    sink.add(reports[0])
+    sink.flush()
+    sink.add_many(reports)
+    backend.fail_next(RuntimeError("MERGE failed"), matching="MERGE")
+    with pytest.raises(RuntimeError):
+        sink.flush()
+    assert sink.flush() == 3
+    assert stored_report_ids(backend) == sorted(report["report_id"] for report in reports)
+    # The staging tables of the failed and the successful write are dropped
+    drops = [query for query in backend.queries if query.startswith("DROP TABLE IF EXISTS") and "sar_reports_ingest_" in query]
+    assert len(drops) == 2
+    sink.close()
+
+
+def test_concurrent_adds_and_flushes_store_each_report_once(backend, sink):
+    reports = [
+        prepare_sar_report("C1", [dict(LARGE_AMOUNT, transaction_id=f"T{number}")])
+        for number in range(20)
+    ]
+    sink.start()
+
+    def add_and_flush():
+        for report in reports:
+            sink.add(report)
+        sink.flush()
+
+    threads = [threading.Thread(target=add_and_flush) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    sink.flush()
+    assert stored_report_ids(backend) == sorted(report["report_id"] for report in reports)
+    assert sink.stats()["written"] >= len(reports)
@@ -0,0 +1,65 @@
+"""
+Dashboard result cache: repeated tool calls are answered from the cache until the entry expires
+or a tool writes a table the result depends on, and the SQLite tier shares entries and
+invalidations between processes.
+"""
+import time
+
+from dashboard_agent.sub_agents.dashboard_risk_agent.tools import get_top_risk_customers
+from root_agent.tools.result_cache import CUSTOMERS, TRANSACTIONS, ResultCache, get_result_cache
+from root_agent.tools.risk_score_calculator import update_risk_score
+
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return {"calls": self.calls}
+
+
+def test_repeated_call_is_answered_from_the_cache(backend):
+    first = get_top_risk_customers(limit=2)
+    queries = len(backend.queries)
+    # Callers get copies, so changing a result does not change the cached one
+    first[0]["risk_score"] = -1
+
+    second = get_top_risk_customers(limit=2)
+
+    assert len(backend.queries) == queries
+    assert [customer["customer_id"] for customer in second] == ["C5", "C4"]
+    assert second[0]["risk_score"] == 50
+    assert get_result_cache().stats()["hits"] == 1
+
+
+def test_risk_update_invalidates_the_customer_results(backend):
+    get_top_risk_customers(limit=1)
+
+    update_risk_score("C1", 90)
+
+    assert get_top_risk_customers(limit=1)[0]["customer_id"] == "C1"
+
+
+def test_entries_expire_and_other_tables_do_not_invalidate():
+    cache = ResultCache(ttl=0.1, max_entries=8)
+    compute = Counter()
+
+    cache.get_or_compute("tool", {"limit": 1}, (CUSTOMERS,), compute)
+    cache.invalidate(TRANSACTIONS)
+    assert cache.get_or_compute("tool", {"limit": 1}, (CUSTOMERS,), compute) == {"calls": 1}
+    time.sleep(0.2)
+    assert cache.get_or_compute("tool", {"limit": 1}, (CUSTOMERS,), compute) == {"calls": 2}
+
+
+def test_sqlite_tier_is_shared_between_caches(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    first, second = ResultCache(sqlite_path=path), ResultCache(sqlite_path=path)
+    compute = Counter()
+
+    first.get_or_compute("tool", {}, (TRANSACTIONS,), compute)
+    assert second.get_or_compute("tool", {}, (TRANSACTIONS,), compute) == {"calls": 1}
+    assert second.stats()["shared_hits"] == 1
+
+    first.invalidate(TRANSACTIONS)
+    assert second.get_or_compute("tool", {}, (TRANSACTIONS,), compute) == {"calls": 2}
@@ -0,0 +1,137 @@
+"""
+Risk increments are added in the database: concurrent scorings of a customer are coalesced
+within a process, and transactions aborted by another process's update are retried.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from root_agent.tools import risk_score_calculator
+from root_agent.tools.risk_score_calculator import (
+    RiskIncrementCoalescer,
+    apply_risk_increment_async,
+    calculate_risk_score,
+    calculate_risk_scores_batch,
+    increment_risk_score,
+    is_concurrent_update_error,
+)
+
+CONFLICT = RuntimeError("TransactionContext Error: Conflict on update!")
+
+
+@pytest.fixture
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(risk_score_calculator, "RISK_UPDATE_RETRY_SECONDS", 0.001)
+
+
+def test_concurrent_update_errors_are_recognized():
+    assert is_concurrent_update_error(CONFLICT)
+    assert is_concurrent_update_error(RuntimeError(
+        "Transaction is aborted due to concurrent update against table customers"
+    ))
+    assert not is_concurrent_update_error(RuntimeError("Syntax error"))
+
+
+def test_concurrent_increments_are_coalesced_and_exact(backend):
+    coalescer = RiskIncrementCoalescer()
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(lambda _: coalescer.apply("C1", 1.0), range(100)))
+    assert backend.stored_risk_scores()["C1"] == 110
+    assert coalescer.stats()["increments"] == 100
+    assert coalescer.stats()["jobs"] < 100
+    # Every caller gets the scores of its own increment, as if they were applied in turn
+    assert sorted(result["previous_risk_score"] for result in results) == [10.0 + n for n in range(100)]
+    assert all(result["total_risk_score"] == result["previous_risk_score"] + 1.0 for result in results)
+
+
+def test_sync_and_async_increments_share_the_coalescer(backend):
+    async def score():
+        await asyncio.gather(*(apply_risk_increment_async("C2", 2.0) for _ in range(20)))
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda _: calculate_risk_score([{"risk_type": "large_amount", "customer_id": "C2"}]), range(10)))
+    asyncio.run(score())
+    assert backend.stored_risk_scores()["C2"] == 20 + 10 * 15 + 20 * 2
+
+
+def test_failed_job_fails_only_its_callers(backend):
+    coalescer = RiskIncrementCoalescer()
+    backend.fail_next(RuntimeError("Syntax error"), matching="BEGIN TRANSACTION")
+    with pytest.raises(RuntimeError):
+        coalescer.apply("C3", 5.0)
+    assert coalescer.apply("C3", 5.0) == {"previous_risk_score": 30.0, "total_risk_score": 35.0}
+    assert backend.stored_risk_scores()["C3"] == 35
+
+
+def test_conflicting_transaction_is_retried(backend, no_retry_delay):
+    backend.fail_next(CONFLICT, times=2, matching="BEGIN TRANSACTION")
+    assert increment_risk_score("C1", 5.0) == 10.0
+    assert backend.stored_risk_scores()["C1"] == 15
+
+
+def test_conflict_is_raised_after_the_last_retry(backend, no_retry_delay):
+    backend.fail_next(CONFLICT, times=risk_score_calculator.RISK_UPDATE_RETRIES + 1, matching="BEGIN TRANSACTION")
+    with pytest.raises(RuntimeError, match="Conflict"):
+        increment_risk_score("C1", 5.0)
+    assert backend.stored_risk_scores()["C1"] == 10
+
+
+def test_other_errors_are_not_retried(backend, no_retry_delay):
+    backend.fail_next(RuntimeError("Syntax error"), times=2, matching="BEGIN TRANSACTION")
+    with pytest.raises(RuntimeError, match="Syntax"):
+        increment_risk_score("C1", 5.0)
+    assert len(backend.failures) == 1
+
+
+def test_increments_of_several_processes_are_exact(backend, monkeypatch):
+    # Long enough for the retries to outlast the conflicting jobs
+    monkeypatch.setattr(risk_score_calculator, "RISK_UPDATE_RETRY_SECONDS", 0.05)
+    # One coalescer per process: their jobs for the same customer conflict in the database
+    coalescers = [RiskIncrementCoalescer() for _ in range(4)]
+    applied = []
+    errors = []
+
+    def score(coalescer):
+        for _ in range(10):
+            try:
+                coalescer.apply("C4", 1.0)
+                applied.append(1.0)
+            except Exception as e:
+                errors.append(e)
+
+    def sweep():
+        for _ in range(5):
+            result = calculate_risk_scores_batch({"C4": [{"risk_type": "large_amount"}], "C5": []})[0]
+            if result["updated"]:
+                applied.append(15.0)
+
+    threads = [threading.Thread(target=score, args=(coalescer,)) for coalescer in coalescers]
+    threads.append(threading.Thread(target=sweep))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Every increment reported as stored is added exactly once, and failures are conflicts
+    # that outlasted the retries
+    assert all(is_concurrent_update_error(error) for error in errors)
+    assert backend.stored_risk_scores()["C4"] == 40 + sum(applied)
+    assert len(applied) == 45
+    assert backend.stored_risk_scores()["C5"] == 50
+
+
+def test_batch_adds_to_the_stored_scores(backend):
+    results = calculate_risk_scores_batch({
+        "C1": [{"risk_type": "large_amount"}, {"risk_type": "large_amount"}],
+        "C2": [{"risk_type": "frequent_small_transactions"}],
+        "C3": [],
+        "C404": [{"risk_type": "large_amount"}],
+    })
+    by_customer = {result["customer_id"]: result for result in results}
+    assert by_customer["C1"]["previous_risk_score"] == 10.0
+    assert by_customer["C1"]["total_risk_score"] == 40.0
+    assert by_customer["C2"]["total_risk_score"] == 30.0
+    assert by_customer["C3"]["total_risk_score"] == 30.0
+    assert all(result["updated"] for result in results)
+    assert backend.stored_risk_scores() == {"C1": 40, "C2": 30, "C3": 30, "C4": 40, "C5": 50}
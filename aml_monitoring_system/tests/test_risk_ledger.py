@@ -0,0 +1,140 @@
+"""
+Risk score ledger: with AML_USE_RISK_LEDGER, scorings append events, and the current score is
+the stored baseline plus the customer's events.
+"""
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from root_agent.tools import risk_ledger, risk_score_calculator
+from root_agent.tools.config import CUSTOMER_RISK_SCORES_VIEW, RISK_SCORE_EVENTS_TABLE
+from root_agent.tools.customer_profiles import customer_profile_scope
+from root_agent.tools.risk_ledger import (
+    ADJUSTMENT_RISK_TYPE,
+    build_risk_score_trend_query,
+    build_top_risk_increases_query,
+)
+from root_agent.tools.risk_score_calculator import (
+    calculate_risk_score,
+    calculate_risk_scores_batch,
+    check_risk_threshold,
+    get_current_risk_score,
+    get_current_risk_scores,
+    update_risk_score,
+)
+
+
+@pytest.fixture
+def ledger(backend, monkeypatch):
+    monkeypatch.setattr(risk_ledger, "USE_RISK_LEDGER", True)
+    monkeypatch.setattr(risk_score_calculator, "USE_RISK_LEDGER", True)
+    return backend
+
+
+def events(backend, customer_id):
+    return backend.query(
+        f"SELECT risk_type, risk_increment, activity_count, source FROM {RISK_SCORE_EVENTS_TABLE} "
+        f"WHERE customer_id = '{customer_id}' ORDER BY risk_type"
+    )
+
+
+def view_scores(backend):
+    rows = backend.query(f"SELECT customer_id, risk_score, baseline_risk_score FROM {CUSTOMER_RISK_SCORES_VIEW}")
+    return {row.customer_id: (row.risk_score, row.baseline_risk_score) for row in rows}
+
+
+def test_scoring_appends_one_event_per_risk_type(ledger):
+    result = calculate_risk_score([
+        {"risk_type": "large_amount", "customer_id": "C1"},
+        {"risk_type": "large_amount", "customer_id": "C1"},
+        {"risk_type": "multiple_locations", "customer_id": "C1"},
+    ])
+    assert result["previous_risk_score"] == 10.0
+    assert result["total_risk_score"] == 60.0
+    assert [(row.risk_type, row.risk_increment, row.activity_count) for row in events(ledger, "C1")] == [
+        ("large_amount", 30.0, 2),
+        ("multiple_locations", 20.0, 1),
+    ]
+    # The customers table keeps the baseline, the view adds the events
+    assert ledger.stored_risk_scores()["C1"] == 10
+    assert view_scores(ledger)["C1"] == (60, 10)
+    assert get_current_risk_score("C1") == 60.0
+
+
+def test_score_written_in_a_request_is_read_back(ledger):
+    with customer_profile_scope():
+        assert check_risk_threshold("C2", 50.0)["threshold_exceeded"] is False
+        calculate_risk_score([{"risk_type": "multiple_locations", "customer_id": "C2"}] * 2)
+        assert check_risk_threshold("C2", 50.0)["threshold_exceeded"] is True
+    assert get_current_risk_score("C2") == 60.0
+
+
+def test_batch_appends_the_events_of_all_customers(ledger):
+    results = calculate_risk_scores_batch({
+        "C1": [{"risk_type": "large_amount"}],
+        "C2": [{"risk_type": "frequent_small_transactions"}, {"risk_type": "large_amount"}],
+        "C3": [],
+    })
+    assert all(result["updated"] for result in results)
+    assert [result["total_risk_score"] for result in results] == [25.0, 45.0, 30.0]
+    assert len(events(ledger, "C2")) == 2
+    assert events(ledger, "C3") == []
+    assert get_current_risk_scores(["C1", "C2", "C3"]) == {"C1": 25.0, "C2": 45.0, "C3": 30.0}
+    assert ledger.stored_risk_scores() == {"C1": 10, "C2": 20, "C3": 30, "C4": 40, "C5": 50}
+
+
+def test_setting_a_score_appends_an_adjustment(ledger):
+    calculate_risk_score([{"risk_type": "large_amount", "customer_id": "C3"}])
+    assert update_risk_score("C3", 20) is True
+    adjustments = [row for row in events(ledger, "C3") if row.risk_type == ADJUSTMENT_RISK_TYPE]
+    assert [(row.risk_increment, row.activity_count) for row in adjustments] == [(-25.0, 0)]
+    assert get_current_risk_score("C3") == 20.0
+    assert view_scores(ledger)["C3"] == (20, 30)
+    # Setting the current score again changes nothing
+    assert update_risk_score("C3", 20) is True
+    assert len(events(ledger, "C3")) == 2
+
+
+def test_concurrent_scorings_lose_no_increments(ledger):
+    errors = []
+
+    def score():
+        try:
+            for _ in range(10):
+                calculate_risk_score([{"risk_type": "frequent_small_transactions", "customer_id": "C4"}])
+        except Exception as e:
+            errors.append(e)
+
+    def sweep():
+        try:
+            for _ in range(5):
+                calculate_risk_scores_batch({"C4": [{"risk_type": "large_amount"}]})
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=score) for _ in range(4)] + [threading.Thread(target=sweep)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(events(ledger, "C4")) == 45
+    assert get_current_risk_score("C4") == 40 + 40 * 10 + 5 * 15
+    assert ledger.stored_risk_scores()["C4"] == 40
+
+
+def test_trend_and_top_increases_read_the_events(ledger):
+    calculate_risk_score([{"risk_type": "large_amount", "customer_id": "C5"}])
+    calculate_risk_score([{"risk_type": "multiple_locations", "customer_id": "C5"}])
+    calculate_risk_score([{"risk_type": "frequent_small_transactions", "customer_id": "C1"}])
+    since = datetime.now(timezone.utc) - timedelta(days=1)
+
+    trend = ledger.query(*build_risk_score_trend_query("C5", since))
+    assert [(row.risk_increment, row.events, row.risk_score) for row in trend] == [(35.0, 2, 85)]
+
+    increases = ledger.query(*build_top_risk_increases_query(since, 10))
+    assert [(row.customer_id, row.risk_increase, row.risk_score) for row in increases] == [
+        ("C5", 35.0, 85),
+        ("C1", 10.0, 20),
+    ]
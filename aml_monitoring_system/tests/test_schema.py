@@ -0,0 +1,80 @@
+"""
+Transaction tables: the migration keeps the transactions under their name or as the backup at
+every step, the legs backfill writes one row per customer and side of every transaction, and
+rerunning a batch replaces its legs instead of duplicating them.
+"""
+from datetime import datetime, timezone
+
+import pytest
+
+from root_agent.tools.config import TRANSACTION_LEGS_TABLE, TRANSACTIONS_TABLE
+from root_agent.tools.schema import (
+    BACKUP_TABLE_NAME,
+    MIGRATION_TABLE_NAME,
+    backfill_transaction_legs,
+    build_transaction_legs_select,
+    migrate_transactions,
+)
+
+LEG_COLUMNS = "customer_id, direction, transaction_id, counterparty_id, location, time, amount"
+
+
+def naive_utc(value):
+    # The fixture times are naive UTC, the legs table stores aware ones
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def legs(backend, source):
+    rows = backend.query(f"SELECT {LEG_COLUMNS} FROM {source} ORDER BY transaction_id, direction")
+    return [tuple(naive_utc(value) for value in row.values()) for row in rows]
+
+
+def test_backfilled_legs_match_the_transactions(backend):
+    result = backfill_transaction_legs(days_per_batch=3)
+
+    derived = legs(backend, f"({build_transaction_legs_select()})")
+    assert result["batches"] == 6
+    assert len(derived) == 12
+    assert legs(backend, TRANSACTION_LEGS_TABLE) == derived
+    assert ("C1", "receiver", "T6", "C3", "NY") in [leg[:5] for leg in derived]
+
+
+def test_rerunning_a_batch_does_not_duplicate_legs(backend):
+    backfill_transaction_legs()
+    expected = legs(backend, TRANSACTION_LEGS_TABLE)
+
+    backfill_transaction_legs(datetime(2025, 1, 20, tzinfo=timezone.utc), datetime(2025, 1, 21, tzinfo=timezone.utc))
+
+    assert legs(backend, TRANSACTION_LEGS_TABLE) == expected
+
+
+def tables(backend):
+    return sorted(row.table_name for row in backend.query("SELECT table_name FROM duckdb_tables()"))
+
+
+def transaction_ids(backend):
+    return [row.transaction_id for row in backend.query(f"SELECT transaction_id FROM {TRANSACTIONS_TABLE} ORDER BY 1")]
+
+
+@pytest.mark.parametrize("keep_backup", [True, False])
+def test_migration_replaces_the_transactions_table(backend, keep_backup):
+    expected = transaction_ids(backend)
+
+    assert migrate_transactions(keep_backup=keep_backup)["migrated"]
+
+    assert transaction_ids(backend) == expected
+    assert (BACKUP_TABLE_NAME in tables(backend)) == keep_backup
+    assert MIGRATION_TABLE_NAME not in tables(backend)
+
+
+def test_failed_rename_keeps_the_original_transactions(backend):
+    expected = transaction_ids(backend)
+    backend.fail_next(RuntimeError("rename failed"), matching=f"{MIGRATION_TABLE_NAME}` RENAME")
+
+    with pytest.raises(RuntimeError):
+        migrate_transactions(keep_backup=False)
+
+    assert transaction_ids(backend) == expected
+    assert BACKUP_TABLE_NAME not in tables(backend)
@@ -0,0 +1,78 @@
+"""
+Streaming detectors: the pages of the stream_* variants add up to the list of the detector, and
+the consumers summarize or write a stream without collecting it.
+"""
+import json
+
+import pytest
+
+from dashboard_agent.sub_agents.dashboard_large_amount_agent import tool as dashboard_large_amount
+from root_agent.tools.frequent_transaction_detector import (
+    detect_frequent_small_transactions,
+    stream_frequent_small_transactions,
+)
+from root_agent.tools.large_amount_detector import detect_large_amount_transactions, stream_large_amount_transactions
+from root_agent.tools.multiple_location_detector import (
+    detect_multiple_location_transactions,
+    stream_multiple_location_transactions,
+)
+from root_agent.tools.streaming import StreamSummary, summarize_batches, write_jsonl
+
+
+@pytest.mark.parametrize("detect, stream", [
+    (detect_large_amount_transactions, stream_large_amount_transactions),
+    (detect_frequent_small_transactions, stream_frequent_small_transactions),
+    (detect_multiple_location_transactions, stream_multiple_location_transactions),
+])
+def test_stream_pages_add_up_to_the_detector_result(backend, detect, stream):
+    expected = detect("")
+    pages = list(stream("", page_size=1))
+
+    assert expected
+    assert all(len(page) == 1 for page in pages)
+    assert sorted((item for page in pages for item in page), key=repr) == sorted(expected, key=repr)
+
+
+def test_summary_keeps_the_top_items_and_the_totals():
+    batches = iter([
+        [{"id": "a", "count": 2}, {"id": "b", "count": 5}],
+        [{"id": "c", "count": 5}, {"id": "d", "count": None}],
+        [{"id": "e", "count": 1}],
+    ])
+
+    summary = summarize_batches(batches, top_n=2, sort_field="count", sum_fields=["count"])
+
+    # Ties keep the earlier item first
+    assert [item["id"] for item in summary["top"]] == ["b", "c"]
+    assert summary["total_count"] == 5
+    assert summary["totals"] == {"count": 13}
+    assert summary["truncated"]
+
+
+def test_summary_without_a_sort_field_keeps_the_first_items():
+    summary = StreamSummary(top_n=3)
+    summary.add([{"id": "a"}, {"id": "b"}])
+    summary.add([{"id": "c"}, {"id": "d"}])
+
+    assert [item["id"] for item in summary.result()["top"]] == ["a", "b", "c"]
+    assert summary.result()["truncated"]
+
+
+def test_dashboard_summary_matches_the_full_list(backend):
+    customers = dashboard_large_amount.detect_large_amount_transactions()
+
+    summary = dashboard_large_amount.summarize_large_amount_transactions(top_n=1)
+
+    assert summary["total_count"] == len(customers)
+    assert summary["totals"]["large_transaction_count"] == sum(item["large_transaction_count"] for item in customers)
+    assert summary["top"][0]["large_transaction_count"] == max(item["large_transaction_count"] for item in customers)
+
+
+def test_write_jsonl_writes_every_item(backend, tmp_path):
+    path = tmp_path / "large_amount.jsonl"
+
+    count = write_jsonl(stream_large_amount_transactions("", page_size=1), str(path))
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert count == len(lines) == 2
+    assert sorted(line["transaction_id"] for line in lines) == ["T1", "T2"]
@@ -0,0 +1,60 @@
+"""
+Tool metrics: they go to the global meter provider, and the local in-memory reader behind
+/metrics is installed only when no provider is configured. The global provider can be set once
+per process, so each case runs in its own interpreter.
+"""
+import os
+import subprocess
+import sys
+import textwrap
+
+AML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TOOL_CALLS = """
+from root_agent.tools.telemetry import instrumented_tool, render_prometheus
+
+@instrumented_tool
+def lookup():
+    return 1
+
+lookup()
+lookup()
+"""
+
+
+def run(*parts):
+    result = subprocess.run(
+        [sys.executable, "-c", "\n".join(textwrap.dedent(part) for part in parts)], cwd=AML_DIR, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+def test_metrics_are_rendered_by_the_local_reader_without_a_provider():
+    output = run(TOOL_CALLS, "print(render_prometheus())")
+
+    assert 'aml_tool_calls_total{status="ok",tool="lookup"} 2' in output
+
+
+def test_metrics_go_to_the_configured_provider():
+    output = run(
+        """
+        from opentelemetry import metrics
+        from opentelemetry.sdk.metrics import MeterProvider
+        from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+
+        reader = InMemoryMetricReader()
+        metrics.set_meter_provider(MeterProvider(metric_readers=[reader]))
+        """,
+        TOOL_CALLS,
+        """
+        assert render_prometheus() == ""
+        for resource_metrics in reader.get_metrics_data().resource_metrics:
+            for scope_metrics in resource_metrics.scope_metrics:
+                for metric in scope_metrics.metrics:
+                    if metric.name == "aml.tool.calls":
+                        print(sum(point.value for point in metric.data.data_points))
+        """
+    )
+
+    assert output.strip() == "2"